@@ -1,17 +1,31 @@
-import MetaTrader5 as mt5
+from broker import clock, mt5
 import pandas as pd
-import time
+from config import script_settings
+from symbol_specs import get_symbol_specs
+from timeframes import TIMEFRAMES, timeframe_name
 
 # Connect to MT5
 if not mt5.initialize():
     print("MT5 initialization failed")
     quit()
 
-symbol = "BTCUSD"
-lot_size = 0.09
-sl_amount = 5  # Stop loss in dollars
-tp_amount = 10  # Take profit in dollars
-timeframe = mt5.TIMEFRAME_M5
+# Overridden by scripts.1bigin6 in config.yaml
+settings = script_settings("1bigin6", {
+    "symbol": "BTCUSD",
+    "lot_size": 0.09,
+    "sl_amount": 5,  # Stop loss in dollars
+    "tp_amount": 10,  # Take profit in dollars
+    "timeframe": "M5",
+})
+symbol = settings["symbol"]
+lot_size = settings["lot_size"]
+sl_amount = settings["sl_amount"]
+tp_amount = settings["tp_amount"]
+timeframe = TIMEFRAMES[timeframe_name(settings["timeframe"])]
+
+# Tick size, digits, volume step and stops level, read once so orders need no extra terminal call
+specs = get_symbol_specs(mt5, clock)
+specs.load([symbol])
 
 def get_data():
     rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, 6)  # Get last 6 candles
@@ -33,8 +47,8 @@ def check_entry_condition():
     return None, None, None
 
 def place_trade(entry_price):
-    point = mt5.symbol_info(symbol).point
-    price = mt5.symbol_info_tick(symbol).ask
+    tick = mt5.symbol_info_tick(symbol)
+    price = tick.ask
     sl = price - sl_amount
     tp = price + tp_amount
     
@@ -52,8 +66,12 @@ def place_trade(entry_price):
         "type_time": mt5.ORDER_TIME_GTC,
         "type_filling": mt5.ORDER_FILLING_IOC,
     }
-    
+    if specs.normalize_request(request, tick) is None:  # SL/TP on the tick grid and outside the stops level
+        print(f"Skipped {request['symbol']} entry: SL/TP already on the wrong side of the market")
+        return
+
     order = mt5.order_send(request)
+    specs.rejected(symbol, order.retcode)  # a volume/price/stops rejection gets the spec re-read
     if order.retcode != mt5.TRADE_RETCODE_DONE:
         print("Trade failed, error code:", order.retcode)
     else:
@@ -67,4 +85,4 @@ while True:
             if row['low'] <= trigger_point <= row['high']:
                 place_trade(trigger_point)
                 break
-    time.sleep(300)  # Check every 5 minutes
+    clock.sleep(300)  # Check every 5 minutes
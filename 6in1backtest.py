@@ -1,11 +1,11 @@
-import MetaTrader5 as mt5
+from broker import mt5
 import pandas as pd
 import time
-
-# Connect to MetaTrader 5
-if not mt5.initialize():
-    print("MT5 Initialization Failed")
-    quit()
+import os
+from backtest_engine import run_backtest, OUTCOME_TP, OUTCOME_SL
+from bar_store import BarStore, BarStoreProvider
+from ingest import PartitionProvider, PartitionStore
+from symbol_specs import get_symbol_specs
 
 SYMBOL = "BTCUSDm"
 LOT_SIZE = 0.09
@@ -13,6 +13,9 @@ SL_AMOUNT = 5  # Stop Loss in dollars
 TP_AMOUNT = 10  # Take Profit in dollars
 TIMEFRAME = mt5.TIMEFRAME_M1
 HISTORY_BARS = 6  # Last 5 candles + current
+BAR_STORE = os.environ.get("BAR_STORE")  # Read history from a local bar_store.py directory instead of the terminal
+HISTORY = os.environ.get("HISTORY")  # ...or from an ingest.py partition store, for years of M1
+BACKTEST_DAYS = int(os.environ.get("BACKTEST_DAYS", 30))
 
 # Function to fetch last N bars
 def get_candles():
@@ -38,45 +41,37 @@ def place_order(direction, entry_price):
         "type_time": mt5.ORDER_TIME_GTC,
         "type_filling": mt5.ORDER_FILLING_IOC
     }
+    if get_symbol_specs(mt5).normalize_request(request) is None:  # SL/TP on the tick grid and outside the stops level
+        print("Skipped order: SL/TP on the wrong side of the entry price")
+        return
     result = mt5.order_send(request)
     print("Trade Result:", result)
 
 # Backtesting Function
 def backtest():
-    rates = mt5.copy_rates_from_pos(SYMBOL, TIMEFRAME, 0, 288 * 30)  # 1 month of 5-minute candles
-    df = pd.DataFrame(rates)
-    
-    trades = 0
-    profit = 0
-
-    for i in range(5, len(df)):
-        last_5 = df.iloc[i-5:i]
-        last_6 = df.iloc[i-6:i]
-        current_candle = df.iloc[i]
-        # print(f'current_candle low {current_candle["open"]}, low {current_candle["low"]}')
-        # print(f'{df.iloc[i]}')
+    if HISTORY:
+        source = PartitionProvider(PartitionStore(HISTORY))
+    elif BAR_STORE:
+        source = BarStoreProvider(BarStore(BAR_STORE))
+    else:
+        # Connect to MetaTrader 5 only when the history comes from the terminal
+        if not mt5.initialize():
+            print("MT5 Initialization Failed")
+            quit()
+        source = mt5
+    rates = source.copy_rates_from_pos(SYMBOL, TIMEFRAME, 0, 1440 * BACKTEST_DAYS)  # BACKTEST_DAYS of 1-minute candles
+    trades = run_backtest(rates, sl_amount=SL_AMOUNT, tp_amount=TP_AMOUNT)
 
+    profit = 0
+    for n, trade in enumerate(trades, start=1):
+        if trade["outcome"] == OUTCOME_TP:
+            profit += TP_AMOUNT
+            print(f"Trade {n}: Target Hit {profit}")
+        elif trade["outcome"] == OUTCOME_SL:
+            profit -= SL_AMOUNT
+            print(f"Trade {n}: SL Hit {profit}")
+    trades = len(trades)
 
-        max_body = (last_5["high"] - last_5["low"]).max()
-        current_body = current_candle["high"] - current_candle["low"]
-        #print(f'{max_body} {current_body}')
-        if current_body >= 2 * max_body:
-            entry_price = current_candle["low"] + 0.4 * (current_candle["high"] - current_candle["low"])
-            
-            for j in range(i+1, min(i+6, len(df))):
-                if df.iloc[j]["low"] <= entry_price:
-                    trades += 1
-                    sl = entry_price + SL_AMOUNT
-                    tp = entry_price - TP_AMOUNT
-                    
-                    if df.iloc[j]["low"] <= tp:
-                        profit += TP_AMOUNT
-                        print(f"Trade {trades}: Target Hit {profit}")
-                    elif df.iloc[j]["high"] >= sl:
-                        profit -= SL_AMOUNT
-                        print(f"Trade {trades}: SL Hit {profit}")
-                    break
-    
     print(f"Total Trades: {trades}, Total Profit: {profit}")
 
 # Run backtest
@@ -1,18 +1,33 @@
 import sys
-import MetaTrader5 as mt5
+from broker import clock, mt5
 import pandas as pd
-import time
+from config import script_settings
+from scanner import UniverseWindow, resolve_symbols
+from symbol_specs import get_symbol_specs
+from timeframes import TIMEFRAMES, timeframe_name
 
 # Connect to MT5
 if not mt5.initialize():
     print("MT5 initialization failed")
     quit()
 
-symbols = ["BTCUSDm", "EURUSDm", "GBPUSDm", "USDJPYm", "USDCADm", "AUDUSDm", "NZDUSDm", "XAUUSDm"]
-lot_size = 0.09
-sl_amount = 5  # Stop loss in dollars
-tp_amount = 10  # Take profit in dollars
-timeframe = mt5.TIMEFRAME_M1
+# Overridden by scripts.allpair in config.yaml ("symbols" may also be a symbols_get group pattern, "*" for all)
+settings = script_settings("allpair", {
+    "symbols": ["BTCUSDm", "EURUSDm", "GBPUSDm", "USDJPYm", "USDCADm", "AUDUSDm", "NZDUSDm", "XAUUSDm"],
+    "lot_size": 0.09,
+    "sl_amount": 5,  # Stop loss in dollars
+    "tp_amount": 10,  # Take profit in dollars
+    "timeframe": "M1",
+})
+symbols = resolve_symbols(mt5, settings["symbols"])
+lot_size = settings["lot_size"]
+sl_amount = settings["sl_amount"]
+tp_amount = settings["tp_amount"]
+timeframe = TIMEFRAMES[timeframe_name(settings["timeframe"])]
+
+# Every symbol's tick size, digits, volume step and stops level in one bulk read
+specs = get_symbol_specs(mt5, clock)
+specs.load(symbols)
 
 def get_data(symbol):
     rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, 6)  # Get last 6 candles
@@ -22,22 +37,12 @@ def get_data(symbol):
     df['time'] = pd.to_datetime(df['time'], unit='s')
     return df
 
-def check_entry_condition(symbol):
-    df = get_data(symbol)
-    last_candle = df.iloc[-1]
-    prev_candles = df.iloc[:-1]
-    
-    avg_size = (prev_candles['high'] - prev_candles['low']).mean()
-    last_candle_size = last_candle['high'] - last_candle['low']
-    
-    if last_candle_size >= 2 * avg_size:
-        trigger_point = last_candle['low'] + (last_candle_size * 0.4)
-        return trigger_point, last_candle['high'], last_candle['low']
-    return None, None, None
+# The last 6 candles of every symbol as one (symbol x bar) window, checked in a single pass
+window = UniverseWindow(symbols, timeframe, lookback=5)
 
 def place_trade(symbol, entry_price):
-    point = mt5.symbol_info(symbol).point
-    price = mt5.symbol_info_tick(symbol).ask
+    tick = mt5.symbol_info_tick(symbol)
+    price = tick.ask
     sl = price - sl_amount
     tp = price + tp_amount
     
@@ -55,20 +60,23 @@ def place_trade(symbol, entry_price):
         "type_time": mt5.ORDER_TIME_GTC,
         "type_filling": mt5.ORDER_FILLING_IOC,
     }
-    
+    if specs.normalize_request(request, tick) is None:  # SL/TP on the tick grid and outside the stops level
+        print(f"Skipped {request['symbol']} entry: SL/TP already on the wrong side of the market")
+        return
+
     order = mt5.order_send(request)
+    specs.rejected(symbol, order.retcode)  # a volume/price/stops rejection gets the spec re-read
     if order.retcode != mt5.TRADE_RETCODE_DONE:
         print(f"Trade failed for {symbol}, error code:", order.retcode)
     else:
         print(f"Trade executed successfully for {symbol}")
 
 while True:
-    for symbol in symbols:
-        trigger_point, high, low = check_entry_condition(symbol)
-        if trigger_point:
-            df = get_data(symbol)
-            for _, row in df.iterrows():
-                if row['low'] <= trigger_point <= row['high']:
-                    place_trade(symbol, trigger_point)
-                    break
-    time.sleep(60)  # Check every 5 minutes
+    window.load(mt5, start_pos=0)  # the current candle is the signal candle
+    for candidate in window.scan(multiple=2, direction="BUY"):  # biggest candles first
+        df = get_data(candidate.symbol)
+        for _, row in df.iterrows():
+            if row['low'] <= candidate.trigger <= row['high']:
+                place_trade(candidate.symbol, candidate.trigger)
+                break
+    clock.sleep(60)  # Check every 5 minutes
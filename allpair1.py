@@ -1,21 +1,44 @@
-import MetaTrader5 as mt5
-import pandas as pd
-import time
+from broker import clock, mt5
+import os
 import pytz
-from datetime import datetime, timedelta
+from datetime import datetime
+from trigger_watch import TriggerWatcher
+from config import CONFIG_PATH, ConfigWatcher, script_settings
+from timeframes import TIMEFRAMES, timeframe_name
+from bar_aggregator import AggregatedFeed
+from bar_scheduler import BarCloseScheduler
+from scanner import UniverseWindow, resolve_symbols
+from symbol_specs import get_symbol_specs
+from tick_feed import from_env
+
+# With TICK_FEED set, the armed symbols' prices come from the shared-memory feed (python tick_feed.py)
+mt5 = from_env(mt5)
 
 # Connect to MT5
 if not mt5.initialize():
     print("MT5 initialization failed")
     quit()
 
-# Configurable variables
-symbols = ["BTCUSDm", "EURUSDm", "GBPUSDm", "USDJPYm", "USDCADm", "AUDUSDm", "NZDUSDm", "XAUUSDm","USTECm","USOILm"] # Bitcoin and Gold
-lot_size = 0.09
-sl_amount = 2.5  # Stop loss in dollars
-tp_amount = 1.5  # Take profit in dollars
-timeframe = mt5.TIMEFRAME_M1  # Timeframe (M1, M5, M15, etc.)
-interval_minutes = 1  # Interval in minutes (should match the selected timeframe)
+# Configurable variables (overridden by scripts.allpair1 in config.yaml; lot size and SL/TP follow edits live).
+# "symbols" may also be a symbols_get group pattern, "*" for every symbol in the terminal.
+settings = script_settings("allpair1", {
+    "symbols": ["BTCUSDm", "EURUSDm", "GBPUSDm", "USDJPYm", "USDCADm", "AUDUSDm", "NZDUSDm", "XAUUSDm", "USTECm", "USOILm"],
+    "lot_size": 0.09,
+    "sl_amount": 2.5,  # Stop loss in dollars
+    "tp_amount": 1.5,  # Take profit in dollars
+    "timeframe": "M1",  # Timeframe (M1, M5, M15, etc.)
+    "trigger_expiry_minutes": None,  # Drop an armed trigger after this many minutes (None = watch until hit)
+})
+symbols = resolve_symbols(mt5, settings["symbols"])
+lot_size = settings["lot_size"]
+sl_amount = settings["sl_amount"]
+tp_amount = settings["tp_amount"]
+timeframe = TIMEFRAMES[timeframe_name(settings["timeframe"])]
+trigger_expiry_minutes = settings["trigger_expiry_minutes"]
+
+# Every symbol's tick size, digits, volume step and stops level in one bulk read
+specs = get_symbol_specs(mt5, clock)
+specs.load(symbols)
 
 # Define IST timezone
 ist = pytz.timezone("Asia/Kolkata")
@@ -33,36 +56,14 @@ def get_current_price(symbol):
         print(f"Failed to get tick data for {symbol}")
         return None
 
-def get_data(symbol):
-    rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, 6)  # Get last 6 candles
-    df = pd.DataFrame(rates)
-    
-    # Convert time to IST
-    df['time'] = pd.to_datetime(df['time'], unit='s').dt.tz_localize('UTC').dt.tz_convert(ist)
-    df['time'] = df['time'].dt.strftime('%Y-%m-%d %H:%M:%S IST')  # Readable format
-    
-    return df
-
-def check_entry_condition(symbol):
-    df = get_data(symbol)
-    last_candle = df.iloc[-1]
-    prev_candles = df.iloc[-6:-1]  # Last 5 candles before the current one
-    prev_candle = df.iloc[-2]  # Previous candle
-
-    avg_size = (prev_candles['high'] - prev_candles['low']).mean()
-    last_candle_size = last_candle['high'] - last_candle['low']
-
-    # Determine buy/sell direction
-    trade_type = "BUY" if prev_candle['close'] > prev_candle['open'] else "SELL"
-    print(f"last_candle_size: {last_candle_size} avg_size: {avg_size}")
-    if last_candle_size >= 1 * avg_size:
-        trigger_point = last_candle['low'] + (last_candle_size * 0.4) if trade_type == "BUY" else last_candle['high'] - (last_candle_size * 0.4)
-        return trigger_point, trade_type, last_candle['high'], last_candle['low'], last_candle['time']
-    
-    return None, None, None, None, None
+# The last 6 closed candles of every symbol as one (symbol x bar) window: the symbols whose candle closed during a
+# scheduler pass are checked together in one vectorized scan
+window = UniverseWindow(symbols, timeframe, lookback=5)
+closed_symbols = []
 
 def place_trade(symbol, entry_price, trade_type):
-    price = mt5.symbol_info_tick(symbol).ask if trade_type == "BUY" else mt5.symbol_info_tick(symbol).bid
+    tick = mt5.symbol_info_tick(symbol)
+    price = tick.ask if trade_type == "BUY" else tick.bid
     sl = price - sl_amount if trade_type == "BUY" else price + sl_amount
     tp = price + tp_amount if trade_type == "BUY" else price - tp_amount
 
@@ -80,50 +81,68 @@ def place_trade(symbol, entry_price, trade_type):
         "type_time": mt5.ORDER_TIME_GTC,
         "type_filling": mt5.ORDER_FILLING_IOC,
     }
-    
+    if specs.normalize_request(request, tick) is None:  # SL/TP on the tick grid and outside the stops level
+        print(f"Skipped {request['symbol']} entry: SL/TP already on the wrong side of the market")
+        return
+
     order = mt5.order_send(request)
+    specs.rejected(symbol, order.retcode)  # a volume/price/stops rejection gets the spec re-read
     if order.retcode != mt5.TRADE_RETCODE_DONE:
         print(f"[{datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S IST')}] Trade failed for {symbol} ({trade_type}), error code:", order.retcode)
     else:
         print(f"[{datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S IST')}] {trade_type} Trade executed successfully for {symbol} at {entry_price}")
 
-# Wait for the next exact interval mark
-def wait_for_next_interval():
-    now = datetime.now(ist)
-    next_minute = (now.minute // interval_minutes + 1) * interval_minutes  # Next multiple of interval_minutes
-    if next_minute >= 60:
-        next_minute = 0
-        next_hour = now.hour + 1
-    else:
-        next_hour = now.hour
-
-    next_run_time = now.replace(hour=next_hour, minute=next_minute, second=0, microsecond=0)
-    wait_time = (next_run_time - now).total_seconds()
-    
-    print(f"Waiting until {next_run_time.strftime('%Y-%m-%d %H:%M:%S IST')} to start execution...")
-    time.sleep(wait_time)  # Wait until the next exact interval mark
-
-# Ensure execution starts exactly at the next interval mark
-wait_for_next_interval()
+# Armed triggers for all symbols, checked together every second
+watcher = TriggerWatcher()
+
+def on_bar_close(symbol, timeframe, closed):
+    if symbol in watcher:
+        return  # Still waiting for this symbol's trigger point
+    if window.set(symbol, closed):
+        closed_symbols.append(symbol)
+
+def scan_closed():
+    # Big candle: at least the average range of the 5 candles before it; direction from the candle before it
+    for candidate in window.scan(multiple=1, symbols=closed_symbols):
+        candle_time = datetime.fromtimestamp(candidate.time, ist).strftime('%Y-%m-%d %H:%M:%S IST')
+        print(f"[{candle_time}] Big candle detected for {candidate.symbol} ({candidate.ratio:.2f}x average range). "
+              f"Monitoring trigger point {candidate.trigger} every second...")
+        watcher.arm(candidate.symbol, candidate.direction, candidate.trigger, clock.time(),
+                    trigger_expiry_minutes * 60 if trigger_expiry_minutes is not None else None)
+    closed_symbols.clear()
+
+def watch_triggers():
+    prices = {symbol: get_current_price(symbol) for symbol in watcher.symbols()}
+    for trigger in watcher.check(prices, clock.time()):
+        print(f"[{datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S IST')}] {trigger.direction} Entry triggered for {trigger.symbol} at {trigger.level}")
+        place_trade(trigger.symbol, trigger.level, trigger.direction)
+
+# Each symbol is checked as soon as the feed shows its candle has closed
+scheduler = BarCloseScheduler(AggregatedFeed(mt5), clock=clock)
+for symbol in symbols:
+    scheduler.subscribe(symbol, timeframe, on_bar_close)
+
+def reload_settings():
+    global lot_size, sl_amount, tp_amount, trigger_expiry_minutes
+    settings = config_watcher.config.scripts.get("allpair1") or {}
+    lot_size = settings.get("lot_size", lot_size)
+    sl_amount = settings.get("sl_amount", sl_amount)
+    tp_amount = settings.get("tp_amount", tp_amount)
+    trigger_expiry_minutes = settings.get("trigger_expiry_minutes", trigger_expiry_minutes)
+    print(f"Settings reloaded: lot_size {lot_size}, sl_amount {sl_amount}, tp_amount {tp_amount}")
+
+config_watcher = ConfigWatcher() if os.path.exists(CONFIG_PATH) else None
 
 # Main Loop
 while True:
-    for symbol in symbols:
-        trigger_point, trade_type, high, low, candle_time = check_entry_condition(symbol)
-        
-        if trigger_point:
-            print(f"[{candle_time}] Big candle detected for {symbol}. Monitoring trigger point {trigger_point} every second...")
-            
-            # Monitor every second until trigger point is touched
-            while True:
-                #df = get_data(symbol)
-                current_price = get_current_price(symbol)
-
-                if (trade_type == "BUY" and current_price <= trigger_point) or (trade_type == "SELL" and current_price >= trigger_point):
-                    print(f"[{datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S IST')}] {trade_type} Entry triggered for {symbol} at {trigger_point}")
-                    place_trade(symbol, trigger_point, trade_type)
-                    break  # Exit monitoring loop once trade is placed
-
-                time.sleep(1)  # Check price every second
-
-    wait_for_next_interval()  # Ensure the script runs exactly at the next interval mark
+    if config_watcher is not None and config_watcher.poll() is not None:
+        reload_settings()
+    scheduler.run_pending()
+    if closed_symbols:
+        scan_closed()
+    delay = min(scheduler.delay(), config_watcher.interval) if config_watcher is not None else scheduler.delay()
+    if watcher:
+        watch_triggers()
+        clock.sleep(min(1, delay))  # Check prices every second
+    else:
+        clock.sleep(delay)
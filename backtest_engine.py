@@ -0,0 +1,148 @@
+import time
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Outcome codes for a filled trade
+OUTCOME_NONE = 0  # trigger touched but neither TP nor SL on the fill candle
+OUTCOME_TP = 1
+OUTCOME_SL = -1
+
+TRADE_DTYPE = np.dtype([
+    ("signal_index", "<i8"),
+    ("fill_index", "<i8"),
+    ("entry", "<f8"),
+    ("outcome", "<i1"),
+    ("pnl", "<f8"),
+])
+
+
+def candle_ranges(rates):
+    high = np.asarray(rates["high"], dtype=np.float64)
+    low = np.asarray(rates["low"], dtype=np.float64)
+    return high, low, high - low
+
+
+def prior_max(ranges, lookback=5):
+    # Largest range of the `lookback` bars before each bar; inf where there is not enough history
+    out = np.full(len(ranges), np.inf)
+    if len(ranges) > lookback:
+        out[lookback:] = sliding_window_view(ranges[:-1], lookback).max(axis=1)
+    return out
+
+
+def find_signals(ranges, lookback=5, multiplier=2.0, prev_max=None):
+    # Bar i is a signal when its range is >= multiplier x the largest range of the previous `lookback` bars
+    if prev_max is None:
+        prev_max = prior_max(ranges, lookback)
+    return ranges >= multiplier * prev_max
+
+
+def resolve_trades(high, low, signal_index, entry, fill_window=5, sl_amount=5, tp_amount=10):
+    # Short entries: first bar in the next `fill_window` whose low touches the entry fills the trade,
+    # and that same bar decides TP (checked first) or SL, exactly as the original loop does.
+    n = len(high)
+    if len(signal_index) == 0 or fill_window <= 0:
+        return np.zeros(0, dtype=TRADE_DTYPE)
+
+    cols = signal_index[:, None] + np.arange(1, fill_window + 1)[None, :]
+    valid = cols < n
+    cols = np.minimum(cols, n - 1)
+    touched = (low[cols] <= entry[:, None]) & valid
+
+    filled = touched.any(axis=1)
+    first = touched.argmax(axis=1)
+    fill_index = cols[np.arange(len(cols)), first][filled]
+    entry = entry[filled]
+
+    tp_hit = low[fill_index] <= entry - tp_amount
+    sl_hit = ~tp_hit & (high[fill_index] >= entry + sl_amount)
+
+    trades = np.zeros(len(fill_index), dtype=TRADE_DTYPE)
+    trades["signal_index"] = signal_index[filled]
+    trades["fill_index"] = fill_index
+    trades["entry"] = entry
+    trades["outcome"] = np.where(tp_hit, OUTCOME_TP, np.where(sl_hit, OUTCOME_SL, OUTCOME_NONE))
+    trades["pnl"] = np.where(tp_hit, tp_amount, np.where(sl_hit, -sl_amount, 0.0))
+    return trades
+
+
+def run_backtest(rates, lookback=5, multiplier=2.0, trigger_fraction=0.4, fill_window=5, sl_amount=5, tp_amount=10,
+                 prev_max=None):
+    high, low, ranges = candle_ranges(rates)
+    signal_index = np.flatnonzero(find_signals(ranges, lookback, multiplier, prev_max))
+    entry = low[signal_index] + trigger_fraction * ranges[signal_index]
+    return resolve_trades(high, low, signal_index, entry, fill_window, sl_amount, tp_amount)
+
+
+def summarize(trades):
+    return {
+        "trades": len(trades),
+        "profit": float(trades["pnl"].sum()),
+        "tp_hits": int((trades["outcome"] == OUTCOME_TP).sum()),
+        "sl_hits": int((trades["outcome"] == OUTCOME_SL).sum()),
+    }
+
+
+# Reference implementation: the original bar-by-bar loop from 6in1backtest.py, kept for equivalence checks
+def loop_backtest(df, sl_amount=5, tp_amount=10):
+    trades = []
+    for i in range(5, len(df)):
+        last_5 = df.iloc[i-5:i]
+        current_candle = df.iloc[i]
+
+        max_body = (last_5["high"] - last_5["low"]).max()
+        current_body = current_candle["high"] - current_candle["low"]
+        if current_body >= 2 * max_body:
+            entry_price = current_candle["low"] + 0.4 * (current_candle["high"] - current_candle["low"])
+
+            for j in range(i+1, min(i+6, len(df))):
+                if df.iloc[j]["low"] <= entry_price:
+                    sl = entry_price + sl_amount
+                    tp = entry_price - tp_amount
+
+                    if df.iloc[j]["low"] <= tp:
+                        pnl = tp_amount
+                    elif df.iloc[j]["high"] >= sl:
+                        pnl = -sl_amount
+                    else:
+                        pnl = 0
+                    trades.append((i, j, entry_price, pnl))
+                    break
+    return trades
+
+
+def random_walk_rates(n, seed=0, start_price=60000.0, volatility=8.0):
+    rng = np.random.default_rng(seed)
+    close = start_price + np.cumsum(rng.normal(0, volatility, n))
+    open_ = np.concatenate(([start_price], close[:-1]))
+    # Occasional wide bars so the big-candle signal actually fires
+    wick = np.abs(rng.normal(0, volatility, n)) * np.where(rng.random(n) < 0.03, 6.0, 1.0)
+    rates = np.zeros(n, dtype=[("time", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"), ("close", "<f8")])
+    rates["time"] = 1_700_000_000 + 60 * np.arange(n)
+    rates["open"] = open_
+    rates["close"] = close
+    rates["high"] = np.maximum(open_, close) + wick
+    rates["low"] = np.minimum(open_, close) - wick
+    return rates
+
+
+def check_equivalence(n=8640, seed=0, sl_amount=5, tp_amount=10):
+    import pandas as pd
+
+    rates = random_walk_rates(n, seed)
+    expected = loop_backtest(pd.DataFrame(rates), sl_amount, tp_amount)
+    trades = run_backtest(rates, sl_amount=sl_amount, tp_amount=tp_amount)
+    got = [(int(t["signal_index"]), int(t["fill_index"]), float(t["entry"]), float(t["pnl"])) for t in trades]
+    return got == [(i, j, float(e), float(p)) for i, j, e, p in expected], len(expected)
+
+
+if __name__ == "__main__":
+    for seed in range(5):
+        ok, count = check_equivalence(seed=seed)
+        print(f"seed {seed}: {count} trades, vectorized matches loop: {ok}")
+
+    rates = random_walk_rates(5_000_000, seed=1)
+    start = time.perf_counter()
+    result = summarize(run_backtest(rates))
+    print(f"5,000,000 bars in {time.perf_counter() - start:.3f}s -> {result}")
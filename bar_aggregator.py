@@ -0,0 +1,318 @@
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import numpy as np
+
+from timeframes import RATES_DTYPE, TIMEFRAMES, timeframe_name, timeframe_seconds
+
+STANDARD_TIMEFRAMES = ("M1", "M5", "M15", "M30", "H1", "H4", "D1", "W1", "MN1")
+
+# MT5 weekly bars open on Sunday 00:00; 1970-01-04 was the first Sunday after the epoch
+WEEK_ORIGIN = 3 * 86400
+
+
+# --- bucketing ---
+
+def bucket_times(times, timeframe):
+    # Open time of the bar each timestamp (seconds, int64 array) belongs to
+    name = timeframe_name(timeframe)
+    times = np.asarray(times, dtype=np.int64)
+    if name == "MN1":
+        return times.astype("datetime64[s]").astype("datetime64[M]").astype("datetime64[s]").astype(np.int64)
+    if name == "W1":
+        return (times - WEEK_ORIGIN) // 604800 * 604800 + WEEK_ORIGIN
+    seconds = timeframe_seconds(name)
+    return times // seconds * seconds
+
+
+def bucket_start(t, timeframe):
+    name = timeframe_name(timeframe)
+    t = int(t)
+    if name == "MN1":
+        day = datetime.fromtimestamp(t, timezone.utc)
+        return int(datetime(day.year, day.month, 1, tzinfo=timezone.utc).timestamp())
+    if name == "W1":
+        return (t - WEEK_ORIGIN) // 604800 * 604800 + WEEK_ORIGIN
+    seconds = timeframe_seconds(name)
+    return t // seconds * seconds
+
+
+def bucket_end(start, timeframe):
+    # Open time of the bar after the one opening at `start`
+    name = timeframe_name(timeframe)
+    if name == "MN1":
+        day = datetime.fromtimestamp(int(start), timezone.utc)
+        year, month = (day.year + 1, 1) if day.month == 12 else (day.year, day.month + 1)
+        return int(datetime(year, month, 1, tzinfo=timezone.utc).timestamp())
+    return int(start) + timeframe_seconds(name)
+
+
+# --- bulk ---
+
+def aggregate(rates, timeframe, complete_only=False, source_seconds=60):
+    # Higher-timeframe bars from time-ordered lower-timeframe rates (M1 by default) in one reduceat pass.
+    # complete_only drops a trailing bar whose period the input does not cover yet.
+    out = np.zeros(0, dtype=RATES_DTYPE)
+    if len(rates) == 0:
+        return out
+    times = np.asarray(rates["time"], dtype=np.int64)
+    buckets = bucket_times(times, timeframe)
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.concatenate((starts[1:], [len(rates)])) - 1
+    out = np.zeros(len(starts), dtype=RATES_DTYPE)
+    out["time"] = buckets[starts]
+    out["open"] = rates["open"][starts]
+    out["high"] = np.maximum.reduceat(rates["high"], starts)
+    out["low"] = np.minimum.reduceat(rates["low"], starts)
+    out["close"] = rates["close"][ends]
+    names = rates.dtype.names
+    if "tick_volume" in names:
+        out["tick_volume"] = np.add.reduceat(rates["tick_volume"], starts)
+    if "spread" in names:
+        out["spread"] = np.maximum.reduceat(rates["spread"], starts)
+    if "real_volume" in names:
+        out["real_volume"] = np.add.reduceat(rates["real_volume"], starts)
+    if complete_only and bucket_end(out["time"][-1], timeframe) > times[-1] + source_seconds:
+        out = out[:-1]
+    return out
+
+
+def _nests(source, target):
+    # Every `source` bar falls inside exactly one `target` bar
+    if target in ("W1", "MN1"):
+        return source not in ("W1", "MN1") and 86400 % timeframe_seconds(source) == 0
+    return timeframe_seconds(target) % timeframe_seconds(source) == 0
+
+
+def aggregate_all(rates, timeframes=STANDARD_TIMEFRAMES, complete_only=False):
+    # {timeframe: bars} for every requested timeframe; each is built from the largest one already built that
+    # nests into it (M5 -> M15 -> H1 -> H4 -> D1 -> W1/MN1), so later passes touch far fewer rows than the M1 input
+    built = {"M1": np.asarray(rates)}
+    for name in sorted((timeframe_name(tf) for tf in timeframes), key=timeframe_seconds):
+        if name in built:
+            continue
+        source = max((tf for tf in built if _nests(tf, name)), key=timeframe_seconds)
+        built[name] = aggregate(built[source], name)
+    result = {}
+    for timeframe in timeframes:
+        name = timeframe_name(timeframe)
+        bars = built[name]
+        if complete_only and len(bars) and bucket_end(bars["time"][-1], name) > int(rates["time"][-1]) + 60:
+            bars = bars[:-1]
+        result[name] = bars
+    return result
+
+
+def ticks_to_rates(ticks, timeframe="M1", point=None):
+    # Bars of the bid from TICK_DTYPE records (time_msc, bid, ask); spread in points when `point` is given
+    out = np.zeros(0, dtype=RATES_DTYPE)
+    if len(ticks) == 0:
+        return out
+    buckets = bucket_times(np.asarray(ticks["time_msc"], dtype=np.int64) // 1000, timeframe)
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    ends = np.concatenate((starts[1:], [len(ticks)])) - 1
+    bid = np.asarray(ticks["bid"], dtype=np.float64)
+    out = np.zeros(len(starts), dtype=RATES_DTYPE)
+    out["time"] = buckets[starts]
+    out["open"] = bid[starts]
+    out["high"] = np.maximum.reduceat(bid, starts)
+    out["low"] = np.minimum.reduceat(bid, starts)
+    out["close"] = bid[ends]
+    out["tick_volume"] = np.diff(np.concatenate((starts, [len(ticks)])))
+    if point:
+        spread = np.rint((np.asarray(ticks["ask"], dtype=np.float64) - bid) / point)
+        out["spread"] = np.maximum.reduceat(spread, starts)
+    return out
+
+
+# --- incremental ---
+
+class BarAggregator:
+    # Incremental counterpart of aggregate(): feed closed M1 bars (or ticks) in time order and every timeframe's
+    # bars come back as they complete. Keeps the forming bar and the last `history` closed bars per timeframe.
+    def __init__(self, timeframes=STANDARD_TIMEFRAMES, history=500):
+        self.history = history
+        self.timeframes = []
+        self.forming = {}
+        self.ends = {}
+        self.closed = {}
+        for timeframe in timeframes:
+            self.add_timeframe(timeframe)
+
+    def add_timeframe(self, timeframe, closed=(), partial=()):
+        # closed: earlier bars of this timeframe; partial: closed M1 bars already inside its forming bar
+        name = timeframe_name(timeframe)
+        if name not in self.closed:
+            self.timeframes.append(name)
+        self.forming[name] = None
+        self.closed[name] = deque((tuple(bar.item()) if hasattr(bar, "item") else tuple(bar) for bar in closed),
+                                  maxlen=self.history)
+        for bar in partial:
+            self._merge(name, int(bar["time"]), float(bar["open"]), float(bar["high"]), float(bar["low"]),
+                        float(bar["close"]), int(bar["tick_volume"]), int(bar["spread"]), int(bar["real_volume"]))
+
+    def _merge(self, name, t, open_, high, low, close, tick_volume, spread, real_volume):
+        bar = self.forming[name]
+        if bar is None:
+            start = bucket_start(t, name)
+            self.forming[name] = [start, open_, high, low, close, tick_volume, spread, real_volume]
+            self.ends[name] = bucket_end(start, name)
+            return
+        if high > bar[2]:
+            bar[2] = high
+        if low < bar[3]:
+            bar[3] = low
+        bar[4] = close
+        bar[5] += tick_volume
+        if spread > bar[6]:
+            bar[6] = spread
+        bar[7] += real_volume
+
+    def push(self, t, open_, high, low, close, tick_volume=1, spread=0, real_volume=0):
+        # Returns [(timeframe, bar tuple)] for every bar this push completed
+        completed = []
+        for name in self.timeframes:
+            if self.forming[name] is not None and t >= self.ends[name]:
+                completed.append(self._close(name))
+            self._merge(name, t, open_, high, low, close, tick_volume, spread, real_volume)
+        return completed
+
+    def push_bar(self, bar, seconds=60):
+        # A closed source bar: also completes any bar that ends with it instead of waiting for the next push
+        t = int(bar["time"])
+        completed = self.push(t, float(bar["open"]), float(bar["high"]), float(bar["low"]), float(bar["close"]),
+                              int(bar["tick_volume"]), int(bar["spread"]), int(bar["real_volume"]))
+        return completed + self.close_through(t + seconds)
+
+    def push_tick(self, t, bid, ask=None, point=None):
+        spread = int(round((ask - bid) / point)) if ask is not None and point else 0
+        return self.push(int(t), bid, bid, bid, bid, 1, spread, 0)
+
+    def close_through(self, t):
+        return [self._close(name) for name in self.timeframes
+                if self.forming[name] is not None and self.ends[name] <= t]
+
+    def _close(self, name):
+        bar = tuple(self.forming[name])
+        self.closed[name].append(bar)
+        self.forming[name] = None
+        return name, bar
+
+    def rates(self, timeframe, count=None, forming=True):
+        # Last `count` bars as RATES_DTYPE, oldest first, ending with the forming bar when `forming` is set
+        name = timeframe_name(timeframe)
+        bars = list(self.closed[name])
+        if forming and self.forming[name] is not None:
+            bars.append(tuple(self.forming[name]))
+        if count is not None:
+            bars = bars[-count:] if count > 0 else []
+        return np.array(bars, dtype=RATES_DTYPE)
+
+
+class AggregatedFeed:
+    # Wraps the MT5 module so every timeframe of a symbol is served from one M1 stream: each call fetches only the
+    # M1 bars closed since the last one and rolls them into all the symbol's timeframes. Higher timeframes are
+    # seeded once from the terminal when first requested. Everything else is passed through to the terminal.
+    def __init__(self, mt5, history=500, max_fetch=100000):
+        self.mt5 = mt5
+        self.history = history
+        self.max_fetch = max_fetch
+        self.states = {}
+
+    def __getattr__(self, name):
+        return getattr(self.mt5, name)
+
+    def _m1_since(self, symbol, t):
+        # M1 bars (the forming one last) opened at or after `t`, growing the request until it reaches back to `t`
+        count = 2
+        while True:
+            bars = self.mt5.copy_rates_from_pos(symbol, TIMEFRAMES["M1"], 0, count)
+            if bars is None:
+                return None
+            if len(bars) < count or int(bars["time"][0]) <= t or count >= self.max_fetch:
+                return bars[bars["time"] >= t]
+            count *= 4
+
+    def _sync(self, symbol):
+        state = self.states.get(symbol)
+        if state is None:
+            latest = self.mt5.copy_rates_from_pos(symbol, TIMEFRAMES["M1"], 0, 1)
+            if latest is None or len(latest) == 0:
+                return None
+            state = self.states[symbol] = {"aggregator": BarAggregator((), self.history),
+                                           "last": int(latest["time"][-1]) - 60, "forming": latest[-1]}
+            return state
+        bars = self._m1_since(symbol, state["last"] + 60)
+        if bars is None or len(bars) == 0:
+            return state
+        for bar in bars[:-1]:
+            state["aggregator"].push_bar(bar)
+            state["last"] = int(bar["time"])
+        state["forming"] = bars[-1]
+        return state
+
+    def _seed(self, symbol, state, name):
+        start = bucket_start(int(state["forming"]["time"]), name)
+        native = self.mt5.copy_rates_from_pos(symbol, TIMEFRAMES[name], 0, self.history + 1)
+        closed = native[native["time"] < start] if native is not None else ()
+        partial = ()
+        if name != "M1" and state["last"] >= start:
+            partial = self._m1_since(symbol, start)
+            partial = partial[partial["time"] <= state["last"]] if partial is not None else ()
+        state["aggregator"].add_timeframe(name, closed, partial)
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        name = timeframe_name(timeframe)
+        state = self._sync(symbol)
+        if state is None:
+            return self.mt5.copy_rates_from_pos(symbol, timeframe, start_pos, count)
+        aggregator = state["aggregator"]
+        if name not in aggregator.closed:
+            self._seed(symbol, state, name)
+
+        # Forming bar = this timeframe's closed M1 bars so far plus the forming M1 bar
+        window = aggregator.rates(name, forming=False)
+        forming = state["forming"]
+        current = aggregator.forming[name]
+        if current is not None and current[0] == bucket_start(int(forming["time"]), name):
+            bar = np.array([tuple(current)], dtype=RATES_DTYPE)
+            bar["high"] = max(bar["high"][0], forming["high"])
+            bar["low"] = min(bar["low"][0], forming["low"])
+            bar["close"] = forming["close"]
+            bar["tick_volume"] += forming["tick_volume"]
+            bar["spread"] = max(bar["spread"][0], forming["spread"])
+            bar["real_volume"] += forming["real_volume"]
+        else:
+            bar = np.array([tuple(forming.item())], dtype=RATES_DTYPE)
+            bar["time"] = bucket_start(int(forming["time"]), name)
+        window = np.concatenate((window, bar))
+        end = len(window) - start_pos
+        return window[max(end - count, 0):max(end, 0)]
+
+
+def check_equivalence(rates, timeframes=STANDARD_TIMEFRAMES):
+    # Incremental bars must equal the bulk ones bar for bar
+    bulk = aggregate_all(rates, timeframes, complete_only=True)
+    aggregator = BarAggregator(timeframes, history=len(rates))
+    for bar in rates:
+        aggregator.push_bar(bar)
+    return {name: bool(np.array_equal(aggregator.rates(name, forming=False), bulk[name])) for name in bulk}
+
+
+if __name__ == "__main__":
+    from backtest_engine import random_walk_rates
+
+    year = random_walk_rates(366 * 1440, seed=3)
+    rates = np.zeros(len(year), dtype=RATES_DTYPE)
+    for name in year.dtype.names:
+        rates[name] = year[name]
+    rates["time"] = year["time"] // 60 * 60
+    rates["tick_volume"] = 100
+    rates["spread"] = 20
+
+    print("incremental matches bulk:", check_equivalence(rates[:20 * 1440]))
+    start = time.perf_counter()
+    bars = aggregate_all(rates)
+    elapsed = time.perf_counter() - start
+    print(f"{len(rates):,} M1 bars -> {', '.join(f'{name}: {len(b)}' for name, b in bars.items())} in {elapsed:.3f}s")
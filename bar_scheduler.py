@@ -0,0 +1,114 @@
+import heapq
+import itertools
+import time
+
+from metrics import REGISTRY
+from timeframes import timeframe_seconds
+
+
+class BarCloseScheduler:
+    # Fires callback(symbol, timeframe, closed_bars) as soon as the feed shows a new bar for a subscription.
+    # Each subscription sleeps on one shared timer heap until its bar is due to close (server clock), then polls
+    # the latest bars every `poll_interval`, backing off to `max_poll_interval` through quiet periods/weekends.
+    # `clock` (time() like the time module) is the simulator's under MT5_BACKEND=sim, see broker.clock.
+    def __init__(self, mt5, poll_interval=0.25, max_poll_interval=2.0, clock=time):
+        self.mt5 = mt5
+        self.clock = clock
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.subscriptions = {}
+        self.heap = []
+        self._seq = itertools.count()
+        # Server clock minus local clock per symbol, from the symbol's own last tick. A closed market's last tick is
+        # hours old, so sharing one offset would push every other symbol's expected close into the future.
+        self.server_offsets = {}
+
+    def subscribe(self, symbol, timeframe, callback, history=6):
+        key = (symbol, timeframe)
+        sub = self.subscriptions[key] = {
+            "callback": callback,
+            "history": history,
+            "seconds": timeframe_seconds(timeframe),
+            "last_open": None,
+            "expected": None,
+            "backoff": self.poll_interval,
+        }
+        self._schedule(key, sub, self.clock.time())
+
+    def unsubscribe(self, symbol, timeframe):
+        self.subscriptions.pop((symbol, timeframe), None)
+
+    def _schedule(self, key, sub, due):
+        # Entries carry their subscription: one left behind by unsubscribe() is skipped even after the same
+        # (symbol, timeframe) is subscribed again, so a re-subscribed symbol is not polled twice per cycle
+        heapq.heappush(self.heap, (due, next(self._seq), key, sub))
+
+    def _live(self, entry):
+        return self.subscriptions.get(entry[2]) is entry[3]
+
+    def next_due(self):
+        while self.heap and not self._live(self.heap[0]):
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def delay(self, now=None):
+        due = self.next_due()
+        if due is None:
+            return self.max_poll_interval
+        return max(due - (self.clock.time() if now is None else now), 0)
+
+    def run_pending(self, now=None):
+        now = self.clock.time() if now is None else now
+        fired = 0
+        while self.heap and self.heap[0][0] <= now:
+            entry = heapq.heappop(self.heap)
+            if self._live(entry):
+                fired += self._poll(entry[2], now)
+        return fired
+
+    def _poll(self, key, now):
+        symbol, timeframe = key
+        sub = self.subscriptions[key]
+        rates = self.mt5.copy_rates_from_pos(symbol, timeframe, 0, sub["history"] + 1)
+        if rates is None or len(rates) == 0:
+            self._backoff(key, sub, now)
+            return 0
+
+        bar_open = int(rates["time"][-1])
+        new_bar = sub["last_open"] is not None and bar_open > sub["last_open"]
+        if new_bar or symbol not in self.server_offsets:
+            # Re-measured with every new bar, when the symbol's last tick is fresh
+            self._measure_offset(symbol, now)
+        offset = self.server_offsets[symbol]
+
+        if not new_bar:
+            if sub["last_open"] is None:
+                sub["last_open"] = bar_open
+            expected = sub["last_open"] + sub["seconds"] - offset
+            if expected > now:
+                # Nothing to poll for until the current bar is due to close
+                sub["backoff"] = self.poll_interval
+                self._schedule(key, sub, expected)
+            else:
+                self._backoff(key, sub, now)
+            return 0
+
+        # A new bar opened, so the previous one has closed
+        expected = sub["last_open"] + sub["seconds"] - offset
+        REGISTRY.observe("bar_close_lag", symbol, max(now - expected, 0))
+        sub["last_open"] = bar_open
+        sub["backoff"] = self.poll_interval
+        self._schedule(key, sub, bar_open + sub["seconds"] - offset)
+        sub["callback"](symbol, timeframe, rates[:-1])
+        return 1
+
+    def _measure_offset(self, symbol, now):
+        tick = self.mt5.symbol_info_tick(symbol)
+        if tick is not None:
+            self.server_offsets[symbol] = tick.time - now
+        else:
+            self.server_offsets.setdefault(symbol, 0)
+
+    def _backoff(self, key, sub, now):
+        self._schedule(key, sub, now + sub["backoff"])
+        sub["backoff"] = min(sub["backoff"] * 2, self.max_poll_interval)
@@ -0,0 +1,153 @@
+import os
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bar_aggregator import STANDARD_TIMEFRAMES, aggregate_all, bucket_end
+from timeframes import RATES_DTYPE, TIMEFRAMES, timeframe_name, timeframe_seconds
+
+
+def _to_timestamp(value):
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+    return int(value)
+
+
+class BarStore:
+    # One append-only file of RATES_DTYPE records per symbol/timeframe: <root>/<symbol>/<timeframe>.bin
+    def __init__(self, root):
+        self.root = root
+        self._maps = {}
+
+    def path(self, symbol, timeframe):
+        return os.path.join(self.root, symbol, f"{timeframe_name(timeframe)}.bin")
+
+    def symbols(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(name for name in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, name)))
+
+    def bars(self, symbol, timeframe):
+        # Memory-mapped view of every stored bar; re-mapped only when the file has grown
+        path = self.path(symbol, timeframe)
+        size = os.path.getsize(path) if os.path.isfile(path) else 0
+        cached = self._maps.get(path)
+        if cached and cached[0] == size:
+            return cached[1]
+        if size < RATES_DTYPE.itemsize:
+            bars = np.zeros(0, dtype=RATES_DTYPE)
+        else:
+            bars = np.memmap(path, dtype=RATES_DTYPE, mode="r", shape=(size // RATES_DTYPE.itemsize,))
+        self._maps[path] = (size, bars)
+        return bars
+
+    def last_time(self, symbol, timeframe):
+        bars = self.bars(symbol, timeframe)
+        return int(bars["time"][-1]) if len(bars) else None
+
+    def append(self, symbol, timeframe, rates):
+        # Only bars newer than the last stored one are written, so the file stays sorted and duplicate-free
+        rates = np.asarray(rates, dtype=RATES_DTYPE)
+        last = self.last_time(symbol, timeframe)
+        if last is not None:
+            rates = rates[rates["time"] > last]
+        if len(rates) == 0:
+            return 0
+        rates = rates[np.concatenate(([True], np.diff(rates["time"]) > 0))]
+
+        path = self.path(symbol, timeframe)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "ab") as file:
+            file.write(np.ascontiguousarray(rates).tobytes())
+        return len(rates)
+
+    def read_range(self, symbol, timeframe, date_from=None, date_to=None):
+        # Zero-copy slice of the memory map covering [date_from, date_to]
+        bars = self.bars(symbol, timeframe)
+        times = bars["time"]
+        start = 0 if date_from is None else int(np.searchsorted(times, _to_timestamp(date_from), side="left"))
+        end = len(bars) if date_to is None else int(np.searchsorted(times, _to_timestamp(date_to), side="right"))
+        return bars[start:end]
+
+    def sync(self, source, symbol, timeframe, initial_bars=100000):
+        # Pull only closed bars (position 1 onwards) that are newer than what is already stored.
+        # `source` is the MetaTrader5 module or anything exposing copy_rates_from_pos.
+        tf = TIMEFRAMES[timeframe_name(timeframe)]
+        latest = source.copy_rates_from_pos(symbol, tf, 1, 1)
+        if latest is None or len(latest) == 0:
+            return 0
+
+        last = self.last_time(symbol, timeframe)
+        if last is None:
+            count = initial_bars
+        else:
+            newest = int(latest["time"][-1])
+            if newest <= last:
+                return 0
+            # Rounded up plus one: timeframe_seconds is nominal (an MN1 "month" is 30 days, so a 28-day February
+            # would floor to 0), and append() drops whatever was already stored, so over-fetching is harmless
+            count = -(-(newest - last) // timeframe_seconds(timeframe)) + 1
+        rates = source.copy_rates_from_pos(symbol, tf, 1, count)
+        if rates is None:
+            return 0
+        return self.append(symbol, timeframe, rates)
+
+    def derive(self, symbol, timeframes=STANDARD_TIMEFRAMES[1:]):
+        # Build higher timeframes from the stored M1 bars; only complete bars past each file's end are added
+        names = [timeframe_name(tf) for tf in timeframes]
+        lasts = {name: self.last_time(symbol, name) for name in names}
+        if any(last is None for last in lasts.values()):
+            start = None
+        else:
+            start = min(bucket_end(last, name) for name, last in lasts.items())
+        m1 = self.read_range(symbol, "M1", start)
+        if len(m1) == 0:
+            return {name: 0 for name in names}
+        bars = aggregate_all(m1, names, complete_only=True)
+        return {name: self.append(symbol, name, bars[name]) for name in names}
+
+
+class BarStoreProvider:
+    # Drop-in for the mt5 history calls, answered from a BarStore instead of the terminal
+    def __init__(self, store):
+        self.store = store
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        bars = self.store.bars(symbol, timeframe)
+        end = max(len(bars) - start_pos, 0)
+        return bars[max(end - count, 0):end]
+
+    def copy_rates_from(self, symbol, timeframe, date_from, count):
+        # Like MT5: `count` bars ending at date_from
+        bars = self.store.bars(symbol, timeframe)
+        end = int(np.searchsorted(bars["time"], _to_timestamp(date_from), side="right"))
+        return bars[max(end - count, 0):end]
+
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        return self.store.read_range(symbol, timeframe, date_from, date_to)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 4:
+        print("Usage: python bar_store.py <store_dir> <timeframe> <symbol> [<symbol> ...]")
+        sys.exit(1)
+
+    import MetaTrader5 as mt5
+
+    if not mt5.initialize():
+        print("MT5 initialization failed")
+        sys.exit(1)
+
+    store = BarStore(sys.argv[1])
+    timeframe = timeframe_name(sys.argv[2])
+    for symbol in sys.argv[3:]:
+        added = store.sync(mt5, symbol, timeframe)
+        print(f"{symbol} {timeframe}: {added} new bars, {len(store.bars(symbol, timeframe))} stored")
+        if timeframe == "M1":
+            # Every other timeframe comes from the M1 file rather than another download
+            for name, count in store.derive(symbol).items():
+                print(f"{symbol} {name}: {count} new bars derived from M1")
+    mt5.shutdown()
@@ -0,0 +1,323 @@
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from backtest_engine import loop_backtest, run_backtest
+from candle_state import CandleRangeState
+from mt5_sim import SimTerminal
+from order_router import OrderRouter
+from scanner import UniverseWindow
+from strategy import SymbolStrategy
+from symbol_specs import SymbolSpecs
+from synthetic import model_for, synthetic_rates, synthetic_ticks, synthetic_universe
+from tick_backtest import TickBacktest
+from trade_journal import TradeJournal
+from trigger_watch import TriggerWatcher
+
+# Timings of the strategy's hot paths on seeded synthetic data, with no terminal: the live code runs against the
+# in-process simulator (mt5_sim.SimTerminal) and orders are built and normalized but never sent.
+#   python bench.py --save bench_baseline.json      # record a baseline
+#   python bench.py --baseline bench_baseline.json  # compare; exits 1 when a case got slower than --tolerance
+
+# One benchmark: setup(seed, **params) returns (run, items), where run() does the whole workload once and items is
+# how many bars/ticks/orders it handles, for a per-item time
+Case = namedtuple("Case", "name description params setup")
+
+BENCH_SYMBOLS = ["BTCUSDm", "EURUSDm", "XAUUSDm", "USDJPYm", "USOILm", "USTECm", "GBPUSDm", "AUDUSDm"]
+
+CASES = []
+
+
+def case(name, description, *params):
+    def register(setup):
+        CASES.append(Case(name, description, params, setup))
+        return setup
+    return register
+
+
+def bench_symbols(count):
+    return BENCH_SYMBOLS[:count] if count <= len(BENCH_SYMBOLS) else [f"SYM{i:04d}" for i in range(count)]
+
+
+def sim_terminal(universe):
+    # The simulator's clock a few bars into the history, so ticks and the last closed bars exist
+    return SimTerminal(universe, start_time=min(int(rates["time"][0]) for rates in universe.values()) + 300)
+
+
+def quiet_strategy(mt5, symbol, router=None):
+    # A SymbolStrategy whose log goes nowhere and whose journal is in memory, so no files are written
+    logger = logging.getLogger(f"strategy.{symbol}")
+    if not logger.handlers:
+        logger.addHandler(logging.NullHandler())
+        logger.propagate = False
+    return SymbolStrategy(mt5, symbol, 0.01, 50, 10, 5, "M1", 1, 5, 10, router=router,
+                          journal=TradeJournal(":memory:"))
+
+
+class DryRouter(OrderRouter):
+    # Builds and normalizes every request exactly as the live router does, but never calls order_send
+    def send(self, request, action):
+        return None
+
+
+# --- signal detection ---
+
+def dataframe_signal(rates):
+    # check_entry_condition as 1bigin6.py/allpair.py write it: a DataFrame of the last 6 candles per check
+    df = pd.DataFrame(rates)
+    last_candle = df.iloc[-1]
+    prev_candles = df.iloc[:-1]
+    avg_size = (prev_candles['high'] - prev_candles['low']).mean()
+    last_candle_size = last_candle['high'] - last_candle['low']
+    if last_candle_size >= 2 * avg_size:
+        return last_candle['low'] + (last_candle_size * 0.4)
+    return None
+
+
+@case("signal_dataframe", "pandas check_entry_condition per closed bar (1bigin6.py/allpair.py)",
+      {"symbols": 1, "bars": 200}, {"symbols": 10, "bars": 50})
+def bench_signal_dataframe(seed, symbols, bars):
+    universe = synthetic_universe(bench_symbols(symbols), bars + 6, seed)
+
+    def run():
+        for rates in universe.values():
+            for i in range(bars):
+                dataframe_signal(rates[i:i + 6])
+    return run, symbols * bars
+
+
+@case("signal_strategy", "SymbolStrategy.check_entry_condition per closed bar (child.py/runner.py)",
+      {"symbols": 1, "bars": 1000}, {"symbols": 10, "bars": 1000}, {"symbols": 100, "bars": 200})
+def bench_signal_strategy(seed, symbols, bars):
+    universe = synthetic_universe(bench_symbols(symbols), bars + 6, seed)
+    mt5 = sim_terminal(universe)
+    strategies = [(quiet_strategy(mt5, symbol), rates) for symbol, rates in universe.items()]
+
+    def run():
+        for strategy, rates in strategies:
+            strategy.ranges = CandleRangeState(5)
+            for i in range(bars):
+                strategy.check_entry_condition(rates[i:i + 6])
+    return run, symbols * bars
+
+
+@case("signal_scan", "scanner.UniverseWindow.scan over every symbol's last closed bars (allpair.py)",
+      {"symbols": 10}, {"symbols": 100}, {"symbols": 1000})
+def bench_signal_scan(seed, symbols):
+    window = UniverseWindow(bench_symbols(symbols), "M1", lookback=5)
+    for symbol, rates in synthetic_universe(window.symbols, 6, seed).items():
+        window.set(symbol, rates)
+
+    def run():
+        window.scan(multiple=1.0)
+    return run, symbols
+
+
+# --- backtest ---
+
+@case("backtest_loop", "the original bar-by-bar iloc loop of 6in1backtest.py's backtest()",
+      {"bars": 500}, {"bars": 2000})
+def bench_backtest_loop(seed, bars):
+    df = pd.DataFrame(synthetic_rates(bars, seed))
+
+    def run():
+        loop_backtest(df)
+    return run, bars
+
+
+@case("backtest_vectorized", "backtest_engine.run_backtest, as 6in1backtest.py now runs it",
+      {"bars": 10_000}, {"bars": 100_000}, {"bars": 1_000_000})
+def bench_backtest_vectorized(seed, bars):
+    rates = synthetic_rates(bars, seed)
+
+    def run():
+        run_backtest(rates)
+    return run, bars
+
+
+@case("tick_backtest", "tick_backtest.TickBacktest over synthetic bid/ask ticks",
+      {"ticks": 100_000}, {"ticks": 1_000_000})
+def bench_tick_backtest(seed, ticks):
+    model = model_for("BTCUSDm")
+    data = synthetic_ticks(synthetic_rates(ticks // 20, seed, model=model), seed, 20, model)
+
+    def run():
+        TickBacktest(5, 10).run([data])
+    return run, len(data)
+
+
+# --- trigger watching ---
+
+@case("trigger_watch", "TriggerWatcher.check of every armed symbol against one price snapshot per tick (allpair1.py)",
+      {"symbols": 10, "ticks": 1000}, {"symbols": 100, "ticks": 1000}, {"symbols": 1000, "ticks": 100})
+def bench_trigger_watch(seed, symbols, ticks):
+    names = bench_symbols(symbols)
+    rng = np.random.default_rng(seed)
+    walk = 1.0 + np.cumsum(rng.normal(0, 0.0005, (ticks, symbols)), axis=0)
+    snapshots = [dict(zip(names, row)) for row in walk.tolist()]
+    levels = 1.0 + rng.normal(0, 0.01, symbols)
+
+    def run():
+        watcher = TriggerWatcher()
+        for symbol, level in zip(names, levels.tolist()):
+            watcher.arm(symbol, "BUY" if level < 1.0 else "SELL", level, 0.0)
+        for now, prices in enumerate(snapshots):
+            watcher.check(prices, now)
+    return run, symbols * ticks
+
+
+@case("strategy_on_price", "SymbolStrategy.on_price per tick while a trigger is armed and not hit (child.py)",
+      {"ticks": 10_000})
+def bench_strategy_on_price(seed, ticks):
+    universe = synthetic_universe(["BTCUSDm"], 60, seed)
+    strategy = quiet_strategy(sim_terminal(universe), "BTCUSDm")
+    prices = synthetic_ticks(universe["BTCUSDm"], seed, max(ticks // 60, 4), model_for("BTCUSDm"))["bid"][:ticks]
+    strategy.arm(float(prices.min()) - 1000.0, "BUY")
+    prices = prices.tolist()
+
+    def run():
+        for price in prices:
+            strategy.on_price(price)
+    return run, len(prices)
+
+
+# --- order construction ---
+
+@case("order_build", "OrderRouter.open_position request building and spec normalization, not sent",
+      {"symbols": 1, "orders": 1000}, {"symbols": 8, "orders": 1000})
+def bench_order_build(seed, symbols, orders):
+    names = bench_symbols(symbols)
+    mt5 = sim_terminal(synthetic_universe(names, 60, seed))
+    router = DryRouter(mt5, specs=SymbolSpecs(mt5))
+    router.specs.load(names)
+    ticks = {symbol: mt5.symbol_info_tick(symbol) for symbol in names}
+    sides = ["BUY", "SELL"] * (orders // 2) + ["BUY"] * (orders % 2)
+
+    def run():
+        for symbol, tick in ticks.items():
+            distance = tick.bid * 0.001
+            for side in sides:
+                price = tick.ask if side == "BUY" else tick.bid
+                sl = price - distance if side == "BUY" else price + distance
+                tp = price + 2 * distance if side == "BUY" else price - 2 * distance
+                router.open_position(symbol, side, 0.0137, price, sl, tp, f"{side} Entry", tick)
+    return run, symbols * orders
+
+
+# --- harness ---
+
+def case_key(name, params):
+    return name + "[" + ",".join(f"{key}={value}" for key, value in params.items()) + "]"
+
+
+def measure(run, repeat=5, min_time=0.2):
+    # Median and best seconds per run() over `repeat` rounds, each of enough calls to take about `min_time`
+    started = time.perf_counter()
+    run()
+    first = time.perf_counter() - started
+    number = max(1, int(min_time / first)) if first > 0 else 1000
+    rounds = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(number):
+            run()
+        rounds.append((time.perf_counter() - started) / number)
+    return statistics.median(rounds), min(rounds), number
+
+
+def run_cases(cases, seed=0, repeat=5, min_time=0.2, quick=False, log=print):
+    results = {}
+    for bench in cases:
+        for params in bench.params[:1] if quick else bench.params:
+            key = case_key(bench.name, params)
+            run, items = bench.setup(seed, **params)
+            median, best, number = measure(run, repeat, min_time)
+            results[key] = {"median": median, "best": best, "items": items, "number": number, "repeat": repeat}
+            log(f"{key:<52}{median * 1000:>12.3f} ms{median / items * 1e6:>12.3f} us/item")
+    return results
+
+
+def environment():
+    return {"python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+            "machine": platform.machine(), "processor": platform.processor(), "cpus": os.cpu_count(),
+            "platform": platform.platform()}
+
+
+def compare(results, baseline, tolerance=0.25):
+    # Rows of (key, baseline median, median, change) for cases in both runs, and the keys that got slower than
+    # `tolerance` (0.25 = 25%)
+    rows, regressions = [], []
+    for key, result in results.items():
+        old = baseline.get(key)
+        if old is None:
+            continue
+        change = result["median"] / old["median"] - 1.0
+        rows.append((key, old["median"], result["median"], change))
+        if change > tolerance:
+            regressions.append(key)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the strategy's signal, backtest, trigger and order "
+                                                 "paths on synthetic data")
+    parser.add_argument("--cases", nargs="+", help="only cases whose name contains one of these")
+    parser.add_argument("--quick", action="store_true", help="only the smallest size of each case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="rounds per case; the median is reported")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds each round should take")
+    parser.add_argument("--save", help="write the results (with the machine they ran on) to this JSON file")
+    parser.add_argument("--baseline", help="JSON file from an earlier --save to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="slowdown flagged as a regression")
+    parser.add_argument("--list", action="store_true")
+    args = parser.parse_args()
+
+    cases = [c for c in CASES if not args.cases or any(part in c.name for part in args.cases)]
+    if args.list:
+        for bench in cases:
+            print(f"{bench.name:<22}{bench.description}")
+            for params in bench.params:
+                print(f"{'':<22}{case_key(bench.name, params)}")
+        return 0
+
+    print(f"{'case':<52}{'median':>15}{'per item':>20}")
+    results = run_cases(cases, args.seed, args.repeat, args.min_time, args.quick)
+    env = environment()
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump({"created": datetime.now().isoformat(timespec="seconds"), "seed": args.seed,
+                       "environment": env, "results": results}, file, indent=2)
+        print(f"Saved {len(results)} results to {args.save}")
+    if not args.baseline:
+        return 0
+
+    with open(args.baseline) as file:
+        baseline = json.load(file)
+    if baseline.get("environment") != env:
+        print(f"Note: baseline ran on {baseline.get('environment')}, this run on {env}")
+    if baseline.get("seed") != args.seed:
+        print(f"Note: baseline used seed {baseline.get('seed')}, this run {args.seed}")
+    rows, regressions = compare(results, baseline["results"], args.tolerance)
+    print(f"\n{'case':<52}{'baseline':>12}{'now':>12}{'change':>10}")
+    for key, old, new, change in rows:
+        flag = "  REGRESSION" if key in regressions else ""
+        print(f"{key:<52}{old * 1000:>9.3f} ms{new * 1000:>9.3f} ms{change:>+10.1%}{flag}")
+    if regressions:
+        print(f"{len(regressions)} of {len(rows)} cases slower than the baseline by more than {args.tolerance:.0%}")
+        return 1
+    print(f"No regressions in {len(rows)} cases (tolerance {args.tolerance:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,22 @@
+import os
+import time
+
+# MT5_BACKEND=sim runs the scripts against the in-process simulator in mt5_sim.py instead of the terminal
+BACKEND = os.environ.get("MT5_BACKEND", "mt5")
+
+
+def load_backend(name=BACKEND):
+    if name == "sim":
+        import mt5_sim
+
+        return mt5_sim.terminal_from_env()
+
+    import MetaTrader5
+    return MetaTrader5
+
+
+mt5 = load_backend()
+# What the live loops read the time from and pace themselves with (passed to the strategy, runner and scheduler).
+# On the simulator its sleep() advances the replay clock instead of waiting, so a simulated week runs in minutes;
+# everything else in the process (journal thread, metrics, heartbeat) stays on the real clock.
+clock = mt5 if BACKEND == "sim" else time
@@ -0,0 +1,65 @@
+from collections import deque
+
+
+class CandleRangeState:
+    # Rolling ranges of the last `lookback` closed bars for one symbol, updated in O(1) per new bar
+    # so the signal check needs no DataFrame.
+    def __init__(self, lookback=5):
+        self.lookback = lookback
+        self.ranges = deque(maxlen=lookback)
+        self.total = 0.0
+        self.maxima = deque()  # (index, range) pairs with decreasing ranges: front is the window max
+        self.pushed = 0
+        self.last_time = None
+        self.last_open = None
+        self.last_close = None
+
+    @property
+    def ready(self):
+        return len(self.ranges) == self.lookback
+
+    def push(self, time, open_, high, low, close):
+        if self.last_time is not None and time <= self.last_time:
+            return False
+        size = high - low
+        if len(self.ranges) == self.lookback:
+            self.total -= self.ranges[0]
+        self.ranges.append(size)
+        self.total += size
+
+        while self.maxima and self.maxima[-1][1] <= size:
+            self.maxima.pop()
+        self.maxima.append((self.pushed, size))
+        if self.maxima[0][0] <= self.pushed - self.lookback:
+            self.maxima.popleft()
+
+        self.pushed += 1
+        if self.pushed % 4096 == 0:
+            self.total = sum(self.ranges)  # keep the running sum from drifting
+        self.last_time, self.last_open, self.last_close = time, open_, close
+        return True
+
+    def update(self, closed_rates):
+        # Push only the closed bars newer than the last one seen; returns how many were added
+        added = 0
+        for bar in closed_rates:
+            added += self.push(int(bar["time"]), float(bar["open"]), float(bar["high"]), float(bar["low"]), float(bar["close"]))
+        return added
+
+    def average_range(self):
+        return self.total / len(self.ranges) if self.ranges else 0.0
+
+    def max_range(self):
+        return self.maxima[0][1] if self.maxima else 0.0
+
+    def last_direction(self):
+        return "BUY" if self.last_close > self.last_open else "SELL"
+
+
+def bar_direction(bar):
+    return "BUY" if bar["close"] > bar["open"] else "SELL"
+
+
+def trigger_level(high, low, direction, fraction=0.4):
+    size = high - low
+    return low + fraction * size if direction == "BUY" else high - fraction * size
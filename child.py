@@ -1,211 +1,92 @@
-import MetaTrader5 as mt5
-import pandas as pd
-import time
-import pytz
-import sys
-import logging
-import csv
-from datetime import datetime, timedelta
 import os
+import sys
+
+from heartbeat import Heartbeat
 
 # Argument validation
-if len(sys.argv) < 10:
-    print("Usage: python child.py <symbol> <lot_size> <profit_target> <sl_trailing_trigger> <sl_trailing_adjustment> <timeframe> <interval_minutes> <sl> <tp>")
+POOL = sys.argv[1:] == ["--pool"]
+if not POOL and len(sys.argv) not in (2, 10):
+    print("Usage: python child.py <symbol>  (parameters from config.yaml, reloaded on change)")
+    print("   or: python child.py <symbol> <lot_size> <profit_target> <sl_trailing_trigger> <sl_trailing_adjustment> <timeframe> <interval_minutes> <sl> <tp>")
+    print("   or: python child.py --pool  (warm worker for master.py: symbol, heartbeat and log path on stdin)")
     sys.exit(1)
 
-# Parse input arguments
-symbol = sys.argv[1]
-lot_size = float(sys.argv[2])
-profit_target = float(sys.argv[3])
-sl_trailing_trigger = float(sys.argv[4])
-sl_trailing_adjustment = float(sys.argv[5])
-timeframe_str = sys.argv[6]
-interval_minutes = int(sys.argv[7])
-sl = float(sys.argv[8])
-tp = float(sys.argv[9])
-
-
-# Map timeframe
-timeframe_map = {"M1": mt5.TIMEFRAME_M1, "M5": mt5.TIMEFRAME_M5, "M15": mt5.TIMEFRAME_M15, "M30": mt5.TIMEFRAME_M30}
-timeframe = timeframe_map.get(timeframe_str, mt5.TIMEFRAME_M1)
-
-# Ensure "logs" folder exists
-if not os.path.exists("logs"):
-    os.makedirs("logs")
-
-# Logging setup
-log_file = os.path.join("logs", f"{symbol}.log")
-
-logging.basicConfig(
-    filename=log_file,
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
-
-# Connect MT5
-if not mt5.initialize():
-    logging.error("Failed to initialize MT5")
+# The heavy part of a start (numpy, the terminal package, the strategy modules) only after the arguments check out
+from broker import clock, mt5
+import metrics
+import session_log
+import tick_feed
+from config import ConfigWatcher
+from strategy import SymbolStrategy
+
+# With TICK_FEED set, prices come from the shared-memory feed instead of one terminal poll per worker
+mt5 = tick_feed.from_env(mt5)
+
+heartbeat = Heartbeat.from_env()
+
+if POOL:
+    # Warm worker: import and connect now, then wait for master.py to hand over a symbol, so bringing a symbol
+    # up costs a config read and its first bars instead of an interpreter start and mt5.initialize()
+    if not mt5.initialize():
+        print("Failed to initialize MT5")
+        sys.exit(1)
+    heartbeat.beat()
+    assignment = sys.stdin.readline().rstrip("\n")
+    if not assignment:
+        sys.exit(0)  # supervisor shut down before this worker was needed
+    symbol, heartbeat_file, log_path = assignment.split("\t")
+    # From here on this worker's output belongs to the symbol's log
+    log = open(log_path, "a", buffering=1)
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+    sys.argv[1:] = [symbol]
+    heartbeat = Heartbeat(heartbeat_file)
+
+# With SESSION_LOG set, every terminal answer, signal and order of this worker goes to a session log for replay
+mt5 = session_log.from_env(mt5, sys.argv[1], clock)
+
+watcher = None
+if len(sys.argv) == 2:
+    watcher = ConfigWatcher()
+    if sys.argv[1] not in watcher.config.symbols:
+        print(f"{sys.argv[1]} is not configured in {watcher.path}")
+        sys.exit(1)
+    strategy = SymbolStrategy.from_config(mt5, watcher.config.symbols[sys.argv[1]], clock=clock)
+else:
+    # Parse input arguments
+    strategy = SymbolStrategy(
+        mt5,
+        symbol=sys.argv[1],
+        lot_size=float(sys.argv[2]),
+        profit_target=float(sys.argv[3]),
+        sl_trailing_trigger=float(sys.argv[4]),
+        sl_trailing_adjustment=float(sys.argv[5]),
+        timeframe_str=sys.argv[6],
+        interval_minutes=int(sys.argv[7]),
+        sl=float(sys.argv[8]),
+        tp=float(sys.argv[9]),
+        clock=clock,
+    )
+
+# Connect MT5 (a pool worker already is)
+if not POOL and not mt5.initialize():
+    strategy.logger.error("Failed to initialize MT5")
     sys.exit(1)
 
-# Timezone
-ist = pytz.timezone("Asia/Kolkata")
-logging.info(f"symbol: {symbol}, lot_size: {lot_size}, profit_target: {profit_target}, sl_trailing_trigger: {sl_trailing_trigger}, sl_trailing_adjustment: {sl_trailing_adjustment}, timeframe_str: {timeframe_str}, interval_minutes: {interval_minutes}, sl: {sl}, tp: {tp}")
-def log_trade_to_csv(action, order_type, price, volume, result, retcode=None, ticket=None):
-    file_path = os.path.join("logs", "Trades.csv")
-    file_exists = os.path.isfile(file_path)
-
-    with open(file_path, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        if not file_exists:
-            writer.writerow(["Timestamp", "Symbol", "Action", "OrderType", "Price", "Volume", "Result", "Retcode", "Ticket"])
-        writer.writerow([
-            datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            symbol,
-            action,
-            order_type,
-            price,
-            volume,
-            result,
-            retcode,
-            ticket
-        ])
-
-def get_current_price():
-    tick = mt5.symbol_info_tick(symbol)
-    return tick.bid if tick else None
-
-def get_open_trade_type():
-    positions = mt5.positions_get(symbol=symbol)
-    if not positions:
-        return None
-    return 'BUY' if positions[0].type == mt5.ORDER_TYPE_BUY else 'SELL'
-
-def close_all_trades():
-    positions = mt5.positions_get(symbol=symbol)
-    if not positions:
-        return
-
-    logging.info(f"Attempting to close all trades for {symbol}. Total open trades: {len(positions)}")
-
-    for pos in positions:
-        order_type = mt5.ORDER_TYPE_SELL if pos.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
-        price = mt5.symbol_info_tick(symbol).bid if order_type == mt5.ORDER_TYPE_SELL else mt5.symbol_info_tick(symbol).ask
-
-        request = {
-            "action": mt5.TRADE_ACTION_DEAL,
-            "symbol": symbol,
-            "volume": pos.volume,
-            "type": order_type,
-            "position": pos.ticket,
-            "price": price,
-            "deviation": 10,
-            "magic": 123456,
-            "comment": "Close opposite trade",
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC
-        }
-
-        result = mt5.order_send(request)
-        if result.retcode == mt5.TRADE_RETCODE_DONE:
-            logging.info(f"Closed trade {pos.ticket} for {symbol}")
-            log_trade_to_csv("Close", "BUY" if pos.type == mt5.ORDER_TYPE_BUY else "SELL", price, pos.volume, "Success", result.retcode, pos.ticket)
-        else:
-            logging.error(f"Failed to close trade {pos.ticket}, retcode: {result.retcode}")
-            log_trade_to_csv("Close", "BUY" if pos.type == mt5.ORDER_TYPE_BUY else "SELL", price, pos.volume, "Failed", result.retcode, pos.ticket)
-
-    time.sleep(1)
-
-def place_trade(trade_type, entry_price):
-    positions = mt5.positions_get(symbol=symbol)
-    if positions:
-        logging.info(f"Detected {len(positions)} open trades for {symbol} before placing new {trade_type} trade. Closing all trades first.")
-        close_all_trades()
-
-        time.sleep(1)
-
-        if mt5.positions_get(symbol=symbol):
-            logging.error(f"Cannot place new {trade_type} trade - trades failed to close.")
-            return False
-
-    price = mt5.symbol_info_tick(symbol).ask if trade_type == "BUY" else mt5.symbol_info_tick(symbol).bid
-
-    request = {
-        "action": mt5.TRADE_ACTION_DEAL,
-        "symbol": symbol,
-        "volume": lot_size,
-        "type": mt5.ORDER_TYPE_BUY if trade_type == "BUY" else mt5.ORDER_TYPE_SELL,
-        "price": price,
-        "sl": entry_price - sl if trade_type == "BUY" else entry_price + sl,
-        "tp": entry_price + tp if trade_type == "BUY" else entry_price - tp,
-        "deviation": 10,
-        "magic": 123456,
-        "comment": f"{trade_type} Entry",
-        "type_time": mt5.ORDER_TIME_GTC,
-        "type_filling": mt5.ORDER_FILLING_IOC
-    }
-
-    logging.info(f"Placing {trade_type} trade for {symbol} at {price}")
-    logging.info(f"SL: {request['sl']} | TP: {request['tp']}")
-
-    result = mt5.order_send(request)
-    if result.retcode == mt5.TRADE_RETCODE_DONE:
-        logging.info(f"{trade_type} trade placed for {symbol} at {price}")
-        log_trade_to_csv("Open", trade_type, price, lot_size, "Success", result.retcode, result.order)
-        return True
-    else:
-        logging.error(f"Failed to place {trade_type} trade for {symbol}, retcode: {result.retcode}")
-        log_trade_to_csv("Open", trade_type, price, lot_size, "Failed", result.retcode)
-        return False
-
-def check_entry_condition():
-    rates = mt5.copy_rates_from_pos(symbol, timeframe, 0, 6)
-    df = pd.DataFrame(rates)
-    df['time'] = pd.to_datetime(df['time'], unit='s').dt.tz_localize('UTC').dt.tz_convert(ist)
-
-    last = df.iloc[-1]
-    avg_size = (df['high'] - df['low']).iloc[-6:-1].mean()
-    last_size = last['high'] - last['low']
-
-    trade_type = 'BUY' if last['close'] > last['open'] else 'SELL'
-    if last_size >= 1.2 * avg_size:
-        trigger_point = (last['low'] + 0.4 * last_size) if trade_type == 'BUY' else (last['high'] - 0.4 * last_size)
-        logging.info(f"Found signals for {symbol} - {trade_type} at {trigger_point}")
-        return trigger_point, trade_type
-    return None, None
-
-def watch_price(trigger_point, trade_type):
-    logging.info(f"Watching price for {symbol} {trade_type} entry at {trigger_point}")
-    last_log_time = time.time()
-    now = datetime.now(ist)
-    SingalLogTime=  now.strftime('%Y-%m-%d %H:%M:%S')
-    SignalFoundTime = f"Single was found at {SingalLogTime} for {symbol} {trade_type} entry at {trigger_point}"
-    while True:
-        price = get_current_price()
-
-        if (trade_type == "BUY" and price <= trigger_point) or (trade_type == "SELL" and price >= trigger_point):
-            if place_trade(trade_type, trigger_point):
-                logging.info(f'{SignalFoundTime}')
-                return
-        current_time = time.time()
-        if current_time - last_log_time >= 15:
-            logging.info(f"{symbol} Current price: {price} and {trigger_point}")
-            last_log_time = current_time
-        time.sleep(1)
-
-def wait_for_next_candle():
-    now = datetime.now(ist)
-    next_minute = (now.minute // interval_minutes + 1) * interval_minutes
-    next_time = (now + timedelta(minutes=interval_minutes)).replace(second=0, microsecond=0)
-    wait_time = (next_time - now).total_seconds()
-    logging.info(f"Waiting until {next_time.strftime('%Y-%m-%d %H:%M:%S')} for next candle")
-    time.sleep(max(wait_time, 0))
+strategy.log_settings()
+metrics.start_from_env()
 
 def main():
-    while True:
-        trigger_point, trade_type = check_entry_condition()
-        if trigger_point:
-            watch_price(trigger_point, trade_type)
-        wait_for_next_candle()
+    # Under master.py's supervisor the first beat comes after the first cycle: the symbol is up and evaluating bars
+    strategy.run(watcher, heartbeat)
+    if heartbeat is not None and heartbeat.stopping:
+        # Graceful stop: leave positions to their broker-side SL/TP for the next worker's position manager,
+        # or close them when the supervisor was started with --on-stop close
+        if os.environ.get("WORKER_ON_STOP") == "close":
+            strategy.close_all_trades()
+        mt5.shutdown()
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,193 @@
+import logging
+import os
+import time
+from collections import namedtuple
+
+import yaml
+
+from timeframes import timeframe_name
+
+# FOREX_CONFIG points every process at another file (e.g. a paper-trading copy)
+CONFIG_PATH = os.environ.get("FOREX_CONFIG", os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.yaml"))
+
+SymbolConfig = namedtuple("SymbolConfig", "symbol lot_size profit_target sl_trailing_trigger sl_trailing_adjustment "
+                                          "timeframe interval_minutes sl tp enabled")
+Config = namedtuple("Config", "symbols scripts")
+
+FIELD_TYPES = {
+    "lot_size": float,
+    "profit_target": float,
+    "sl_trailing_trigger": float,
+    "sl_trailing_adjustment": float,
+    "timeframe": str,
+    "interval_minutes": int,
+    "sl": float,
+    "tp": float,
+    "enabled": bool,
+}
+
+# The `scripts` section: the settings each standalone script reads with script_settings()
+SCRIPT_FIELDS = {
+    "allpair": ("symbols", "lot_size", "sl_amount", "tp_amount", "timeframe"),
+    "allpair1": ("symbols", "lot_size", "sl_amount", "tp_amount", "timeframe", "trigger_expiry_minutes"),
+    "1bigin6": ("symbol", "lot_size", "sl_amount", "tp_amount", "timeframe"),
+}
+
+SCRIPT_FIELD_TYPES = {
+    "symbol": str,
+    "symbols": list,  # or one symbols_get group pattern, e.g. "*"
+    "lot_size": float,
+    "sl_amount": float,
+    "tp_amount": float,
+    "timeframe": str,
+    "trigger_expiry_minutes": float,  # or null: watch until hit
+}
+
+# libyaml's parser when PyYAML was built with it; several times faster than the pure-Python one
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+logger = logging.getLogger("config")
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def _field(where, name, value, types=FIELD_TYPES):
+    kind = types[name]
+    if kind is str and name != "timeframe":
+        if not isinstance(value, str) or not value:
+            raise ConfigError(f"{where}.{name}: expected a name, got {value!r}")
+        return value
+    if kind is list:
+        if isinstance(value, str) and value:
+            return value
+        if not isinstance(value, list) or not value or not all(isinstance(item, str) and item for item in value):
+            raise ConfigError(f"{where}.{name}: expected a list of symbols or a group pattern, got {value!r}")
+        return value
+    if kind is bool:
+        if not isinstance(value, bool):
+            raise ConfigError(f"{where}.{name}: expected true/false, got {value!r}")
+        return value
+    if kind in (int, float) and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        raise ConfigError(f"{where}.{name}: expected a number, got {value!r}")
+    if kind is int and value != int(value):
+        raise ConfigError(f"{where}.{name}: expected a whole number, got {value!r}")
+    value = kind(value)
+
+    if name == "timeframe":
+        try:
+            return timeframe_name(value)
+        except ValueError:
+            raise ConfigError(f"{where}.timeframe: unknown timeframe {value!r}") from None
+    if name == "lot_size" and value <= 0:
+        raise ConfigError(f"{where}.lot_size must be positive, got {value}")
+    if name == "trigger_expiry_minutes" and value <= 0:
+        raise ConfigError(f"{where}.trigger_expiry_minutes must be positive or null, got {value}")
+    if name == "interval_minutes" and value < 1:
+        raise ConfigError(f"{where}.interval_minutes must be at least 1, got {value}")
+    if kind is float and value < 0:
+        raise ConfigError(f"{where}.{name} must not be negative, got {value}")
+    return value
+
+
+def _fields(where, values):
+    if not isinstance(values, dict):
+        raise ConfigError(f"{where}: expected a mapping, got {values!r}")
+    unknown = set(values) - set(FIELD_TYPES)
+    if unknown:
+        raise ConfigError(f"{where}: unknown setting(s) {', '.join(sorted(unknown))}")
+    return {name: _field(where, name, value) for name, value in values.items()}
+
+
+def _script_fields(script, values):
+    where = f"scripts.{script}"
+    if script not in SCRIPT_FIELDS:
+        raise ConfigError(f"{where}: unknown script (expected one of {', '.join(SCRIPT_FIELDS)})")
+    if not isinstance(values, dict):
+        raise ConfigError(f"{where}: expected a mapping, got {values!r}")
+    unknown = set(values) - set(SCRIPT_FIELDS[script])
+    if unknown:
+        raise ConfigError(f"{where}: unknown setting(s) {', '.join(sorted(unknown))}")
+    return {name: None if value is None and name == "trigger_expiry_minutes"
+            else _field(where, name, value, SCRIPT_FIELD_TYPES) for name, value in values.items()}
+
+
+def parse_config(data):
+    # Validated Config from the parsed YAML document; raises ConfigError naming the offending setting
+    if not isinstance(data, dict):
+        raise ConfigError("config: expected a mapping at the top level")
+    defaults = _fields("defaults", data.get("defaults") or {})
+    symbols = {}
+    for symbol, overrides in (data.get("symbols") or {}).items():
+        values = dict(defaults)
+        values.update(_fields(f"symbols.{symbol}", overrides or {}))
+        missing = set(FIELD_TYPES) - set(values) - {"enabled"}
+        if missing:
+            raise ConfigError(f"symbols.{symbol}: missing {', '.join(sorted(missing))}")
+        values.setdefault("enabled", True)
+        symbols[symbol] = SymbolConfig(symbol=symbol, **values)
+    scripts = data.get("scripts") or {}
+    if not isinstance(scripts, dict):
+        raise ConfigError("scripts: expected a mapping")
+    scripts = {script: _script_fields(script, values or {}) for script, values in scripts.items()}
+    return Config(symbols, scripts)
+
+
+def load_config(path=CONFIG_PATH):
+    with open(path) as file:
+        return parse_config(yaml.load(file, Loader=YAML_LOADER))
+
+
+def symbol_dicts(config, enabled_only=True):
+    # {symbol: {"lot_size": ..., ...}} in master.symbol_configs' old shape
+    return {symbol: {name: getattr(cfg, name) for name in FIELD_TYPES if name != "enabled"}
+            for symbol, cfg in config.symbols.items() if cfg.enabled or not enabled_only}
+
+
+def script_settings(name, defaults, path=CONFIG_PATH):
+    # A standalone script's settings from the `scripts` section, over its built-in defaults
+    settings = dict(defaults)
+    if os.path.exists(path):
+        settings.update(load_config(path).scripts.get(name) or {})
+    return settings
+
+
+class ConfigWatcher:
+    # Polled from a strategy's main loop (no extra thread touching live objects): stats the file at most every
+    # `interval` seconds and, when it has changed, re-reads and validates it. A broken edit is logged and the
+    # previous config stays in force.
+    def __init__(self, path=CONFIG_PATH, interval=1.0):
+        self.path = path
+        self.interval = interval
+        self.config = load_config(path)
+        self.mtime = os.stat(path).st_mtime_ns
+        self.checked = time.time()
+        self.error = None
+
+    def poll(self):
+        # None when nothing was reloaded, else {symbol: new SymbolConfig, or None if removed} for what changed
+        now = time.time()
+        if now - self.checked < self.interval:
+            return None
+        self.checked = now
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        if mtime == self.mtime:
+            return None
+        self.mtime = mtime
+        try:
+            config = load_config(self.path)
+        except (OSError, yaml.YAMLError, ConfigError) as error:
+            self.error = error
+            logger.error(f"Ignoring invalid config {self.path}: {error}")
+            return None
+
+        old = self.config.symbols
+        changes = {symbol: cfg for symbol, cfg in config.symbols.items() if old.get(symbol) != cfg}
+        changes.update({symbol: None for symbol in old if symbol not in config.symbols})
+        self.config = config
+        self.error = None
+        return changes
@@ -0,0 +1,37 @@
+import os
+import time
+
+HEARTBEAT_DIR = "heartbeats"
+
+
+def heartbeat_path(name):
+    return os.path.join(HEARTBEAT_DIR, f"{name}.hb")
+
+
+class Heartbeat:
+    # Liveness file a supervised worker touches from its main loop. master.py restarts a worker whose file goes
+    # stale and asks it to stop by creating <file>.stop next to it. Paced on time.monotonic, not the loop's clock,
+    # so a simulated or replayed run beats in wall-clock seconds too.
+    def __init__(self, path, interval=1.0):
+        self.path = path
+        self.stop_path = path + ".stop"
+        self.interval = interval
+        self.last = float("-inf")
+        self.stopping = False
+
+    @classmethod
+    def from_env(cls):
+        # master.py passes the file in WORKER_HEARTBEAT; None when the script was started by hand
+        path = os.environ.get("WORKER_HEARTBEAT")
+        return cls(path) if path else None
+
+    def beat(self):
+        # Touch the file at most once per interval; True once the supervisor has asked for a stop
+        now = time.monotonic()
+        if now - self.last >= self.interval:
+            self.last = now
+            with open(self.path, "a"):
+                pass
+            os.utime(self.path)
+            self.stopping = os.path.exists(self.stop_path)
+        return self.stopping
@@ -0,0 +1,357 @@
+import argparse
+import csv
+import os
+import sys
+import time
+import zipfile
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bar_store import BarStore, _to_timestamp
+from timeframes import RATES_DTYPE, TIMEFRAMES, timeframe_name, timeframe_seconds
+
+CATALOG_FIELDS = ("symbol", "timeframe", "month", "path", "rows", "first", "last", "gaps", "bytes")
+Partition = namedtuple("Partition", CATALOG_FIELDS)
+
+PRICE_COLUMNS = ("open", "high", "low", "close")
+COMPRESS_LEVEL = 1  # deflate level of the partitions: np.savez_compressed's 6 is 3x slower for files ~10% smaller
+
+
+def months_of(times):
+    # datetime64[M] of each epoch-second time; str() of one is the partition's "YYYY-MM"
+    return times.astype("datetime64[s]").astype("datetime64[M]")
+
+
+def clean(rates):
+    # Sorted by time with one bar per time (the later duplicate wins) and no bar with impossible prices.
+    # Returns (bars, duplicates dropped, invalid dropped).
+    rates = rates[np.argsort(rates["time"], kind="stable")]
+    times = rates["time"]
+    last_of_run = np.append(times[1:] != times[:-1], True) if len(rates) else np.zeros(0, dtype=bool)
+    duplicates = len(rates) - int(last_of_run.sum())
+    rates = rates[last_of_run]
+    o, h, l, c = (rates[name] for name in PRICE_COLUMNS)
+    valid = np.isfinite(o) & np.isfinite(h) & np.isfinite(l) & np.isfinite(c) & (l > 0)
+    valid &= (h >= l) & (h >= np.maximum(o, c)) & (l <= np.minimum(o, c))
+    return rates[valid], duplicates, len(rates) - int(valid.sum())
+
+
+def find_gaps(times, timeframe, max_gap=None):
+    # (last bar before, first bar after) of every hole longer than max_gap seconds (default: 10 bars, at least an
+    # hour, which covers the daily rollover pause). The weekend close (Friday/Saturday to Sunday/Monday) is not a gap.
+    if max_gap is None:
+        max_gap = max(10 * timeframe_seconds(timeframe), 3600)
+    if len(times) < 2:
+        return []
+    holes = np.nonzero(np.diff(times) > max_gap)[0]
+    starts, ends = times[holes], times[holes + 1]
+    weekday_start = (starts // 86400 + 3) % 7  # Monday = 0
+    weekday_end = (ends // 86400 + 3) % 7
+    weekend = np.isin(weekday_start, (4, 5)) & np.isin(weekday_end, (5, 6, 0)) & (ends - starts < 4 * 86400)
+    return [(int(start), int(end)) for start, end in zip(starts[~weekend], ends[~weekend])]
+
+
+def _rates_from_frame(frame):
+    # pandas DataFrame in MT5's export layout (<DATE> <TIME> <OPEN> ... <TICKVOL> <VOL> <SPREAD>) or the generic
+    # one (time, open, high, low, close[, tick_volume, spread, real_volume]) -> RATES_DTYPE array
+    import pandas as pd
+
+    columns = {name.strip("<>").lower(): name for name in frame.columns}
+    rates = np.zeros(len(frame), dtype=RATES_DTYPE)
+    if "date" in columns:
+        stamp = frame[columns["date"]].astype(str)
+        if "time" in columns:
+            stamp = stamp + " " + frame[columns["time"]].astype(str)
+        parsed = pd.to_datetime(stamp, format="mixed" if "time" not in columns else "%Y.%m.%d %H:%M:%S")
+        rates["time"] = parsed.to_numpy(dtype="datetime64[s]").astype(np.int64)
+        aliases = {"tickvol": "tick_volume", "vol": "real_volume", "spread": "spread"}
+    else:
+        times = frame[columns["time"]]
+        if times.dtype.kind in "iuf":
+            rates["time"] = times.to_numpy(dtype=np.int64)
+        else:
+            rates["time"] = pd.to_datetime(times, utc=True).dt.tz_localize(None).to_numpy(dtype="datetime64[s]").astype(np.int64)
+        aliases = {"tick_volume": "tick_volume", "volume": "tick_volume", "spread": "spread", "real_volume": "real_volume"}
+    for name in PRICE_COLUMNS:
+        rates[name] = frame[columns[name]].to_numpy(dtype=np.float64)
+    for alias, name in aliases.items():
+        if alias in columns:
+            rates[name] = frame[columns[alias]].to_numpy()
+    return rates
+
+
+def csv_chunks(path, chunk_rows=1_000_000):
+    # A broker CSV export in chunks of chunk_rows bars, so a multi-year file never sits in memory whole
+    import pandas as pd
+
+    with open(path) as file:
+        header = file.readline()
+    sep = "\t" if "\t" in header else ","
+    for frame in pd.read_csv(path, sep=sep, chunksize=chunk_rows):
+        yield _rates_from_frame(frame)
+
+
+def parquet_chunks(path, chunk_rows=1_000_000):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Reading Parquet needs pyarrow: pip install pyarrow") from None
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+        yield _rates_from_frame(batch.to_pandas())
+
+
+def mt5_chunks(source, symbol, timeframe, start, end=None):
+    # One copy_rates_range per calendar month, so a ten-year pull never asks the terminal for more bars at once
+    # than its "max bars in chart" setting allows. `source` is the MetaTrader5 module or anything like it.
+    tf = TIMEFRAMES[timeframe_name(timeframe)]
+    end = _to_timestamp(end) if end is not None else int(time.time())
+    month = np.datetime64(_to_timestamp(start), "s").astype("datetime64[M]")
+    while True:
+        first = int(month.astype("datetime64[s]").astype(np.int64))
+        if first > end:
+            return
+        month += 1
+        last = min(int(month.astype("datetime64[s]").astype(np.int64)) - 1, end)
+        rates = source.copy_rates_range(symbol, tf, datetime.fromtimestamp(max(first, _to_timestamp(start)), timezone.utc),
+                                        datetime.fromtimestamp(last, timezone.utc))
+        if rates is not None and len(rates):
+            yield np.asarray(rates, dtype=RATES_DTYPE)
+
+
+class PartitionStore:
+    # Compacted research history: one compressed, column-per-field file per symbol/timeframe/month,
+    # <root>/<symbol>/<timeframe>/<YYYY-MM>.npz, listed with its row count, time span and gap count in
+    # <root>/catalog.csv. Times are stored as deltas (almost all equal to the bar length), which zlib folds away.
+    def __init__(self, root):
+        self.root = root
+        self.catalog_path = os.path.join(root, "catalog.csv")
+        self.catalog = {}
+        if os.path.isfile(self.catalog_path):
+            with open(self.catalog_path, newline="") as file:
+                for row in csv.DictReader(file):
+                    for name in ("rows", "first", "last", "gaps", "bytes"):
+                        row[name] = int(row[name])
+                    self.catalog[(row["symbol"], row["timeframe"], row["month"])] = Partition(**row)
+
+    def save_catalog(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self.catalog_path + ".tmp"
+        with open(tmp, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(CATALOG_FIELDS)
+            writer.writerows(self.catalog[key] for key in sorted(self.catalog))
+        os.replace(tmp, self.catalog_path)
+
+    def partitions(self, symbol=None, timeframe=None):
+        name = timeframe_name(timeframe) if timeframe is not None else None
+        return [part for key, part in sorted(self.catalog.items())
+                if (symbol is None or key[0] == symbol) and (name is None or key[1] == name)]
+
+    def load(self, part):
+        with np.load(os.path.join(self.root, part.path)) as data:
+            rates = np.zeros(part.rows, dtype=RATES_DTYPE)
+            for name in RATES_DTYPE.names:
+                rates[name] = data[name]
+        rates["time"] = np.cumsum(rates["time"])
+        return rates
+
+    def write(self, symbol, timeframe, month, rates):
+        # Merge `rates` (all inside `month`) into that month's partition; returns (rows added, duplicates, invalid).
+        # Nothing is written when no valid row is left: an empty partition would carry a 0 first/last time.
+        name = timeframe_name(timeframe)
+        key = (symbol, name, month)
+        existing = self.catalog.get(key)
+        before = existing.rows if existing else 0
+        if existing is not None:
+            rates = np.concatenate((self.load(existing), rates))
+        rates, duplicates, invalid = clean(rates)
+        if not len(rates):
+            return 0, duplicates, invalid
+        path = os.path.join(symbol, name, f"{month}.npz")
+        full = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        columns = {field: rates[field] for field in RATES_DTYPE.names}
+        columns["time"] = np.diff(rates["time"], prepend=0)
+        with zipfile.ZipFile(full + ".tmp", "w", zipfile.ZIP_DEFLATED, compresslevel=COMPRESS_LEVEL) as archive:
+            for field, column in columns.items():
+                with archive.open(field + ".npy", "w", force_zip64=True) as member:
+                    np.lib.format.write_array(member, np.ascontiguousarray(column), allow_pickle=False)
+        os.replace(full + ".tmp", full)
+        times = rates["time"]
+        self.catalog[key] = Partition(symbol, name, month, path.replace(os.sep, "/"), len(rates), int(times[0]),
+                                      int(times[-1]), len(find_gaps(times, name)), os.path.getsize(full))
+        return len(rates) - before, duplicates, invalid
+
+    def ingest(self, symbol, timeframe, chunks):
+        # Stream chunks (any order, any size) into monthly partitions. A month is written once a later month shows
+        # up, so sorted input holds one month plus one chunk in memory; out-of-order rows merge into what is stored.
+        stats = {"rows": 0, "added": 0, "duplicates": 0, "invalid": 0, "partitions": 0}
+        pending = {}
+
+        def flush(month):
+            added, duplicates, invalid = self.write(symbol, timeframe, month, np.concatenate(pending.pop(month)))
+            stats["added"] += added
+            stats["duplicates"] += duplicates
+            stats["invalid"] += invalid
+            stats["partitions"] += (symbol, timeframe_name(timeframe), month) in self.catalog
+
+        for chunk in chunks:
+            stats["rows"] += len(chunk)
+            if not len(chunk):
+                continue
+            months = months_of(chunk["time"])
+            for month in np.unique(months):
+                pending.setdefault(str(month), []).append(chunk[months == month])
+            newest = str(months.max())
+            for month in sorted(month for month in pending if month < newest):
+                flush(month)
+        for month in sorted(pending):
+            flush(month)
+        self.save_catalog()
+        return stats
+
+    def iter_months(self, symbol, timeframe, start=None, end=None):
+        # One month of bars at a time, oldest first, clipped to [start, end]
+        start = _to_timestamp(start) if start is not None else None
+        end = _to_timestamp(end) if end is not None else None
+        for part in self.partitions(symbol, timeframe):
+            if (start is not None and part.last < start) or (end is not None and part.first > end):
+                continue
+            rates = self.load(part)
+            if start is not None:
+                rates = rates[rates["time"] >= start]
+            if end is not None:
+                rates = rates[rates["time"] <= end]
+            yield rates
+
+    def read(self, symbol, timeframe, start=None, end=None):
+        months = list(self.iter_months(symbol, timeframe, start, end))
+        return np.concatenate(months) if months else np.zeros(0, dtype=RATES_DTYPE)
+
+    def tail(self, symbol, timeframe, count, end=None):
+        # The last `count` bars up to `end`, reading months from the newest back only as far as needed
+        end = _to_timestamp(end) if end is not None else None
+        months = []
+        for part in reversed(self.partitions(symbol, timeframe)):
+            if end is not None and part.first > end:
+                continue
+            rates = self.load(part)
+            months.insert(0, rates if end is None else rates[rates["time"] <= end])
+            if sum(len(month) for month in months) >= count:
+                break
+        bars = np.concatenate(months) if months else np.zeros(0, dtype=RATES_DTYPE)
+        return bars[max(len(bars) - count, 0):]
+
+    def gaps(self, symbol, timeframe, max_gap=None):
+        # Holes inside and between partitions
+        holes = []
+        previous = None
+        for rates in self.iter_months(symbol, timeframe):
+            times = rates["time"] if previous is None else np.concatenate(([previous], rates["time"]))
+            holes.extend(find_gaps(times, timeframe, max_gap))
+            if len(rates):
+                previous = rates["time"][-1]
+        return holes
+
+    def export(self, store, symbol, timeframe="M1"):
+        # Copy the history into a BarStore (bar_store.py) a month at a time, for the simulator, the portfolio
+        # backtest and 6in1backtest.py; the BarStore only takes bars newer than what it already has
+        added = sum(store.append(symbol, timeframe, rates) for rates in self.iter_months(symbol, timeframe))
+        if timeframe_name(timeframe) == "M1":
+            store.derive(symbol)
+        return added
+
+
+class PartitionProvider:
+    # Drop-in for the mt5 history calls, answered from a PartitionStore (like bar_store.BarStoreProvider)
+    def __init__(self, store):
+        self.store = store
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        bars = self.store.tail(symbol, timeframe, start_pos + count)
+        return bars[:max(len(bars) - start_pos, 0)]
+
+    def copy_rates_from(self, symbol, timeframe, date_from, count):
+        # Like MT5: `count` bars ending at date_from
+        return self.store.tail(symbol, timeframe, count, end=date_from)
+
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        return self.store.read(symbol, timeframe, date_from, date_to)
+
+
+def _print_stats(symbol, stats, elapsed):
+    print(f"{symbol}: {stats['rows']} rows read, {stats['added']} new bars in {stats['partitions']} partition writes, "
+          f"{stats['duplicates']} duplicates and {stats['invalid']} invalid bars dropped ({elapsed:.1f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest bar history into compressed monthly partitions")
+    parser.add_argument("root", help="partition store directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    files = commands.add_parser("files", help="load broker CSV (MT5 export or generic) or Parquet files")
+    files.add_argument("symbol")
+    files.add_argument("paths", nargs="+")
+    files.add_argument("--timeframe", default="M1")
+    files.add_argument("--chunk-rows", type=int, default=1_000_000)
+
+    pull = commands.add_parser("mt5", help="pull from the terminal with one copy_rates_range per month")
+    pull.add_argument("symbols", nargs="+")
+    pull.add_argument("--start", required=True, help="e.g. 2015-01-01")
+    pull.add_argument("--end")
+    pull.add_argument("--timeframe", default="M1")
+
+    catalog = commands.add_parser("catalog", help="list the partitions")
+    catalog.add_argument("--symbol")
+
+    gaps = commands.add_parser("gaps", help="list holes in a symbol's history (weekends excluded)")
+    gaps.add_argument("symbol")
+    gaps.add_argument("--timeframe", default="M1")
+    gaps.add_argument("--max-gap", type=int, help="seconds; default 10 bars or an hour, whichever is longer")
+
+    export = commands.add_parser("export", help="copy into a bar_store.py directory for the simulator and backtests")
+    export.add_argument("bar_store")
+    export.add_argument("symbols", nargs="+")
+    export.add_argument("--timeframe", default="M1")
+    args = parser.parse_args()
+
+    store = PartitionStore(args.root)
+    if args.command == "files":
+        for path in args.paths:
+            started = time.perf_counter()
+            reader = parquet_chunks if path.lower().endswith((".parquet", ".pq")) else csv_chunks
+            _print_stats(f"{args.symbol} <- {path}", store.ingest(args.symbol, args.timeframe, reader(path, args.chunk_rows)),
+                         time.perf_counter() - started)
+    elif args.command == "mt5":
+        start = datetime.fromisoformat(args.start).replace(tzinfo=timezone.utc)
+        end = datetime.fromisoformat(args.end).replace(tzinfo=timezone.utc) if args.end else None
+        from broker import mt5
+
+        if not mt5.initialize():
+            print("MT5 initialization failed")
+            return 1
+        for symbol in args.symbols:
+            started = time.perf_counter()
+            stats = store.ingest(symbol, args.timeframe, mt5_chunks(mt5, symbol, args.timeframe, start, end))
+            _print_stats(symbol, stats, time.perf_counter() - started)
+        mt5.shutdown()
+    elif args.command == "catalog":
+        parts = store.partitions(args.symbol)
+        for part in parts:
+            print(f"{part.symbol:<10} {part.timeframe:<4} {part.month}  {part.rows:>7} bars  {part.gaps:>3} gaps  "
+                  f"{part.bytes / 1024:>8.1f} KiB")
+        print(f"{len(parts)} partitions, {sum(p.rows for p in parts)} bars, {sum(p.bytes for p in parts) / 2 ** 20:.1f} MiB")
+    elif args.command == "gaps":
+        for start, end in store.gaps(args.symbol, args.timeframe, args.max_gap):
+            print(f"{datetime.fromtimestamp(start, timezone.utc):%Y-%m-%d %H:%M} -> "
+                  f"{datetime.fromtimestamp(end, timezone.utc):%Y-%m-%d %H:%M}  ({(end - start) / 3600:.1f}h)")
+    elif args.command == "export":
+        bar_store = BarStore(args.bar_store)
+        for symbol in args.symbols:
+            print(f"{symbol}: {store.export(bar_store, symbol, args.timeframe)} bars exported to {args.bar_store}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,77 +1,339 @@
+import argparse
+import itertools
+import logging
+import os
+import signal
 import subprocess
+import sys
 import time
 
- 
-
-# Dictionary storing different parameters for each symbol
-symbol_configs = {
-   
-    # "EURUSDm":   {"lot_size": 0.03,  "profit_target": 3, "sl_trailing_trigger": 8,  "sl_trailing_adjustment": 1.5, "timeframe": "M1", "interval_minutes": 1,"sl": 0.01,"tp": 0.01},
-    # "GBPUSDm":   {"lot_size": 0.05, "profit_target": 4, "sl_trailing_trigger": 9,  "sl_trailing_adjustment": 1.8, "timeframe": "M1", "interval_minutes": 1,"sl": 0.001,"tp": 0.002},
-    # "USDJPYm":   {"lot_size": 0.09, "profit_target": 6, "sl_trailing_trigger": 12, "sl_trailing_adjustment": 2.5, "timeframe": "M1", "interval_minutes": 1,"sl": 0.100,"tp": 0.200},
-    # "USDCADm":   {"lot_size": 0.05, "profit_target": 3, "sl_trailing_trigger": 7,  "sl_trailing_adjustment": 1.2, "timeframe": "M1", "interval_minutes": 1,"sl": 0.001,"tp": 0.002},
-    # "AUDUSDm":   {"lot_size": 0.09, "profit_target": 1, "sl_trailing_trigger": 2,  "sl_trailing_adjustment": 0.6, "timeframe": "M1", "interval_minutes": 1,"sl": 0.0004,"tp": 0.0009},
-    # "NZDUSDm":   {"lot_size": 0.04, "profit_target": 2, "sl_trailing_trigger": 5,  "sl_trailing_adjustment": 2, "timeframe": "M1", "interval_minutes": 1,"sl": 0.0025,"tp": 0.0052},
-    # "XAUUSDm":   {"lot_size": 0.09,  "profit_target": 10, "sl_trailing_trigger": 15, "sl_trailing_adjustment": 3, "timeframe": "M1", "interval_minutes": 1,"sl": 2.5,"tp": 6},
-    # "USTECm":    {"lot_size": 0.09,  "profit_target": 7,  "sl_trailing_trigger": 11, "sl_trailing_adjustment": 2.2, "timeframe": "M1", "interval_minutes": 1,"sl": 3,"tp": 1},
-    # "USOILm":    {"lot_size": 0.09,  "profit_target": 5,  "sl_trailing_trigger": 9,  "sl_trailing_adjustment": 1.5, "timeframe": "M1", "interval_minutes": 1,"sl": 0.15,"tp": 0.32},
-    # Add Crypto  symbols here
-    "BTCUSDm":    {"lot_size": 0.5, "profit_target": 5, "sl_trailing_trigger": 10, "sl_trailing_adjustment": 2, "timeframe": "H1", "interval_minutes": 1,"sl": 15,"tp": 15},
-    "BTCAUDm":    {"lot_size": 0.5, "profit_target": 5, "sl_trailing_trigger": 10, "sl_trailing_adjustment": 2, "timeframe": "H1", "interval_minutes": 1,"sl": 15,"tp": 15},
-    "BTCCNHm":    {"lot_size": 0.5, "profit_target": 5, "sl_trailing_trigger": 10, "sl_trailing_adjustment": 2, "timeframe": "H1", "interval_minutes": 1,"sl": 15,"tp": 15},
-    "BTCJPYm":    {"lot_size": 0.9, "profit_target": 5, "sl_trailing_trigger": 10, "sl_trailing_adjustment": 2, "timeframe": "H1", "interval_minutes": 1,"sl": 40000,"tp": 40000},
-    "BTCTHBm":    {"lot_size": 0.5, "profit_target": 5, "sl_trailing_trigger": 10, "sl_trailing_adjustment": 2, "timeframe": "H1", "interval_minutes": 1,"sl": 15,"tp": 15},
-    "BTCXAGm":    {"lot_size": 0.5, "profit_target": 5, "sl_trailing_trigger": 10, "sl_trailing_adjustment": 2, "timeframe": "H1", "interval_minutes": 1,"sl": 15,"tp": 15},
-    "BTCXAUm":    {"lot_size": 0.5, "profit_target": 5, "sl_trailing_trigger": 10, "sl_trailing_adjustment": 2, "timeframe": "H1", "interval_minutes": 1,"sl": .1,"tp": .1},
-    "BTCZARm":    {"lot_size": 0.5, "profit_target": 5, "sl_trailing_trigger": 10, "sl_trailing_adjustment": 2, "timeframe": "H1", "interval_minutes": 1,"sl": 15,"tp": 15},
-    "ETHUSDm":    {"lot_size": 0.5, "profit_target": 5, "sl_trailing_trigger": 10, "sl_trailing_adjustment": 2, "timeframe": "H1", "interval_minutes": 1,"sl": 15,"tp": 15},
-
-
-
-}
+from config import ConfigWatcher, load_config, symbol_dicts
+from heartbeat import HEARTBEAT_DIR, heartbeat_path
+
+# Per-symbol parameters come from config.yaml (defaults plus per-symbol overrides); enabled symbols only.
+# optimizer.py and portfolio_backtest.py read their SL/TP from here.
+symbol_configs = symbol_dicts(load_config())
 
 # Path to Python interpreter (adjust if needed)
-PYTHON_EXECUTABLE = ".venv\Scripts\python.exe"  # Use "python" for Windows
-
-# Centralized log file
-
-
-# Store subprocess references
-processes = {}
-log_file = "All_trades.log"
-err_file = "All_trades_error.log"
-# Start a subprocess for each symbol
-with open(log_file, "w") as out, open(err_file, "w") as err:
-    for symbol, config in symbol_configs.items():
-        print(f"Starting child.py for {symbol}...")
-
-        # Pass parameters based on symbol-specific config
-        process = subprocess.Popen(
-            [
-                PYTHON_EXECUTABLE, "child.py", 
-                symbol, 
-                str(config["lot_size"]), 
-                str(config["profit_target"]), 
-                str(config["sl_trailing_trigger"]), 
-                str(config["sl_trailing_adjustment"]), 
-                config["timeframe"], 
-                str(config["interval_minutes"]),
-                str(config["sl"]),
-                str(config["tp"]),
-            ],
-            stdout=out,
-            stderr=err
-        )
-        processes[symbol] = process  # Store process reference
-
-# Monitor processes
-try:
-    while True:
-        time.sleep(5)  # Check status every 5 seconds
-        for symbol, process in processes.items():
-            if process.poll() is not None:  # If the process has exited
-                print(f"Process for {symbol} exited.")
-except KeyboardInterrupt:
-    print("Stopping all processes...")
-    for process in processes.values():
-        process.terminate()  # Terminate all subprocesses
+PYTHON_EXECUTABLE = r".venv\Scripts\python.exe"  # Use "python" for Windows
+
+# Each worker's stdout/stderr goes to logs/workers/<symbol>.log, appended across restarts
+WORKER_LOG_DIR = os.path.join("logs", "workers")
+
+logger = logging.getLogger("master")
+
+
+class Worker:
+    # One supervised symbol. state: pending (waiting to start or for its backoff), starting (launched or assigned,
+    # no heartbeat yet), running, stopping, done (exited cleanly, e.g. disabled in config)
+    def __init__(self, symbol):
+        self.symbol = symbol
+        self.heartbeat = heartbeat_path(symbol)
+        self.log_path = os.path.join(WORKER_LOG_DIR, f"{symbol}.log")
+        self.process = None
+        self.state = "pending"
+        self.cold = True  # launched as a fresh interpreter rather than taken from the warm pool
+        self.started_at = 0.0
+        self.up_after = None  # seconds from launch/assignment to the first heartbeat (first bars evaluated)
+        self.next_start = 0.0
+        self.failures = 0  # consecutive; reset once a run has stayed up for Supervisor.stable_seconds
+        self.restarts = 0
+
+    def heartbeat_age(self):
+        try:
+            return time.time() - os.stat(self.heartbeat).st_mtime
+        except OSError:
+            return None
+
+
+class Spare:
+    # A `child.py --pool` process: imported and connected, waiting on stdin for a symbol
+    def __init__(self, name, process):
+        self.name = name
+        self.process = process
+        self.heartbeat = heartbeat_path(name)
+        self.started_at = time.monotonic()
+        self.warm = False
+
+
+def _spawn(args, env, log_path, banner, stdin=None):
+    # Own process group/session, so Ctrl+C reaches only the supervisor and workers stop through their heartbeat
+    if os.name == "nt":
+        group = {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    else:
+        group = {"start_new_session": True}
+    with open(log_path, "a") as log:
+        log.write(f"--- {time.strftime('%Y-%m-%d %H:%M:%S')} {banner}\n")
+        log.flush()
+        return subprocess.Popen(args, stdin=stdin, stdout=log, stderr=subprocess.STDOUT, env=env, **group)
+
+
+def _clear(path):
+    for stale in (path, path + ".stop"):
+        if os.path.exists(stale):
+            os.remove(stale)
+
+
+class Supervisor:
+    # Keeps one child.py per symbol alive. Crashed workers restart after an exponential backoff, workers whose
+    # heartbeat goes stale (a stalled main loop) are killed and restarted, and at most `max_starting` processes are
+    # between launch and their first heartbeat, so 50 children do not hit mt5.initialize() at the same moment.
+    # With pool_size > 0 symbols are handed to pre-started `child.py --pool` workers that have already imported
+    # everything and connected, and the pool is topped back up in the background; a restart or a symbol enabled
+    # in config.yaml (followed through `watcher`) then comes up in tens of milliseconds.
+    # Shutdown asks every worker to stop through its heartbeat file and only terminates those that do not.
+    def __init__(self, symbols, python=PYTHON_EXECUTABLE, max_starting=4, stagger=0.5, start_timeout=120,
+                 hang_timeout=60, backoff=1.0, max_backoff=300, stable_seconds=300, grace=30, on_stop="leave",
+                 pool_size=0, watcher=None, tick_feed=None):
+        self.workers = {symbol: Worker(symbol) for symbol in symbols}
+        self.python = python
+        self.max_starting = max_starting
+        self.stagger = stagger
+        self.start_timeout = start_timeout
+        self.hang_timeout = hang_timeout
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.stable_seconds = stable_seconds
+        self.grace = grace
+        self.on_stop = on_stop
+        self.pool_size = pool_size
+        self.watcher = watcher
+        self.tick_feed = tick_feed  # shared memory name: run tick_feed.py and point every worker at it
+        self.feed = None
+        self.feed_started = float("-inf")
+        self.spares = []
+        self._spare_ids = itertools.count(1)
+        self.last_launch = float("-inf")
+        self.stopping = False
+        os.makedirs(HEARTBEAT_DIR, exist_ok=True)
+        os.makedirs(WORKER_LOG_DIR, exist_ok=True)
+
+    def env(self, heartbeat):
+        env = dict(os.environ, WORKER_HEARTBEAT=heartbeat, WORKER_ON_STOP=self.on_stop)
+        if self.tick_feed:
+            env["TICK_FEED"] = self.tick_feed
+        return env
+
+    def check_feed(self):
+        # Started before the workers and restarted (at most every 5s) when it exits; meanwhile the workers'
+        # SharedTicks fall back to reading the terminal themselves
+        if not self.tick_feed or (self.feed is not None and self.feed.poll() is None):
+            return
+        if time.monotonic() - self.feed_started < 5:
+            return
+        if self.feed is not None:
+            logger.error(f"Tick feed exited with code {self.feed.returncode}, restarting")
+        self.feed = _spawn([self.python, "tick_feed.py", "--name", self.tick_feed], dict(os.environ),
+                           os.path.join(WORKER_LOG_DIR, "tick_feed.log"), "starting tick feed")
+        self.feed_started = time.monotonic()
+        logger.info(f"Started tick feed {self.tick_feed} (pid {self.feed.pid})")
+
+    def launch(self, worker):
+        _clear(worker.heartbeat)
+        # The child reads its parameters from config.yaml and follows later edits to it
+        worker.process = _spawn([self.python, "child.py", worker.symbol], self.env(worker.heartbeat), worker.log_path,
+                                f"starting {worker.symbol} (restart {worker.restarts})")
+        worker.state = "starting"
+        worker.cold = True
+        worker.started_at = self.last_launch = time.monotonic()
+        logger.info(f"Started {worker.symbol} (pid {worker.process.pid})")
+
+    def launch_spare(self):
+        name = f"pool-{next(self._spare_ids)}"
+        path = heartbeat_path(name)
+        _clear(path)
+        # The assignment arrives as one line on stdin
+        process = _spawn([self.python, "child.py", "--pool"], self.env(path), os.path.join(WORKER_LOG_DIR, "pool.log"),
+                         f"starting warm worker {name}", stdin=subprocess.PIPE)
+        self.spares.append(Spare(name, process))
+        self.last_launch = time.monotonic()
+
+    def assign(self, worker, spare):
+        self.spares.remove(spare)
+        _clear(worker.heartbeat)
+        with open(worker.log_path, "a") as log:
+            log.write(f"--- {time.strftime('%Y-%m-%d %H:%M:%S')} assigning {worker.symbol} to warm worker "
+                      f"{spare.name} (restart {worker.restarts})\n")
+        spare.process.stdin.write(f"{worker.symbol}\t{worker.heartbeat}\t{worker.log_path}\n".encode())
+        spare.process.stdin.flush()
+        _clear(spare.heartbeat)
+        worker.process = spare.process
+        worker.state = "starting"
+        worker.cold = False
+        worker.started_at = time.monotonic()
+        logger.info(f"Assigned {worker.symbol} to warm worker {spare.name} (pid {spare.process.pid})")
+
+    def failed(self, worker, reason):
+        now = time.monotonic()
+        if now - worker.started_at >= self.stable_seconds:
+            worker.failures = 0
+        delay = min(self.backoff * 2 ** worker.failures, self.max_backoff)
+        worker.failures += 1
+        worker.restarts += 1
+        worker.state = "pending"
+        worker.next_start = now + delay
+        logger.error(f"{worker.symbol} {reason}; restarting in {delay:.0f}s")
+
+    def kill(self, worker):
+        if worker.process.poll() is None:
+            worker.process.kill()
+            worker.process.wait()
+
+    def check(self, worker):
+        if worker.state not in ("starting", "running"):
+            return
+        code = worker.process.poll()
+        if code is not None:
+            if code == 0:
+                worker.state = "done"
+                logger.info(f"{worker.symbol} exited cleanly, not restarting")
+            else:
+                self.failed(worker, f"exited with code {code}")
+            return
+        age = worker.heartbeat_age()
+        elapsed = time.monotonic() - worker.started_at
+        if worker.state == "starting":
+            if age is not None:
+                worker.state = "running"
+                worker.up_after = elapsed
+                logger.info(f"{worker.symbol} is up after {elapsed * 1000:.0f} ms")
+            elif elapsed > self.start_timeout:
+                self.kill(worker)
+                self.failed(worker, f"sent no heartbeat within {self.start_timeout}s of starting")
+        elif age is not None and age > self.hang_timeout:
+            self.kill(worker)
+            self.failed(worker, f"heartbeat stale for {age:.0f}s (hung)")
+
+    def check_spares(self):
+        for spare in list(self.spares):
+            code = spare.process.poll()
+            if code is not None:
+                logger.error(f"Warm worker {spare.name} exited with code {code}")
+                self.spares.remove(spare)
+            elif not spare.warm:
+                if os.path.exists(spare.heartbeat):
+                    spare.warm = True
+                elif time.monotonic() - spare.started_at > self.start_timeout:
+                    logger.error(f"Warm worker {spare.name} did not come up within {self.start_timeout}s")
+                    spare.process.kill()
+                    self.spares.remove(spare)
+
+    def start_due(self):
+        now = time.monotonic()
+        due = [worker for worker in self.workers.values() if worker.state == "pending" and worker.next_start <= now]
+        if self.pool_size:
+            warm = [spare for spare in self.spares if spare.warm]
+            while due and warm:
+                self.assign(due.pop(0), warm.pop(0))
+        starting = sum(worker.state == "starting" and worker.cold for worker in self.workers.values())
+        starting += sum(not spare.warm for spare in self.spares)
+        while starting < self.max_starting and now - self.last_launch >= self.stagger:
+            if self.pool_size:
+                # Keep pool_size spares beyond what the due symbols are about to take, but only top up once the
+                # symbols just handed out are up: a new interpreter importing numpy would compete with their first cycle
+                handed_out = any(worker.state == "starting" and not worker.cold for worker in self.workers.values())
+                if handed_out or len(self.spares) >= self.pool_size + len(due):
+                    return
+                self.launch_spare()
+            elif due:
+                self.launch(due.pop(0))
+            else:
+                return
+            starting += 1
+            now = time.monotonic()
+
+    def apply_config(self, changes):
+        # Symbols enabled or added in config.yaml get a worker; a disabled or removed symbol's worker sees the
+        # same edit through its own ConfigWatcher and exits cleanly
+        for symbol, cfg in changes.items():
+            if cfg is None or not cfg.enabled:
+                continue
+            worker = self.workers.get(symbol)
+            if worker is None:
+                self.workers[symbol] = Worker(symbol)
+                logger.info(f"{symbol} added in config")
+            elif worker.state == "done":
+                worker.state = "pending"
+                worker.next_start = 0.0
+                logger.info(f"{symbol} re-enabled in config")
+
+    def step(self):
+        if self.watcher is not None:
+            changes = self.watcher.poll()
+            if changes:
+                self.apply_config(changes)
+        self.check_feed()
+        for worker in self.workers.values():
+            self.check(worker)
+        self.check_spares()
+        self.start_due()
+
+    def run(self, poll=0.1):
+        while not self.stopping:
+            self.step()
+            time.sleep(poll)
+
+    def shutdown(self):
+        # Ask every live worker to stop, give them `grace` seconds to finish their cycle (and close positions with
+        # --on-stop close), then terminate and finally kill whatever is left. Idle spares exit on end of input.
+        for spare in self.spares:
+            spare.process.stdin.close()
+        live = [worker for worker in self.workers.values() if worker.process is not None and worker.process.poll() is None]
+        logger.info(f"Stopping {len(live)} workers...")
+        for worker in live:
+            worker.state = "stopping"
+            open(worker.heartbeat + ".stop", "w").close()
+        processes = [worker.process for worker in live] + [spare.process for spare in self.spares]
+        deadline = time.monotonic() + self.grace
+        while time.monotonic() < deadline and any(process.poll() is None for process in processes):
+            time.sleep(0.2)
+        for process in processes:
+            if process.poll() is None:
+                logger.warning(f"Worker pid {process.pid} did not stop within {self.grace}s, terminating")
+                process.terminate()
+                try:
+                    process.wait(5)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+        if self.feed is not None and self.feed.poll() is None:
+            self.feed.terminate()
+            self.feed.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run and supervise one child.py per enabled symbol in config.yaml")
+    parser.add_argument("--python", default=PYTHON_EXECUTABLE, help="interpreter for the workers")
+    parser.add_argument("--max-starting", type=int, default=4, help="workers allowed to be initializing at once")
+    parser.add_argument("--stagger", type=float, default=0.5, help="minimum seconds between two launches")
+    parser.add_argument("--hang-timeout", type=float, default=60, help="restart a worker whose heartbeat is this stale")
+    parser.add_argument("--max-backoff", type=float, default=300, help="upper bound of the restart delay in seconds")
+    parser.add_argument("--pool", type=int, default=2,
+                        help="warm workers kept ready for restarts and newly enabled symbols (0: cold starts only)")
+    parser.add_argument("--tick-feed", nargs="?", const="forex_mt5_ticks", metavar="NAME",
+                        help="run tick_feed.py and have every worker read prices from its shared memory")
+    parser.add_argument("--on-stop", choices=("leave", "close"), default="leave",
+                        help="on shutdown leave positions to their SL/TP (default) or close them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s",
+                        handlers=[logging.StreamHandler(), logging.FileHandler("master.log")])
+    # The watcher brings up symbols enabled in config.yaml while running
+    watcher = ConfigWatcher()
+    supervisor = Supervisor(symbol_configs, python=args.python, max_starting=args.max_starting,
+                            stagger=args.stagger, hang_timeout=args.hang_timeout, max_backoff=args.max_backoff,
+                            on_stop=args.on_stop, pool_size=args.pool, watcher=watcher, tick_feed=args.tick_feed)
+
+    def request_stop(signum, frame):
+        supervisor.stopping = True
+
+    signal.signal(signal.SIGTERM, request_stop)
+    try:
+        supervisor.run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.shutdown()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
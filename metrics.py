@@ -0,0 +1,200 @@
+import atexit
+import bisect
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# Latency bucket upper bounds in seconds: 10us .. ~100s
+LATENCY_BUCKETS = tuple(round(10 ** (exp / 4), 9) for exp in range(-20, 9))
+# Absolute slippage bucket bounds in price units: 1e-6 .. 1e4
+SLIPPAGE_BUCKETS = tuple(round(10 ** (exp / 2), 9) for exp in range(-12, 9))
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class Metrics:
+    # Per-symbol histograms and counters for the live loop; cheap enough to sit on every hot call
+    def __init__(self):
+        self.histograms = {}
+        self.counters = Counter()
+        self.started = time.time()
+        self.profiler = None  # a SamplingProfiler whose hottest lines go into snapshots and the Prometheus text
+
+    def observe(self, name, symbol, value, bounds=LATENCY_BUCKETS):
+        key = (name, symbol)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(bounds)
+        histogram.observe(value)
+
+    def inc(self, name, symbol, amount=1):
+        self.counters[(name, symbol)] += amount
+
+    def record_slippage(self, symbol, trade_type, trigger_point, fill_price):
+        # Positive = filled worse than the trigger (paid more on a BUY, received less on a SELL)
+        slippage = fill_price - trigger_point if trade_type == "BUY" else trigger_point - fill_price
+        self.observe("slippage_price", symbol, abs(slippage), SLIPPAGE_BUCKETS)
+        self.inc("slippage_price_sum", symbol, slippage)
+
+    def snapshot(self):
+        return {
+            "uptime_seconds": time.time() - self.started,
+            "histograms": {
+                f"{name}{{symbol={symbol}}}": {
+                    "count": h.count, "sum": h.sum, "mean": h.sum / h.count if h.count else 0.0,
+                    "p50": h.quantile(0.5), "p99": h.quantile(0.99),
+                }
+                for (name, symbol), h in list(self.histograms.items())
+            },
+            "counters": {f"{name}{{symbol={symbol}}}": value for (name, symbol), value in list(self.counters.items())},
+            **({"profile": [{"where": where, "samples": hits, "share": share}
+                            for where, hits, share in self.profiler.top()]} if self.profiler else {}),
+        }
+
+    def prometheus_text(self):
+        lines = []
+        for (name, symbol), h in sorted(list(self.histograms.items())):
+            metric = f"forex_{name}"
+            cumulative = 0
+            for bound, count in zip(h.bounds, h.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{symbol="{symbol}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_bucket{{symbol="{symbol}",le="+Inf"}} {h.count}')
+            lines.append(f'{metric}_sum{{symbol="{symbol}"}} {h.sum}')
+            lines.append(f'{metric}_count{{symbol="{symbol}"}} {h.count}')
+        for (name, symbol), value in sorted(list(self.counters.items())):
+            lines.append(f'forex_{name}{{symbol="{symbol}"}} {value}')
+        if self.profiler:
+            for where, hits, _ in self.profiler.top():
+                location = where.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'forex_profile_samples{{location="{location}"}} {hits}')
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide registry shared by every strategy in the process
+REGISTRY = Metrics()
+
+
+def timed(name):
+    # Decorator for SymbolStrategy methods: latency histogram and call count labelled with self.symbol
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                REGISTRY.observe(name, self.symbol, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def serve_prometheus(port, registry=REGISTRY):
+    # Imported here: http.server (and the email/ssl modules under it) is a third of a worker's import time
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = registry.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics-http").start()
+    return server
+
+
+def write_snapshots(path, interval=60, registry=REGISTRY):
+    stop = threading.Event()
+
+    def loop():
+        while not stop.wait(interval):
+            with open(path + ".tmp", "w") as file:
+                json.dump(registry.snapshot(), file, indent=2)
+            os.replace(path + ".tmp", path)
+
+    threading.Thread(target=loop, daemon=True, name="metrics-json").start()
+    return stop
+
+
+class SamplingProfiler:
+    # Opt-in: samples the target thread's stack every `interval` seconds and counts the innermost frames
+    def __init__(self, interval=0.01, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.samples = Counter()
+        self._stop = threading.Event()
+
+    def start(self):
+        self._stop.clear()
+        threading.Thread(target=self._run, daemon=True, name="metrics-profiler").start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                code = frame.f_code
+                self.samples[f"{os.path.basename(code.co_filename)}:{frame.f_lineno} {code.co_name}"] += 1
+            self._stop.wait(self.interval)
+
+    def top(self, count=20):
+        samples = self.samples.copy()  # the sampling thread keeps adding to it
+        total = sum(samples.values()) or 1
+        return [(where, hits, hits / total) for where, hits in samples.most_common(count)]
+
+    def report(self, count=20):
+        lines = [f"{share:7.1%} {hits:>8}  {where}" for where, hits, share in self.top(count)]
+        return "\n".join([f"Profile: {sum(self.samples.values())} samples every {self.interval}s"] + lines)
+
+
+def start_from_env(registry=REGISTRY):
+    # METRICS_PORT serves Prometheus text, METRICS_JSON writes periodic snapshots, METRICS_PROFILE=1 samples stacks:
+    # the hottest lines appear in both outputs and are printed to stderr when the process exits
+    profiler = None
+    if os.environ.get("METRICS_PROFILE") == "1":
+        profiler = registry.profiler = SamplingProfiler(float(os.environ.get("METRICS_PROFILE_INTERVAL", 0.01))).start()
+        atexit.register(lambda: print(profiler.report(), file=sys.stderr))
+    if os.environ.get("METRICS_PORT"):
+        serve_prometheus(int(os.environ["METRICS_PORT"]), registry)
+    if os.environ.get("METRICS_JSON"):
+        write_snapshots(os.environ["METRICS_JSON"], float(os.environ.get("METRICS_INTERVAL", 60)), registry)
+    return profiler
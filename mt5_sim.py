@@ -0,0 +1,429 @@
+import bisect
+import os
+import runpy
+import sys
+import zlib
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bar_aggregator import aggregate
+from bar_store import BarStore
+from timeframes import RATES_DTYPE, TIMEFRAMES, timeframe_name, timeframe_seconds
+
+Tick = namedtuple("Tick", "time bid ask last volume time_msc flags volume_real")
+SymbolInfo = namedtuple("SymbolInfo", "name point digits spread trade_tick_size trade_tick_value trade_contract_size "
+                                      "volume_min volume_max volume_step trade_stops_level currency_profit")
+TradePosition = namedtuple("TradePosition", "ticket time type magic identifier volume price_open sl tp "
+                                            "price_current swap profit symbol comment")
+OrderSendResult = namedtuple("OrderSendResult", "retcode deal order volume price bid ask comment request_id "
+                                                "retcode_external request")
+TradeDeal = namedtuple("TradeDeal", "ticket order time type entry magic position_id volume price profit symbol comment")
+
+SIM_EPOCH = int(datetime(2024, 1, 1, tzinfo=timezone.utc).timestamp())
+
+
+class ReplayFinished(Exception):
+    pass
+
+
+CURRENCIES = {"USD", "EUR", "GBP", "JPY", "AUD", "NZD", "CAD", "CHF", "CNH", "THB", "ZAR", "XAU", "XAG", "BTC", "ETH"}
+
+
+def quote_currency(symbol):
+    # "BTCJPYm" -> "JPY"; indices, oil and anything unrecognised are quoted in USD
+    core = symbol.rstrip("abcdefghijklmnopqrstuvwxyz").upper()
+    if len(core) == 6 and core[:3] in CURRENCIES and core[3:] in CURRENCIES:
+        return core[3:]
+    return "USD"
+
+
+def symbol_defaults(price, symbol=""):
+    # Rough Exness-like specs when no real symbol_info has been supplied
+    if price >= 1000:
+        point, digits = 0.01, 2
+    elif price >= 10:
+        point, digits = 0.001, 3
+    else:
+        point, digits = 0.00001, 5
+    return {"point": point, "digits": digits, "spread": 20, "trade_tick_size": point, "trade_tick_value": point,
+            "trade_contract_size": 1.0, "volume_min": 0.01, "volume_max": 200.0, "volume_step": 0.01,
+            "trade_stops_level": 0, "currency_profit": quote_currency(symbol)}
+
+
+def base_price(symbol):
+    # Rough price level of an Exness symbol, for made-up history
+    name = symbol.upper()
+    return 60000.0 if name.startswith(("BTC", "ETH")) else 2000.0 if name.startswith("XAU") else \
+        150.0 if "JPY" in name else 75.0 if "OIL" in name else 18000.0 if "USTEC" in name else 1.1
+
+
+def _synthetic_rates(symbol, start, count):
+    # Seeded per symbol, so every run of the simulator sees the same market
+    rng = np.random.default_rng(zlib.crc32(symbol.encode()))
+    price = base_price(symbol)
+    volatility = price * 0.0004
+    close = price + np.cumsum(rng.normal(0, volatility, count))
+    close = np.maximum(close, price * 0.05)
+    open_ = np.concatenate(([price], close[:-1]))
+    wick = np.abs(rng.normal(0, volatility, count)) * np.where(rng.random(count) < 0.03, 5.0, 1.0)
+
+    rates = np.zeros(count, dtype=RATES_DTYPE)
+    rates["time"] = start + 60 * np.arange(count)
+    rates["open"] = open_
+    rates["close"] = close
+    rates["high"] = np.maximum(open_, close) + wick
+    rates["low"] = np.minimum(open_, close) - wick
+    rates["tick_volume"] = rng.integers(20, 400, count)
+    rates["spread"] = 20
+    return rates
+
+
+class SimTerminal:
+    # In-process stand-in for the MetaTrader5 module: replays M1 bars on a simulated clock,
+    # synthesizes ticks along an open->low->high->close path and keeps a hedging position book.
+    ORDER_TYPE_BUY = 0
+    ORDER_TYPE_SELL = 1
+    POSITION_TYPE_BUY = 0
+    POSITION_TYPE_SELL = 1
+    DEAL_ENTRY_IN = 0
+    DEAL_ENTRY_OUT = 1
+    TRADE_ACTION_DEAL = 1
+    TRADE_ACTION_PENDING = 5
+    TRADE_ACTION_SLTP = 6
+    ORDER_TIME_GTC = 0
+    ORDER_FILLING_FOK = 0
+    ORDER_FILLING_IOC = 1
+    ORDER_FILLING_RETURN = 2
+    TRADE_RETCODE_REQUOTE = 10004
+    TRADE_RETCODE_REJECT = 10006
+    TRADE_RETCODE_DONE = 10009
+    TRADE_RETCODE_INVALID = 10013
+    TRADE_RETCODE_INVALID_VOLUME = 10014
+    TRADE_RETCODE_INVALID_STOPS = 10016
+    TRADE_RETCODE_MARKET_CLOSED = 10018
+    TRADE_RETCODE_POSITION_CLOSED = 10036
+
+    def __init__(self, bars=None, start_time=None, end_time=None, specs=None, synthetic_days=None):
+        # bars: {symbol: M1 rates}; unknown symbols get synthetic bars when synthetic_days is set
+        self.bars = {}
+        self.columns = {}  # symbol -> (time, open, high, low, close) as lists; bisect on a numpy field is slow
+        self.specs = specs or {}
+        self.synthetic_days = synthetic_days
+        self.positions = {}
+        self.deals = []
+        self._next_ticket = 1
+        for symbol, rates in (bars or {}).items():
+            self.add_symbol(symbol, rates)
+
+        if start_time is None:
+            start_time = max((int(r["time"][0]) for r in self.bars.values()), default=SIM_EPOCH) + 1000 * 60
+        if end_time is None and self.bars:
+            end_time = min(int(r["time"][-1]) for r in self.bars.values()) + 60
+        if end_time is None and synthetic_days:
+            end_time = start_time + int(synthetic_days * 86400)
+        self.now = float(start_time)
+        self.end_time = end_time
+
+    def add_symbol(self, symbol, rates):
+        rates = np.ascontiguousarray(rates, dtype=RATES_DTYPE)
+        self.bars[symbol] = rates
+        self.columns[symbol] = tuple(rates[name].tolist() for name in ("time", "open", "high", "low", "close"))
+        spec = symbol_defaults(float(rates["close"][0]), symbol)
+        spec.update(self.specs.get(symbol, {}))
+        self.specs[symbol] = spec
+
+    def _rates(self, symbol):
+        if symbol not in self.bars and self.synthetic_days:
+            count = int((self.end_time - SIM_EPOCH) // 60) + 1
+            self.add_symbol(symbol, _synthetic_rates(symbol, SIM_EPOCH, count))
+        return self.bars.get(symbol)
+
+    # --- clock ---
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.advance(max(seconds, 0))
+
+    def advance(self, seconds):
+        target = self.now + seconds
+        if self.end_time is not None and target > self.end_time:
+            self._process_stops(self.end_time)
+            self.now = float(self.end_time)
+            raise ReplayFinished(f"Replay reached {datetime.fromtimestamp(self.end_time, timezone.utc)}")
+        self._process_stops(target)
+        self.now = target
+
+    # --- price path ---
+
+    def _bar_index(self, symbol, t):
+        return bisect.bisect_right(self.columns[symbol][0], t) - 1
+
+    def _vertices(self, symbol, i):
+        times, opens, highs, lows, closes = self.columns[symbol]
+        t0 = times[i]
+        if closes[i] >= opens[i]:
+            prices = (opens[i], lows[i], highs[i], closes[i])
+        else:
+            prices = (opens[i], highs[i], lows[i], closes[i])
+        return (t0, t0 + 15, t0 + 45, t0 + 59), prices
+
+    def _bid_at(self, symbol, t):
+        i = self._bar_index(symbol, t)
+        if i < 0:
+            return None
+        times, prices = self._vertices(symbol, i)
+        if t >= times[-1]:
+            return prices[-1]
+        k = bisect.bisect_right(times, t) - 1
+        frac = (t - times[k]) / (times[k + 1] - times[k])
+        return prices[k] + (prices[k + 1] - prices[k]) * frac
+
+    def _path(self, symbol, t0, t1):
+        # Ordered (time, bid) vertices in (t0, t1]; extremes of a piecewise-linear path sit on its vertices
+        points = []
+        bar_times = self.columns[symbol][0]
+        i = max(self._bar_index(symbol, t0), 0)
+        while i < len(bar_times) and bar_times[i] <= t1:
+            times, prices = self._vertices(symbol, i)
+            points.extend((t, p) for t, p in zip(times, prices) if t0 < t <= t1)
+            i += 1
+        end = self._bid_at(symbol, t1)
+        if end is not None:
+            points.append((t1, end))
+        return points
+
+    def _spread(self, symbol):
+        return self.specs[symbol]["spread"] * self.specs[symbol]["point"]
+
+    def _process_stops(self, target):
+        for ticket, pos in list(self.positions.items()):
+            spread = self._spread(pos["symbol"])
+            for t, bid in self._path(pos["symbol"], self.now, target):
+                # Buys close on the bid, sells on the ask
+                price = bid if pos["type"] == self.POSITION_TYPE_BUY else bid + spread
+                sign = 1 if pos["type"] == self.POSITION_TYPE_BUY else -1
+                if pos["sl"] and (price - pos["sl"]) * sign <= 0:
+                    self._close(ticket, pos["volume"], pos["sl"], t, "sl")
+                    break
+                if pos["tp"] and (price - pos["tp"]) * sign >= 0:
+                    self._close(ticket, pos["volume"], pos["tp"], t, "tp")
+                    break
+
+    # --- MetaTrader5 API ---
+
+    def initialize(self, *args, **kwargs):
+        return True
+
+    def shutdown(self):
+        return True
+
+    def last_error(self):
+        return (1, "Success")
+
+    def symbols_get(self, group=None):
+        return tuple(self.symbol_info(symbol) for symbol in self.bars)
+
+    def symbol_info(self, symbol):
+        if self._rates(symbol) is None:
+            return None
+        return SymbolInfo(name=symbol, **self.specs[symbol])
+
+    def symbol_info_tick(self, symbol):
+        rates = self._rates(symbol)
+        if rates is None:
+            return None
+        bid = self._bid_at(symbol, self.now)
+        if bid is None:
+            return None
+        bar = rates[self._bar_index(symbol, self.now)]
+        return Tick(time=int(self.now), bid=bid, ask=bid + self._spread(symbol), last=0.0,
+                    volume=int(bar["tick_volume"]), time_msc=int(self.now * 1000), flags=6, volume_real=0.0)
+
+    def _forming_bar(self, symbol, rates, i):
+        bar = rates[i].copy()
+        times, prices = self._vertices(symbol, i)
+        seen = [p for t, p in zip(times, prices) if t <= self.now] + [self._bid_at(symbol, self.now)]
+        bar["high"] = max(seen)
+        bar["low"] = min(seen)
+        bar["close"] = seen[-1]
+        return bar
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        rates = self._rates(symbol)
+        if rates is None:
+            return None
+        i = self._bar_index(symbol, self.now)
+        if i < 0:
+            return np.zeros(0, dtype=RATES_DTYPE)
+        seconds = timeframe_seconds(timeframe)
+        ratio = max(seconds // 60, 1)
+        first_m1 = max(i + 1 - (start_pos + count + 1) * ratio, 0)
+        window = rates[first_m1:i + 1].copy()
+        window[-1] = self._forming_bar(symbol, rates, i)
+        if ratio > 1:
+            window = aggregate(window, timeframe)
+        end = len(window) - start_pos
+        return window[max(end - count, 0):max(end, 0)]
+
+    def copy_rates_range(self, symbol, timeframe, date_from, date_to):
+        rates = self._rates(symbol)
+        if rates is None:
+            return None
+        start = date_from.timestamp() if isinstance(date_from, datetime) else date_from
+        end = min(date_to.timestamp() if isinstance(date_to, datetime) else date_to, self.now - 60)
+        times = self.columns[symbol][0]
+        window = rates[bisect.bisect_left(times, start):bisect.bisect_right(times, end)]
+        if timeframe_name(timeframe) != "M1":
+            window = aggregate(window, timeframe)
+        return window
+
+    def positions_total(self):
+        return len(self.positions)
+
+    def positions_get(self, symbol=None, ticket=None, group=None):
+        result = []
+        for pos in self.positions.values():
+            if (symbol and pos["symbol"] != symbol) or (ticket and pos["ticket"] != ticket):
+                continue
+            tick = self.symbol_info_tick(pos["symbol"])
+            buy = pos["type"] == self.POSITION_TYPE_BUY
+            current = tick.bid if buy else tick.ask
+            profit = (current - pos["price_open"]) * (1 if buy else -1) * pos["volume"] * \
+                self.specs[pos["symbol"]]["trade_contract_size"]
+            result.append(TradePosition(price_current=current, swap=0.0, profit=profit, identifier=pos["ticket"],
+                                        **pos))
+        return tuple(result)
+
+    def history_deals_get(self, *args, **kwargs):
+        return tuple(self.deals)
+
+    def _result(self, retcode, request, price=0.0, volume=0.0, deal=0, order=0, comment=""):
+        tick = self.symbol_info_tick(request.get("symbol", "")) if request.get("symbol") in self.bars else None
+        return OrderSendResult(retcode=retcode, deal=deal, order=order, volume=volume, price=price,
+                               bid=tick.bid if tick else 0.0, ask=tick.ask if tick else 0.0, comment=comment,
+                               request_id=0, retcode_external=0, request=request)
+
+    def _ticket(self):
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        return ticket
+
+    def _close(self, ticket, volume, price, t, comment):
+        pos = self.positions[ticket]
+        buy = pos["type"] == self.POSITION_TYPE_BUY
+        profit = (price - pos["price_open"]) * (1 if buy else -1) * volume * \
+            self.specs[pos["symbol"]]["trade_contract_size"]
+        deal = self._ticket()
+        self.deals.append(TradeDeal(ticket=deal, order=deal, time=int(t), type=self.ORDER_TYPE_SELL if buy else
+                                    self.ORDER_TYPE_BUY, entry=self.DEAL_ENTRY_OUT, magic=pos["magic"],
+                                    position_id=ticket, volume=volume, price=price, profit=profit,
+                                    symbol=pos["symbol"], comment=comment))
+        if volume >= pos["volume"] - 1e-9:
+            del self.positions[ticket]
+        else:
+            pos["volume"] = round(pos["volume"] - volume, 8)
+        return deal
+
+    def _stops_valid(self, order_type, price, sl, tp):
+        sign = 1 if order_type == self.ORDER_TYPE_BUY else -1
+        return (not sl or (price - sl) * sign > 0) and (not tp or (tp - price) * sign > 0)
+
+    def order_send(self, request):
+        symbol = request.get("symbol")
+        action = request.get("action")
+        if self._rates(symbol) is None:
+            return self._result(self.TRADE_RETCODE_INVALID, request, comment="Unknown symbol")
+        tick = self.symbol_info_tick(symbol)
+        if tick is None:
+            return self._result(self.TRADE_RETCODE_MARKET_CLOSED, request, comment="Market closed")
+
+        if action == self.TRADE_ACTION_SLTP:
+            pos = self.positions.get(request.get("position"))
+            if pos is None:
+                return self._result(self.TRADE_RETCODE_POSITION_CLOSED, request, comment="Position closed")
+            market = tick.bid if pos["type"] == self.POSITION_TYPE_BUY else tick.ask
+            if not self._stops_valid(pos["type"], market, request.get("sl", 0.0), request.get("tp", 0.0)):
+                return self._result(self.TRADE_RETCODE_INVALID_STOPS, request, comment="Invalid stops")
+            pos["sl"] = request.get("sl", 0.0)
+            pos["tp"] = request.get("tp", 0.0)
+            return self._result(self.TRADE_RETCODE_DONE, request, comment="Request executed")
+
+        if action != self.TRADE_ACTION_DEAL:
+            return self._result(self.TRADE_RETCODE_INVALID, request, comment="Unsupported action")
+
+        volume = request.get("volume", 0.0)
+        if volume < self.specs[symbol]["volume_min"] or volume > self.specs[symbol]["volume_max"]:
+            return self._result(self.TRADE_RETCODE_INVALID_VOLUME, request, comment="Invalid volume")
+        order_type = request.get("type")
+        price = tick.ask if order_type == self.ORDER_TYPE_BUY else tick.bid
+        deviation = request.get("deviation", 0) * self.specs[symbol]["point"]
+        if request.get("price") and abs(request["price"] - price) > deviation:
+            return self._result(self.TRADE_RETCODE_REQUOTE, request, comment="Requote")
+
+        ticket = request.get("position")
+        if ticket:
+            pos = self.positions.get(ticket)
+            if pos is None:
+                return self._result(self.TRADE_RETCODE_POSITION_CLOSED, request, comment="Position closed")
+            deal = self._close(ticket, min(volume, pos["volume"]), price, self.now, request.get("comment", ""))
+            return self._result(self.TRADE_RETCODE_DONE, request, price, volume, deal, deal, "Request executed")
+
+        sl, tp = request.get("sl", 0.0), request.get("tp", 0.0)
+        market = tick.bid if order_type == self.ORDER_TYPE_BUY else tick.ask
+        if not self._stops_valid(order_type, market, sl, tp):
+            return self._result(self.TRADE_RETCODE_INVALID_STOPS, request, comment="Invalid stops")
+
+        ticket = self._ticket()
+        self.positions[ticket] = {"ticket": ticket, "time": int(self.now), "type": order_type,
+                                  "magic": request.get("magic", 0), "volume": volume, "price_open": price,
+                                  "sl": sl, "tp": tp, "symbol": symbol, "comment": request.get("comment", "")}
+        self.deals.append(TradeDeal(ticket=ticket, order=ticket, time=int(self.now), type=order_type,
+                                    entry=self.DEAL_ENTRY_IN, magic=request.get("magic", 0), position_id=ticket,
+                                    volume=volume, price=price, profit=0.0, symbol=symbol,
+                                    comment=request.get("comment", "")))
+        return self._result(self.TRADE_RETCODE_DONE, request, price, volume, ticket, ticket, "Request executed")
+
+    def summary(self):
+        closed = [d for d in self.deals if d.entry == self.DEAL_ENTRY_OUT]
+        return {"sim_time": datetime.fromtimestamp(self.now, timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+                "opened": len(self.deals) - len(closed), "closed": len(closed),
+                "open_positions": len(self.positions), "profit": sum(d.profit for d in closed)}
+
+
+for _name, _value in TIMEFRAMES.items():
+    setattr(SimTerminal, f"TIMEFRAME_{_name}", _value)
+
+
+def terminal_from_env():
+    # MT5_SIM_DATA: bar_store directory with M1 history; otherwise seeded synthetic bars for MT5_SIM_DAYS days
+    start = os.environ.get("MT5_SIM_START")
+    start = int(datetime.fromisoformat(start).replace(tzinfo=timezone.utc).timestamp()) if start else None
+    data_dir = os.environ.get("MT5_SIM_DATA")
+    if data_dir:
+        store = BarStore(data_dir)
+        bars = {symbol: np.array(store.bars(symbol, "M1")) for symbol in store.symbols()}
+        return SimTerminal(bars, start_time=start)
+    return SimTerminal(start_time=start or SIM_EPOCH + 86400, synthetic_days=float(os.environ.get("MT5_SIM_DAYS", 7)))
+
+
+if __name__ == "__main__":
+    # Soak test: python mt5_sim.py child.py BTCUSDm 0.5 5 10 2 M1 1 15 15
+    if len(sys.argv) < 2:
+        print("Usage: python mt5_sim.py <script.py> [script args...]")
+        sys.exit(1)
+
+    os.environ["MT5_BACKEND"] = "sim"
+    import broker
+    # This file is running as __main__, so catch the class the broker's copy of the module raises
+    from mt5_sim import ReplayFinished
+
+    sys.argv = sys.argv[1:]
+    try:
+        runpy.run_path(sys.argv[0], run_name="__main__")
+    except ReplayFinished as finished:
+        print(finished)
+    print(broker.mt5.summary())
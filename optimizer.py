@@ -0,0 +1,175 @@
+import argparse
+import csv
+import itertools
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from backtest_engine import candle_ranges, prior_max, run_backtest, summarize
+from tick_feed import attach_shared_memory
+
+# The hand-tuned constants of the big-candle strategy, as a search space
+DEFAULT_SPACE = {
+    "multiplier": [1.0, 1.2, 1.5, 2.0, 2.5, 3.0],
+    "trigger_fraction": [0.2, 0.3, 0.4, 0.5, 0.6],
+    "lookback": [3, 5, 8, 10],
+    "fill_window": [3, 5, 10],
+    "sl_scale": [0.5, 1.0, 2.0],
+    "tp_scale": [0.5, 1.0, 2.0],
+}
+
+# 6in1backtest.py's dollar SL/TP, used for symbols without an entry in master.symbol_configs
+DEFAULT_SL = 5
+DEFAULT_TP = 10
+
+
+def grid(space):
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def random_sample(space, count, seed=0):
+    combos = grid(space)
+    if count >= len(combos):
+        return combos
+    return random.Random(seed).sample(combos, count)
+
+
+def symbol_stops(symbols):
+    # Per-symbol SL/TP offsets from master.symbol_configs; the search scales these via sl_scale/tp_scale
+    from master import symbol_configs
+
+    return {symbol: (symbol_configs[symbol]["sl"], symbol_configs[symbol]["tp"]) if symbol in symbol_configs
+            else (DEFAULT_SL, DEFAULT_TP) for symbol in symbols}
+
+
+class SharedBars:
+    # high/low of every symbol in one shared-memory block each, so workers map them instead of unpickling history
+    def __init__(self, bars):
+        self.blocks = {}
+        self.layout = {}
+        for symbol, rates in bars.items():
+            high, low, _ = candle_ranges(rates)
+            block = shared_memory.SharedMemory(create=True, size=max(high.nbytes * 2, 1))
+            view = np.ndarray((2, len(high)), dtype=np.float64, buffer=block.buf)
+            view[0] = high
+            view[1] = low
+            self.blocks[symbol] = block
+            self.layout[symbol] = (block.name, len(high))
+
+    def close(self):
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+
+
+# Worker-side state: attached blocks, bar views and prior-max arrays cached per (symbol, lookback)
+_blocks = {}
+_bars = {}
+_prev_max = {}
+
+
+def _attach(layout):
+    for symbol, (name, length) in layout.items():
+        block = attach_shared_memory(name)
+        _blocks[symbol] = block
+        view = np.ndarray((2, length), dtype=np.float64, buffer=block.buf)
+        _bars[symbol] = {"high": view[0], "low": view[1]}
+
+
+def _backtest(symbol, stops, combo):
+    # One combination on one attached symbol; the prior-max array of each lookback is computed once per worker
+    bars = _bars[symbol]
+    key = (symbol, combo["lookback"])
+    if key not in _prev_max:
+        _prev_max[key] = prior_max(bars["high"] - bars["low"], combo["lookback"])
+    return run_backtest(
+        bars,
+        lookback=combo["lookback"],
+        multiplier=combo["multiplier"],
+        trigger_fraction=combo["trigger_fraction"],
+        fill_window=combo["fill_window"],
+        sl_amount=stops[0] * combo.get("sl_scale", 1.0),
+        tp_amount=stops[1] * combo.get("tp_scale", 1.0),
+        prev_max=_prev_max[key],
+    )
+
+
+def _evaluate(symbol, stops, combos):
+    return symbol, [summarize(_backtest(symbol, stops, combo)) for combo in combos]
+
+
+def optimize(bars, combos, workers=None, chunk_size=200, stops=None):
+    stops = stops or symbol_stops(bars)
+    shared = SharedBars(bars)
+    totals = [{"trades": 0, "profit": 0.0, "tp_hits": 0, "sl_hits": 0} for _ in combos]
+    per_symbol = [{} for _ in combos]
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(shared.layout,)) as pool:
+            futures = []
+            for symbol in bars:
+                for start in range(0, len(combos), chunk_size):
+                    futures.append((start, pool.submit(_evaluate, symbol, stops[symbol], combos[start:start + chunk_size])))
+            for start, future in futures:
+                symbol, results = future.result()
+                for offset, summary in enumerate(results):
+                    total = totals[start + offset]
+                    for name, value in summary.items():
+                        total[name] += value
+                    per_symbol[start + offset][symbol] = summary["profit"]
+    finally:
+        shared.close()
+
+    rows = []
+    for combo, total, profits in zip(combos, totals, per_symbol):
+        decided = total["tp_hits"] + total["sl_hits"]
+        rows.append({**combo, **total, "win_rate": total["tp_hits"] / decided if decided else 0.0,
+                     **{f"profit_{symbol}": profit for symbol, profit in profits.items()}})
+    rows.sort(key=lambda row: row["profit"], reverse=True)
+    for rank, row in enumerate(rows, start=1):
+        row["rank"] = rank
+    return rows
+
+
+def write_results(rows, path):
+    if not rows:
+        return
+    fields = ["rank"] + [name for name in rows[0] if name != "rank"]
+    with open(path, mode="w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parameter sweep for the big-candle backtest")
+    parser.add_argument("store", help="bar_store.py directory with M1 history")
+    parser.add_argument("--symbols", nargs="*", help="defaults to every symbol in the store")
+    parser.add_argument("--timeframe", default="M1")
+    parser.add_argument("--random", type=int, help="sample this many combinations instead of the full grid")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", default="optimizer_results.csv")
+    args = parser.parse_args()
+
+    from bar_store import BarStore
+
+    store = BarStore(args.store)
+    symbols = args.symbols or store.symbols()
+    bars = {symbol: store.bars(symbol, args.timeframe) for symbol in symbols}
+    combos = random_sample(DEFAULT_SPACE, args.random) if args.random else grid(DEFAULT_SPACE)
+
+    start = time.perf_counter()
+    rows = optimize(bars, combos, workers=args.workers)
+    write_results(rows, args.out)
+    print(f"{len(combos)} combinations x {len(symbols)} symbols in {time.perf_counter() - start:.1f}s -> {args.out}")
+    for row in rows[:10]:
+        print(f"#{row['rank']}: profit {row['profit']:.2f}, trades {row['trades']}, win rate {row['win_rate']:.2%} "
+              f"{ {name: row[name] for name in DEFAULT_SPACE} }")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import time
+from collections import deque, namedtuple
+
+from symbol_specs import get_symbol_specs
+
+OrderLatency = namedtuple("OrderLatency", "symbol action retcode seconds")
+CloseResult = namedtuple("CloseResult", "position price result")
+
+
+class RateLimiter:
+    # Token bucket: `rate` requests per second on average, bursts of up to `burst`.
+    # Reads `clock`, so it follows the simulator's clock in replays.
+    def __init__(self, rate=5.0, burst=10, clock=time):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock.time()
+
+    def try_acquire(self):
+        now = self.clock.time()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class OrderRouter:
+    # All order traffic for one terminal connection: one tick/positions snapshot per decision, closes sent as a
+    # batch, a single positions query (with short exponential backoff) to confirm them, and timing of every send.
+    # Opens and stop modifications are normalized against the cached symbol specs before they go out.
+    def __init__(self, mt5, deviation=10, magic=123456, confirm_attempts=6, confirm_backoff=0.05, history=10000,
+                 specs=None, clock=time):
+        self.mt5 = mt5
+        self.clock = clock  # the connection's clock (broker.clock): the simulator's under MT5_BACKEND=sim
+        self.specs = specs or get_symbol_specs(mt5, clock)
+        self.deviation = deviation
+        self.magic = magic
+        self.confirm_attempts = confirm_attempts
+        self.confirm_backoff = confirm_backoff
+        self.latencies = deque(maxlen=history)
+
+    def snapshot(self, symbol):
+        return self.mt5.symbol_info_tick(symbol), self.mt5.positions_get(symbol=symbol) or ()
+
+    def send(self, request, action):
+        start = time.perf_counter()
+        result = self.mt5.order_send(request)
+        elapsed = time.perf_counter() - start
+        self.latencies.append(OrderLatency(request["symbol"], action, result.retcode if result else None, elapsed))
+        if result is not None:
+            self.specs.rejected(request["symbol"], result.retcode)
+        return result
+
+    def close_positions(self, symbol, positions, tick, comment="Close opposite trade"):
+        # Closing price comes from the snapshot tick: bid for closing buys, ask for closing sells
+        mt5 = self.mt5
+        results = []
+        for pos in positions:
+            order_type = mt5.ORDER_TYPE_SELL if pos.type == mt5.ORDER_TYPE_BUY else mt5.ORDER_TYPE_BUY
+            price = tick.bid if order_type == mt5.ORDER_TYPE_SELL else tick.ask
+            request = {
+                "action": mt5.TRADE_ACTION_DEAL,
+                "symbol": symbol,
+                "volume": pos.volume,
+                "type": order_type,
+                "position": pos.ticket,
+                "price": price,
+                "deviation": self.deviation,
+                "magic": self.magic,
+                "comment": comment,
+                "type_time": mt5.ORDER_TIME_GTC,
+                "type_filling": mt5.ORDER_FILLING_IOC
+            }
+            results.append(CloseResult(pos, price, self.send(request, "close")))
+        return results
+
+    def confirm_closed(self, symbol, tickets):
+        # Poll until none of `tickets` is open; returns the positions still open after the last attempt
+        delay = self.confirm_backoff
+        remaining = ()
+        for attempt in range(self.confirm_attempts):
+            positions = self.mt5.positions_get(symbol=symbol) or ()
+            remaining = tuple(pos for pos in positions if pos.ticket in tickets)
+            if not remaining:
+                return ()
+            if attempt < self.confirm_attempts - 1:
+                self.clock.sleep(delay)
+                delay *= 2
+        return remaining
+
+    def open_position(self, symbol, trade_type, volume, price, sl, tp, comment, tick=None):
+        # `tick` (the snapshot `price` came from) lets the stops-level check use the right side of the spread.
+        # The result is None, and nothing is sent, when the SL/TP is already on the wrong side of the market.
+        mt5 = self.mt5
+        request = {
+            "action": mt5.TRADE_ACTION_DEAL,
+            "symbol": symbol,
+            "volume": volume,
+            "type": mt5.ORDER_TYPE_BUY if trade_type == "BUY" else mt5.ORDER_TYPE_SELL,
+            "price": price,
+            "sl": sl,
+            "tp": tp,
+            "deviation": self.deviation,
+            "magic": self.magic,
+            "comment": comment,
+            "type_time": mt5.ORDER_TIME_GTC,
+            "type_filling": mt5.ORDER_FILLING_IOC
+        }
+        if self.specs.normalize_request(request, tick) is None:
+            return request, None
+        return request, self.send(request, "open")
+
+    def modify_position(self, symbol, ticket, sl, tp):
+        request = {
+            "action": self.mt5.TRADE_ACTION_SLTP,
+            "symbol": symbol,
+            "position": ticket,
+            "sl": sl,
+            "tp": tp,
+            "magic": self.magic,
+        }
+        self.specs.normalize_request(request)
+        return self.send(request, "modify")
+
+    def stats(self):
+        by_action = {}
+        for record in self.latencies:
+            by_action.setdefault(record.action, []).append(record.seconds)
+        report = {}
+        for action, samples in by_action.items():
+            samples.sort()
+            report[action] = {
+                "count": len(samples),
+                "mean_ms": 1000 * sum(samples) / len(samples),
+                "p50_ms": 1000 * samples[len(samples) // 2],
+                "p99_ms": 1000 * samples[min(int(len(samples) * 0.99), len(samples) - 1)],
+            }
+        return report
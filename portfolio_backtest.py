@@ -0,0 +1,479 @@
+import argparse
+import csv
+import heapq
+import string
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from bar_aggregator import BarAggregator
+from bar_store import BarStore
+from candle_state import CandleRangeState, trigger_level
+from mt5_sim import symbol_defaults
+from position_manager import STEP_POINTS, trail_stop_for
+from symbol_specs import decimals, load_snapshot, normalize_stops, normalize_volume, spec_from_snapshot
+from timeframes import timeframe_name
+
+PortfolioTrade = namedtuple("PortfolioTrade", "symbol direction entry_time entry_price exit_time exit_price volume "
+                                              "reason pnl")
+EquityPoint = namedtuple("EquityPoint", "time balance equity margin drawdown open_positions")
+
+ACCOUNT_CURRENCY = "USD"
+
+# What a SymbolBook needs from the symbol's spec; guessing these (contract size 1.0) is off by 100000x for forex
+SPEC_FIELDS = ("trade_contract_size", "point", "currency_profit")
+
+
+def _core(symbol):
+    # "USDJPYm" -> "USDJPY"
+    return symbol.rstrip(string.ascii_lowercase).upper()
+
+
+def conversion_symbols(currencies, available):
+    # Symbols that price a needed quote currency against the account currency
+    pairs = {currency + ACCOUNT_CURRENCY for currency in currencies} | {ACCOUNT_CURRENCY + currency for currency in currencies}
+    return [symbol for symbol in available if _core(symbol) in pairs]
+
+
+def parse_spec_overrides(items):
+    # ["EURUSDm:trade_contract_size=100000", ...] -> {"EURUSDm": {"trade_contract_size": 100000.0}}
+    overrides = {}
+    for item in items:
+        symbol, _, assignment = item.partition(":")
+        field, _, value = assignment.partition("=")
+        if not symbol or field not in SPEC_FIELDS or not value:
+            raise ValueError(f"bad --spec {item!r}: expected SYMBOL:FIELD=VALUE with FIELD one of {', '.join(SPEC_FIELDS)}")
+        overrides.setdefault(symbol, {})[field] = value if field == "currency_profit" else float(value)
+    return overrides
+
+
+def resolve_specs(symbols, snapshot, overrides, first_prices, allow_defaults=False):
+    # Each symbol's spec from the snapshot plus overrides. Symbols still missing a field are an error, or with
+    # `allow_defaults` get the simulator's guesses (with a warning on stderr), since those skew P&L and margin.
+    # Fields outside SPEC_FIELDS (tick grid, stops level, volume step) fall back to the guesses on the given point.
+    specs, missing = {}, []
+    for symbol in symbols:
+        spec = {**snapshot.get(symbol, {}), **overrides.get(symbol, {})}
+        absent = [field for field in SPEC_FIELDS if field not in spec]
+        if absent:
+            missing.append(f"{symbol} ({', '.join(absent)})")
+        guessed = symbol_defaults(first_prices[symbol], symbol)
+        if "point" in spec:
+            guessed.update(point=spec["point"], trade_tick_size=spec["point"], digits=decimals(spec["point"]))
+        specs[symbol] = {**guessed, **spec}
+    if missing and not allow_defaults:
+        raise ValueError(f"no spec for {'; '.join(missing)}: pass --specs from `python symbol_specs.py specs.json`, "
+                         f"--spec SYMBOL:FIELD=VALUE, or --default-specs to use guessed specs")
+    for entry in missing:
+        print(f"WARNING: {entry} missing from the specs, using simulator defaults (contract size 1.0): P&L and margin "
+              f"for this symbol are not real", file=sys.stderr)
+    return specs
+
+
+def stream_bars(bars, index, chunk=65536):
+    # (time, index, bar tuple) per M1 bar, decoded from the memory map one chunk at a time
+    for start in range(0, len(bars), chunk):
+        for bar in bars[start:start + chunk].tolist():
+            yield bar[0], index, bar
+
+
+def _path(open_, high, low, close):
+    # The simulator's intrabar order: up bars visit the low first, down bars the high first
+    return (open_, low, high, close) if close >= open_ else (open_, high, low, close)
+
+
+def _first_touch(path, level, below, start=0.0, end=3):
+    # Earliest point in [start, end] (measured in path segments, 0..3) where the price is <= level (below)
+    # or >= level; returns (position, price). A bar that is already through the level fills where it stands.
+    k = min(int(start), 2)
+    a = path[k] + (path[k + 1] - path[k]) * (start - k)
+    if (a <= level) if below else (a >= level):
+        return start, a
+    for i in range(k, int(end)):
+        b = path[i + 1]
+        if (b <= level) if below else (b >= level):
+            frac = (level - path[i]) / (b - path[i])
+            return i + max(frac, start - i), level
+    return None
+
+
+class SymbolBook:
+    # Per-symbol state of child.py's strategy: closed-bar ranges, the armed trigger and the open position
+    def __init__(self, symbol, config, spec):
+        self.symbol = symbol
+        self.volume = config["lot_size"]
+        self.sl = config["sl"]
+        self.tp = config["tp"]
+        self.timeframe = timeframe_name(config.get("timeframe", "M1"))
+        # PositionManager's rules, applied at each vertex of the intrabar path
+        self.profit_target = config.get("profit_target", 0)
+        self.trailing_trigger = config.get("sl_trailing_trigger", 0)
+        self.trailing_adjustment = config.get("sl_trailing_adjustment", 0)
+        self.spec = spec_from_snapshot(symbol, spec)
+        self.volume = normalize_volume(self.spec, self.volume)  # as the router sends it
+        self.contract_size = spec["trade_contract_size"]
+        self.point = spec["point"]
+        self.currency = spec["currency_profit"]
+        self.aggregator = BarAggregator([self.timeframe], history=1)
+        self.ranges = CandleRangeState(5)
+        self.armed = None  # (direction, level)
+        self.position = None  # (direction, entry_time, entry_price, sl, tp, margin, target)
+        self.bid = None  # last close and spread, to mark the open position between this symbol's bars
+        self.offset = 0.0
+        self.unrealized = 0.0
+        self.trades = 0
+        self.pnl = 0.0
+        self.rejected = 0
+        self.refused = 0
+        self.unpriced = 0
+        self.modifies = 0
+
+
+class PortfolioBacktest:
+    # Replays every symbol's M1 bars on one time axis (a heap merge of per-symbol streams) and runs the big-candle
+    # strategy per symbol against a single account: one balance, margin against leverage, and exposure limits
+    # that turn away entries the account could not carry. P&L is converted from each symbol's quote currency.
+    def __init__(self, books, balance=10000.0, leverage=200, max_positions=None, max_margin=0.5, fx=None,
+                 sample_seconds=3600, manage=True, step_points=STEP_POINTS):
+        self.books = {book.symbol: book for book in books}
+        self.initial_balance = balance
+        self.balance = balance
+        self.leverage = leverage
+        self.max_positions = max_positions
+        self.max_margin = max_margin  # margin in use may not exceed this fraction of equity
+        self.fx = dict(fx or {})  # static USD value of one unit of a currency, when no conversion symbol is loaded
+        self.sample_seconds = sample_seconds
+        self.manage = manage  # profit target and trailing stop, as PositionManager does live
+        self.step_points = step_points
+
+        self.prices = {}
+        self.conversions = {}
+        self.unrealized = 0.0
+        self.margin = 0.0
+        self.open_positions = 0
+        self.peak = balance
+        self.max_drawdown = 0.0
+        self.max_drawdown_pct = 0.0
+        self.peak_margin_pct = 0.0
+        self.trades = []
+        self.curve = []
+        self.next_sample = None
+
+    @property
+    def equity(self):
+        return self.balance + self.unrealized
+
+    def resolve_conversions(self, symbols):
+        # Pick, per quote currency, a loaded <CCY>USD or USD<CCY> symbol, else a static --fx rate
+        for book in self.books.values():
+            currency = book.currency
+            if currency == ACCOUNT_CURRENCY or currency in self.conversions:
+                continue
+            for symbol in symbols:
+                core = _core(symbol)
+                if core == currency + ACCOUNT_CURRENCY:
+                    self.conversions[currency] = (symbol, False)
+                    break
+                if core == ACCOUNT_CURRENCY + currency:
+                    self.conversions[currency] = (symbol, True)
+                    break
+            else:
+                if currency not in self.fx:
+                    raise ValueError(f"No {currency} to {ACCOUNT_CURRENCY} conversion: store a {currency}{ACCOUNT_CURRENCY} "
+                                     f"or {ACCOUNT_CURRENCY}{currency} symbol or pass --fx {currency}=<rate>")
+                self.conversions[currency] = None
+
+    def rate(self, currency):
+        # Account currency per unit of `currency`, or None while its conversion symbol has no price and there
+        # is no --fx rate to fall back on
+        if currency == ACCOUNT_CURRENCY:
+            return 1.0
+        conversion = self.conversions[currency]
+        price = self.prices.get(conversion[0]) if conversion is not None else None
+        if price is None:
+            return self.fx.get(currency)
+        return 1.0 / price if conversion[1] else price
+
+    def to_account(self, amount, currency):
+        rate = self.rate(currency)
+        if rate is None:
+            # enter() turns away entries it cannot price, so an open position always has a rate
+            raise ValueError(f"No {currency} to {ACCOUNT_CURRENCY} rate yet: pass --fx {currency}=<rate>")
+        return amount * rate
+
+    def run(self, streams, symbols):
+        # streams[i] yields (time, i, bar) for symbols[i]; symbols without a book only feed currency conversion
+        self.resolve_conversions(symbols)
+        prices = self.prices
+        books = self.books
+        t = None
+        for t, index, bar in heapq.merge(*streams):
+            symbol = symbols[index]
+            prices[symbol] = bar[4]
+            book = books.get(symbol)
+            if book is not None:
+                self.step(book, t, bar)
+            if self.next_sample is None or t >= self.next_sample:
+                self.sample(t)
+                self.next_sample = (t // self.sample_seconds + 1) * self.sample_seconds
+        if t is not None:
+            self.sample(t)
+        return self.trades
+
+    def step(self, book, t, bar):
+        _, open_, high, low, close, _, spread, _ = bar
+        offset = spread * book.point  # ask - bid
+        if book.armed is not None or book.position is not None:
+            path = _path(open_, high, low, close)
+            at = 0.0
+            # Segment by segment: the path's extremes are its vertices, so trailing there is exact
+            for end in (1, 2, 3):
+                while True:
+                    exit_ = self.exit_touch(book, path, offset, at, end) if book.position is not None else None
+                    fill = None
+                    if book.armed is not None:
+                        direction, level = book.armed
+                        fill = _first_touch(path, level, direction == "BUY", at, end)
+                    if exit_ is None and fill is None:
+                        break
+                    if fill is None or (exit_ is not None and exit_[0] <= fill[0]):
+                        at = exit_[0]
+                        self.close(book, t, exit_[1], exit_[2])
+                    else:
+                        at = fill[0]
+                        self.enter(book, t, fill[1], offset)
+                at = end
+                if self.manage and book.position is not None:
+                    self.trail(book, path[end], offset)
+
+        book.bid, book.offset = close, offset
+        if book.position is not None:
+            self.mark(book)
+            self.track()
+
+        for _, closed in book.aggregator.push(t, open_, high, low, close) + book.aggregator.close_through(t + 60):
+            self.on_bar_close(book, closed)
+
+    def exit_touch(self, book, path, offset, at, end):
+        # Buys close on the bid, sells on the ask (bid + spread): SL/TP levels are shifted onto the bid path.
+        # Ties go to the stop.
+        direction, _, _, sl, tp, _, target = book.position
+        levels = [(sl, "sl", direction != "BUY"), (tp, "tp", direction == "BUY")]
+        if target is not None:
+            levels.append((target, "target", direction == "BUY"))
+        best = None
+        for level, reason, above in levels:
+            touch = _first_touch(path, level if direction == "BUY" else level - offset, not above, at, end)
+            if touch is not None and (best is None or touch[0] < best[0]):
+                best = (touch[0], touch[1] if direction == "BUY" else touch[1] + offset, reason)
+        return best
+
+    def mark(self, book):
+        # The open position's floating P&L at the symbol's last bar and today's conversion rate
+        direction, _, entry_price = book.position[:3]
+        price = book.bid if direction == "BUY" else book.bid + book.offset
+        value = self.to_account((price - entry_price) * (1 if direction == "BUY" else -1) * book.volume *
+                                book.contract_size, book.currency)
+        self.unrealized += value - book.unrealized
+        book.unrealized = value
+
+    def revalue(self):
+        # Every open position marked at the current merge time, so equity is not stale for books that have not
+        # had a bar since their last mark (or whose quote currency has moved)
+        for book in self.books.values():
+            if book.position is not None and book.bid is not None:
+                self.mark(book)
+
+    def trail(self, book, bid, offset):
+        # PositionManager's rule through the same normalization: the stops level, tick grid and minimum step
+        direction, entry_time, entry_price, sl, tp, margin, target = book.position
+        price = bid if direction == "BUY" else bid + offset
+        new_sl = trail_stop_for(book.spec, direction, entry_price, price, sl, book.trailing_trigger,
+                                book.trailing_adjustment, self.step_points)
+        if new_sl is not None:
+            book.position = (direction, entry_time, entry_price, new_sl, tp, margin, target)
+            book.modifies += 1
+
+    def enter(self, book, t, bid, offset):
+        direction, level = book.armed
+        book.armed = None
+        if book.position is not None:
+            # place_trade closes whatever is open on the symbol before entering
+            self.close(book, t, bid if book.position[0] == "BUY" else bid + offset, "reverse")
+
+        if self.rate(book.currency) is None:
+            # No conversion yet for the quote currency: the trade cannot be booked, so it is not taken
+            if not book.unpriced:
+                print(f"WARNING: {book.symbol} entry at {datetime.fromtimestamp(t, timezone.utc)} skipped: no "
+                      f"{book.currency} price yet, pass --fx {book.currency}=<rate> to trade before it has one",
+                      file=sys.stderr)
+            book.unpriced += 1
+            return
+        price = bid + offset if direction == "BUY" else bid
+        sl = level - book.sl if direction == "BUY" else level + book.sl
+        tp = level + book.tp if direction == "BUY" else level - book.tp
+        # As OrderRouter.open_position: on the tick grid and outside the stops level, or refused when the market
+        # is already past them
+        stops = normalize_stops(book.spec, direction, sl, tp, bid, bid + offset)
+        if stops is None:
+            book.refused += 1
+            return
+        sl, tp = stops
+        margin = self.to_account(book.volume * book.contract_size * price / self.leverage, book.currency)
+        self.revalue()
+        if ((self.max_positions is not None and self.open_positions >= self.max_positions)
+                or self.margin + margin > self.max_margin * self.equity):
+            book.rejected += 1
+            return
+        target = None
+        unit_value = self.to_account(book.volume * book.contract_size, book.currency)
+        if self.manage and book.profit_target and unit_value > 0:
+            # Floating profit reaching profit_target, as a price level at today's conversion rate
+            distance = book.profit_target / unit_value
+            target = price + distance if direction == "BUY" else price - distance
+        book.position = (direction, t, price, sl, tp, margin, target)
+        self.margin += margin
+        self.open_positions += 1
+        self.track()
+
+    def close(self, book, t, price, reason):
+        direction, entry_time, entry_price, _, _, margin, _ = book.position
+        pnl = self.to_account((price - entry_price) * (1 if direction == "BUY" else -1) * book.volume *
+                              book.contract_size, book.currency)
+        self.balance += pnl
+        self.unrealized -= book.unrealized
+        self.margin -= margin
+        self.open_positions -= 1
+        book.unrealized = 0.0
+        book.position = None
+        book.trades += 1
+        book.pnl += pnl
+        self.trades.append(PortfolioTrade(book.symbol, direction, entry_time, entry_price, t, price, book.volume,
+                                          reason, pnl))
+        self.track()
+
+    def on_bar_close(self, book, bar):
+        # check_entry_condition on the bar that just closed: >= 1.2x the average of the previous five ranges
+        bar_time, open_, high, low, close = bar[:5]
+        if book.armed is None and book.ranges.ready and high - low >= 1.2 * book.ranges.average_range():
+            direction = "BUY" if close > open_ else "SELL"
+            book.armed = (direction, trigger_level(high, low, direction))
+        book.ranges.push(bar_time, open_, high, low, close)
+
+    def track(self):
+        equity = self.equity
+        if equity > self.peak:
+            self.peak = equity
+        drawdown = self.peak - equity
+        if drawdown > self.max_drawdown:
+            self.max_drawdown = drawdown
+        if self.peak > 0 and drawdown / self.peak > self.max_drawdown_pct:
+            self.max_drawdown_pct = drawdown / self.peak
+        if equity > 0 and self.margin / equity > self.peak_margin_pct:
+            self.peak_margin_pct = self.margin / equity
+
+    def sample(self, t):
+        self.revalue()
+        self.track()
+        self.curve.append(EquityPoint(t, self.balance, self.equity, self.margin, self.peak - self.equity,
+                                      self.open_positions))
+
+    def summary(self):
+        wins = sum(1 for trade in self.trades if trade.pnl > 0)
+        return {
+            "trades": len(self.trades),
+            "wins": wins,
+            "losses": len(self.trades) - wins,
+            "net_profit": round(self.balance - self.initial_balance, 2),
+            "final_equity": round(self.equity, 2),
+            "max_drawdown": round(self.max_drawdown, 2),
+            "max_drawdown_pct": round(100 * self.max_drawdown_pct, 2),
+            "peak_margin_pct": round(100 * self.peak_margin_pct, 2),
+            "rejected_entries": sum(book.rejected for book in self.books.values()),
+            "refused_entries": sum(book.refused for book in self.books.values()),
+            "unpriced_entries": sum(book.unpriced for book in self.books.values()),
+            "stop_modifications": sum(book.modifies for book in self.books.values()),
+            "symbols": {symbol: {"trades": book.trades, "pnl": round(book.pnl, 2), "rejected": book.rejected}
+                        for symbol, book in self.books.items()},
+        }
+
+    def write_equity_csv(self, path):
+        with open(path, mode="w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["Timestamp", "Balance", "Equity", "Margin", "Drawdown", "OpenPositions"])
+            for point in self.curve:
+                writer.writerow([datetime.fromtimestamp(point.time, timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+                                 round(point.balance, 2), round(point.equity, 2), round(point.margin, 2),
+                                 round(point.drawdown, 2), point.open_positions])
+
+    def write_trades_csv(self, path):
+        with open(path, mode="w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(PortfolioTrade._fields)
+            writer.writerows(self.trades)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Portfolio backtest of the master.py basket on one account")
+    parser.add_argument("--store", required=True, help="bar_store.py directory with M1 bars for every symbol")
+    parser.add_argument("--symbols", nargs="*", help="default: every enabled symbol in config.yaml")
+    parser.add_argument("--start", help="YYYY-MM-DD")
+    parser.add_argument("--end", help="YYYY-MM-DD")
+    parser.add_argument("--balance", type=float, default=10000.0)
+    parser.add_argument("--leverage", type=float, default=200)
+    parser.add_argument("--max-positions", type=int)
+    parser.add_argument("--max-margin", type=float, default=0.5, help="max margin in use as a fraction of equity")
+    parser.add_argument("--specs", help="symbol spec snapshot from `python symbol_specs.py specs.json`")
+    parser.add_argument("--spec", action="extend", nargs="+", default=[],
+                        help="per-symbol override, e.g. EURUSDm:trade_contract_size=100000 XAUUSDm:currency_profit=USD")
+    parser.add_argument("--default-specs", action="store_true",
+                        help="run symbols without a spec on guessed specs (contract size 1.0) instead of failing")
+    parser.add_argument("--fx", action="extend", nargs="+", default=[], help="CCY=USD value of one unit, e.g. THB=0.028")
+    parser.add_argument("--no-manage", action="store_true", help="skip the profit target and trailing stop")
+    parser.add_argument("--sample-minutes", type=int, default=60)
+    parser.add_argument("--equity-csv", default="portfolio_equity.csv")
+    parser.add_argument("--trades-csv")
+    args = parser.parse_args()
+
+    from master import symbol_configs
+
+    store = BarStore(args.store)
+    names = args.symbols or list(symbol_configs)
+    start = datetime.strptime(args.start, "%Y-%m-%d").replace(tzinfo=timezone.utc) if args.start else None
+    end = datetime.strptime(args.end, "%Y-%m-%d").replace(tzinfo=timezone.utc) if args.end else None
+    fx = {item.split("=")[0].upper(): float(item.split("=")[1]) for item in args.fx}
+
+    bars = {symbol: store.read_range(symbol, "M1", start, end) for symbol in store.symbols()}
+    for symbol in names:
+        if symbol not in symbol_configs:
+            parser.error(f"{symbol} is not an enabled symbol in config.yaml")
+        if len(bars.get(symbol, ())) == 0:
+            parser.error(f"no M1 bars for {symbol} in {args.store}")
+    try:
+        specs = resolve_specs(names, load_snapshot(args.specs) if args.specs else {}, parse_spec_overrides(args.spec),
+                              {symbol: float(bars[symbol]["close"][0]) for symbol in names}, args.default_specs)
+    except ValueError as error:
+        parser.error(str(error))
+    books = [SymbolBook(symbol, symbol_configs[symbol], specs[symbol]) for symbol in names]
+
+    backtest = PortfolioBacktest(books, args.balance, args.leverage, args.max_positions, args.max_margin, fx,
+                                 args.sample_minutes * 60, manage=not args.no_manage)
+    # Conversion-only symbols (e.g. USDJPYm for BTCJPYm) are streamed too, but only when some book needs them
+    needed = {book.currency for book in books} - {ACCOUNT_CURRENCY}
+    symbols = names + [symbol for symbol in conversion_symbols(needed, bars) if symbol not in names]
+    streams = [stream_bars(bars[symbol], index) for index, symbol in enumerate(symbols)]
+
+    started = time.perf_counter()
+    backtest.run(streams, symbols)
+    elapsed = time.perf_counter() - started
+    total = sum(len(bars[symbol]) for symbol in symbols)
+    print(f"{len(symbols)} symbols, {total:,} M1 bars in {elapsed:.1f}s")
+    print(backtest.summary())
+    backtest.write_equity_csv(args.equity_csv)
+    if args.trades_csv:
+        backtest.write_trades_csv(args.trades_csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import logging
+from collections import namedtuple
+
+from metrics import REGISTRY
+from order_router import RateLimiter
+from symbol_specs import normalize_stops
+from trade_journal import get_journal
+
+# profit_target: close once the position's floating profit (account currency) reaches it.
+# trailing_trigger / trailing_adjustment: price distances; once price has moved trailing_trigger in the position's
+# favour the stop follows trailing_adjustment behind it. 0 switches either rule off.
+PositionRule = namedtuple("PositionRule", "profit_target trailing_trigger trailing_adjustment")
+
+# Stop moves smaller than this many points are not sent
+STEP_POINTS = 10
+
+
+def trail_stop(direction, price_open, price, sl, trigger, adjustment, min_step=0.0):
+    # New stop for a position at `price`, or None if it stays put (rule off, not triggered, or not tighter by min_step)
+    if not trigger or not adjustment:
+        return None
+    if direction == "BUY":
+        if price - price_open < trigger:
+            return None
+        new_sl = price - adjustment
+        return new_sl if not sl or new_sl >= sl + min_step else None
+    if price_open - price < trigger:
+        return None
+    new_sl = price + adjustment
+    return new_sl if not sl or new_sl <= sl - min_step else None
+
+
+def trail_stop_for(spec, direction, price_open, price, sl, trigger, adjustment, step_points=STEP_POINTS):
+    # trail_stop() as the broker would accept it: normalized like an entry's SL (normalize_stops: at least the
+    # stops level behind `price`, on the tick grid, rounded away from the market). None when it stays put, including
+    # when the widening leaves it no longer step_points tighter than the current stop.
+    min_step = step_points * spec.point
+    new_sl = trail_stop(direction, price_open, price, sl, trigger, adjustment, min_step)
+    if new_sl is None:
+        return None
+    stops = normalize_stops(spec, direction, new_sl, 0.0, price, price)
+    if stops is None:
+        return None
+    new_sl = stops[0]
+    if sl and (new_sl < sl + min_step - 1e-9 if direction == "BUY" else new_sl > sl - min_step + 1e-9):
+        return None
+    return new_sl
+
+
+class PositionManager:
+    # Looks after every open position from one positions_get() snapshot per cycle: closes positions at their
+    # symbol's profit target and trails stops with TRADE_ACTION_SLTP. Modifications pass a token bucket and a
+    # per-position minimum interval, so a fast market cannot push the request rate past the broker's limits.
+    def __init__(self, mt5, router, rules=None, rate=5.0, burst=10, min_interval=1.0, step_points=STEP_POINTS,
+                 journal=None):
+        self.mt5 = mt5
+        self.router = router
+        self.rules = dict(rules or {})
+        self.clock = router.clock
+        self.limiter = RateLimiter(rate, burst, router.clock)
+        self.min_interval = min_interval
+        self.step_points = step_points  # ignore stop moves smaller than this many points
+        self.journal = journal or get_journal()
+        self.specs = router.specs
+        self.last_modified = {}  # ticket -> time of its last SLTP request
+        self.active = False
+
+    def add(self, symbol, profit_target, trailing_trigger, trailing_adjustment):
+        self.rules[symbol] = PositionRule(profit_target, trailing_trigger, trailing_adjustment)
+
+    def update(self):
+        self.specs.maybe_refresh()
+        positions = [pos for pos in (self.mt5.positions_get() or ())
+                     if pos.symbol in self.rules and pos.magic == self.router.magic]
+        self.active = bool(positions)
+        open_tickets = {pos.ticket for pos in positions}
+        for ticket in [ticket for ticket in self.last_modified if ticket not in open_tickets]:
+            del self.last_modified[ticket]
+
+        for pos in positions:
+            rule = self.rules[pos.symbol]
+            if rule.profit_target and pos.profit >= rule.profit_target:
+                self.close(pos)
+            else:
+                self.trail(pos, rule)
+
+    def close(self, pos):
+        mt5 = self.mt5
+        logger = logging.getLogger(f"strategy.{pos.symbol}")
+        tick = mt5.symbol_info_tick(pos.symbol)
+        if tick is None:
+            return
+        for _, price, result in self.router.close_positions(pos.symbol, [pos], tick, comment="Profit target"):
+            order_type = "BUY" if pos.type == mt5.POSITION_TYPE_BUY else "SELL"
+            if result.retcode == mt5.TRADE_RETCODE_DONE:
+                logger.info(f"Profit target {pos.profit} reached, closed trade {pos.ticket} for {pos.symbol}")
+                self.journal.record(pos.symbol, "Close", order_type, price, pos.volume, "Success", result.retcode, pos.ticket)
+                REGISTRY.inc("profit_target_close", pos.symbol)
+            else:
+                logger.error(f"Failed to close trade {pos.ticket} at profit target, retcode: {result.retcode}")
+                self.journal.record(pos.symbol, "Close", order_type, price, pos.volume, "Failed", result.retcode, pos.ticket)
+
+    def trail(self, pos, rule):
+        mt5 = self.mt5
+        spec = self.specs.get(pos.symbol)
+        if spec is None:
+            return
+        direction = "BUY" if pos.type == mt5.POSITION_TYPE_BUY else "SELL"
+        # price_current is the bid for buys and the ask for sells: the side each stop triggers on
+        new_sl = trail_stop_for(spec, direction, pos.price_open, pos.price_current, pos.sl, rule.trailing_trigger,
+                                rule.trailing_adjustment, self.step_points)
+        if new_sl is None:
+            return
+
+        now = self.clock.time()
+        if now - self.last_modified.get(pos.ticket, float("-inf")) < self.min_interval or not self.limiter.try_acquire():
+            REGISTRY.inc("sl_modify_throttled", pos.symbol)
+            return
+        self.last_modified[pos.ticket] = now
+        result = self.router.modify_position(pos.symbol, pos.ticket, new_sl, pos.tp)
+        logger = logging.getLogger(f"strategy.{pos.symbol}")
+        if result is not None and result.retcode == mt5.TRADE_RETCODE_DONE:
+            logger.info(f"Trailing stop for {pos.ticket} moved from {pos.sl} to {new_sl}")
+            self.journal.record(pos.symbol, "Modify", direction, new_sl, pos.volume, "Success", result.retcode, pos.ticket)
+            REGISTRY.inc("sl_modify", pos.symbol)
+        else:
+            retcode = result.retcode if result is not None else None
+            logger.error(f"Failed to move stop for {pos.ticket} to {new_sl}, retcode: {retcode}")
+            self.journal.record(pos.symbol, "Modify", direction, new_sl, pos.volume, "Failed", retcode, pos.ticket)
@@ -0,0 +1,346 @@
+import argparse
+import csv
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from backtest_engine import random_walk_rates, run_backtest
+from optimizer import DEFAULT_SPACE, SharedBars, _attach, _backtest, grid, random_sample, symbol_stops
+
+# 6in1backtest.py's parameters: a bar >= 2x the largest range of the prior 5 bars, trigger at 40%, 5 bars to
+# fill, 1x SL/TP. The live child.py/runner.py signal (>= 1.2x the average of the prior 5 ranges) is a different
+# rule, which the engine's max-based signal does not reproduce.
+DEFAULT_COMBO = {"multiplier": 2.0, "trigger_fraction": 0.4, "lookback": 5, "fill_window": 5, "sl_scale": 1.0,
+                 "tp_scale": 1.0}
+
+DAY = 86400
+
+# One rolling window: [start, split) is in-sample, [split, end) out-of-sample (epoch seconds)
+Window = namedtuple("Window", "start split end")
+
+
+def rolling_windows(first, last, in_sample_days, out_of_sample_days, step_days=None):
+    # Windows over [first, last], each out-of-sample period following the previous one unless `step_days` says
+    # otherwise; the last window is dropped when its out-of-sample period would run past the history
+    step = (step_days or out_of_sample_days) * DAY
+    windows = []
+    start = first
+    while start + (in_sample_days + out_of_sample_days) * DAY <= last + DAY:
+        split = start + in_sample_days * DAY
+        windows.append(Window(start, split, split + out_of_sample_days * DAY))
+        start += step
+    return windows
+
+
+def window_edges(times, windows):
+    # (windows x 3) bar indices of each window's start, split and end in one symbol's history
+    bounds = np.array([[w.start, w.split, w.end] for w in windows], dtype=np.int64).reshape(-1, 3)
+    return np.searchsorted(times, bounds)
+
+
+def _window_results(symbol, stops, combos, edges):
+    # Each combination is backtested once over the whole history and its trades are split into windows by signal
+    # bar, so a combination costs one backtest however many windows there are
+    shape = (len(combos), len(edges))
+    is_profit, oos_profit = np.zeros(shape), np.zeros(shape)
+    is_trades, oos_trades = np.zeros(shape, dtype=np.int64), np.zeros(shape, dtype=np.int64)
+    for c, combo in enumerate(combos):
+        trades = _backtest(symbol, stops, combo)
+        profit = np.concatenate(([0.0], np.cumsum(trades["pnl"])))
+        pos = np.searchsorted(trades["signal_index"], edges)
+        is_profit[c] = profit[pos[:, 1]] - profit[pos[:, 0]]
+        oos_profit[c] = profit[pos[:, 2]] - profit[pos[:, 1]]
+        is_trades[c] = pos[:, 1] - pos[:, 0]
+        oos_trades[c] = pos[:, 2] - pos[:, 1]
+    return is_profit, is_trades, oos_profit, oos_trades
+
+
+def _selected_trades(symbol, stops, combo, ranges):
+    # Signal bar and pnl of `combo`'s trades inside the given [start, end) bar ranges
+    trades = _backtest(symbol, stops, combo)
+    keep = np.zeros(len(trades), dtype=bool)
+    for start, end in ranges:
+        keep |= (trades["signal_index"] >= start) & (trades["signal_index"] < end)
+    return trades["signal_index"][keep], trades["pnl"][keep]
+
+
+def walk_forward(bars, combos, in_sample_days=90, out_of_sample_days=30, step_days=None, min_trades=20,
+                 workers=None, chunk_size=200, stops=None):
+    # Rolling walk-forward: in every window the combination with the best in-sample profit (over all symbols, with
+    # at least `min_trades` in-sample trades) is traded out-of-sample. Returns the per-window rows and the
+    # out-of-sample trade pnls of the selected combinations in time order, for monte_carlo().
+    stops = stops or symbol_stops(bars)
+    if DEFAULT_COMBO not in combos:
+        combos = combos + [DEFAULT_COMBO]
+    default = combos.index(DEFAULT_COMBO)
+    times = {symbol: np.asarray(rates["time"]) for symbol, rates in bars.items() if len(rates)}
+    if not times:
+        return [], np.zeros(0)
+    windows = rolling_windows(min(t[0] for t in times.values()), max(t[-1] for t in times.values()),
+                              in_sample_days, out_of_sample_days, step_days)
+    if not windows:
+        return [], np.zeros(0)
+    edges = {symbol: window_edges(t, windows) for symbol, t in times.items()}
+
+    shape = (len(combos), len(windows))
+    is_profit, oos_profit = np.zeros(shape), np.zeros(shape)
+    is_trades, oos_trades = np.zeros(shape, dtype=np.int64), np.zeros(shape, dtype=np.int64)
+    shared = SharedBars({symbol: bars[symbol] for symbol in times})
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(shared.layout,)) as pool:
+            futures = []
+            for symbol in times:
+                for start in range(0, len(combos), chunk_size):
+                    futures.append((start, pool.submit(_window_results, symbol, stops[symbol],
+                                                       combos[start:start + chunk_size], edges[symbol])))
+            for start, future in futures:
+                results = future.result()
+                rows = slice(start, start + len(results[0]))
+                for total, part in zip((is_profit, is_trades, oos_profit, oos_trades), results):
+                    total[rows] += part
+
+            score = np.where(is_trades >= min_trades, is_profit, -np.inf)
+            best = score.argmax(axis=0)
+            chosen = {}
+            for w, c in enumerate(best):
+                if np.isfinite(score[c, w]):
+                    chosen.setdefault(int(c), []).append(w)
+            futures = [(symbol, pool.submit(_selected_trades, symbol, stops[symbol], combos[c],
+                                            [(edges[symbol][w, 1], edges[symbol][w, 2]) for w in ws]))
+                       for c, ws in chosen.items() for symbol in times]
+            signal_times, pnls = [], []
+            for symbol, future in futures:
+                index, pnl = future.result()
+                signal_times.append(times[symbol][index])
+                pnls.append(pnl)
+    finally:
+        shared.close()
+
+    order = np.argsort(np.concatenate(signal_times), kind="stable") if pnls else np.zeros(0, dtype=np.int64)
+    sequence = np.concatenate(pnls)[order] if pnls else np.zeros(0)
+
+    rows = []
+    for w, window in enumerate(windows):
+        c = best[w]
+        selected = bool(np.isfinite(score[c, w]))
+        # Where the live parameters ranked in-sample (1 = best) and what they made out-of-sample
+        default_rank = int((is_profit[:, w] > is_profit[default, w]).sum()) + 1
+        rows.append({
+            "window": w + 1,
+            "in_sample_start": _date(window.start),
+            "out_of_sample_start": _date(window.split),
+            "out_of_sample_end": _date(window.end),
+            **{name: combos[c][name] if selected else None for name in DEFAULT_SPACE},
+            "in_sample_profit": float(is_profit[c, w]) if selected else 0.0,
+            "in_sample_trades": int(is_trades[c, w]) if selected else 0,
+            "out_of_sample_profit": float(oos_profit[c, w]) if selected else 0.0,
+            "out_of_sample_trades": int(oos_trades[c, w]) if selected else 0,
+            "default_in_sample_rank": default_rank,
+            "default_out_of_sample_profit": float(oos_profit[default, w]),
+        })
+    return rows, sequence
+
+
+def efficiency(rows, in_sample_days, out_of_sample_days):
+    # Out-of-sample profit per day over in-sample profit per day of the selected combinations; near 1 means the
+    # in-sample edge carried over, near 0 or negative means it was fitted to noise
+    in_sample = sum(row["in_sample_profit"] for row in rows) / in_sample_days
+    out_of_sample = sum(row["out_of_sample_profit"] for row in rows) / out_of_sample_days
+    return out_of_sample / in_sample if in_sample > 0 else float("nan")
+
+
+def _date(timestamp):
+    return datetime.fromtimestamp(int(timestamp), timezone.utc).strftime("%Y-%m-%d")
+
+
+def resample(pnl, count, seed, method="bootstrap", checkpoints=None):
+    # `count` resampled equity curves of the trade sequence: "bootstrap" draws trades with replacement (final P&L
+    # and drawdown both vary), "shuffle" permutes them (same final P&L, only the path and its drawdown vary).
+    # Returns each curve's final P&L, maximum drawdown from the running peak (starting at 0) and equity at the
+    # `checkpoints` trade indices.
+    rng = np.random.default_rng(seed)
+    n = len(pnl)
+    if method == "shuffle":
+        index = rng.permuted(np.tile(np.arange(n), (count, 1)), axis=1)
+    else:
+        index = rng.integers(0, n, size=(count, n))
+    equity = pnl[index]
+    np.cumsum(equity, axis=1, out=equity)
+    peak = np.maximum.accumulate(equity, axis=1)
+    np.maximum(peak, 0.0, out=peak)
+    peak -= equity
+    return equity[:, -1].copy(), peak.max(axis=1), equity[:, checkpoints if checkpoints is not None else [-1]]
+
+
+def monte_carlo(pnl, resamples=10000, method="bootstrap", seed=0, workers=None, bands=(5, 50, 95), points=20,
+                chunk_cells=4_000_000):
+    # Percentile bands of final P&L, maximum drawdown and the equity curve over `resamples` resampled trade
+    # sequences. Resamples run in chunks of about `chunk_cells` trades, spread over a process pool when
+    # `workers` > 1; every chunk has its own seed from `seed`, so results do not depend on the worker count.
+    pnl = np.asarray(pnl, dtype=np.float64)
+    if not len(pnl) or resamples <= 0:
+        return None
+    checkpoints = np.unique(np.linspace(0, len(pnl) - 1, min(points, len(pnl))).round().astype(np.int64))
+    chunk = max(1, min(resamples, chunk_cells // len(pnl)))
+    counts = [min(chunk, resamples - start) for start in range(0, resamples, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(counts))
+    jobs = [(pnl, count, child, method, checkpoints) for count, child in zip(counts, seeds)]
+    if workers and workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(resample, *zip(*jobs)))
+    else:
+        results = [resample(*job) for job in jobs]
+    final = np.concatenate([r[0] for r in results])
+    drawdown = np.concatenate([r[1] for r in results])
+    equity = np.concatenate([r[2] for r in results])
+    return {
+        "trades": len(pnl),
+        "resamples": resamples,
+        "method": method,
+        "actual_profit": float(pnl.sum()),
+        "actual_drawdown": max_drawdown(pnl),
+        "profit": dict(zip(bands, np.percentile(final, bands))),
+        "drawdown": dict(zip(bands, np.percentile(drawdown, bands))),
+        "loss_probability": float((final < 0).mean()),
+        "checkpoints": checkpoints + 1,
+        "equity": dict(zip(bands, np.percentile(equity, bands, axis=0))),
+    }
+
+
+def max_drawdown(pnl):
+    # Maximum drawdown of the trade sequence as it actually happened
+    equity = np.cumsum(pnl)
+    return float((np.maximum(np.maximum.accumulate(equity), 0.0) - equity).max()) if len(equity) else 0.0
+
+
+def print_monte_carlo(result):
+    if result is None:
+        print("No trades to resample")
+        return
+    bands = list(result["profit"])
+    print(f"{result['resamples']} {result['method']} resamples of {result['trades']} trades: "
+          f"actual profit {result['actual_profit']:.2f}, actual max drawdown {result['actual_drawdown']:.2f}, "
+          f"P(loss) {result['loss_probability']:.1%}")
+    print("  profit:       " + ", ".join(f"p{band} {result['profit'][band]:.2f}" for band in bands))
+    print("  max drawdown: " + ", ".join(f"p{band} {result['drawdown'][band]:.2f}" for band in bands))
+    print("  equity after trade " + " / ".join(f"p{band}" for band in bands) + ":")
+    for i, trade in enumerate(result["checkpoints"]):
+        print(f"    {trade:>7}: " + " / ".join(f"{result['equity'][band][i]:.2f}" for band in bands))
+
+
+def trade_sequence(bars, combo, stops=None):
+    # Trade pnls of one combination over every symbol, merged in signal-time order
+    stops = stops or symbol_stops(bars)
+    signal_times, pnls = [], []
+    for symbol, rates in bars.items():
+        trades = run_backtest(rates, lookback=combo["lookback"], multiplier=combo["multiplier"],
+                              trigger_fraction=combo["trigger_fraction"], fill_window=combo["fill_window"],
+                              sl_amount=stops[symbol][0] * combo["sl_scale"],
+                              tp_amount=stops[symbol][1] * combo["tp_scale"])
+        signal_times.append(np.asarray(rates["time"])[trades["signal_index"]])
+        pnls.append(trades["pnl"])
+    if not pnls:
+        return np.zeros(0)
+    return np.concatenate(pnls)[np.argsort(np.concatenate(signal_times), kind="stable")]
+
+
+def write_rows(rows, path):
+    if not rows:
+        return
+    with open(path, mode="w", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def load_bars(path, symbols, timeframe, days=None):
+    # An ingest.py partition store (has a catalog) or a bar_store.py directory; `days` keeps only the most recent
+    from ingest import PartitionStore
+
+    if os.path.isfile(os.path.join(path, "catalog.csv")):
+        store = PartitionStore(path)
+        symbols = symbols or sorted({part.symbol for part in store.partitions(timeframe=timeframe)})
+        bars = {symbol: store.read(symbol, timeframe) for symbol in symbols}
+    else:
+        from bar_store import BarStore
+
+        store = BarStore(path)
+        symbols = symbols or store.symbols()
+        bars = {symbol: store.bars(symbol, timeframe) for symbol in symbols}
+    if days:
+        last = max((int(rates["time"][-1]) for rates in bars.values() if len(rates)), default=0)
+        bars = {symbol: rates[np.searchsorted(rates["time"], last - days * DAY):] for symbol, rates in bars.items()}
+    return bars
+
+
+def bench(resamples=10000, trades=None, workers=None, method="bootstrap"):
+    # A year of M1 random-walk bars through the default parameters, then `resamples` of its trade sequence
+    rates = random_walk_rates(365 * 1440, seed=1)
+    pnl = run_backtest(rates)["pnl"]
+    if trades:
+        pnl = np.resize(pnl, trades)
+    start = time.perf_counter()
+    result = monte_carlo(pnl, resamples, method=method, workers=workers)
+    elapsed = time.perf_counter() - start
+    print_monte_carlo(result)
+    print(f"{resamples} resamples of {len(pnl)} trades in {elapsed:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Walk-forward and Monte Carlo robustness checks for the big-candle "
+                                                 "backtest")
+    parser.add_argument("mode", choices=["walkforward", "montecarlo", "bench"])
+    parser.add_argument("store", nargs="?", help="ingest.py partition store or bar_store.py directory")
+    parser.add_argument("--symbols", nargs="*", help="defaults to every symbol in the store")
+    parser.add_argument("--timeframe", default="M1")
+    parser.add_argument("--days", type=int, help="only the most recent days of history")
+    parser.add_argument("--in-sample", type=int, default=90, help="walk-forward in-sample days")
+    parser.add_argument("--out-of-sample", type=int, default=30, help="walk-forward out-of-sample days")
+    parser.add_argument("--step", type=int, help="days between windows (default: the out-of-sample length)")
+    parser.add_argument("--random", type=int, help="sample this many combinations instead of the full grid")
+    parser.add_argument("--min-trades", type=int, default=20, help="in-sample trades a combination needs to be picked")
+    for name, value in DEFAULT_COMBO.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(value), default=value,
+                            help="montecarlo: parameter to resample")
+    parser.add_argument("--resamples", type=int, default=10000)
+    parser.add_argument("--method", choices=["bootstrap", "shuffle"], default="bootstrap")
+    parser.add_argument("--trades", type=int, help="bench: resize the trade sequence to this many trades")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--out", default="walkforward.csv")
+    args = parser.parse_args()
+
+    if args.mode == "bench":
+        bench(args.resamples, args.trades, args.workers, args.method)
+        return
+    if not args.store:
+        parser.error(f"{args.mode} needs a store")
+    bars = load_bars(args.store, args.symbols, args.timeframe, args.days)
+    start = time.perf_counter()
+
+    if args.mode == "walkforward":
+        combos = random_sample(DEFAULT_SPACE, args.random) if args.random else grid(DEFAULT_SPACE)
+        rows, pnl = walk_forward(bars, combos, args.in_sample, args.out_of_sample, args.step, args.min_trades,
+                                 workers=args.workers)
+        write_rows(rows, args.out)
+        print(f"{len(rows)} windows x {len(combos)} combinations x {len(bars)} symbols in "
+              f"{time.perf_counter() - start:.1f}s -> {args.out}")
+        for row in rows:
+            print(f"#{row['window']} {row['out_of_sample_start']}..{row['out_of_sample_end']}: in-sample "
+                  f"{row['in_sample_profit']:.2f} ({row['in_sample_trades']} trades), out-of-sample "
+                  f"{row['out_of_sample_profit']:.2f} ({row['out_of_sample_trades']} trades); default parameters "
+                  f"ranked {row['default_in_sample_rank']}, out-of-sample {row['default_out_of_sample_profit']:.2f}")
+        print(f"Walk-forward out-of-sample profit {sum(row['out_of_sample_profit'] for row in rows):.2f}, "
+              f"default parameters {sum(row['default_out_of_sample_profit'] for row in rows):.2f}, "
+              f"efficiency {efficiency(rows, args.in_sample, args.out_of_sample):.2f}")
+    else:
+        pnl = trade_sequence(bars, {name: getattr(args, name) for name in DEFAULT_COMBO})
+    print_monte_carlo(monte_carlo(pnl, args.resamples, method=args.method, workers=args.workers))
+    print(f"Done in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import sys
+import time
+
+import metrics
+from bar_aggregator import AggregatedFeed
+from bar_scheduler import BarCloseScheduler
+from order_router import OrderRouter
+from position_manager import PositionManager
+from session_log import note
+from strategy import SymbolStrategy
+
+
+class MultiSymbolRunner:
+    # Hosts every configured symbol in one process over one terminal connection.
+    # One BarCloseScheduler evaluates each symbol the moment its own timeframe's bar closes; each cycle
+    # also reads one tick per armed symbol, then sleeps until the next poll or bar close, whichever is first.
+    # With a config.ConfigWatcher, edits to the config file are applied between cycles. `clock` paces the loop
+    # (broker.clock: the simulator's under MT5_BACKEND=sim).
+    def __init__(self, mt5, strategies, poll_seconds=1, watcher=None, clock=time):
+        self.mt5 = mt5
+        self.clock = clock
+        self.strategies = list(strategies)
+        self.poll_seconds = poll_seconds
+        self.watcher = watcher
+        # Bars for every timeframe are rolled up from one M1 stream per symbol
+        self.scheduler = BarCloseScheduler(AggregatedFeed(mt5), clock=clock)
+        self.managers = list({id(strategy.manager): strategy.manager for strategy in strategies}.values())
+        for strategy in strategies:
+            self.scheduler.subscribe(strategy.symbol, strategy.timeframe, strategy.on_bar_close)
+
+    def add(self, strategy):
+        self.strategies.append(strategy)
+        if strategy.manager not in self.managers:
+            self.managers.append(strategy.manager)
+        self.scheduler.subscribe(strategy.symbol, strategy.timeframe, strategy.on_bar_close)
+
+    def remove(self, strategy):
+        # Stops new signals only; the position manager keeps looking after anything still open
+        self.strategies.remove(strategy)
+        self.scheduler.unsubscribe(strategy.symbol, strategy.timeframe)
+
+    def apply_config(self, changes):
+        # {symbol: SymbolConfig or None} from ConfigWatcher.poll(): update in place, start new symbols, stop removed
+        # or disabled ones. Unchanged subscriptions keep their place on the scheduler, so no bar close is missed.
+        by_symbol = {strategy.symbol: strategy for strategy in self.strategies}
+        for symbol, cfg in changes.items():
+            strategy = by_symbol.get(symbol)
+            if cfg is None or not cfg.enabled:
+                if strategy is not None:
+                    strategy.logger.info(f"{symbol} removed or disabled in config, stopping")
+                    self.remove(strategy)
+            elif strategy is None:
+                shared = {"clock": self.clock}
+                if self.strategies:
+                    template = self.strategies[0]
+                    shared.update(router=template.router, journal=template.journal, manager=template.manager)
+                strategy = SymbolStrategy.from_config(self.mt5, cfg, **shared)
+                strategy.router.specs.load([symbol])
+                strategy.log_settings()
+                self.add(strategy)
+            else:
+                old_timeframe = strategy.timeframe
+                if strategy.apply_config(cfg):
+                    self.scheduler.unsubscribe(symbol, old_timeframe)
+                    self.scheduler.subscribe(symbol, strategy.timeframe, strategy.on_bar_close)
+
+    def watch_armed(self):
+        armed = [strategy for strategy in self.strategies if strategy.armed]
+        ticks = {strategy.symbol: self.mt5.symbol_info_tick(strategy.symbol) for strategy in armed}
+        for strategy in armed:
+            tick = ticks[strategy.symbol]
+            strategy.on_price(tick.bid if tick else None)
+
+    def run_cycle(self):
+        if self.watcher is not None:
+            changes = self.watcher.poll()
+            if changes:
+                note("changes", None, changes)
+                self.apply_config(changes)
+        self.scheduler.run_pending()
+        self.watch_armed()
+        for manager in self.managers:
+            manager.update()
+
+    def sleep_time(self):
+        delay = self.scheduler.delay()
+        if self.watcher is not None:
+            delay = min(delay, self.watcher.interval)
+        if any(strategy.armed for strategy in self.strategies) or any(manager.active for manager in self.managers):
+            return min(self.poll_seconds, delay)
+        return delay
+
+    def run(self):
+        # Every symbol's spec in one bulk read, so no order has to ask the terminal for one
+        if self.strategies:
+            self.strategies[0].router.specs.load(strategy.symbol for strategy in self.strategies)
+        note("run", None, {"runner": True, "poll_seconds": self.poll_seconds,
+                           "watcher": self.watcher.interval if self.watcher is not None else None})
+        while True:
+            self.run_cycle()
+            self.clock.sleep(self.sleep_time())
+
+
+def build_strategies(mt5, symbol_configs, clock=time):
+    # One router, so every symbol shares the connection and the latency history, and one position manager,
+    # so each cycle takes a single positions snapshot for all symbols
+    router = OrderRouter(mt5, clock=clock)
+    manager = PositionManager(mt5, router)
+    return [
+        SymbolStrategy(
+            mt5,
+            symbol,
+            lot_size=config["lot_size"],
+            profit_target=config["profit_target"],
+            sl_trailing_trigger=config["sl_trailing_trigger"],
+            sl_trailing_adjustment=config["sl_trailing_adjustment"],
+            timeframe_str=config["timeframe"],
+            interval_minutes=config["interval_minutes"],
+            sl=config["sl"],
+            tp=config["tp"],
+            router=router,
+            manager=manager,
+        )
+        for symbol, config in symbol_configs.items()
+    ]
+
+
+if __name__ == "__main__":
+    import session_log
+    from broker import clock, mt5
+    from config import ConfigWatcher, symbol_dicts
+
+    mt5 = session_log.from_env(mt5, "runner", clock)
+
+    if not mt5.initialize():
+        print("MT5 initialization failed")
+        sys.exit(1)
+
+    metrics.start_from_env()
+    watcher = ConfigWatcher()
+    strategies = build_strategies(mt5, symbol_dicts(watcher.config), clock)
+    for strategy in strategies:
+        strategy.log_settings()
+    print(f"Running {len(strategies)} symbols in one process: {', '.join(s.symbol for s in strategies)}")
+    MultiSymbolRunner(mt5, strategies, watcher=watcher, clock=clock).run()
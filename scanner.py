@@ -0,0 +1,162 @@
+import argparse
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from timeframes import TIMEFRAMES, timeframe_name
+
+Candidate = namedtuple("Candidate", "symbol direction trigger ratio size average high low time")
+
+FIELDS = ("time", "open", "high", "low", "close")
+
+
+def universe(mt5, group=None):
+    # Names of the terminal's symbols, optionally filtered with a symbols_get group pattern ("*USD*,!*BTC*")
+    infos = mt5.symbols_get(group=group) if group else mt5.symbols_get()
+    return [info.name for info in infos or ()]
+
+
+def resolve_symbols(mt5, symbols):
+    # A settings "symbols" entry: a list of names, or a group pattern string ("*" for the whole universe)
+    return universe(mt5, None if symbols == "*" else symbols) if isinstance(symbols, str) else list(symbols)
+
+
+class UniverseWindow:
+    # The last `lookback` closed bars plus the signal candle for every symbol, held as (symbol x bar) arrays so the
+    # big-candle check runs over the whole universe in one vectorized pass. Rows are filled per symbol, from the
+    # terminal (load) or from bars a BarCloseScheduler callback already has (set); a row without enough history is
+    # left out of the scan until it gets some.
+    def __init__(self, symbols, timeframe, lookback=5):
+        self.symbols = list(symbols)
+        self.index = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.timeframe = TIMEFRAMES[timeframe_name(timeframe)]
+        self.lookback = lookback
+        shape = (len(self.symbols), lookback + 1)
+        self.time = np.zeros(shape, dtype=np.int64)
+        self.open = np.zeros(shape)
+        self.high = np.zeros(shape)
+        self.low = np.zeros(shape)
+        self.close = np.zeros(shape)
+        self.ready = np.zeros(len(self.symbols), dtype=bool)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def set(self, symbol, rates):
+        # rates: bars oldest first, the last being the signal candle; only the newest lookback + 1 are kept
+        i = self.index[symbol]
+        width = self.lookback + 1
+        if rates is None or len(rates) < width:
+            self.ready[i] = False
+            return False
+        rates = rates[-width:]
+        for name in FIELDS:
+            getattr(self, name)[i] = rates[name]
+        self.ready[i] = True
+        return True
+
+    def load(self, mt5, start_pos=1):
+        # One copy_rates_from_pos per symbol (the terminal has no batch call); start_pos=1 leaves out the forming
+        # bar, 0 makes it the signal candle. Returns how many rows have enough history.
+        for symbol in self.symbols:
+            self.set(symbol, mt5.copy_rates_from_pos(symbol, self.timeframe, start_pos, self.lookback + 1))
+        return int(self.ready.sum())
+
+    def scan(self, multiple=1.0, fraction=0.4, direction=None, symbols=None, since=None, limit=None):
+        # Candidates whose signal candle's range is at least `multiple` times the average of the `lookback` before
+        # it, best ratio first. direction None takes each symbol's from the candle before the signal candle, as
+        # CandleRangeState.last_direction does; "BUY"/"SELL" forces it. The trigger sits `fraction` of the candle
+        # into it from the low (BUY) or the high (SELL), as candle_state.trigger_level. `symbols` restricts the
+        # scan to those rows and `since` to signal candles opened at or after that time.
+        ranges = self.high - self.low
+        average = ranges[:, :-1].mean(axis=1)
+        size = ranges[:, -1]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratio = size / average
+        hit = self.ready & (average > 0) & (ratio >= multiple)
+        if symbols is not None:
+            rows = np.zeros(len(self.symbols), dtype=bool)
+            rows[[self.index[symbol] for symbol in symbols]] = True
+            hit &= rows
+        if since is not None:
+            hit &= self.time[:, -1] >= since
+        if direction is None:
+            buy = self.close[:, -2] > self.open[:, -2]
+        else:
+            buy = np.full(len(self.symbols), direction == "BUY")
+        trigger = np.where(buy, self.low[:, -1] + fraction * size, self.high[:, -1] - fraction * size)
+
+        rows = np.nonzero(hit)[0]
+        rows = rows[np.argsort(-ratio[rows], kind="stable")][:limit]
+        columns = (trigger[rows], ratio[rows], size[rows], average[rows], self.high[rows, -1], self.low[rows, -1],
+                   self.time[rows, -1])
+        return [Candidate(self.symbols[i], "BUY" if is_buy else "SELL", *values)
+                for i, is_buy, *values in zip(rows.tolist(), buy[rows].tolist(), *(c.tolist() for c in columns))]
+
+
+def synthetic_window(count, lookback=5, seed=1):
+    # Random bars for `count` made-up symbols, for timing the scan without a terminal
+    rng = np.random.default_rng(seed)
+    window = UniverseWindow([f"SYM{i:04d}" for i in range(count)], "M1", lookback)
+    shape = window.open.shape
+    window.time[:] = 60 * np.arange(shape[1])
+    window.open[:] = 1 + rng.random(shape)
+    window.close[:] = window.open + rng.normal(0, 0.001, shape)
+    wick = np.abs(rng.normal(0, 0.001, shape)) * np.where(rng.random(shape) < 0.05, 5.0, 1.0)
+    window.high[:] = np.maximum(window.open, window.close) + wick
+    window.low[:] = np.minimum(window.open, window.close) - wick
+    window.ready[:] = True
+    return window
+
+
+def bench(count, repeat, multiple):
+    window = synthetic_window(count)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        candidates = window.scan(multiple)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    print(f"{count} symbols: {len(candidates)} candidates, scan median {timings[len(timings) // 2] * 1000:.3f} ms, "
+          f"best {timings[0] * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank the big-candle signal across the terminal's symbols")
+    parser.add_argument("--group", default="*", help='symbols_get group pattern, e.g. "*USD*" (default: all)')
+    parser.add_argument("--symbols", nargs="+", help="scan these instead of a group")
+    parser.add_argument("--timeframe", default="M1")
+    parser.add_argument("--lookback", type=int, default=5, help="closed candles averaged before the signal candle")
+    parser.add_argument("--multiple", type=float, default=1.0, help="signal candle range / average range")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--bench", type=int, metavar="N", help="time the scan on N synthetic symbols instead")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bench, args.repeat, args.multiple)
+        return 0
+
+    from broker import mt5
+
+    if not mt5.initialize():
+        print("MT5 initialization failed")
+        return 1
+    window = UniverseWindow(resolve_symbols(mt5, args.symbols or args.group), args.timeframe, args.lookback)
+    started = time.perf_counter()
+    loaded = window.load(mt5)
+    fetched = time.perf_counter()
+    candidates = window.scan(args.multiple, limit=args.top)
+    scanned = time.perf_counter()
+    for candidate in candidates:
+        print(f"{candidate.symbol:<12}{candidate.direction:<5} ratio {candidate.ratio:6.2f}  trigger {candidate.trigger}")
+    print(f"{loaded}/{len(window)} symbols with history: fetch {(fetched - started) * 1000:.1f} ms, "
+          f"scan {(scanned - fetched) * 1000:.3f} ms")
+    mt5.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,482 @@
+import argparse
+import atexit
+import logging
+import os
+import pickle
+import struct
+import sys
+import time
+from collections import deque, namedtuple
+from datetime import datetime
+
+import numpy as np
+
+from timeframes import RATES_DTYPE
+
+# Session log: an append-only binary capture of everything a live loop asked the terminal and got back, plus what
+# it decided (config, signals, triggers), so `python session_log.py replay <log>` can push the same inputs through
+# the current strategy code at full speed and show where it parts ways with what happened live.
+# Record SESSION_LOG=logs/sessions python child.py EURUSDm   (or runner.py; master.py passes the variable on)
+
+MAGIC = b"MT5SESSION1\n"
+_HEADER = struct.Struct("<BIdI")  # kind, key id, clock time of the call, payload length
+_TICK = struct.Struct("<qdddqqqd")  # time bid ask last volume time_msc flags volume_real
+NONE = 0xFFFFFFFF  # payload length of a call that returned None
+
+KEY, CONSTANTS, RATES, TICK, OBJECT, REPEAT, NOTE = range(7)
+
+# Terminal calls whose results are captured; anything else (constants, initialize, shutdown) passes straight through
+RATES_CALLS = ("copy_rates_from_pos", "copy_rates_from", "copy_rates_range")
+OBJECT_CALLS = ("symbol_info", "symbols_get", "positions_get", "positions_total", "orders_get", "history_deals_get",
+                "account_info")
+ORDER_FIELDS = ("action", "type", "volume", "price", "sl", "tp", "position")
+
+Record = namedtuple("Record", "kind key time payload")
+Note = namedtuple("Note", "time kind symbol value")
+
+logger = logging.getLogger("session_log")
+
+_sink = None  # where note() goes: the recorder of this process, or the replay terminal
+
+
+class LogExhausted(Exception):
+    pass
+
+
+def note(kind, symbol, value=None):
+    # A decision of the live loop (config, signal, trigger...), kept next to the terminal calls that led to it
+    if _sink is not None:
+        _sink.note(kind, symbol, value)
+
+
+def _plain(value):
+    # MetaTrader5's result types only unpickle where the package is installed: keep them as (name, fields, values)
+    if hasattr(value, "_asdict"):
+        fields = value._asdict()
+        return ("__tuple__", type(value).__name__, tuple(fields), tuple(_plain(v) for v in fields.values()))
+    if isinstance(value, (tuple, list)):
+        return type(value)(_plain(v) for v in value)
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    return value
+
+
+_TUPLE_TYPES = {}
+
+
+def _rebuild(value):
+    if isinstance(value, tuple) and len(value) == 4 and value[0] == "__tuple__":
+        _, name, fields, values = value
+        cls = _TUPLE_TYPES.get((name, fields))
+        if cls is None:
+            cls = _TUPLE_TYPES[(name, fields)] = namedtuple(name, fields)
+        return cls(*(_rebuild(v) for v in values))
+    if isinstance(value, (tuple, list)):
+        return type(value)(_rebuild(v) for v in value)
+    if isinstance(value, dict):
+        return {k: _rebuild(v) for k, v in value.items()}
+    return value
+
+
+class SessionRecorder:
+    # Drop-in for the mt5 module (like tick_feed.SharedTicks) that appends every data call's result to a session
+    # log: rates as raw RATES_DTYPE bytes, ticks as one packed struct, anything else pickled, and written as a
+    # one-byte REPEAT when it equals that call's previous answer (positions_get() of a flat book every cycle).
+    # Records collect in memory and reach the file every `flush_bytes` or `flush_interval` seconds, so a watched
+    # tick costs a struct pack and a bytearray append.
+    def __init__(self, mt5, path, flush_bytes=1 << 16, flush_interval=1.0, clock=time):
+        self.mt5 = mt5
+        self.clock = clock  # calls are stamped with the loop's clock, which the replay then runs on
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "wb")
+        self.buffer = bytearray(MAGIC)
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.flushed = time.monotonic()
+        self.keys = {}
+        self.last = {}
+        base = mt5
+        while hasattr(base, "mt5"):
+            base = base.mt5  # under tick_feed.SharedTicks: the constants live on the module it wraps
+        constants = {name: getattr(base, name) for name in dir(base)
+                     if name.isupper() and isinstance(getattr(base, name), (int, float, str))}
+        self._append(CONSTANTS, 0, self.clock.time(), pickle.dumps(constants))
+        for names, record in ((RATES_CALLS, self._rates), (OBJECT_CALLS, self._object)):
+            for name in names:
+                if hasattr(mt5, name):
+                    setattr(self, name, self._wrap(name, record))
+        atexit.register(self.close)
+
+    def __getattr__(self, name):
+        return getattr(self.mt5, name)
+
+    def _key(self, key):
+        key_id = self.keys.get(key)
+        if key_id is None:
+            key_id = self.keys[key] = len(self.keys) + 1
+            self._append(KEY, key_id, 0.0, pickle.dumps(key))
+        return key_id
+
+    def _append(self, kind, key_id, t, payload):
+        if payload is None:
+            self.buffer += _HEADER.pack(kind, key_id, t, NONE)
+        else:
+            self.buffer += _HEADER.pack(kind, key_id, t, len(payload))
+            self.buffer += payload
+        if len(self.buffer) >= self.flush_bytes or time.monotonic() - self.flushed >= self.flush_interval:
+            self.flush()
+
+    def _wrap(self, name, record):
+        call = getattr(self.mt5, name)
+
+        def recorded(*args, **kwargs):
+            t = self.clock.time()
+            result = call(*args, **kwargs)
+            record(self._key((name, args, tuple(sorted(kwargs.items())))), t, result)
+            return result
+        recorded.__name__ = name
+        return recorded
+
+    def _rates(self, key_id, t, rates):
+        self._append(RATES, key_id, t, None if rates is None else np.ascontiguousarray(rates, dtype=RATES_DTYPE).tobytes())
+
+    def _object(self, key_id, t, result):
+        payload = pickle.dumps(_plain(result), protocol=pickle.HIGHEST_PROTOCOL)
+        if self.last.get(key_id) == payload:
+            self._append(REPEAT, key_id, t, b"")
+        else:
+            self.last[key_id] = payload
+            self._append(OBJECT, key_id, t, payload)
+
+    def symbol_info_tick(self, symbol):
+        t = self.clock.time()
+        tick = self.mt5.symbol_info_tick(symbol)
+        key_id = self.keys.get(("symbol_info_tick", symbol)) or self._key(("symbol_info_tick", symbol))
+        self._append(TICK, key_id, t, None if tick is None else _TICK.pack(
+            tick.time, tick.bid, tick.ask, tick.last, tick.volume, tick.time_msc, tick.flags, tick.volume_real))
+        return tick
+
+    def order_send(self, request):
+        t = self.clock.time()
+        result = self.mt5.order_send(request)
+        self._append(OBJECT, self._key(("order_send", request.get("symbol"))), t,
+                     pickle.dumps((_plain(request), _plain(result)), protocol=pickle.HIGHEST_PROTOCOL))
+        return result
+
+    def note(self, kind, symbol, value=None):
+        self._append(NOTE, 0, self.clock.time(), pickle.dumps((kind, symbol, _plain(value)), protocol=pickle.HIGHEST_PROTOCOL))
+
+    def flush(self):
+        if self.file is not None and self.buffer:
+            self.file.write(self.buffer)
+            self.file.flush()
+            self.buffer.clear()
+        self.flushed = time.monotonic()
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+
+def from_env(mt5, name, clock=time):
+    # SESSION_LOG=<dir>: record this process to <dir>/<name>-<YYYYmmdd-HHMMSS>-<pid>.bin
+    global _sink
+    directory = os.environ.get("SESSION_LOG")
+    if not directory:
+        return mt5
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    _sink = SessionRecorder(mt5, os.path.join(directory, f"{name}-{stamp}-{os.getpid()}.bin"), clock=clock)
+    return _sink
+
+
+def read_log(path):
+    # (constants, [Record...], {key id: key}) of a session log; a record cut short by a crash ends the read
+    with open(path, "rb") as file:
+        data = file.read()
+    if not data.startswith(MAGIC):
+        raise ValueError(f"{path} is not a session log")
+    constants, records, keys = {}, [], {}
+    at, end = len(MAGIC), len(data)
+    while at + _HEADER.size <= end:
+        kind, key_id, t, length = _HEADER.unpack_from(data, at)
+        at += _HEADER.size
+        if length == NONE:
+            payload = None
+        else:
+            if at + length > end:
+                break
+            payload = data[at:at + length]
+            at += length
+        if kind == KEY:
+            keys[key_id] = pickle.loads(payload)
+        elif kind == CONSTANTS:
+            constants = pickle.loads(payload)
+        else:
+            records.append(Record(kind, key_id, t, payload))
+    return constants, records, keys
+
+
+def _decode(kind, payload):
+    if payload is None:
+        return None
+    if kind == RATES:
+        return np.frombuffer(payload, dtype=RATES_DTYPE).copy()
+    if kind == TICK:
+        return _Tick(*_TICK.unpack(payload))
+    return _rebuild(pickle.loads(payload))
+
+
+_Tick = namedtuple("Tick", "time bid ask last volume time_msc flags volume_real")
+
+
+class ReplayTerminal:
+    # Stands in for the mt5 module during a replay: each call is answered with the next recorded answer to the same
+    # call (method and arguments) and the clock jumps to the time that answer was taken; sleep() only moves the
+    # clock (the replayed loop is given this terminal as its clock). Unchanged code asks exactly what was asked live and gets the same answers. Code that diverges
+    # gets the newest answer taken at or before its clock, so a symbol armed later than live sees current prices.
+    # Orders are not executed: order_send() returns the recorded result and notes any field of the request that
+    # differs from the one sent live. LogExhausted ends the replay at the end of the log.
+    def __init__(self, path):
+        constants, records, keys = read_log(path)
+        for name, value in constants.items():
+            setattr(self, name, value)
+        self.queues = {}
+        self.recorded = []  # Notes written live
+        self.replayed = []  # Notes written by this replay
+        self.divergences = []  # (time, symbol, field, live value, replay value) of order requests
+        self.orders = 0
+        self.calls = 0
+        last = {}
+        for record in records:
+            if record.kind == NOTE:
+                kind, symbol, value = pickle.loads(record.payload)
+                self.recorded.append(Note(record.time, kind, symbol, _rebuild(value)))
+                continue
+            kind, payload = record.kind, record.payload
+            if kind == REPEAT:
+                kind, payload = last[record.key]
+            elif kind == OBJECT:
+                last[record.key] = (kind, payload)
+            self.queues.setdefault(keys[record.key], deque()).append((record.time, kind, payload))
+        times = [r.time for r in records if r.kind != NOTE]
+        self.start = min(times) if times else 0.0
+        self.end = max(times) if times else 0.0
+        self.now = self.start
+        self.stopped = None
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += max(seconds, 0)
+
+    def initialize(self, *args, **kwargs):
+        return True
+
+    def shutdown(self):
+        return True
+
+    def last_error(self):
+        return (1, "Success")
+
+    def _answer(self, key):
+        if self.now > self.end:
+            raise LogExhausted("reached the end of the log")
+        queue = self.queues.get(key)
+        if not queue:
+            raise LogExhausted(f"{key[0]}{key[1]} was never called live")
+        while len(queue) > 1 and queue[1][0] < self.now:
+            queue.popleft()
+        t, kind, payload = queue.popleft() if len(queue) > 1 else queue[0]
+        self.now = max(self.now, t)
+        self.calls += 1
+        return _decode(kind, payload)
+
+    def __getattr__(self, name):
+        if name in RATES_CALLS or name in OBJECT_CALLS:
+            def call(*args, **kwargs):
+                return self._answer((name, args, tuple(sorted(kwargs.items()))))
+            call.__name__ = name
+            return call
+        raise AttributeError(name)
+
+    def symbol_info_tick(self, symbol):
+        return self._answer(("symbol_info_tick", symbol))
+
+    def order_send(self, request):
+        live_request, result = self._answer(("order_send", request.get("symbol")))
+        self.orders += 1
+        for field in ORDER_FIELDS:
+            if live_request.get(field) != request.get(field):
+                self.divergences.append((self.now, request.get("symbol"), field, live_request.get(field),
+                                         request.get(field)))
+        return result
+
+    def note(self, kind, symbol, value=None):
+        self.replayed.append(Note(self.now, kind, symbol, value))
+
+
+class ReplayWatcher:
+    # config.ConfigWatcher stand-in: hands out the config changes recorded live once the replay clock reaches them
+    def __init__(self, terminal, changes, interval):
+        self.terminal = terminal
+        self.changes = deque(changes)
+        self.interval = interval
+
+    def poll(self):
+        if self.changes and self.changes[0].time <= self.terminal.now:
+            return self.changes.popleft().value
+        return None
+
+
+class ReplayHeartbeat:
+    # Keeps the live loop's sleep cap without touching a heartbeat file
+    stopping = False
+
+    def __init__(self, interval):
+        self.interval = interval
+
+    def beat(self):
+        return False
+
+
+def replay(path, log_path=None):
+    # Runs the loop that made the log (SymbolStrategy.run for child.py, MultiSymbolRunner for runner.py) on its
+    # recorded inputs; returns the ReplayTerminal with what it recorded and what the replay did
+    global _sink
+    from order_router import OrderRouter
+    from position_manager import PositionManager
+    from runner import MultiSymbolRunner
+    from strategy import SymbolStrategy
+    from trade_journal import TradeJournal
+
+    terminal = ReplayTerminal(path)
+    run = next((n for n in terminal.recorded if n.kind == "run"), None)
+    if run is None:
+        raise ValueError(f"{path} has no recorded run: the loop never started")
+    configs = {}
+    for n in terminal.recorded:
+        if n.time > run.time:
+            break
+        if n.kind == "config":
+            configs[n.symbol] = n.value
+    changes = [n for n in terminal.recorded if n.kind == "changes"]
+
+    # Strategy logs go to log_path (or nowhere) rather than the live logs/<symbol>.log
+    handler = logging.FileHandler(log_path) if log_path else logging.NullHandler()
+    handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+    for symbol in set(configs) | {symbol for n in changes for symbol in n.value}:
+        strategy_logger = logging.getLogger(f"strategy.{symbol}")
+        strategy_logger.handlers[:] = [handler]
+        strategy_logger.setLevel(logging.INFO)
+        strategy_logger.propagate = False
+
+    journal = TradeJournal(":memory:")
+    _sink = terminal
+    try:
+        params = run.value
+        watcher = ReplayWatcher(terminal, changes, params["watcher"]) if params.get("watcher") else None
+        if params.get("runner"):
+            # As runner.build_strategies: one router and one position manager for every symbol
+            router = OrderRouter(terminal, clock=terminal)
+            manager = PositionManager(terminal, router, journal=journal)
+            strategies = [SymbolStrategy.from_config(terminal, cfg, router=router, journal=journal, manager=manager)
+                          for cfg in configs.values()]
+            MultiSymbolRunner(terminal, strategies, poll_seconds=params["poll_seconds"], watcher=watcher,
+                              clock=terminal).run()
+        else:
+            strategy = SymbolStrategy.from_config(terminal, configs[run.symbol], journal=journal, clock=terminal)
+            heartbeat = ReplayHeartbeat(params["heartbeat"]) if params.get("heartbeat") else None
+            strategy.run(watcher, heartbeat)
+    except LogExhausted as error:
+        terminal.stopped = str(error)
+    finally:
+        _sink = None
+    return terminal
+
+
+def compare(terminal, kinds=("signal", "trigger")):
+    # First differences between the live and replayed decisions, per symbol: [(symbol, index, live, replay)]
+    differences = []
+    symbols = {n.symbol for n in terminal.recorded + terminal.replayed if n.kind in kinds}
+    for symbol in sorted(symbols, key=str):
+        live = [n for n in terminal.recorded if n.kind in kinds and n.symbol == symbol]
+        again = [n for n in terminal.replayed if n.kind in kinds and n.symbol == symbol]
+        for i in range(max(len(live), len(again))):
+            a = live[i] if i < len(live) else None
+            b = again[i] if i < len(again) else None
+            if a is None or b is None or (a.kind, a.value) != (b.kind, b.value):
+                differences.append((symbol, i, a, b))
+                break
+    return differences
+
+
+def _describe(n):
+    if n is None:
+        return "nothing"
+    return f"{n.kind} {n.value} at {datetime.fromtimestamp(n.time).strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+def dump(path, limit=None):
+    constants, records, keys = read_log(path)
+    for i, record in enumerate(records):
+        if limit is not None and i >= limit:
+            break
+        stamp = datetime.fromtimestamp(record.time).strftime("%H:%M:%S.%f")[:-3]
+        if record.kind == NOTE:
+            kind, symbol, value = pickle.loads(record.payload)
+            print(f"{stamp} note {kind} {symbol} {_rebuild(value)}")
+        elif record.kind == REPEAT:
+            print(f"{stamp} {keys[record.key]} (same as before)")
+        else:
+            value = _decode(record.kind, record.payload)
+            shown = f"{len(value)} rows" if isinstance(value, np.ndarray) else value
+            print(f"{stamp} {keys[record.key]} -> {shown}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay or inspect a session log written with SESSION_LOG set")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("replay", help="run the strategy code on the recorded inputs and compare decisions")
+    run.add_argument("log")
+    run.add_argument("--log-file", help="write the replayed strategy's log here")
+    show = commands.add_parser("dump", help="print the recorded calls and notes")
+    show.add_argument("log")
+    show.add_argument("--limit", type=int)
+    args = parser.parse_args()
+
+    if args.command == "dump":
+        dump(args.log, args.limit)
+        return 0
+
+    started = time.perf_counter()
+    terminal = replay(args.log, args.log_file)
+    elapsed = time.perf_counter() - started
+    span = terminal.now - terminal.start
+    print(f"Replayed {span / 3600:.1f}h of {(terminal.end - terminal.start) / 3600:.1f}h session in {elapsed:.2f}s: "
+          f"{terminal.calls} terminal answers, {terminal.orders} orders")
+    if terminal.stopped:
+        print(f"Stopped at {datetime.fromtimestamp(terminal.now).strftime('%Y-%m-%d %H:%M:%S')}: {terminal.stopped}")
+    for kind in ("signal", "trigger"):
+        live = sum(n.kind == kind for n in terminal.recorded)
+        again = sum(n.kind == kind for n in terminal.replayed)
+        print(f"{kind + 's':<9} live {live:>6}  replay {again:>6}")
+    differences = compare(terminal)
+    for symbol, i, live, again in differences:
+        print(f"{symbol}: decision #{i + 1} differs: live {_describe(live)}, replay {_describe(again)}")
+    for t, symbol, field, live, again in terminal.divergences[:20]:
+        print(f"{datetime.fromtimestamp(t).strftime('%Y-%m-%d %H:%M:%S')} {symbol} order {field}: live {live}, replay {again}")
+    if not differences and not terminal.divergences:
+        print("No divergence: the replay made the same decisions and sent the same orders")
+    return 1 if differences or terminal.divergences else 0
+
+
+if __name__ == "__main__":
+    # Through the importable module, so the strategy code's note() reports to this replay
+    import session_log
+    sys.exit(session_log.main())
@@ -0,0 +1,71 @@
+import argparse
+import logging
+import statistics
+import sys
+import time
+
+from config import load_config, symbol_dicts
+from master import PYTHON_EXECUTABLE, Supervisor, Worker
+
+# Time to first signal evaluation per symbol: from launching (cold) or assigning (warm pool) a worker to its first
+# heartbeat, which child.py sends after its first cycle has looked at the symbol's closed bars.
+# Try it on the simulator: MT5_BACKEND=sim python startup_bench.py --python python
+
+
+def wait_until(supervisor, done, timeout, poll):
+    deadline = time.monotonic() + timeout
+    while not done():
+        if time.monotonic() > deadline:
+            raise TimeoutError("workers did not come up in time")
+        supervisor.step()
+        time.sleep(poll)
+
+
+def cold_start(symbols, python, max_starting, timeout, poll):
+    supervisor = Supervisor(symbols, python=python, max_starting=max_starting, stagger=0)
+    started = time.monotonic()
+    try:
+        wait_until(supervisor, lambda: all(w.state == "running" for w in supervisor.workers.values()), timeout, poll)
+        return {symbol: worker.up_after for symbol, worker in supervisor.workers.items()}, time.monotonic() - started
+    finally:
+        supervisor.shutdown()
+
+
+def warm_start(symbols, python, max_starting, timeout, poll):
+    supervisor = Supervisor([], python=python, max_starting=max_starting, stagger=0, pool_size=len(symbols))
+    try:
+        wait_until(supervisor, lambda: len(supervisor.spares) == len(symbols) and all(s.warm for s in supervisor.spares),
+                   timeout, poll)
+        started = time.monotonic()
+        for symbol in symbols:
+            supervisor.workers[symbol] = Worker(symbol)
+        wait_until(supervisor, lambda: all(w.state == "running" for w in supervisor.workers.values()), timeout, poll)
+        return {symbol: worker.up_after for symbol, worker in supervisor.workers.items()}, time.monotonic() - started
+    finally:
+        supervisor.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold child.py starts with warm-pool assignment")
+    parser.add_argument("--symbols", nargs="+", help="default: the enabled symbols in config.yaml")
+    parser.add_argument("--python", default=PYTHON_EXECUTABLE, help="interpreter for the workers")
+    parser.add_argument("--max-starting", type=int, default=4, help="workers allowed to be initializing at once")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--poll", type=float, default=0.002, help="supervisor poll interval, the timing resolution")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    symbols = args.symbols or list(symbol_dicts(load_config()))
+    cold, cold_total = cold_start(symbols, args.python, args.max_starting, args.timeout, args.poll)
+    warm, warm_total = warm_start(symbols, args.python, args.max_starting, args.timeout, args.poll)
+
+    print(f"{'symbol':<12}{'cold ms':>10}{'warm ms':>10}")
+    for symbol in symbols:
+        print(f"{symbol:<12}{cold[symbol] * 1000:>10.0f}{warm[symbol] * 1000:>10.0f}")
+    print(f"{'median':<12}{statistics.median(cold.values()) * 1000:>10.0f}{statistics.median(warm.values()) * 1000:>10.0f}")
+    print(f"All {len(symbols)} symbols up: cold {cold_total:.2f}s (max {args.max_starting} initializing at once), "
+          f"warm pool {warm_total:.3f}s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
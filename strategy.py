@@ -0,0 +1,291 @@
+import logging
+import os
+import time
+from datetime import datetime
+
+import pytz
+
+from bar_aggregator import AggregatedFeed
+from bar_scheduler import BarCloseScheduler
+from candle_state import CandleRangeState, bar_direction, trigger_level
+from config import SymbolConfig
+from metrics import REGISTRY, timed
+from order_router import OrderRouter
+from position_manager import PositionManager
+from session_log import note
+from timeframes import TIMEFRAMES, timeframe_name
+from trade_journal import get_journal
+
+# Timezone
+ist = pytz.timezone("Asia/Kolkata")
+
+
+def setup_logger(symbol):
+    # One log file per symbol, as child.py always had, but usable by many symbols in one process
+    if not os.path.exists("logs"):
+        os.makedirs("logs")
+    logger = logging.getLogger(f"strategy.{symbol}")
+    if not logger.handlers:
+        handler = logging.FileHandler(os.path.join("logs", f"{symbol}.log"))
+        handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+class SymbolStrategy:
+    # The big-candle strategy for one symbol, as run by child.py: signal on candle close,
+    # watch the bid for the 40% trigger, then close opposite trades and enter.
+    # `clock` paces the loop (broker.clock: the simulator's under MT5_BACKEND=sim); a shared router brings its own.
+    def __init__(self, mt5, symbol, lot_size, profit_target, sl_trailing_trigger, sl_trailing_adjustment,
+                 timeframe_str, interval_minutes, sl, tp, router=None, journal=None, manager=None, clock=time):
+        self.mt5 = mt5
+        self.symbol = symbol
+        self.lot_size = lot_size
+        self.profit_target = profit_target
+        self.sl_trailing_trigger = sl_trailing_trigger
+        self.sl_trailing_adjustment = sl_trailing_adjustment
+        self.timeframe_str = timeframe_str
+        self.interval_minutes = interval_minutes
+        self.sl = sl
+        self.tp = tp
+
+        # Map timeframe: any MT5 timeframe (M1 ... H1 ... MN1); an unknown name is an error, not a silent M1
+        self.timeframe = TIMEFRAMES[timeframe_name(timeframe_str)]
+
+        self.logger = setup_logger(symbol)
+        self.router = router or OrderRouter(mt5, clock=clock)
+        self.clock = self.router.clock
+        self.journal = journal or get_journal()
+        # Profit target and trailing stop for this symbol's positions; a runner shares one manager across symbols
+        self.manager = manager or PositionManager(mt5, self.router, journal=self.journal)
+        self.manager.add(symbol, profit_target, sl_trailing_trigger, sl_trailing_adjustment)
+
+        # Ranges of the last 5 closed bars, updated as bars close
+        self.ranges = CandleRangeState(5)
+
+        # Armed trigger while watching price
+        self.trigger_point = None
+        self.trade_type = None
+        self.signal_found_time = None
+        self.last_log_time = 0
+        self.armed_at = None
+
+    @classmethod
+    def from_config(cls, mt5, cfg, **kwargs):
+        # From a config.SymbolConfig
+        return cls(mt5, cfg.symbol, cfg.lot_size, cfg.profit_target, cfg.sl_trailing_trigger, cfg.sl_trailing_adjustment,
+                   cfg.timeframe, cfg.interval_minutes, cfg.sl, cfg.tp, **kwargs)
+
+    def apply_config(self, cfg):
+        # Hot reload: take new parameters in place, keeping the connection, router and armed trigger.
+        # Returns True when the timeframe changed, so the caller can move the bar-close subscription.
+        self.lot_size = cfg.lot_size
+        self.profit_target = cfg.profit_target
+        self.sl_trailing_trigger = cfg.sl_trailing_trigger
+        self.sl_trailing_adjustment = cfg.sl_trailing_adjustment
+        self.interval_minutes = cfg.interval_minutes
+        self.sl = cfg.sl
+        self.tp = cfg.tp
+        self.manager.add(self.symbol, cfg.profit_target, cfg.sl_trailing_trigger, cfg.sl_trailing_adjustment)
+        timeframe = TIMEFRAMES[timeframe_name(cfg.timeframe)]
+        changed = timeframe != self.timeframe
+        if changed:
+            self.timeframe_str, self.timeframe = cfg.timeframe, timeframe
+            self.ranges = CandleRangeState(5)
+        self.logger.info("Config reloaded")
+        self.log_settings()
+        return changed
+
+    def log_settings(self):
+        self.logger.info(f"symbol: {self.symbol}, lot_size: {self.lot_size}, profit_target: {self.profit_target}, sl_trailing_trigger: {self.sl_trailing_trigger}, sl_trailing_adjustment: {self.sl_trailing_adjustment}, timeframe_str: {self.timeframe_str}, interval_minutes: {self.interval_minutes}, sl: {self.sl}, tp: {self.tp}")
+        note("config", self.symbol, self.config())
+
+    def config(self):
+        # Current parameters as a config.SymbolConfig
+        return SymbolConfig(self.symbol, self.lot_size, self.profit_target, self.sl_trailing_trigger,
+                            self.sl_trailing_adjustment, self.timeframe_str, self.interval_minutes, self.sl, self.tp, True)
+
+    def log_trade(self, action, order_type, price, volume, result, retcode=None, ticket=None):
+        self.journal.record(self.symbol, action, order_type, price, volume, result, retcode, ticket)
+
+    @timed("get_current_price")
+    def get_current_price(self):
+        tick = self.mt5.symbol_info_tick(self.symbol)
+        return tick.bid if tick else None
+
+    def get_open_trade_type(self):
+        positions = self.mt5.positions_get(symbol=self.symbol)
+        if not positions:
+            return None
+        return 'BUY' if positions[0].type == self.mt5.ORDER_TYPE_BUY else 'SELL'
+
+    @timed("close_all_trades")
+    def close_all_trades(self, positions=None, tick=None):
+        # Closes are sent as one batch priced from a single tick snapshot; returns the tickets sent
+        mt5 = self.mt5
+        if positions is None:
+            tick, positions = self.router.snapshot(self.symbol)
+        if not positions:
+            return set()
+
+        self.logger.info(f"Attempting to close all trades for {self.symbol}. Total open trades: {len(positions)}")
+
+        for pos, price, result in self.router.close_positions(self.symbol, positions, tick):
+            order_type = "BUY" if pos.type == mt5.ORDER_TYPE_BUY else "SELL"
+            if result.retcode == mt5.TRADE_RETCODE_DONE:
+                self.logger.info(f"Closed trade {pos.ticket} for {self.symbol}")
+                self.log_trade("Close", order_type, price, pos.volume, "Success", result.retcode, pos.ticket)
+            else:
+                self.logger.error(f"Failed to close trade {pos.ticket}, retcode: {result.retcode}")
+                self.log_trade("Close", order_type, price, pos.volume, "Failed", result.retcode, pos.ticket)
+        return {pos.ticket for pos in positions}
+
+    @timed("place_trade")
+    def place_trade(self, trade_type, entry_price):
+        mt5 = self.mt5
+        tick, positions = self.router.snapshot(self.symbol)
+        if positions:
+            self.logger.info(f"Detected {len(positions)} open trades for {self.symbol} before placing new {trade_type} trade. Closing all trades first.")
+            tickets = self.close_all_trades(positions, tick)
+
+            if self.router.confirm_closed(self.symbol, tickets):
+                self.logger.error(f"Cannot place new {trade_type} trade - trades failed to close.")
+                return False
+            # The closes took a broker round trip, so price the entry off a fresh (local) tick read
+            tick = mt5.symbol_info_tick(self.symbol)
+
+        price = tick.ask if trade_type == "BUY" else tick.bid
+        sl = entry_price - self.sl if trade_type == "BUY" else entry_price + self.sl
+        tp = entry_price + self.tp if trade_type == "BUY" else entry_price - self.tp
+
+        self.logger.info(f"Placing {trade_type} trade for {self.symbol} at {price}")
+
+        # The router puts SL/TP on the symbol's tick grid and outside its stops level
+        request, result = self.router.open_position(self.symbol, trade_type, self.lot_size, price, sl, tp,
+                                                    f"{trade_type} Entry", tick)
+        if result is None:
+            # The market is already past the SL/TP: the signal is spent, so skip it rather than retry every tick
+            self.logger.error(f"Skipped {trade_type} entry for {self.symbol}: SL {sl} / TP {tp} already on the wrong "
+                              f"side of bid {tick.bid} / ask {tick.ask}")
+            self.log_trade("Open", trade_type, price, self.lot_size, "Refused")
+            self.trigger_point = self.trade_type = None
+            return False
+        self.logger.info(f"SL: {request['sl']} | TP: {request['tp']}")
+        if result.retcode == mt5.TRADE_RETCODE_DONE:
+            self.logger.info(f"{trade_type} trade placed for {self.symbol} at {price}")
+            REGISTRY.record_slippage(self.symbol, trade_type, entry_price, result.price or price)
+            self.log_trade("Open", trade_type, price, self.lot_size, "Success", result.retcode, result.order)
+            return True
+        else:
+            self.logger.error(f"Failed to place {trade_type} trade for {self.symbol}, retcode: {result.retcode}")
+            self.log_trade("Open", trade_type, price, self.lot_size, "Failed", result.retcode)
+            return False
+
+    @timed("check_entry_condition")
+    def check_entry_condition(self, rates=None):
+        if rates is None:
+            rates = self.mt5.copy_rates_from_pos(self.symbol, self.timeframe, 1, 6)  # last 6 closed candles
+        if rates is None or len(rates) < 2:
+            return None, None
+        self.ranges.update(rates[:-1])
+        if not self.ranges.ready:
+            return None, None
+
+        last = rates[-1]
+        avg_size = self.ranges.average_range()
+        last_size = float(last['high'] - last['low'])
+
+        trade_type = bar_direction(last)
+        if last_size >= 1.2 * avg_size:
+            trigger_point = trigger_level(float(last['high']), float(last['low']), trade_type)
+            self.logger.info(f"Found signals for {self.symbol} - {trade_type} at {trigger_point}")
+            return trigger_point, trade_type
+        return None, None
+
+    def arm(self, trigger_point, trade_type):
+        self.logger.info(f"Watching price for {self.symbol} {trade_type} entry at {trigger_point}")
+        note("signal", self.symbol, (trade_type, trigger_point))
+        self.trigger_point = trigger_point
+        self.trade_type = trade_type
+        self.last_log_time = self.armed_at = self.clock.time()
+        SingalLogTime = datetime.now(ist).strftime('%Y-%m-%d %H:%M:%S')
+        self.signal_found_time = f"Single was found at {SingalLogTime} for {self.symbol} {trade_type} entry at {trigger_point}"
+
+    @property
+    def armed(self):
+        return self.trigger_point is not None
+
+    @timed("on_price")
+    def on_price(self, price):
+        # One watch_price step; returns True once the trigger is disarmed: the trade was placed, or the entry was
+        # skipped because the market had already run past its SL/TP
+        trigger_point, trade_type = self.trigger_point, self.trade_type
+        if price is not None and ((trade_type == "BUY" and price <= trigger_point) or (trade_type == "SELL" and price >= trigger_point)):
+            note("trigger", self.symbol, (price, trigger_point))
+            if self.place_trade(trade_type, trigger_point):
+                self.logger.info(f'{self.signal_found_time}')
+                REGISTRY.observe("signal_to_fill", self.symbol, self.clock.time() - self.armed_at)
+                self.trigger_point = self.trade_type = None
+                return True
+            if not self.armed:
+                return True
+        current_time = self.clock.time()
+        if current_time - self.last_log_time >= 15:
+            self.logger.info(f"{self.symbol} Current price: {price} and {trigger_point}")
+            self.last_log_time = current_time
+        return False
+
+    @timed("watch_price")
+    def watch_price(self, trigger_point, trade_type):
+        self.arm(trigger_point, trade_type)
+        while not self.on_price(self.get_current_price()):
+            self.clock.sleep(1)
+
+    def on_bar_close(self, symbol, timeframe, closed):
+        # BarCloseScheduler callback: evaluate the bar that just closed, unless a trigger is still being watched
+        if self.armed:
+            return
+        trigger_point, trade_type = self.check_entry_condition(closed)
+        if trigger_point:
+            self.arm(trigger_point, trade_type)
+
+    def run(self, watcher=None, heartbeat=None):
+        # watcher: optional config.ConfigWatcher; edits to this symbol apply between cycles, disabling it stops the loop.
+        # heartbeat: optional heartbeat.Heartbeat, beaten every cycle; the loop returns when the supervisor asks it to stop.
+        scheduler = BarCloseScheduler(AggregatedFeed(self.mt5), clock=self.clock)
+        scheduler.subscribe(self.symbol, self.timeframe, self.on_bar_close)
+        self.router.specs.load([self.symbol])
+        note("run", self.symbol, {"watcher": watcher.interval if watcher else None,
+                                  "heartbeat": heartbeat.interval if heartbeat else None})
+        while True:
+            changes = watcher.poll() if watcher else None
+            if changes:
+                note("changes", None, changes)
+            if changes and self.symbol in changes:
+                cfg = changes[self.symbol]
+                if cfg is None or not cfg.enabled:
+                    self.logger.info(f"{self.symbol} disabled in config, stopping")
+                    return
+                old_timeframe = self.timeframe
+                if self.apply_config(cfg):
+                    scheduler.unsubscribe(self.symbol, old_timeframe)
+                    scheduler.subscribe(self.symbol, self.timeframe, self.on_bar_close)
+            scheduler.run_pending()
+            if self.armed:
+                self.on_price(self.get_current_price())
+            self.manager.update()
+            # Beaten after the cycle, so the first beat also means the first bars have been evaluated
+            if heartbeat is not None and heartbeat.beat():
+                self.logger.info(f"{self.symbol} asked to stop by the supervisor")
+                return
+            delay = scheduler.delay()
+            if watcher is not None:
+                delay = min(delay, watcher.interval)
+            if heartbeat is not None:
+                delay = min(delay, heartbeat.interval)
+            if self.armed or self.manager.active:
+                self.clock.sleep(min(1, delay))
+            else:
+                self.clock.sleep(delay)
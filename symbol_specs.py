@@ -0,0 +1,228 @@
+import argparse
+import json
+import logging
+import math
+import time
+from collections import namedtuple
+from types import SimpleNamespace
+
+SymbolSpec = namedtuple("SymbolSpec", "name point digits tick_size tick_value contract_size volume_min volume_max "
+                                      "volume_step volume_digits stops_level")
+
+# symbol_info fields kept in a spec snapshot: what SymbolSpec needs plus the contract size and quote currency that
+# offline P&L and margin accounting (portfolio_backtest.py) depend on
+SNAPSHOT_FIELDS = ("point", "digits", "trade_tick_size", "trade_tick_value", "trade_contract_size", "volume_min",
+                   "volume_max", "volume_step", "trade_stops_level", "currency_profit", "spread")
+
+# Rejections that mean the cached spec may be out of date: the symbol is re-read before its next order
+SPEC_RETCODES = ("TRADE_RETCODE_INVALID_VOLUME", "TRADE_RETCODE_INVALID_PRICE", "TRADE_RETCODE_INVALID_STOPS")
+
+logger = logging.getLogger("symbol_specs")
+
+
+def decimals(step):
+    # Decimals that multiples of `step` need (0.01 -> 2, 0.5 -> 1, 1 -> 0)
+    text = f"{step:.10f}".rstrip("0")
+    return len(text) - text.index(".") - 1
+
+
+def spec_from_info(info):
+    tick_size = info.trade_tick_size or info.point
+    return SymbolSpec(info.name, info.point, info.digits, tick_size, info.trade_tick_value, info.trade_contract_size,
+                      info.volume_min, info.volume_max, info.volume_step or info.volume_min,
+                      decimals(info.volume_step or info.volume_min), info.trade_stops_level)
+
+
+def spec_from_snapshot(symbol, fields):
+    # SymbolSpec from a snapshot entry ({field: value} of SNAPSHOT_FIELDS, see take_snapshot)
+    return spec_from_info(SimpleNamespace(name=symbol, **fields))
+
+
+def normalize_price(spec, price, rounding="nearest"):
+    # `price` on the symbol's tick grid; rounding "down"/"up" for levels that must not move towards the market
+    ticks = price / spec.tick_size
+    if rounding == "down":
+        ticks = math.floor(ticks + 1e-7)
+    elif rounding == "up":
+        ticks = math.ceil(ticks - 1e-7)
+    else:
+        ticks = round(ticks)
+    return round(ticks * spec.tick_size, spec.digits)
+
+
+def normalize_volume(spec, volume):
+    # Whole volume steps (rounded down), clamped to the symbol's minimum and maximum
+    steps = math.floor(volume / spec.volume_step + 1e-7)
+    volume = min(max(steps * spec.volume_step, spec.volume_min), spec.volume_max)
+    return round(volume, spec.volume_digits)
+
+
+def normalize_stops(spec, direction, sl, tp, bid, ask):
+    # SL/TP on the tick grid and at least the stops level away from the price they trigger on (bid for buys, ask
+    # for sells, and never less than a tick), rounded away from the market so rounding never pulls them inside it.
+    # 0 stays 0 (no stop). Returns None when a level is already on the wrong side of that price (the SL would be hit
+    # on entry): the entry should be skipped, not sent with its stop moved to the market.
+    distance = max(spec.stops_level * spec.point, spec.tick_size)
+    price = bid if direction == "BUY" else ask
+    below, above = (sl, tp) if direction == "BUY" else (tp, sl)
+    if (below and below >= price) or (above and above <= price):
+        return None
+    if direction == "BUY":
+        sl = normalize_price(spec, min(sl, bid - distance), "down") if sl else sl
+        tp = normalize_price(spec, max(tp, bid + distance), "up") if tp else tp
+    else:
+        sl = normalize_price(spec, max(sl, ask + distance), "up") if sl else sl
+        tp = normalize_price(spec, min(tp, ask - distance), "down") if tp else tp
+    return sl, tp
+
+
+class SymbolSpecs:
+    # Process-wide cache of symbol specs, read in bulk with one symbols_get() so building an order takes no terminal
+    # round trip. A symbol missing from the bulk read costs one symbol_info() the first time it is asked for.
+    # refresh() re-reads everything and replaces changed specs; maybe_refresh() does so every `interval` seconds,
+    # and a spec-related rejection (invalid volume/price/stops) marks that symbol to be re-read before its next use.
+    def __init__(self, mt5, interval=300.0, clock=time):
+        self.mt5 = mt5
+        self.interval = interval
+        self.clock = clock
+        self.specs = {}
+        self.stale = set()
+        self.loaded = None
+        self.retcodes = {getattr(mt5, name) for name in SPEC_RETCODES if hasattr(mt5, name)}
+
+    def load(self, symbols=None):
+        # Bulk read of `symbols` (default: every symbol in the terminal); returns the symbols whose spec changed
+        if symbols is not None:
+            symbols = list(symbols)
+            wanted = set(symbols)
+            infos = self.mt5.symbols_get(group=",".join(symbols)) if symbols else ()
+        else:
+            infos = self.mt5.symbols_get()
+        changed = []
+        for info in infos or ():
+            if symbols is None or info.name in wanted:
+                changed += self._store(spec_from_info(info))
+        for symbol in symbols or ():
+            if symbol not in self.specs:
+                self._read(symbol)
+        self.loaded = self.clock.time()
+        return changed
+
+    def _store(self, spec):
+        old = self.specs.get(spec.name)
+        self.specs[spec.name] = spec
+        self.stale.discard(spec.name)
+        if old is not None and old != spec:
+            logger.info(f"{spec.name} spec changed: {old} -> {spec}")
+            return [spec.name]
+        return []
+
+    def _read(self, symbol):
+        info = self.mt5.symbol_info(symbol)
+        if info is None:
+            return None
+        self._store(spec_from_info(info))
+        return self.specs[symbol]
+
+    def get(self, symbol):
+        spec = self.specs.get(symbol)
+        if spec is None or symbol in self.stale:
+            spec = self._read(symbol) or spec
+        return spec
+
+    def refresh(self):
+        return self.load(list(self.specs)) if self.specs else []
+
+    def maybe_refresh(self):
+        if self.loaded is not None and self.clock.time() - self.loaded >= self.interval:
+            return self.refresh()
+        return []
+
+    def rejected(self, symbol, retcode):
+        # Called with every order result's retcode; a spec-related one gets the symbol re-read
+        if retcode in self.retcodes:
+            self.stale.add(symbol)
+
+    def normalize_request(self, request, tick=None):
+        # Price, volume and SL/TP of an order_send request (in place) on the symbol's grid and outside its stops
+        # level, measured from `tick` (or the request price when there is none). Returns the request, or None when
+        # an entry's SL/TP is on the wrong side of the market and the order should not be sent.
+        spec = self.get(request["symbol"])
+        if spec is None:
+            return request
+        price = request.get("price")
+        if price:
+            request["price"] = normalize_price(spec, price)
+        if "volume" in request:
+            request["volume"] = normalize_volume(spec, request["volume"])
+        if request.get("sl") or request.get("tp"):
+            bid, ask = (tick.bid, tick.ask) if tick is not None else (price, price)
+            if "position" in request and "type" not in request:
+                # SLTP modification: the position is already open, so only put the levels on the tick grid
+                request["sl"] = normalize_price(spec, request["sl"]) if request.get("sl") else request.get("sl", 0.0)
+                request["tp"] = normalize_price(spec, request["tp"]) if request.get("tp") else request.get("tp", 0.0)
+            else:
+                direction = "BUY" if request["type"] == self.mt5.ORDER_TYPE_BUY else "SELL"
+                stops = normalize_stops(spec, direction, request.get("sl", 0.0), request.get("tp", 0.0), bid, ask)
+                if stops is None:
+                    logger.warning(f"{request['symbol']} {direction} refused: SL {request.get('sl')} / TP "
+                                   f"{request.get('tp')} on the wrong side of bid {bid} / ask {ask}")
+                    return None
+                request["sl"], request["tp"] = stops
+        return request
+
+
+def take_snapshot(mt5, symbols=None):
+    # {symbol: {field: value}} of SNAPSHOT_FIELDS, read in one symbols_get() (symbol_info() for any it missed)
+    infos = {info.name: info for info in (mt5.symbols_get(group=",".join(symbols)) if symbols else mt5.symbols_get())
+             or ()}
+    for symbol in symbols or ():
+        if symbol not in infos:
+            info = mt5.symbol_info(symbol)
+            if info is None:
+                logger.warning(f"{symbol}: no symbol_info, left out of the snapshot")
+                continue
+            infos[symbol] = info
+    return {name: {field: getattr(info, field) for field in SNAPSHOT_FIELDS if hasattr(info, field)}
+            for name, info in sorted(infos.items()) if symbols is None or name in symbols}
+
+
+def save_snapshot(snapshot, path):
+    with open(path, "w") as file:
+        json.dump(snapshot, file, indent=2, sort_keys=True)
+
+
+def load_snapshot(path):
+    with open(path) as file:
+        return json.load(file)
+
+
+_specs = None
+
+
+def get_symbol_specs(mt5, clock=time):
+    # Process-wide cache, created on first use
+    global _specs
+    if _specs is None:
+        _specs = SymbolSpecs(mt5, clock=clock)
+    return _specs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the terminal's symbol specs to a JSON snapshot, for offline "
+                                                 "tools such as portfolio_backtest.py --specs")
+    parser.add_argument("path")
+    parser.add_argument("--symbols", nargs="+", help="default: every symbol in the terminal")
+    args = parser.parse_args()
+
+    from broker import mt5
+
+    if not mt5.initialize():
+        parser.exit(1, "MT5 initialization failed\n")
+    snapshot = take_snapshot(mt5, args.symbols)
+    save_snapshot(snapshot, args.path)
+    print(f"{len(snapshot)} symbol specs -> {args.path}")
+
+
+if __name__ == "__main__":
+    main()
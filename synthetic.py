@@ -0,0 +1,119 @@
+import argparse
+import math
+import time
+import zlib
+from collections import namedtuple
+
+import numpy as np
+
+from mt5_sim import SIM_EPOCH, base_price, symbol_defaults
+from tick_backtest import synthesize_ticks
+from timeframes import RATES_DTYPE, timeframe_seconds
+
+# How a made-up market moves. volatility is the per-bar standard deviation of log returns; one bar in
+# 1/big_candle_rate gets wicks big_candle_scale times longer (so the big-candle signal fires); one bar in 1/gap_rate
+# opens gap_size volatilities away from the previous close; missing_rate is the chance a bar is absent; weekends
+# leaves out Saturday and Sunday; spread is in points, varied per bar by a lognormal factor of width spread_jitter.
+MarketModel = namedtuple("MarketModel", "price volatility big_candle_rate big_candle_scale gap_rate gap_size "
+                                        "missing_rate weekends spread spread_jitter point",
+                         defaults=(60000.0, 0.0004, 0.03, 5.0, 0.0, 10.0, 0.0, False, 20, 0.3, 0.01))
+
+WEEK = 7 * 86400
+TRADING_WEEK = 5 * 86400
+
+
+def model_for(symbol, **overrides):
+    # A MarketModel at the symbol's rough price level and tick size (as the simulator would give it)
+    price = base_price(symbol)
+    return MarketModel(price=price, point=symbol_defaults(price, symbol)["point"])._replace(**overrides)
+
+
+def _digits(point):
+    return max(0, int(round(-math.log10(point))))
+
+
+def _trading_times(offsets, weekends):
+    # Seconds of trading time since `start` to seconds of calendar time, skipping Saturday and Sunday when
+    # `weekends` is set (the start is taken as a Monday 00:00)
+    if not weekends:
+        return offsets
+    return offsets // TRADING_WEEK * WEEK + offsets % TRADING_WEEK
+
+
+def synthetic_rates(count, seed=0, timeframe="M1", start=None, model=None):
+    # `count` bars of RATES_DTYPE from a seeded geometric random walk, prices on the model's tick grid
+    model = model or MarketModel()
+    rng = np.random.default_rng(seed)
+    seconds = timeframe_seconds(timeframe)
+    start = SIM_EPOCH if start is None else int(start)
+
+    skipped = rng.geometric(1.0 - model.missing_rate, count) - 1 if model.missing_rate > 0 else 0
+    offsets = seconds * (np.arange(count, dtype=np.int64) + np.cumsum(skipped))
+    returns = rng.normal(0.0, model.volatility, count)
+    jumps = np.where(rng.random(count) < model.gap_rate, rng.normal(0.0, model.gap_size * model.volatility, count), 0.0)
+    jumps[0] = 0.0
+    log_close = math.log(model.price) + np.cumsum(returns + jumps)
+    close = np.exp(log_close)
+    open_ = np.exp(log_close - returns)
+    scale = np.where(rng.random(count) < model.big_candle_rate, model.big_candle_scale, 1.0)
+    upper = np.abs(rng.normal(0.0, model.volatility, count)) * scale
+    lower = np.abs(rng.normal(0.0, model.volatility, count)) * scale
+
+    digits = _digits(model.point)
+    rates = np.zeros(count, dtype=RATES_DTYPE)
+    rates["time"] = start + _trading_times(offsets, model.weekends)
+    rates["open"] = np.round(open_, digits)
+    rates["close"] = np.round(close, digits)
+    rates["high"] = np.round(np.maximum(open_, close) * (1.0 + upper), digits)
+    rates["low"] = np.round(np.minimum(open_, close) * (1.0 - lower), digits)
+    rates["tick_volume"] = rng.integers(20, 400, count)
+    rates["spread"] = np.maximum(1, np.rint(model.spread * rng.lognormal(0.0, model.spread_jitter, count)))
+    return rates
+
+
+def synthetic_universe(symbols, count, seed=0, timeframe="M1", start=None, **overrides):
+    # {symbol: rates}, each symbol at its own price level and with its own stream from `seed`
+    return {symbol: synthetic_rates(count, np.random.SeedSequence([seed, zlib.crc32(symbol.encode())]), timeframe,
+                                    start, model_for(symbol, **overrides))
+            for symbol in symbols}
+
+
+def synthetic_ticks(rates, seed=0, ticks_per_bar=20, model=None, bar_seconds=60):
+    # Bid/ask ticks (tick_backtest.TICK_DTYPE) wandering through each bar's range, ask = bid + the bar's spread
+    model = model or MarketModel()
+    chunks = list(synthesize_ticks(rates, model="random", ticks_per_bar=ticks_per_bar, point=model.point,
+                                   bar_seconds=bar_seconds, seed=seed))
+    return np.concatenate(chunks) if len(chunks) > 1 else chunks[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write seeded synthetic M1 history to a bar_store.py directory "
+                                                 "(for MT5_SIM_DATA, BAR_STORE, the optimizer and the benchmarks)")
+    parser.add_argument("store")
+    parser.add_argument("--symbols", nargs="+", default=["BTCUSDm", "EURUSDm", "XAUUSDm"])
+    parser.add_argument("--days", type=float, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--start", help="ISO date of the first bar (default 2024-01-01)")
+    for name in ("volatility", "big_candle_rate", "big_candle_scale", "gap_rate", "gap_size", "missing_rate",
+                 "spread_jitter"):
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float)
+    parser.add_argument("--spread", type=int, help="points")
+    parser.add_argument("--weekends", action="store_true", help="leave out Saturdays and Sundays")
+    args = parser.parse_args()
+
+    from datetime import datetime, timezone
+
+    from bar_store import BarStore
+
+    start = int(datetime.fromisoformat(args.start).replace(tzinfo=timezone.utc).timestamp()) if args.start else None
+    overrides = {name: getattr(args, name) for name in MarketModel._fields if getattr(args, name, None) is not None}
+    started = time.perf_counter()
+    store = BarStore(args.store)
+    universe = synthetic_universe(args.symbols, int(args.days * 1440), args.seed, "M1", start, **overrides)
+    for symbol, rates in universe.items():
+        print(f"{symbol}: {store.append(symbol, 'M1', rates)} bars, {rates['close'][0]} -> {rates['close'][-1]}")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from backtest_engine import loop_backtest, random_walk_rates, run_backtest
+
+
+def as_tuples(trades):
+    return [(int(t["signal_index"]), int(t["fill_index"]), float(t["entry"]), float(t["pnl"])) for t in trades]
+
+
+def expected(rates, sl_amount, tp_amount):
+    return [(i, j, float(e), float(p)) for i, j, e, p in loop_backtest(pd.DataFrame(rates), sl_amount, tp_amount)]
+
+
+def flat_rates(n, price=100.0, size=1.0):
+    # Bars of range `size` around a flat price, so a single wide bar is a signal
+    rates = random_walk_rates(n, volatility=0.0, start_price=price)
+    rates["high"] = price + size / 2
+    rates["low"] = price - size / 2
+    return rates
+
+
+@pytest.mark.parametrize("seed", range(5))
+@pytest.mark.parametrize("sl_amount,tp_amount", [(5, 10), (2.5, 1.5), (20, 20)])
+def test_matches_loop(seed, sl_amount, tp_amount):
+    rates = random_walk_rates(2000, seed)
+    trades = run_backtest(rates, sl_amount=sl_amount, tp_amount=tp_amount)
+    assert len(trades)
+    assert as_tuples(trades) == expected(rates, sl_amount, tp_amount)
+
+
+@pytest.mark.parametrize("offset", range(1, 7))
+def test_signal_in_last_fill_window(offset):
+    # A big bar `offset` bars from the end: its fill window runs past the last bar
+    rates = flat_rates(40)
+    i = len(rates) - offset
+    rates["high"][i] = 106.0
+    rates["low"][i] = 94.0
+    for j in range(i + 1, len(rates)):
+        rates["low"][j] = 90.0  # every later bar touches the entry
+    trades = run_backtest(rates, sl_amount=5, tp_amount=10)
+    assert as_tuples(trades) == expected(rates, 5, 10)
+    assert len(trades) == (offset > 1)
+
+
+@pytest.mark.parametrize("n", range(0, 6))
+def test_fewer_bars_than_lookback(n):
+    # No bar has `lookback` bars before it, so even a huge last bar is no signal
+    rates = random_walk_rates(n, seed=3)
+    rates["high"][-1:] += 1000.0
+    assert len(run_backtest(rates)) == 0
+    assert expected(rates, 5, 10) == []
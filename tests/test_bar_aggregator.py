@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_aggregator import (STANDARD_TIMEFRAMES, AggregatedFeed, BarAggregator, aggregate, aggregate_all, bucket_end,
+                            bucket_start, check_equivalence, ticks_to_rates)
+from mt5_sim import SimTerminal
+from synthetic import MarketModel, synthetic_rates
+from tick_backtest import synthesize_ticks
+from timeframes import TIMEFRAMES, timeframe_name, timeframe_seconds
+
+# Late January into February 2024, with gaps and weekends, so months, weeks and missing bars all show up
+START = int(pd.Timestamp("2024-01-22", tz="UTC").timestamp())
+GAPPY = MarketModel(missing_rate=0.05, weekends=True)
+
+# MT5 weeks open on Sunday
+RULES = {"M5": "5min", "M15": "15min", "H1": "1h", "H4": "4h", "D1": "1D", "W1": "W-SUN", "MN1": "MS"}
+
+
+def resampled(rates, timeframe):
+    frame = pd.DataFrame(rates)
+    frame.index = pd.to_datetime(frame["time"], unit="s")
+    bars = frame.resample(RULES[timeframe], closed="left", label="left").agg(
+        {"open": "first", "high": "max", "low": "min", "close": "last", "tick_volume": "sum", "spread": "max"}).dropna()
+    return bars.index.as_unit("s").astype("int64"), bars
+
+
+@pytest.mark.parametrize("timeframe", list(RULES))
+def test_aggregate_matches_pandas_resample(timeframe):
+    rates = synthetic_rates(20 * 1440, seed=1, start=START, model=GAPPY)
+    bars = aggregate(rates, timeframe)
+    times, expected = resampled(rates, timeframe)
+    assert np.array_equal(bars["time"], times)
+    for name in ("open", "high", "low", "close", "tick_volume", "spread"):
+        assert np.array_equal(bars[name], expected[name].to_numpy()), name
+
+
+def test_incremental_matches_bulk():
+    rates = synthetic_rates(16 * 1440, seed=2, start=START, model=GAPPY)
+    assert check_equivalence(rates) == {name: True for name in STANDARD_TIMEFRAMES}
+
+
+def test_aggregate_all_builds_from_nested_timeframes():
+    rates = synthetic_rates(3 * 1440 + 77, seed=3, start=START)
+    built = aggregate_all(rates, ("H4", "M15", "D1"), complete_only=True)
+    for name, bars in built.items():
+        assert np.array_equal(bars, aggregate(rates, name, complete_only=True))
+    # 77 minutes into the fourth day: its D1, H4 and M15 bars are still forming
+    assert built["D1"]["time"][-1] == START + 2 * 86400
+    assert built["M15"]["time"][-1] == START + 3 * 86400 + 60 * 60
+
+
+def test_aggregator_history_and_forming_bar():
+    rates = synthetic_rates(200, seed=4, start=START)
+    aggregator = BarAggregator(("M5", "H1"), history=3)
+    completed = []
+    for bar in rates[:-2]:
+        completed += aggregator.push_bar(bar)
+    assert [name for name, _ in completed].count("H1") == 3
+    bulk = aggregate(rates[:-2], "M5")
+    assert np.array_equal(aggregator.rates("M5", forming=False), bulk[-4:-1])
+    assert np.array_equal(aggregator.rates("M5"), bulk[-4:])
+    assert np.array_equal(aggregator.rates("M5", count=2), bulk[-2:])
+    assert len(aggregator.rates("M5", count=0)) == 0
+
+
+def test_ticks_to_rates():
+    rates = synthetic_rates(120, seed=5, start=START)
+    ticks = np.concatenate(list(synthesize_ticks(rates, ticks_per_bar=10, spread=0.2)))
+    bars = ticks_to_rates(ticks, point=0.01)
+    assert np.array_equal(bars["time"], rates["time"])
+    for name in ("open", "high", "low", "close"):
+        assert np.allclose(bars[name], rates[name])
+    assert set(bars["tick_volume"]) == {10} and set(bars["spread"]) == {20}
+    assert np.array_equal(ticks_to_rates(ticks, "M15", point=0.01), aggregate(bars, "M15"))
+
+
+@pytest.mark.parametrize("t,timeframe,start,end", [
+    ("2024-02-29 13:37:05", "H4", "2024-02-29 12:00", "2024-02-29 16:00"),
+    ("2024-02-29 13:37:05", "W1", "2024-02-25 00:00", "2024-03-03 00:00"),
+    ("2024-02-29 13:37:05", "MN1", "2024-02-01 00:00", "2024-03-01 00:00"),
+    ("2024-12-31 23:59:59", "MN1", "2024-12-01 00:00", "2025-01-01 00:00"),
+])
+def test_buckets(t, timeframe, start, end):
+    seconds = [int(pd.Timestamp(value, tz="UTC").timestamp()) for value in (t, start, end)]
+    assert bucket_start(seconds[0], timeframe) == seconds[1]
+    assert bucket_end(seconds[1], TIMEFRAMES[timeframe]) == seconds[2]
+
+
+def test_timeframe_names():
+    assert timeframe_name("h1") == "H1"
+    assert timeframe_name(TIMEFRAMES["MN1"]) == "MN1"
+    assert timeframe_seconds(TIMEFRAMES["M15"]) == 900
+    for bad in ("H5", 999):
+        with pytest.raises(ValueError):
+            timeframe_name(bad)
+
+
+def test_aggregated_feed_matches_the_terminal():
+    rates = synthetic_rates(3 * 1440, seed=6, start=START)
+    terminal = SimTerminal({"BTCUSDm": rates}, start_time=START + 1440 * 60 + 17)
+    feed = AggregatedFeed(terminal)
+    for step in [7, 50, 60, 299, 600, 3600, 1234, 86400 // 2]:
+        terminal.sleep(step)
+        for timeframe in ("M1", "M5", "M15", "H1", "H4"):
+            expected = terminal.copy_rates_from_pos("BTCUSDm", TIMEFRAMES[timeframe], 0, 6)
+            assert np.array_equal(feed.copy_rates_from_pos("BTCUSDm", TIMEFRAMES[timeframe], 0, 6), expected)
+            assert np.array_equal(feed.copy_rates_from_pos("BTCUSDm", TIMEFRAMES[timeframe], 1, 5), expected[:-1])
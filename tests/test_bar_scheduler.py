@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from bar_scheduler import BarCloseScheduler
+from mt5_sim import SIM_EPOCH, SimTerminal
+from synthetic import synthetic_universe
+from timeframes import TIMEFRAMES
+
+
+class ShiftedClock:
+    # A local clock `shift` seconds off the terminal's server clock
+    def __init__(self, terminal, shift):
+        self.terminal = terminal
+        self.shift = shift
+
+    def time(self):
+        return self.terminal.time() + self.shift
+
+
+class CountingFeed:
+    def __init__(self, feed):
+        self.feed = feed
+        self.polls = 0
+
+    def copy_rates_from_pos(self, *args):
+        self.polls += 1
+        return self.feed.copy_rates_from_pos(*args)
+
+    def symbol_info_tick(self, symbol):
+        return self.feed.symbol_info_tick(symbol)
+
+
+class EmptyFeed:
+    def copy_rates_from_pos(self, *args):
+        return None
+
+
+def recorder():
+    calls = []
+
+    def callback(symbol, timeframe, closed):
+        calls.append((symbol, timeframe, closed))
+    return calls, callback
+
+
+def run(scheduler, terminal, seconds):
+    end = terminal.time() + seconds
+    while terminal.time() < end:
+        scheduler.run_pending()
+        terminal.sleep(min(scheduler.delay(), end - terminal.time()))
+
+
+@pytest.fixture
+def terminal():
+    bars = synthetic_universe(["BTCUSDm", "ETHUSDm"], 1440, seed=12, start=SIM_EPOCH)
+    return SimTerminal(bars, start_time=SIM_EPOCH + 30)
+
+
+@pytest.mark.parametrize("shift", [0, -3 * 3600, 7200.5])
+def test_fires_once_per_bar_right_after_it_closes(terminal, shift):
+    scheduler = BarCloseScheduler(terminal, clock=ShiftedClock(terminal, shift))
+    calls, callback = recorder()
+    fired_at = []
+    scheduler.subscribe("BTCUSDm", TIMEFRAMES["M5"], lambda *args: (callback(*args), fired_at.append(terminal.time())))
+    run(scheduler, terminal, 3600)
+    opens = [int(closed["time"][-1]) for _, _, closed in calls]
+    assert opens == [SIM_EPOCH + 300 * i for i in range(12)]
+    # Seen within one poll of the close, whatever the local clock's offset from the server
+    assert all(0 <= at - (bar + 300) <= scheduler.poll_interval for bar, at in zip(opens, fired_at))
+    # Up to `history` closed bars; the first ones are all the data there is
+    assert [len(closed) for _, _, closed in calls] == [min(i + 1, 6) for i in range(12)]
+
+
+def test_closed_bars_are_the_ones_before_the_forming_bar(terminal):
+    scheduler = BarCloseScheduler(terminal, clock=terminal)
+    calls, callback = recorder()
+    scheduler.subscribe("ETHUSDm", TIMEFRAMES["M1"], callback, history=3)
+    run(scheduler, terminal, 600)
+    rates = terminal.bars["ETHUSDm"]
+    for _, timeframe, closed in calls:
+        assert timeframe == TIMEFRAMES["M1"]
+        end = int(np.searchsorted(rates["time"], closed["time"][-1])) + 1
+        assert np.array_equal(closed, rates[max(end - 3, 0):end])
+
+
+def test_each_symbol_keeps_its_own_server_offset():
+    # ETHUSDm's feed stopped an hour ago (a closed market): its stale last tick must not delay BTCUSDm
+    bars = synthetic_universe(["BTCUSDm", "ETHUSDm"], 600, seed=13, start=SIM_EPOCH)
+    bars["ETHUSDm"] = bars["ETHUSDm"][:300]
+    terminal = SimTerminal(bars, start_time=SIM_EPOCH + 360 * 60 + 30, end_time=SIM_EPOCH + 600 * 60)
+    scheduler = BarCloseScheduler(terminal, clock=terminal)
+    calls, callback = recorder()
+    scheduler.subscribe("ETHUSDm", TIMEFRAMES["M1"], callback)
+    scheduler.subscribe("BTCUSDm", TIMEFRAMES["M1"], callback)
+    run(scheduler, terminal, 1800)
+    assert [symbol for symbol, _, _ in calls] == ["BTCUSDm"] * 30
+    assert scheduler.server_offsets["BTCUSDm"] == pytest.approx(0, abs=1)
+
+
+def test_resubscribing_does_not_double_the_polls(terminal):
+    feed = CountingFeed(terminal)
+    scheduler = BarCloseScheduler(feed, clock=terminal)
+    calls, callback = recorder()
+    for _ in range(5):
+        scheduler.unsubscribe("BTCUSDm", TIMEFRAMES["M1"])
+        scheduler.subscribe("BTCUSDm", TIMEFRAMES["M1"], callback)
+    assert len(scheduler.heap) == 5
+    assert scheduler.run_pending() == 0
+    assert feed.polls == 1
+    run(scheduler, terminal, 600)
+    assert len(calls) == 10
+    # One poll per bar close, one to find the next close is due
+    assert feed.polls <= 1 + 2 * len(calls)
+
+
+def test_backs_off_when_the_feed_has_nothing(terminal):
+    scheduler = BarCloseScheduler(EmptyFeed(), poll_interval=0.25, max_poll_interval=2.0, clock=terminal)
+    calls, callback = recorder()
+    scheduler.subscribe("BTCUSDm", TIMEFRAMES["M1"], callback)
+    delays = []
+    for _ in range(6):
+        scheduler.run_pending()
+        delays.append(scheduler.delay())
+        terminal.sleep(delays[-1])
+    assert delays == [0.25, 0.5, 1.0, 2.0, 2.0, 2.0]
+    assert not calls
+    scheduler.unsubscribe("BTCUSDm", TIMEFRAMES["M1"])
+    assert scheduler.next_due() is None and scheduler.delay() == 2.0
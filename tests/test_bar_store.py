@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from bar_aggregator import aggregate
+from bar_store import BarStore, BarStoreProvider
+from mt5_sim import SIM_EPOCH, SimTerminal
+from synthetic import synthetic_rates
+from timeframes import RATES_DTYPE
+
+
+def monthly_rates(months):
+    # One MN1 bar per calendar month from 2024-01, so February's 29 days sit next to 31-day months
+    times = np.arange("2024-01", np.datetime64("2024-01", "M") + months, dtype="datetime64[M]")
+    rates = np.zeros(months, dtype=RATES_DTYPE)
+    rates["time"] = times.astype("datetime64[s]").astype(np.int64)
+    rates["open"] = rates["low"] = 100.0
+    rates["high"] = rates["close"] = 101.0
+    return rates
+
+
+class MonthlySource:
+    # copy_rates_from_pos over a fixed MN1 history whose last `forming` bars have not closed yet
+    def __init__(self, rates, forming=1):
+        self.rates = rates
+        self.forming = forming
+
+    def copy_rates_from_pos(self, symbol, timeframe, start_pos, count):
+        end = len(self.rates) - self.forming + 1 - start_pos
+        return self.rates[max(end - count, 0):max(end, 0)]
+
+
+def test_append_keeps_the_file_sorted_and_duplicate_free(tmp_path):
+    store = BarStore(str(tmp_path))
+    rates = synthetic_rates(100, seed=1)
+    assert store.append("BTCUSDm", "M1", rates[:60]) == 60
+    # Overlapping and repeated bars: only the 40 newer ones are written
+    assert store.append("BTCUSDm", "M1", np.concatenate((rates[50:], rates[-1:]))) == 40
+    assert store.append("BTCUSDm", "M1", rates[:10]) == 0
+    stored = store.bars("BTCUSDm", "M1")
+    assert np.array_equal(stored, rates)
+    assert store.last_time("BTCUSDm", "M1") == int(rates["time"][-1])
+    assert store.symbols() == ["BTCUSDm"]
+
+
+@pytest.mark.parametrize("date_from,date_to", [(None, None), (5, 20), (5.5, 20.5), (-10, 3), (95, 200), (50, 10)])
+def test_read_range_is_inclusive(tmp_path, date_from, date_to):
+    store = BarStore(str(tmp_path))
+    rates = synthetic_rates(100, seed=2)
+    store.append("EURUSDm", "M1", rates)
+    times = rates["time"]
+    start = None if date_from is None else int(times[0] + date_from * 60)
+    end = None if date_to is None else int(times[0] + date_to * 60)
+    expected = rates[(times >= (times[0] if start is None else start)) & (times <= (times[-1] if end is None else end))]
+    assert np.array_equal(store.read_range("EURUSDm", "M1", start, end), expected)
+
+
+def test_provider_answers_like_the_terminal(tmp_path):
+    store = BarStore(str(tmp_path))
+    rates = synthetic_rates(30, seed=3)
+    store.append("XAUUSDm", "M1", rates)
+    provider = BarStoreProvider(store)
+    assert np.array_equal(provider.copy_rates_from_pos("XAUUSDm", "M1", 0, 5), rates[-5:])
+    assert np.array_equal(provider.copy_rates_from_pos("XAUUSDm", "M1", 2, 5), rates[-7:-2])
+    assert np.array_equal(provider.copy_rates_from("XAUUSDm", "M1", int(rates["time"][9]), 4), rates[6:10])
+    assert len(provider.copy_rates_from_pos("XAUUSDm", "M1", 100, 5)) == 0
+
+
+def test_sync_pulls_only_new_closed_bars(tmp_path):
+    rates = synthetic_rates(600, seed=4)
+    terminal = SimTerminal({"BTCUSDm": rates}, start_time=int(rates["time"][300]) + 30)
+    store = BarStore(str(tmp_path))
+    assert store.sync(terminal, "BTCUSDm", "M1", initial_bars=1000) == 300  # bars 0..299; 300 is still forming
+    terminal.sleep(120 * 60)
+    assert store.sync(terminal, "BTCUSDm", "M1") == 120
+    assert store.sync(terminal, "BTCUSDm", "M1") == 0
+    assert np.array_equal(store.bars("BTCUSDm", "M1"), rates[:420])
+
+
+def test_sync_does_not_skip_short_months(tmp_path):
+    # MN1's nominal 30 days would floor February (29 days) to no bar at all
+    history = monthly_rates(6)
+    store = BarStore(str(tmp_path))
+    store.append("BTCUSDm", "MN1", history[:1])
+    for known in range(2, 6):
+        assert store.sync(MonthlySource(history[:known + 1]), "BTCUSDm", "MN1") == 1
+    assert np.array_equal(store.bars("BTCUSDm", "MN1"), history[:5])
+
+
+def test_derive_matches_aggregate(tmp_path):
+    rates = synthetic_rates(3 * 1440, seed=5, start=SIM_EPOCH)
+    store = BarStore(str(tmp_path))
+    store.append("BTCUSDm", "M1", rates[:2000])
+    store.derive("BTCUSDm", ("M5", "H1"))
+    store.append("BTCUSDm", "M1", rates[2000:])
+    store.derive("BTCUSDm", ("M5", "H1"))
+    for timeframe in ("M5", "H1"):
+        # Complete bars only: the forming last bucket is left for a later derive
+        assert np.array_equal(store.bars("BTCUSDm", timeframe), aggregate(rates, timeframe, complete_only=True))
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import symbol_specs
+import trade_journal
+from candle_state import CandleRangeState, bar_direction, trigger_level
+from mt5_sim import SimTerminal
+from strategy import SymbolStrategy
+from synthetic import synthetic_rates
+
+
+@pytest.mark.parametrize("lookback", [1, 5, 20])
+def test_matches_a_rolling_dataframe(lookback):
+    rates = synthetic_rates(500, seed=lookback)
+    ranges = pd.Series(rates["high"] - rates["low"])
+    average = ranges.rolling(lookback).mean()
+    maximum = ranges.rolling(lookback).max()
+    state = CandleRangeState(lookback)
+    for i in range(len(rates)):
+        # Overlapping windows as child.py's copy_rates_from_pos pulls: only the new bar is pushed
+        assert state.update(rates[max(i - 5, 0):i + 1]) == 1
+        assert state.ready == (i + 1 >= lookback)
+        if state.ready:
+            assert state.average_range() == pytest.approx(average[i])
+            assert state.max_range() == maximum[i]
+    assert state.last_direction() == bar_direction(rates[-1])
+
+
+def test_old_and_repeated_bars_are_ignored():
+    rates = synthetic_rates(10, seed=3)
+    state = CandleRangeState(3)
+    assert state.update(rates[:5]) == 5
+    assert state.update(rates[2:5]) == 0
+    assert state.update(rates[:1]) == 0
+    assert state.average_range() == pytest.approx(np.mean((rates["high"] - rates["low"])[2:5]))
+
+
+def test_running_sum_does_not_drift():
+    rates = synthetic_rates(10000, seed=4)
+    state = CandleRangeState(5)
+    state.update(rates)
+    assert state.total == pytest.approx(sum(state.ranges), abs=1e-9)
+
+
+@pytest.mark.parametrize("open_,close,direction", [(1.0, 2.0, "BUY"), (2.0, 1.0, "SELL"), (1.0, 1.0, "SELL")])
+def test_bar_direction(open_, close, direction):
+    assert bar_direction({"open": open_, "close": close}) == direction
+
+
+def test_trigger_level_is_40_percent_into_the_candle():
+    assert trigger_level(110.0, 100.0, "BUY") == pytest.approx(104.0)
+    assert trigger_level(110.0, 100.0, "SELL") == pytest.approx(106.0)
+    assert trigger_level(110.0, 100.0, "BUY", fraction=0.5) == pytest.approx(105.0)
+
+
+def test_strategy_signal_matches_the_dataframe_rule(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(symbol_specs, "_specs", None)
+    monkeypatch.setattr(trade_journal, "_journal", trade_journal.TradeJournal(str(tmp_path / "trades.db")))
+    rates = synthetic_rates(400, seed=6)
+    strategy = SymbolStrategy(SimTerminal({"BTCUSDm": rates}), "BTCUSDm", 0.1, 5, 10, 2, "M1", 1, 15, 15)
+    signals = 0
+    for i in range(6, len(rates)):
+        # child.py's rule: the last closed candle against the average range of the 5 before it
+        df = pd.DataFrame(rates[i - 6:i])
+        df["size"] = df["high"] - df["low"]
+        last = df.iloc[-1]
+        expected = (None, None)
+        if last["size"] >= 1.2 * df["size"].iloc[:-1].mean():
+            direction = "BUY" if last["close"] > last["open"] else "SELL"
+            expected = (pytest.approx(trigger_level(last["high"], last["low"], direction)), direction)
+            signals += 1
+        assert strategy.check_entry_condition(rates[i - 6:i]) == expected
+    assert signals > 0
@@ -0,0 +1,141 @@
+import logging
+import os
+
+import pytest
+import yaml
+
+from config import (CONFIG_PATH, FIELD_TYPES, SCRIPT_FIELDS, ConfigError, ConfigWatcher, load_config, parse_config,
+                    script_settings, symbol_dicts)
+
+DEFAULTS = {"lot_size": 0.5, "profit_target": 5, "sl_trailing_trigger": 10, "sl_trailing_adjustment": 2,
+            "timeframe": "H1", "interval_minutes": 1, "sl": 15, "tp": 15}
+
+
+def document(symbols=None, scripts=None, **defaults):
+    return {"defaults": {**DEFAULTS, **defaults}, "symbols": symbols or {"BTCUSDm": {}}, "scripts": scripts or {}}
+
+
+def write(path, data, mtime_ns):
+    # An explicit mtime, so a rewrite is seen even on filesystems with coarse timestamps
+    path.write_text(yaml.safe_dump(data))
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_repository_config_is_valid():
+    config = load_config(CONFIG_PATH)
+    assert set(config.scripts) == set(SCRIPT_FIELDS)
+    assert config.symbols["BTCJPYm"].sl == 40000.0 and config.symbols["BTCJPYm"].lot_size == 0.9
+    assert not config.symbols["EURUSDm"].enabled
+    assert config.scripts["allpair1"]["trigger_expiry_minutes"] is None
+
+
+def test_symbols_start_from_the_defaults():
+    config = parse_config(document({"BTCUSDm": {}, "ETHUSDm": {"sl": 20, "timeframe": "m5", "enabled": False}}))
+    btc, eth = config.symbols["BTCUSDm"], config.symbols["ETHUSDm"]
+    assert (btc.sl, btc.timeframe, btc.enabled) == (15.0, "H1", True)
+    assert (eth.sl, eth.tp, eth.timeframe, eth.enabled) == (20.0, 15.0, "M5", False)
+    assert isinstance(btc.profit_target, float) and isinstance(btc.interval_minutes, int)
+    assert symbol_dicts(config) == {"BTCUSDm": {name: getattr(btc, name) for name in FIELD_TYPES if name != "enabled"}}
+    assert set(symbol_dicts(config, enabled_only=False)) == {"BTCUSDm", "ETHUSDm"}
+
+
+@pytest.mark.parametrize("overrides,message", [
+    ({"slippage": 3}, r"symbols\.BTCUSDm: unknown setting\(s\) slippage"),
+    ({"timeframe": "H5"}, r"symbols\.BTCUSDm\.timeframe: unknown timeframe 'H5'"),
+    ({"lot_size": "0.5"}, r"symbols\.BTCUSDm\.lot_size: expected a number"),
+    ({"lot_size": True}, r"symbols\.BTCUSDm\.lot_size: expected a number"),
+    ({"lot_size": 0}, r"lot_size must be positive"),
+    ({"sl": -1}, r"symbols\.BTCUSDm\.sl must not be negative"),
+    ({"interval_minutes": 1.5}, r"interval_minutes: expected a whole number"),
+    ({"interval_minutes": 0}, r"interval_minutes must be at least 1"),
+    ({"enabled": "yes"}, r"symbols\.BTCUSDm\.enabled: expected true/false"),
+])
+def test_symbol_errors_name_the_setting(overrides, message):
+    with pytest.raises(ConfigError, match=message):
+        parse_config(document({"BTCUSDm": overrides}))
+
+
+def test_document_errors():
+    with pytest.raises(ConfigError, match="top level"):
+        parse_config(["BTCUSDm"])
+    with pytest.raises(ConfigError, match=r"symbols\.BTCUSDm: missing sl, tp"):
+        parse_config({"defaults": {name: value for name, value in DEFAULTS.items() if name not in ("sl", "tp")},
+                      "symbols": {"BTCUSDm": None}})
+    with pytest.raises(ConfigError, match=r"symbols\.BTCUSDm: expected a mapping"):
+        parse_config(document({"BTCUSDm": [1, 2]}))
+    with pytest.raises(ConfigError, match="scripts: expected a mapping"):
+        parse_config({**document(), "scripts": ["allpair"]})
+
+
+@pytest.mark.parametrize("script,values", [
+    ("allpair", {"symbols": ["BTCUSDm", "EURUSDm"], "lot_size": 0.09, "sl_amount": 5, "tp_amount": 10,
+                 "timeframe": "M1"}),
+    ("allpair1", {"symbols": "*", "trigger_expiry_minutes": None}),
+    ("allpair1", {"trigger_expiry_minutes": 30}),
+    ("1bigin6", {"symbol": "BTCUSD", "timeframe": "m5"}),
+])
+def test_script_settings_are_validated(script, values):
+    settings = parse_config(document(scripts={script: values})).scripts[script]
+    assert set(settings) == set(values)
+    if "timeframe" in values:
+        assert settings["timeframe"] == values["timeframe"].upper()
+
+
+@pytest.mark.parametrize("scripts,message", [
+    ({"allpair2": {}}, r"scripts\.allpair2: unknown script"),
+    ({"allpair": {"symbol": "BTCUSD"}}, r"scripts\.allpair: unknown setting\(s\) symbol"),
+    ({"allpair": {"timeframe": "M7"}}, r"scripts\.allpair\.timeframe: unknown timeframe"),
+    ({"allpair": {"sl_amount": "5"}}, r"scripts\.allpair\.sl_amount: expected a number"),
+    ({"allpair": {"symbols": []}}, r"scripts\.allpair\.symbols: expected a list of symbols"),
+    ({"allpair": {"symbols": ["BTCUSDm", 3]}}, r"scripts\.allpair\.symbols: expected a list of symbols"),
+    ({"allpair1": {"trigger_expiry_minutes": 0}}, r"trigger_expiry_minutes must be positive or null"),
+    ({"allpair": {"trigger_expiry_minutes": None}}, r"unknown setting\(s\) trigger_expiry_minutes"),
+    ({"1bigin6": {"symbol": ""}}, r"scripts\.1bigin6\.symbol: expected a name"),
+    ({"1bigin6": {"lot_size": None}}, r"scripts\.1bigin6\.lot_size: expected a number"),
+])
+def test_script_errors_name_the_setting(scripts, message):
+    with pytest.raises(ConfigError, match=message):
+        parse_config(document(scripts=scripts))
+
+
+def test_script_settings_fall_back_to_the_defaults(tmp_path):
+    defaults = {"symbol": "BTCUSD", "lot_size": 0.09, "timeframe": "M5"}
+    assert script_settings("1bigin6", defaults, str(tmp_path / "missing.yaml")) == defaults
+    path = tmp_path / "config.yaml"
+    write(path, document(scripts={"1bigin6": {"lot_size": 0.2}}), 10 ** 18)
+    assert script_settings("1bigin6", defaults, str(path)) == {**defaults, "lot_size": 0.2}
+    assert script_settings("allpair", {"lot_size": 0.09}, str(path)) == {"lot_size": 0.09}
+
+
+def test_watcher_reports_what_changed(tmp_path, caplog):
+    path = tmp_path / "config.yaml"
+    write(path, document({"BTCUSDm": {}, "ETHUSDm": {}, "XAUUSDm": {}}), 10 ** 18)
+    watcher = ConfigWatcher(str(path), interval=0)
+    assert watcher.poll() is None
+    write(path, document({"BTCUSDm": {}, "ETHUSDm": {"sl": 30}, "EURUSDm": {"enabled": False}}), 2 * 10 ** 18)
+    changes = watcher.poll()
+    assert set(changes) == {"ETHUSDm", "EURUSDm", "XAUUSDm"}
+    assert changes["ETHUSDm"].sl == 30.0 and not changes["EURUSDm"].enabled and changes["XAUUSDm"] is None
+    assert watcher.poll() is None
+    # A broken edit is logged and the last good config stays in force
+    write(path, document({"BTCUSDm": {"lot_size": -1}}), 3 * 10 ** 18)
+    with caplog.at_level(logging.ERROR, logger="config"):
+        assert watcher.poll() is None
+    assert isinstance(watcher.error, ConfigError) and "Ignoring invalid config" in caplog.text
+    assert watcher.config.symbols["ETHUSDm"].sl == 30.0
+    write(path, document({"BTCUSDm": {"lot_size": 2}, "ETHUSDm": {"sl": 30}, "EURUSDm": {"enabled": False}}),
+          4 * 10 ** 18)
+    assert set(watcher.poll()) == {"BTCUSDm"} and watcher.error is None
+
+
+def test_watcher_checks_the_file_at_most_every_interval(tmp_path):
+    path = tmp_path / "config.yaml"
+    write(path, document(), 10 ** 18)
+    watcher = ConfigWatcher(str(path), interval=3600)
+    write(path, document(sl=20), 2 * 10 ** 18)
+    assert watcher.poll() is None
+    watcher.checked -= 3600
+    assert watcher.poll()["BTCUSDm"].sl == 20.0
+    os.remove(path)
+    watcher.checked -= 3600
+    assert watcher.poll() is None and watcher.error is None
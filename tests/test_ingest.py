@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_store import BarStore
+from ingest import PartitionProvider, PartitionStore, clean, csv_chunks, find_gaps, mt5_chunks
+from mt5_sim import SimTerminal
+from synthetic import MarketModel, synthetic_rates
+from timeframes import RATES_DTYPE
+
+# A Monday in mid-January: eight trading weeks of M15 bars run into March
+START = int(pd.Timestamp("2024-01-15", tz="UTC").timestamp())
+WEEKDAYS = MarketModel(weekends=True)
+
+
+def utc(value):
+    return int(pd.Timestamp(value, tz="UTC").timestamp())
+
+
+def bars(count=40 * 96, seed=0, timeframe="M15", start=START, model=WEEKDAYS):
+    return synthetic_rates(count, seed=seed, timeframe=timeframe, start=start, model=model)
+
+
+def chunked(rates, size):
+    return [rates[i:i + size] for i in range(0, len(rates), size)]
+
+
+def test_clean_sorts_dedupes_and_drops_impossible_bars():
+    rates = bars(10)
+    later = rates[3].copy()
+    later["close"] = later["open"]  # a corrected copy of bar 3, which wins over the first one
+    broken = rates[[5, 6, 7, 8]].copy()
+    broken["high"][0] = broken["low"][0] - 1
+    broken["low"][1] = 0.0
+    broken["close"][2] = np.nan
+    broken["open"][3] = broken["high"][3] + 1
+    mixed = np.concatenate((rates[::-1][:5], rates[:5], [later], broken, rates[9:]))
+    cleaned, duplicates, invalid = clean(mixed)
+    assert (duplicates, invalid) == (6, 4)
+    assert cleaned["time"].tolist() == rates["time"][[0, 1, 2, 3, 4, 9]].tolist()
+    assert cleaned[3]["close"] == later["close"]
+    assert clean(np.zeros(0, dtype=RATES_DTYPE))[1:] == (0, 0)
+
+
+def test_gaps_skip_weekends():
+    rates = bars(21 * 96)
+    assert find_gaps(rates["time"], "M15") == []
+    # Three hours missing on a Wednesday, and a long weekend that runs into Tuesday
+    holes = (rates["time"] >= utc("2024-01-17 10:00")) & (rates["time"] < utc("2024-01-17 13:00"))
+    holes |= (rates["time"] >= utc("2024-01-29")) & (rates["time"] < utc("2024-01-30"))
+    assert find_gaps(rates["time"][~holes], "M15") == [
+        (utc("2024-01-17 09:45"), utc("2024-01-17 13:00")), (utc("2024-01-26 23:45"), utc("2024-01-30"))]
+    assert find_gaps(rates["time"][~holes], "M15", max_gap=4 * 3600) == [
+        (utc("2024-01-26 23:45"), utc("2024-01-30"))]
+    assert find_gaps(rates["time"][:1], "M15") == []
+
+
+@pytest.mark.parametrize("size,order", [(10 ** 6, 1), (500, 1), (777, -1)])
+def test_ingest_partitions_by_month(tmp_path, size, order):
+    rates = bars()
+    store = PartitionStore(str(tmp_path))
+    stats = store.ingest("BTCUSDm", "M15", chunked(rates, size)[::order])
+    assert (stats["rows"], stats["added"], stats["duplicates"], stats["invalid"]) == (len(rates), len(rates), 0, 0)
+    parts = store.partitions("BTCUSDm")
+    assert [part.month for part in parts] == ["2024-01", "2024-02", "2024-03"]
+    assert [part.path for part in parts] == [f"BTCUSDm/M15/{part.month}.npz" for part in parts]
+    assert sum(part.rows for part in parts) == len(rates)
+    assert parts[1].first == utc("2024-02-01") and parts[1].last == utc("2024-02-29 23:45")
+    assert all(part.gaps == 0 for part in parts)
+    assert np.array_equal(store.read("BTCUSDm", "M15"), rates)
+    # The catalog is read back from disk
+    reopened = PartitionStore(str(tmp_path))
+    assert reopened.partitions() == parts
+    assert np.array_equal(reopened.read("BTCUSDm", "m15"), rates)
+
+
+def test_reingesting_merges_into_the_stored_months(tmp_path):
+    rates = bars()
+    store = PartitionStore(str(tmp_path))
+    store.ingest("BTCUSDm", "M15", [rates[:3000]])
+    stats = store.ingest("BTCUSDm", "M15", [rates[2000:]])
+    assert (stats["added"], stats["duplicates"]) == (len(rates) - 3000, 1000)
+    assert np.array_equal(store.read("BTCUSDm", "M15"), rates)
+    assert store.ingest("BTCUSDm", "M15", [rates])["added"] == 0
+
+
+def test_a_month_with_no_valid_bar_writes_no_partition(tmp_path):
+    rates = bars()
+    february = (rates["time"] >= utc("2024-02-01")) & (rates["time"] < utc("2024-03-01"))
+    rates["low"][february] = -1.0
+    store = PartitionStore(str(tmp_path))
+    stats = store.ingest("BTCUSDm", "M15", [rates])
+    assert stats["invalid"] == february.sum() and stats["partitions"] == 2
+    assert [part.month for part in store.partitions()] == ["2024-01", "2024-03"]
+    assert not (tmp_path / "BTCUSDm" / "M15" / "2024-02.npz").exists()
+    assert all(part.first > 0 for part in store.partitions())
+    # Which leaves a hole across the missing month
+    assert store.gaps("BTCUSDm", "M15") == [(utc("2024-01-31 23:45"), utc("2024-03-01"))]
+
+
+def test_reads_clip_and_tail_across_months(tmp_path):
+    rates = bars()
+    store = PartitionStore(str(tmp_path))
+    store.ingest("BTCUSDm", "M15", [rates])
+    start, end = utc("2024-01-31 12:00"), utc("2024-02-01 12:00")
+    inside = rates[(rates["time"] >= start) & (rates["time"] <= end)]
+    assert np.array_equal(store.read("BTCUSDm", "M15", start, end), inside)
+    assert np.array_equal(store.tail("BTCUSDm", "M15", 100, end=end), rates[rates["time"] <= end][-100:])
+    assert np.array_equal(store.tail("BTCUSDm", "M15", 10 ** 6), rates)
+    assert len(store.read("ETHUSDm", "M15")) == 0
+    provider = PartitionProvider(store)
+    assert np.array_equal(provider.copy_rates_from_pos("BTCUSDm", "M15", 5, 20), rates[-25:-5])
+    assert np.array_equal(provider.copy_rates_from("BTCUSDm", "M15", end, 3), inside[-3:])
+    assert np.array_equal(provider.copy_rates_range("BTCUSDm", "M15", start, end), inside)
+
+
+def test_pull_from_the_terminal_and_export(tmp_path):
+    rates = bars(20 * 1440, seed=1, timeframe="M1", start=utc("2024-01-22"), model=MarketModel(missing_rate=0.01))
+    terminal = SimTerminal({"BTCUSDm": rates}, start_time=int(rates["time"][-1]) + 60)
+    store = PartitionStore(str(tmp_path / "parts"))
+    chunks = list(mt5_chunks(terminal, "BTCUSDm", "M1", utc("2024-01-25"), utc("2024-02-05 12:00")))
+    assert len(chunks) == 2  # one request per month
+    store.ingest("BTCUSDm", "M1", chunks)
+    expected = rates[(rates["time"] >= utc("2024-01-25")) & (rates["time"] <= utc("2024-02-05 12:00"))]
+    assert np.array_equal(store.read("BTCUSDm", "M1"), expected)
+    bar_store = BarStore(str(tmp_path / "bars"))
+    assert store.export(bar_store, "BTCUSDm") == len(expected)
+    assert np.array_equal(bar_store.bars("BTCUSDm", "M1"), expected)
+    assert len(bar_store.bars("BTCUSDm", "H1")) > 0
+
+
+def test_mt5_export_csv(tmp_path):
+    rates = bars(500, seed=2)
+    stamps = pd.to_datetime(rates["time"], unit="s")
+    frame = pd.DataFrame({"<DATE>": stamps.strftime("%Y.%m.%d"), "<TIME>": stamps.strftime("%H:%M:%S"),
+                          "<OPEN>": rates["open"], "<HIGH>": rates["high"], "<LOW>": rates["low"],
+                          "<CLOSE>": rates["close"], "<TICKVOL>": rates["tick_volume"], "<VOL>": 0,
+                          "<SPREAD>": rates["spread"]})
+    path = tmp_path / "BTCUSDm_M15.csv"
+    frame.to_csv(path, sep="\t", index=False)
+    chunks = list(csv_chunks(str(path), chunk_rows=200))
+    assert [len(chunk) for chunk in chunks] == [200, 200, 100]
+    assert np.array_equal(np.concatenate(chunks), rates)
@@ -0,0 +1,276 @@
+import io
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import master
+from config import SymbolConfig
+from heartbeat import Heartbeat, heartbeat_path
+from master import Supervisor
+
+
+class FakeTime:
+    # Stands in for the time module inside master: one clock for time() and monotonic(), sleep() advances it
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def strftime(self, fmt):
+        return time.strftime(fmt)
+
+
+class FakeProcess:
+    # A child that runs until told to exit; `stops_on_request` ones exit once their .stop file appears
+    pids = iter(range(100, 10 ** 6))
+
+    def __init__(self, args, heartbeat, stops_on_request=True):
+        self.args = args
+        self.heartbeat = heartbeat
+        self.stops_on_request = stops_on_request
+        self.pid = next(self.pids)
+        self.returncode = None
+        self.stdin = io.BytesIO()
+        self.stdin.close = lambda: None
+        self.signals = []
+
+    def poll(self):
+        if self.returncode is None and self.stops_on_request and os.path.exists(self.heartbeat + ".stop"):
+            self.returncode = 0
+        return self.returncode
+
+    def kill(self):
+        self.signals.append("kill")
+        self.returncode = -9
+
+    def terminate(self):
+        self.signals.append("terminate")
+        self.returncode = -15
+
+    def wait(self, timeout=None):
+        return self.returncode
+
+
+@pytest.fixture
+def clock(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    fake = FakeTime()
+    monkeypatch.setattr(master, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def spawned(monkeypatch):
+    processes = []
+
+    def spawn(args, env, log_path, banner, stdin=None):
+        processes.append(FakeProcess(args, env["WORKER_HEARTBEAT"]))
+        return processes[-1]
+
+    monkeypatch.setattr(master, "_spawn", spawn)
+    return processes
+
+
+def beat(worker_or_spare, clock):
+    with open(worker_or_spare.heartbeat, "a"):
+        pass
+    os.utime(worker_or_spare.heartbeat, (clock.now, clock.now))
+
+
+def supervisor(symbols, **kwargs):
+    return Supervisor(symbols, **{"stagger": 0.5, "max_starting": 2, "backoff": 1.0, "max_backoff": 8,
+                                  "stable_seconds": 300, **kwargs})
+
+
+def test_cold_starts_are_staggered_and_capped(clock, spawned):
+    sup = supervisor(["A", "B", "C"])
+    sup.step()
+    assert [process.args[-1] for process in spawned] == ["A"]
+    sup.step()
+    assert len(spawned) == 1  # within the stagger
+    clock.sleep(0.5)
+    sup.step()
+    clock.sleep(0.5)
+    sup.step()
+    assert len(spawned) == 2  # two initializing at once at most
+    clock.sleep(0.25)
+    beat(sup.workers["A"], clock)
+    sup.step()
+    assert sup.workers["A"].state == "running" and sup.workers["A"].up_after == 1.25
+    assert [process.args[-1] for process in spawned] == ["A", "B", "C"]
+    assert spawned[0].args[1:] == ["child.py", "A"]
+
+
+def test_crashes_back_off_exponentially(clock, spawned):
+    sup = supervisor(["A"])
+    worker = sup.workers["A"]
+    delays = []
+    for _ in range(6):
+        sup.step()
+        spawned[-1].returncode = 1
+        sup.step()
+        assert worker.state == "pending"
+        delays.append(worker.next_start - clock.now)
+        clock.sleep(delays[-1])
+    assert delays == [1, 2, 4, 8, 8, 8]
+    assert worker.restarts == 6 and len(spawned) == 6
+    # A run that stayed up for stable_seconds starts the backoff over
+    sup.step()
+    beat(worker, clock)
+    sup.step()
+    for _ in range(4):
+        clock.sleep(100)
+        beat(worker, clock)
+        sup.step()
+    spawned[-1].returncode = 1
+    sup.step()
+    assert worker.next_start - clock.now == 1 and worker.failures == 1
+
+
+def test_hung_and_silent_workers_are_killed(clock, spawned):
+    sup = supervisor(["A", "B"], start_timeout=120, hang_timeout=60, stagger=0)
+    sup.step()
+    a, b = sup.workers["A"], sup.workers["B"]
+    beat(a, clock)
+    sup.step()
+    assert (a.state, b.state) == ("running", "starting")
+    clock.sleep(61)
+    sup.step()
+    assert a.state == "pending" and spawned[0].signals == ["kill"]
+    assert b.state == "starting"
+    clock.sleep(60)
+    sup.step()
+    assert b.state == "pending" and spawned[1].signals == ["kill"]
+    assert a.failures == b.failures == 1
+
+
+def test_clean_exit_and_config_changes(clock, spawned):
+    sup = supervisor(["A"])
+    sup.step()
+    spawned[-1].returncode = 0
+    sup.step()
+    clock.sleep(3600)
+    sup.step()
+    assert sup.workers["A"].state == "done" and len(spawned) == 1
+    cfg = SymbolConfig("A", 0.5, 5, 10, 2, "M1", 1, 15, 15, True)
+    sup.apply_config({"A": cfg, "B": cfg._replace(symbol="B"), "C": cfg._replace(symbol="C", enabled=False),
+                      "D": None})
+    assert set(sup.workers) == {"A", "B"}
+    sup.step()
+    clock.sleep(0.5)
+    sup.step()
+    assert sorted(process.args[-1] for process in spawned[1:]) == ["A", "B"]
+
+
+def test_watcher_changes_are_applied_on_step(clock, spawned):
+    cfg = SymbolConfig("B", 0.5, 5, 10, 2, "M1", 1, 15, 15, True)
+    changes = [{"B": cfg}, None]
+    sup = supervisor([], watcher=SimpleNamespace(poll=lambda: changes.pop(0) if changes else None))
+    sup.step()
+    assert [process.args[-1] for process in spawned] == ["B"]
+
+
+def test_warm_pool_takes_restarts(clock, spawned):
+    sup = supervisor(["A"], pool_size=1, stagger=0, max_starting=1)
+    sup.step()
+    spare = sup.spares[0]
+    assert spawned[0].args[1:] == ["child.py", "--pool"]
+    beat(spare, clock)
+    sup.step()
+    # The pending symbol went to the warm worker, its heartbeat and log path on one stdin line
+    worker = sup.workers["A"]
+    assert worker.process is spare.process and not worker.cold and not sup.spares
+    assert spare.process.stdin.getvalue().decode() == f"A\t{worker.heartbeat}\t{worker.log_path}\n"
+    assert not os.path.exists(spare.heartbeat)
+    sup.step()
+    assert not sup.spares  # no top-up while the handed-out symbol is still coming up
+    beat(worker, clock)
+    sup.step()
+    assert worker.state == "running" and len(sup.spares) == 1
+    beat(sup.spares[0], clock)
+    sup.step()
+    worker.process.returncode = 1
+    sup.step()
+    clock.sleep(1)
+    sup.step()
+    assert worker.process is spawned[1] and worker.restarts == 1
+
+
+def test_dead_spares_are_dropped(clock, spawned):
+    sup = supervisor(["A"], pool_size=2, start_timeout=10, stagger=0, max_starting=2)
+    sup.workers["A"].state = "done"
+    sup.step()
+    assert len(sup.spares) == 2
+    spawned[0].returncode = 1
+    clock.sleep(11)
+    sup.step()
+    assert spawned[1].signals == ["kill"]
+    assert [spare.process for spare in sup.spares] == spawned[2:]
+
+
+def test_shutdown_asks_then_terminates(clock, spawned):
+    sup = supervisor(["A", "B"], grace=30, stagger=0)
+    sup.step()
+    spawned[1].stops_on_request = False
+    sup.shutdown()
+    assert all(os.path.exists(sup.workers[symbol].heartbeat + ".stop") for symbol in "AB")
+    assert spawned[0].returncode == 0 and spawned[0].signals == []
+    assert spawned[1].signals == ["terminate"]
+    assert {worker.state for worker in sup.workers.values()} == {"stopping"}
+
+
+def test_heartbeat(tmp_path, monkeypatch):
+    path = str(tmp_path / "A.hb")
+    heartbeat = Heartbeat(path, interval=3600)
+    assert not heartbeat.beat() and os.path.exists(path)
+    open(path + ".stop", "w").close()
+    assert not heartbeat.beat()  # not looked at again within the interval
+    heartbeat.last -= 3600
+    assert heartbeat.beat()
+    monkeypatch.delenv("WORKER_HEARTBEAT", raising=False)
+    assert Heartbeat.from_env() is None
+    monkeypatch.setenv("WORKER_HEARTBEAT", path)
+    assert Heartbeat.from_env().path == path
+    assert heartbeat_path("A") == os.path.join("heartbeats", "A.hb")
+
+
+CRASHING_CHILD = """\
+import os, sys, time
+from heartbeat import Heartbeat
+heartbeat = Heartbeat.from_env()
+runs = os.path.join("logs", sys.argv[1] + ".runs")
+with open(runs, "a") as file:
+    file.write("x")
+if os.path.getsize(runs) < 3:
+    sys.exit(3)
+while not heartbeat.beat():
+    time.sleep(0.01)
+"""
+
+
+def test_real_children_restart_and_stop(tmp_path, monkeypatch):
+    # Real processes on the real clock: a child that crashes twice, then runs until asked to stop
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "child.py").write_text(CRASHING_CHILD)
+    monkeypatch.setenv("PYTHONPATH", os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    sup = Supervisor(["A"], python=sys.executable, stagger=0, backoff=0.05, grace=10)
+    worker = sup.workers["A"]
+    deadline = time.monotonic() + 30
+    while worker.state != "running" and time.monotonic() < deadline:
+        sup.step()
+        time.sleep(0.01)
+    assert worker.state == "running" and worker.restarts == 2
+    sup.shutdown()
+    assert worker.process.returncode == 0
+    with open(worker.log_path) as log:
+        assert log.read().count("--- ") == 3
@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+import urllib.request
+
+import pytest
+
+import metrics
+from metrics import LATENCY_BUCKETS, Histogram, Metrics, SamplingProfiler, serve_prometheus, timed, write_snapshots
+
+
+def test_histogram_quantiles_are_bucket_bounds():
+    histogram = Histogram(bounds=(1, 2, 5, 10))
+    for value in (0.5, 1.5, 1.5, 3, 4, 7, 20):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 2, 1, 1]
+    assert (histogram.count, histogram.sum) == (7, pytest.approx(37.5))
+    assert histogram.quantile(0.1) == 1
+    assert histogram.quantile(0.5) == 5
+    assert histogram.quantile(1.0) == float("inf")
+    assert Histogram().quantile(0.5) == 0.0
+
+
+def test_latency_buckets_are_sorted_and_span_microseconds_to_minutes():
+    assert list(LATENCY_BUCKETS) == sorted(set(LATENCY_BUCKETS))
+    assert LATENCY_BUCKETS[0] == 1e-5 and LATENCY_BUCKETS[-1] == 100.0
+
+
+@pytest.mark.parametrize("trade_type,fill,slippage", [("BUY", 101.0, 1.0), ("BUY", 99.0, -1.0),
+                                                      ("SELL", 99.0, 1.0), ("SELL", 101.0, -1.0)])
+def test_slippage_is_positive_when_filled_worse(trade_type, fill, slippage):
+    registry = Metrics()
+    registry.record_slippage("EURUSDm", trade_type, 100.0, fill)
+    assert registry.counters[("slippage_price_sum", "EURUSDm")] == slippage
+    assert registry.histograms[("slippage_price", "EURUSDm")].sum == abs(slippage)
+
+
+def test_timed_labels_by_symbol(monkeypatch):
+    registry = Metrics()
+    monkeypatch.setattr(metrics, "REGISTRY", registry)
+
+    class Strategy:
+        symbol = "BTCUSDm"
+
+        @timed("work")
+        def work(self, value):
+            return value * 2
+
+    assert Strategy().work(21) == 42
+    assert registry.histograms[("work", "BTCUSDm")].count == 1
+    snapshot = registry.snapshot()
+    assert snapshot["histograms"]["work{symbol=BTCUSDm}"]["count"] == 1
+    assert "profile" not in snapshot
+
+
+def test_prometheus_text():
+    registry = Metrics()
+    registry.observe("order_send", "EURUSDm", 0.002)
+    registry.observe("order_send", "EURUSDm", 0.2)
+    registry.inc("orders", "EURUSDm", 3)
+    registry.profiler = SamplingProfiler()
+    registry.profiler.samples['C:\\bot\\x.py:1 "q"'] = 4
+    lines = registry.prometheus_text().splitlines()
+    buckets = [line for line in lines if line.startswith("forex_order_send_bucket")]
+    counts = [int(line.rsplit(" ", 1)[1]) for line in buckets]
+    assert counts == sorted(counts) and counts[-1] == 2
+    assert buckets[-1] == 'forex_order_send_bucket{symbol="EURUSDm",le="+Inf"} 2'
+    assert 'forex_order_send_count{symbol="EURUSDm"} 2' in lines
+    assert 'forex_orders{symbol="EURUSDm"} 3' in lines
+    assert 'forex_profile_samples{location="C:\\\\bot\\\\x.py:1 \\"q\\""} 4' in lines
+
+
+def test_serve_and_write_snapshots(tmp_path):
+    registry = Metrics()
+    registry.observe("bar_close_lag", "BTCUSDm", 0.1)
+    server = serve_prometheus(0, registry)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics", timeout=5) as response:
+            assert 'forex_bar_close_lag_count{symbol="BTCUSDm"} 1' in response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+    path = str(tmp_path / "metrics.json")
+    stop = write_snapshots(path, interval=0.01, registry=registry)
+    deadline = time.time() + 5
+    while not (tmp_path / "metrics.json").exists() and time.time() < deadline:
+        time.sleep(0.01)
+    stop.set()
+    with open(path) as file:
+        assert json.load(file)["histograms"]["bar_close_lag{symbol=BTCUSDm}"]["count"] == 1
+
+
+def busy_loop(stop):
+    total = 0
+    while not stop.is_set():
+        for i in range(100000):
+            total += i
+    return total
+
+
+def test_sampling_profiler_finds_the_busy_thread():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,))
+    worker.start()
+    profiler = SamplingProfiler(interval=0.001, thread_id=worker.ident).start()
+    time.sleep(0.2)
+    profiler.stop()
+    stop.set()
+    worker.join()
+    top = profiler.top(3)
+    assert top and "busy_loop" in top[0][0]
+    assert sum(share for _, _, share in profiler.top()) == pytest.approx(1.0)
+    assert profiler.report().startswith("Profile: ")
@@ -0,0 +1,113 @@
+import importlib
+import sys
+import time
+
+import numpy as np
+import pytest
+
+from mt5_sim import ReplayFinished, SimTerminal
+from synthetic import synthetic_rates
+from timeframes import RATES_DTYPE
+
+
+def flat_bars(count, price=100.0, start=1704067200):
+    rates = np.zeros(count, dtype=RATES_DTYPE)
+    rates["time"] = start + 60 * np.arange(count)
+    rates["open"] = rates["high"] = rates["low"] = rates["close"] = price
+    return rates
+
+
+def terminal_at(rates, bar, second=30, **kwargs):
+    return SimTerminal({"BTCUSDm": rates}, start_time=int(rates["time"][bar]) + second, **kwargs)
+
+
+def buy(terminal, sl=0.0, tp=0.0, volume=0.1):
+    tick = terminal.symbol_info_tick("BTCUSDm")
+    return terminal.order_send({"action": terminal.TRADE_ACTION_DEAL, "symbol": "BTCUSDm", "volume": volume,
+                                "type": terminal.ORDER_TYPE_BUY, "price": tick.ask, "sl": sl, "tp": tp,
+                                "deviation": 10, "magic": 1})
+
+
+def test_sleep_advances_only_the_simulated_clock():
+    terminal = terminal_at(synthetic_rates(100), 10)
+    wall = time.time()
+    start = terminal.time()
+    terminal.sleep(600)
+    assert terminal.time() == start + 600
+    assert time.time() - wall < 5
+
+
+def test_replay_finishes_at_the_end_of_the_bars():
+    rates = synthetic_rates(20)
+    terminal = terminal_at(rates, 15)
+    with pytest.raises(ReplayFinished):
+        terminal.sleep(3600)
+    assert terminal.time() == int(rates["time"][-1]) + 60
+
+
+def test_tick_follows_the_intrabar_path():
+    rates = flat_bars(10)
+    rates["open"][5], rates["low"][5], rates["high"][5], rates["close"][5] = 100.0, 90.0, 110.0, 105.0
+    # Up bar: open at :00, low at :15, high at :45, close at :59
+    for second, bid in ((0, 100.0), (15, 90.0), (30, 100.0), (45, 110.0), (59, 105.0)):
+        tick = terminal_at(rates, 5, second).symbol_info_tick("BTCUSDm")
+        assert tick.bid == pytest.approx(bid)
+        assert tick.ask > tick.bid
+
+
+def test_copy_rates_from_pos_ends_with_the_forming_bar():
+    rates = synthetic_rates(100, seed=1)
+    terminal = terminal_at(rates, 50, second=15)
+    window = terminal.copy_rates_from_pos("BTCUSDm", terminal.TIMEFRAME_M1, 0, 6)
+    assert np.array_equal(window["time"], rates["time"][45:51])
+    assert np.array_equal(window[:-1], rates[45:50])
+    # The forming bar only covers the path so far
+    assert rates[50]["low"] <= window[-1]["low"] <= window[-1]["high"] <= rates[50]["high"]
+    assert window[-1]["close"] == terminal.symbol_info_tick("BTCUSDm").bid
+    closed = terminal.copy_rates_from_pos("BTCUSDm", terminal.TIMEFRAME_M1, 1, 5)
+    assert np.array_equal(closed, rates[45:50])
+
+
+def test_order_opens_and_stop_closes_it_while_sleeping():
+    rates = flat_bars(30)
+    rates["low"][20] = 90.0  # a dip through the stop in bar 20
+    terminal = terminal_at(rates, 10)
+    result = buy(terminal, sl=95.0, tp=120.0)
+    assert result.retcode == terminal.TRADE_RETCODE_DONE
+    assert len(terminal.positions_get(symbol="BTCUSDm")) == 1
+    terminal.sleep(9 * 60)
+    assert terminal.positions_total() == 1
+    terminal.sleep(2 * 60)
+    assert terminal.positions_total() == 0
+    closing = terminal.history_deals_get()[-1]
+    assert (closing.entry, closing.price, closing.comment) == (terminal.DEAL_ENTRY_OUT, 95.0, "sl")
+    assert closing.profit < 0
+
+
+def test_order_checks():
+    terminal = terminal_at(flat_bars(30), 10)
+    assert buy(terminal, sl=101.0).retcode == terminal.TRADE_RETCODE_INVALID_STOPS
+    assert buy(terminal, volume=0.0).retcode == terminal.TRADE_RETCODE_INVALID_VOLUME
+    request = {"action": terminal.TRADE_ACTION_DEAL, "symbol": "BTCUSDm", "volume": 0.1,
+               "type": terminal.ORDER_TYPE_BUY, "price": 150.0, "deviation": 10}
+    assert terminal.order_send(request).retcode == terminal.TRADE_RETCODE_REQUOTE
+    assert terminal.order_send({**request, "symbol": "NOPE"}).retcode == terminal.TRADE_RETCODE_INVALID
+    assert terminal.positions_total() == 0
+
+
+def test_sim_backend_leaves_the_time_module_alone(monkeypatch):
+    # broker.clock carries the simulated clock; time.time/time.sleep stay real for the rest of the process
+    monkeypatch.setenv("MT5_BACKEND", "sim")
+    monkeypatch.setenv("MT5_SIM_DAYS", "1")
+    monkeypatch.delenv("MT5_SIM_DATA", raising=False)
+    real_time, real_sleep = time.time, time.sleep
+    sys.modules.pop("broker", None)
+    try:
+        broker = importlib.import_module("broker")
+        assert isinstance(broker.mt5, SimTerminal)
+        assert broker.clock is broker.mt5
+        broker.clock.sleep(3600)
+        assert (time.time, time.sleep) == (real_time, real_sleep)
+        assert abs(time.time() - broker.clock.time()) > 86400
+    finally:
+        sys.modules.pop("broker", None)
@@ -0,0 +1,56 @@
+import pytest
+
+from backtest_engine import run_backtest, summarize
+from optimizer import DEFAULT_SPACE, grid, optimize, random_sample, symbol_stops
+from synthetic import synthetic_universe
+
+SPACE = {"multiplier": [1.0, 2.0], "trigger_fraction": [0.3, 0.4], "lookback": [3, 5], "fill_window": [5],
+         "sl_scale": [1.0, 2.0], "tp_scale": [1.0]}
+
+
+def serial(bars, combos, stops):
+    rows = []
+    for combo in combos:
+        summaries = {symbol: summarize(run_backtest(rates, lookback=combo["lookback"], multiplier=combo["multiplier"],
+                                                    trigger_fraction=combo["trigger_fraction"],
+                                                    fill_window=combo["fill_window"],
+                                                    sl_amount=stops[symbol][0] * combo["sl_scale"],
+                                                    tp_amount=stops[symbol][1] * combo["tp_scale"]))
+                     for symbol, rates in bars.items()}
+        rows.append((combo, sum(s["trades"] for s in summaries.values()),
+                     {symbol: s["profit"] for symbol, s in summaries.items()}))
+    return rows
+
+
+def test_grid_and_sample():
+    combos = grid(SPACE)
+    assert len(combos) == 16
+    assert len({tuple(sorted(combo.items())) for combo in combos}) == 16
+    assert random_sample(SPACE, 100) == combos
+    sample = random_sample(DEFAULT_SPACE, 10, seed=3)
+    assert sample == random_sample(DEFAULT_SPACE, 10, seed=3)
+    assert len(sample) == 10 and all(combo in grid(DEFAULT_SPACE) for combo in sample)
+
+
+def test_symbol_stops_fall_back_to_the_backtest_defaults():
+    stops = symbol_stops(["BTCJPYm", "NOTCONFIGUREDm"])
+    assert stops == {"BTCJPYm": (40000, 40000), "NOTCONFIGUREDm": (5, 10)}
+
+
+def test_parallel_sweep_matches_a_serial_run():
+    bars = synthetic_universe(["BTCUSDm", "ETHUSDm"], 3000, seed=9)
+    stops = {"BTCUSDm": (5, 10), "ETHUSDm": (8, 8)}
+    combos = grid(SPACE)
+    # Small chunks, so every worker evaluates several lookbacks of both symbols
+    rows = optimize(bars, combos, workers=2, chunk_size=3, stops=stops)
+    assert [row["rank"] for row in rows] == list(range(1, len(combos) + 1))
+    assert [row["profit"] for row in rows] == sorted((row["profit"] for row in rows), reverse=True)
+    by_combo = {tuple(row[name] for name in SPACE): row for row in rows}
+    for combo, trades, profits in serial(bars, combos, stops):
+        row = by_combo[tuple(combo.values())]
+        assert row["trades"] == trades
+        assert row["profit"] == pytest.approx(sum(profits.values()))
+        assert {symbol: row[f"profit_{symbol}"] for symbol in bars} == pytest.approx(profits)
+        decided = row["tp_hits"] + row["sl_hits"]
+        assert row["win_rate"] == (row["tp_hits"] / decided if decided else 0.0)
+    assert any(row["trades"] for row in rows)
@@ -0,0 +1,128 @@
+import pytest
+
+from mt5_sim import SimTerminal
+from order_router import OrderRouter, RateLimiter
+from symbol_specs import SymbolSpecs
+from synthetic import synthetic_rates
+
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class LaggingTerminal:
+    # Reports closed positions as still open for the first `lag` positions queries
+    def __init__(self, terminal, lag):
+        self.terminal = terminal
+        self.lag = lag
+        self.stale = terminal.positions_get()
+
+    def positions_get(self, **kwargs):
+        if self.lag:
+            self.lag -= 1
+            return self.stale
+        return self.terminal.positions_get(**kwargs)
+
+
+@pytest.fixture
+def terminal():
+    rates = synthetic_rates(600, seed=8)
+    return SimTerminal({"BTCUSDm": rates}, start_time=int(rates["time"][100]) + 20)
+
+
+def router_for(terminal, **kwargs):
+    return OrderRouter(terminal, specs=SymbolSpecs(terminal, clock=terminal), clock=terminal, **kwargs)
+
+
+def open_both_ways(router, terminal):
+    tick = terminal.symbol_info_tick("BTCUSDm")
+    for trade_type, price in (("BUY", tick.ask), ("SELL", tick.bid), ("BUY", tick.ask)):
+        _, result = router.open_position("BTCUSDm", trade_type, 0.1, price, 0.0, 0.0, "test", tick)
+        assert result.retcode == terminal.TRADE_RETCODE_DONE
+    terminal.sleep(10)
+
+
+def test_closes_are_priced_from_one_snapshot(terminal):
+    router = router_for(terminal)
+    open_both_ways(router, terminal)
+    tick, positions = router.snapshot("BTCUSDm")
+    assert len(positions) == 3
+    closes = router.close_positions("BTCUSDm", positions, tick)
+    for pos, price, result in closes:
+        assert price == (tick.bid if pos.type == terminal.ORDER_TYPE_BUY else tick.ask)
+        assert result.retcode == terminal.TRADE_RETCODE_DONE
+    assert router.confirm_closed("BTCUSDm", {pos.ticket for pos in positions}) == ()
+    assert terminal.positions_total() == 0
+    assert router.stats()["close"]["count"] == 3
+    assert router.stats()["open"]["count"] == 3
+
+
+@pytest.mark.parametrize("lag,attempts,still_open", [(0, 6, False), (3, 6, False), (6, 6, True)])
+def test_confirm_closed_backs_off(terminal, lag, attempts, still_open):
+    open_both_ways(router_for(terminal), terminal)
+    lagging = LaggingTerminal(terminal, lag)
+    tickets = {pos.ticket for pos in lagging.stale}
+    terminal_router = router_for(terminal)
+    terminal_router.close_positions("BTCUSDm", lagging.stale, terminal.symbol_info_tick("BTCUSDm"))
+    clock = FakeClock()
+    router = OrderRouter(lagging, specs=terminal_router.specs, clock=clock, confirm_attempts=attempts,
+                         confirm_backoff=0.05)
+    remaining = router.confirm_closed("BTCUSDm", tickets)
+    assert bool(remaining) == still_open
+    # One positions query per attempt, doubling the wait in between and never sleeping after the last one
+    assert clock.slept == pytest.approx([0.05 * 2 ** i for i in range(min(lag, attempts - 1))])
+
+
+def test_open_is_normalized_to_the_symbol(terminal):
+    router = router_for(terminal)
+    tick = terminal.symbol_info_tick("BTCUSDm")
+    request, result = router.open_position("BTCUSDm", "BUY", 0.1234, tick.ask + 0.004, tick.bid - 15.0031,
+                                           tick.bid + 15.0069, "test", tick)
+    assert result.retcode == terminal.TRADE_RETCODE_DONE
+    assert request["volume"] == 0.12
+    assert request["sl"] == pytest.approx(round(tick.bid - 15.01, 2))
+    assert request["tp"] == pytest.approx(round(tick.bid + 15.01, 2))
+    assert terminal.positions_get()[0].sl == request["sl"]
+
+
+def test_open_on_the_wrong_side_of_the_market_is_not_sent(terminal):
+    router = router_for(terminal)
+    tick = terminal.symbol_info_tick("BTCUSDm")
+    request, result = router.open_position("BTCUSDm", "BUY", 0.1, tick.ask, tick.bid + 1, tick.bid + 20, "test", tick)
+    assert result is None
+    assert terminal.positions_total() == 0
+    assert not router.latencies
+
+
+def test_a_stops_rejection_marks_the_spec_stale(terminal):
+    router = router_for(terminal)
+    open_both_ways(router, terminal)
+    position = terminal.positions_get()[0]
+    tick = terminal.symbol_info_tick("BTCUSDm")
+    result = router.modify_position("BTCUSDm", position.ticket, tick.bid + 50, 0.0)  # SL above a buy's bid
+    assert result.retcode == terminal.TRADE_RETCODE_INVALID_STOPS
+    assert "BTCUSDm" in router.specs.stale
+    router.specs.get("BTCUSDm")
+    assert "BTCUSDm" not in router.specs.stale
+
+
+def test_rate_limiter_refills_on_its_clock():
+    clock = FakeClock(1000.0)
+    limiter = RateLimiter(rate=2.0, burst=3, clock=clock)
+    assert [limiter.try_acquire() for _ in range(4)] == [True, True, True, False]
+    clock.sleep(0.25)
+    assert not limiter.try_acquire()
+    clock.sleep(0.25)
+    assert limiter.try_acquire()
+    clock.sleep(100)
+    # Never more than a burst, however long it was idle
+    assert [limiter.try_acquire() for _ in range(4)] == [True, True, True, False]
@@ -0,0 +1,148 @@
+import pytest
+
+from mt5_sim import SIM_EPOCH, symbol_defaults
+from portfolio_backtest import (PortfolioBacktest, SymbolBook, conversion_symbols, parse_spec_overrides,
+                                resolve_specs, stream_bars)
+from synthetic import synthetic_universe
+
+CONFIG = {"lot_size": 0.5, "sl": 150, "tp": 150, "profit_target": 5, "sl_trailing_trigger": 10,
+          "sl_trailing_adjustment": 2, "timeframe": "M1"}
+
+
+def books_for(bars, **config):
+    return [SymbolBook(symbol, {**CONFIG, **config}, symbol_defaults(float(rates["close"][0]), symbol))
+            for symbol, rates in bars.items()]
+
+
+def run(backtest, bars, symbols=None):
+    symbols = symbols or list(bars)
+    backtest.run([stream_bars(bars[symbol], index) for index, symbol in enumerate(symbols)], symbols)
+    return backtest
+
+
+def check_books(backtest):
+    # The account adds up: balance from closed trades, margin and floating P&L from the open positions
+    assert backtest.balance - backtest.initial_balance == pytest.approx(sum(trade.pnl for trade in backtest.trades))
+    open_books = [book for book in backtest.books.values() if book.position is not None]
+    assert backtest.open_positions == len(open_books)
+    assert backtest.margin == pytest.approx(sum(book.position[5] for book in open_books), abs=1e-6)
+    assert backtest.unrealized == pytest.approx(sum(book.unrealized for book in backtest.books.values()), abs=1e-6)
+
+
+def test_parse_spec_overrides():
+    overrides = parse_spec_overrides(["EURUSDm:trade_contract_size=100000", "EURUSDm:point=0.00001",
+                                      "XAUUSDm:currency_profit=USD"])
+    assert overrides == {"EURUSDm": {"trade_contract_size": 100000.0, "point": 0.00001},
+                         "XAUUSDm": {"currency_profit": "USD"}}
+    for bad in ("EURUSDm", ":point=1", "EURUSDm:digits=5", "EURUSDm:point="):
+        with pytest.raises(ValueError):
+            parse_spec_overrides([bad])
+
+
+def test_resolve_specs(capsys):
+    snapshot = {"EURUSDm": {"trade_contract_size": 100000.0, "point": 0.00001, "currency_profit": "USD",
+                            "trade_stops_level": 5}}
+    prices = {"EURUSDm": 1.1, "USDJPYm": 150.0}
+    with pytest.raises(ValueError, match=r"USDJPYm \(trade_contract_size, point, currency_profit\)"):
+        resolve_specs(["EURUSDm", "USDJPYm"], snapshot, {}, prices)
+    specs = resolve_specs(["EURUSDm", "USDJPYm"], snapshot, {"USDJPYm": {"point": 0.001}}, prices, allow_defaults=True)
+    assert "USDJPYm (trade_contract_size, currency_profit)" in capsys.readouterr().err
+    assert specs["EURUSDm"]["trade_contract_size"] == 100000.0 and specs["EURUSDm"]["trade_stops_level"] == 5
+    # Tick grid and digits follow a given point rather than the price-based guess
+    assert (specs["USDJPYm"]["trade_tick_size"], specs["USDJPYm"]["digits"]) == (0.001, 3)
+    assert specs["USDJPYm"]["currency_profit"] == "JPY"
+
+
+def test_conversions():
+    assert conversion_symbols({"JPY", "EUR"}, ["USDJPYm", "EURUSDm", "BTCUSDm"]) == ["USDJPYm", "EURUSDm"]
+    bars = synthetic_universe(["BTCJPYm"], 10, start=SIM_EPOCH)
+    backtest = PortfolioBacktest(books_for(bars))
+    with pytest.raises(ValueError, match="No JPY to USD conversion"):
+        backtest.resolve_conversions(["BTCJPYm"])
+    backtest.resolve_conversions(["BTCJPYm", "USDJPYm"])
+    assert backtest.rate("JPY") is None
+    with pytest.raises(ValueError):
+        backtest.to_account(100.0, "JPY")
+    backtest.prices["USDJPYm"] = 150.0
+    assert backtest.to_account(150.0, "JPY") == pytest.approx(1.0)
+    assert backtest.to_account(5.0, "USD") == 5.0
+
+
+def test_basket_on_one_account():
+    bars = synthetic_universe(["BTCUSDm", "ETHUSDm", "XAUUSDm"], 3 * 1440, seed=21, start=SIM_EPOCH)
+    backtest = run(PortfolioBacktest(books_for(bars), balance=100000.0), bars)
+    summary = backtest.summary()
+    assert summary["trades"] > 10
+    assert {symbol: stats["trades"] > 0 for symbol, stats in summary["symbols"].items()} == dict.fromkeys(bars, True)
+    check_books(backtest)
+    # Hourly samples on the merged time axis, then the final one
+    times = [point.time for point in backtest.curve]
+    assert times == sorted(times) and len(times) == 3 * 24 + 1
+    assert summary["final_equity"] == round(backtest.curve[-1].equity, 2)
+
+
+def test_exposure_limits_turn_entries_away():
+    bars = synthetic_universe(["BTCUSDm", "ETHUSDm", "XAUUSDm"], 2 * 1440, seed=22, start=SIM_EPOCH)
+    backtest = run(PortfolioBacktest(books_for(bars, profit_target=0), balance=100000.0, max_positions=1), bars)
+    assert backtest.summary()["rejected_entries"] > 0
+    assert max(point.open_positions for point in backtest.curve) <= 1
+    tight = run(PortfolioBacktest(books_for(bars, profit_target=0), balance=100.0, max_margin=0.5), bars)
+    # 0.5 lot at 1:200 needs 150 of margin for a 60000 symbol, which never fits in 50, and 5 for gold
+    symbols = tight.summary()["symbols"]
+    assert symbols["BTCUSDm"]["trades"] == symbols["ETHUSDm"]["trades"] == 0
+    assert symbols["BTCUSDm"]["rejected"] > 0 and symbols["XAUUSDm"]["trades"] > 0
+    check_books(tight)
+
+
+def test_entries_wait_for_a_conversion_price(capsys):
+    bars = synthetic_universe(["BTCJPYm", "USDJPYm"], 2 * 1440, seed=23, start=SIM_EPOCH)
+    bars["USDJPYm"] = bars["USDJPYm"][720:]  # no yen price for the first 12 hours
+    priced_from = int(bars["USDJPYm"]["time"][0])
+    books = books_for({"BTCJPYm": bars["BTCJPYm"]})
+    backtest = run(PortfolioBacktest(books), bars, ["BTCJPYm", "USDJPYm"])
+    assert backtest.summary()["unpriced_entries"] > 0
+    assert capsys.readouterr().err.count("skipped: no JPY price yet") == 1
+    assert backtest.trades and all(trade.entry_time >= priced_from for trade in backtest.trades)
+    check_books(backtest)
+    # With a static rate the same entries are taken from the start
+    static = run(PortfolioBacktest(books_for({"BTCJPYm": bars["BTCJPYm"]}), fx={"JPY": 1 / 150}), bars,
+                 ["BTCJPYm", "USDJPYm"])
+    assert static.summary()["unpriced_entries"] == 0
+    assert min(trade.entry_time for trade in static.trades) < priced_from
+
+
+def test_equity_is_revalued_at_every_sample():
+    # Stops too wide to be hit, and BTCJPYm's bars stop hours before the yen's: its open position must still be
+    # marked at the final yen rate, not the one of its own last bar
+    bars = synthetic_universe(["BTCJPYm", "USDJPYm"], 1440, seed=24, start=SIM_EPOCH)
+    bars["BTCJPYm"] = bars["BTCJPYm"][:1000]
+    backtest = PortfolioBacktest(books_for({"BTCJPYm": bars["BTCJPYm"]}, tp=10 ** 6, sl=10 ** 6, profit_target=0,
+                                           sl_trailing_trigger=0))
+    run(backtest, bars, ["BTCJPYm", "USDJPYm"])
+    book = backtest.books["BTCJPYm"]
+    assert book.position is not None
+    direction, _, entry_price = book.position[:3]
+    price = book.bid if direction == "BUY" else book.bid + book.offset
+    expected = (price - entry_price) * (1 if direction == "BUY" else -1) * book.volume * book.contract_size / \
+        backtest.prices["USDJPYm"]
+    assert book.unrealized == pytest.approx(expected)
+    assert backtest.curve[-1].equity == pytest.approx(backtest.balance + expected)
+    check_books(backtest)
+
+
+def test_entry_stops_are_normalized_or_refused():
+    bars = synthetic_universe(["BTCUSDm"], 10, start=SIM_EPOCH)
+    backtest = PortfolioBacktest(books_for(bars, sl=150.004, tp=149.996, profit_target=0))
+    backtest.resolve_conversions(["BTCUSDm"])
+    book = backtest.books["BTCUSDm"]
+    book.armed = ("BUY", 60000.0)
+    backtest.enter(book, SIM_EPOCH, 60000.0, 0.2)
+    # Rounded away from the market onto the 0.01 grid, as the router sends them
+    assert book.position[2:5] == (60000.2, 59849.99, 60150.0)
+    backtest.close(book, SIM_EPOCH + 60, 60000.0, "test")
+    # A bar that gapped through the stop: the SL is already on the wrong side of the bid
+    book.armed = ("BUY", 60000.0)
+    backtest.enter(book, SIM_EPOCH + 120, 59800.0, 0.2)
+    assert book.position is None
+    assert backtest.summary()["refused_entries"] == 1
+    check_books(backtest)
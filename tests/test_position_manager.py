@@ -0,0 +1,136 @@
+import numpy as np
+import pytest
+
+from mt5_sim import SIM_EPOCH, SimTerminal, symbol_defaults
+from order_router import OrderRouter
+from position_manager import PositionManager, trail_stop, trail_stop_for
+from symbol_specs import SymbolSpecs, spec_from_snapshot
+from timeframes import RATES_DTYPE
+from trade_journal import TradeJournal
+
+
+def spec(stops_level=0, point=0.01):
+    return spec_from_snapshot("BTCUSDm", {**symbol_defaults(60000.0, "BTCUSDm"), "point": point,
+                                          "trade_tick_size": point, "trade_stops_level": stops_level})
+
+
+@pytest.mark.parametrize("direction,price,sl,min_step,expected", [
+    ("BUY", 109.0, 0.0, 0.0, None),  # not triggered yet
+    ("BUY", 110.0, 0.0, 0.0, 108.0),
+    ("BUY", 115.0, 108.0, 0.0, 113.0),
+    ("BUY", 110.0, 108.5, 0.0, None),  # never loosens
+    ("BUY", 110.5, 108.0, 1.0, None),  # tighter, but by less than the step
+    ("SELL", 90.0, 0.0, 0.0, 92.0),
+    ("SELL", 85.0, 92.0, 1.0, 87.0),
+    ("SELL", 91.0, 0.0, 0.0, None),
+])
+def test_trail_stop(direction, price, sl, min_step, expected):
+    assert trail_stop(direction, 100.0, price, sl, 10.0, 2.0, min_step) == expected
+
+
+def test_trail_stop_rules_switched_off():
+    assert trail_stop("BUY", 100.0, 200.0, 0.0, 0, 2.0) is None
+    assert trail_stop("BUY", 100.0, 200.0, 0.0, 10.0, 0) is None
+
+
+@pytest.mark.parametrize("direction,price,sl,expected", [
+    ("BUY", 60020.004, 0.0, 60015.0),  # 2 behind, pushed to the 5.00 stops level and rounded down
+    ("SELL", 59979.996, 0.0, 59985.0),
+    ("BUY", 60020.0, 60014.95, None),  # 0.05 tighter: under the 10-point step once normalized
+    ("BUY", 60030.0, 60014.95, 60025.0),
+])
+def test_trail_stop_for_respects_the_stops_level(direction, price, sl, expected):
+    assert trail_stop_for(spec(stops_level=500), direction, 60000.0, price, sl, 10.0, 2.0) == expected
+
+
+def test_trail_stop_for_keeps_the_tick_grid():
+    new_sl = trail_stop_for(spec(point=0.5), "BUY", 60000.0, 60020.3, 0.0, 10.0, 2.0)
+    assert new_sl == 60018.0 and new_sl % 0.5 == 0
+
+
+def rising(minutes, start=60000.0, per_minute=1.0):
+    rates = np.zeros(minutes, dtype=RATES_DTYPE)
+    rates["time"] = SIM_EPOCH + 60 * np.arange(minutes)
+    rates["open"] = start + per_minute * np.arange(minutes)
+    rates["close"] = rates["high"] = rates["open"] + per_minute
+    rates["low"] = rates["open"]
+    return rates
+
+
+@pytest.fixture
+def terminal():
+    return SimTerminal({"BTCUSDm": rising(180), "ETHUSDm": rising(180)}, start_time=SIM_EPOCH + 60)
+
+
+def manager_for(terminal, tmp_path, **kwargs):
+    router = OrderRouter(terminal, specs=SymbolSpecs(terminal, clock=terminal), clock=terminal)
+    return PositionManager(terminal, router, journal=TradeJournal(str(tmp_path / "trades.db")), **kwargs)
+
+
+def buy(manager, terminal, symbol="BTCUSDm", volume=1.0, magic=None):
+    tick = terminal.symbol_info_tick(symbol)
+    request = {"action": terminal.TRADE_ACTION_DEAL, "symbol": symbol, "volume": volume,
+               "type": terminal.ORDER_TYPE_BUY, "price": tick.ask, "deviation": 10,
+               "magic": manager.router.magic if magic is None else magic}
+    assert terminal.order_send(request).retcode == terminal.TRADE_RETCODE_DONE
+
+
+def run(manager, terminal, seconds, step=1):
+    for _ in range(int(seconds / step)):
+        manager.update()
+        terminal.sleep(step)
+
+
+def test_trailing_stop_follows_the_price(terminal, tmp_path):
+    manager = manager_for(terminal, tmp_path)
+    manager.add("BTCUSDm", 0, 10, 2)
+    buy(manager, terminal)
+    stops = []
+    for _ in range(30 * 60):
+        manager.update()
+        stops.append(terminal.positions_get()[0].sl)
+        terminal.sleep(1)
+    position = terminal.positions_get()[0]
+    assert stops == sorted(stops)
+    assert stops[9 * 60] == 0.0  # the first 10 of the move do not trigger it
+    assert position.price_current - 2 - 0.2 <= position.sl <= position.price_current - 2
+    modifies = manager.journal.query(action="Modify")
+    assert modifies and {row["result"] for row in modifies} == {"Success"}
+    # Moves of less than STEP_POINTS are not sent, so at most one per 0.1 of price
+    first = next(sl for sl in stops if sl)
+    assert len(modifies) <= (position.sl - first) / 0.1 + 1
+
+
+def test_modifications_are_throttled_per_position(terminal, tmp_path, monkeypatch):
+    manager = manager_for(terminal, tmp_path, min_interval=60)
+    manager.add("BTCUSDm", 0, 10, 2)
+    buy(manager, terminal)
+    sent = []
+    modify_position = manager.router.modify_position
+
+    def recording(*args):
+        sent.append(terminal.time())
+        return modify_position(*args)
+
+    monkeypatch.setattr(manager.router, "modify_position", recording)
+    run(manager, terminal, 30 * 60)
+    assert len(sent) >= 15
+    assert all(later - earlier >= 60 for earlier, later in zip(sent, sent[1:]))
+
+
+def test_profit_target_closes_only_managed_positions(terminal, tmp_path):
+    manager = manager_for(terminal, tmp_path)
+    manager.add("BTCUSDm", 5, 0, 0)
+    buy(manager, terminal)
+    buy(manager, terminal, magic=999)  # not ours
+    buy(manager, terminal, symbol="ETHUSDm")  # no rule for it
+    run(manager, terminal, 4 * 60)
+    assert terminal.positions_total() == 3
+    run(manager, terminal, 3 * 60)
+    left = terminal.positions_get()
+    assert sorted((pos.symbol, pos.magic) for pos in left) == [("BTCUSDm", 999), ("ETHUSDm", manager.router.magic)]
+    closes = manager.journal.query(action="Close")
+    assert [(row["symbol"], row["result"]) for row in closes] == [("BTCUSDm", "Success")]
+    assert terminal.history_deals_get()[-1].profit >= 5
+    # What is left is not the manager's to look after
+    assert not manager.active
@@ -0,0 +1,173 @@
+import numpy as np
+import pytest
+
+from backtest_engine import run_backtest
+from bar_store import BarStore
+from ingest import PartitionStore
+from optimizer import grid
+from robustness import (DAY, DEFAULT_COMBO, Window, efficiency, load_bars, max_drawdown, monte_carlo, resample,
+                        rolling_windows, trade_sequence, walk_forward, window_edges)
+from synthetic import synthetic_universe
+
+SPACE = {"multiplier": [1.5, 2.0], "trigger_fraction": [0.3, 0.4], "lookback": [3, 5], "fill_window": [5],
+         "sl_scale": [1.0, 2.0], "tp_scale": [1.0]}
+STOPS = {"BTCUSDm": (60, 60), "ETHUSDm": (4, 4)}
+
+
+@pytest.fixture(scope="module")
+def bars():
+    return synthetic_universe(list(STOPS), 10 * 1440, seed=24, big_candle_rate=0.05)
+
+
+def trades_of(rates, combo, symbol):
+    trades = run_backtest(rates, lookback=combo["lookback"], multiplier=combo["multiplier"],
+                          trigger_fraction=combo["trigger_fraction"], fill_window=combo["fill_window"],
+                          sl_amount=STOPS[symbol][0] * combo["sl_scale"],
+                          tp_amount=STOPS[symbol][1] * combo["tp_scale"])
+    return rates["time"][trades["signal_index"]], trades["pnl"]
+
+
+def serial(bars, combos, windows, min_trades):
+    # Every combination backtested per window straight from the signal times, the best in-sample one picked
+    results = []
+    for window in windows:
+        scores = []
+        for combo in combos:
+            is_profit = oos_profit = 0.0
+            is_trades = oos_trades = 0
+            for symbol, rates in bars.items():
+                times, pnl = trades_of(rates, combo, symbol)
+                inside = (times >= window.start) & (times < window.split)
+                after = (times >= window.split) & (times < window.end)
+                is_profit += pnl[inside].sum()
+                oos_profit += pnl[after].sum()
+                is_trades += inside.sum()
+                oos_trades += after.sum()
+            scores.append((is_profit, is_trades, oos_profit, oos_trades))
+        eligible = [s[0] if s[1] >= min_trades else -np.inf for s in scores]
+        results.append((int(np.argmax(eligible)), scores))
+    return results
+
+
+def test_rolling_windows():
+    windows = rolling_windows(0, 100 * DAY, 30, 10)
+    assert windows[0] == Window(0, 30 * DAY, 40 * DAY)
+    assert len(windows) == 7 and windows[-1].end == 100 * DAY
+    assert all(a.end == b.split for a, b in zip(windows, windows[1:]))
+    # Overlapping out-of-sample periods, and a history too short for one window
+    assert [w.start for w in rolling_windows(0, 50 * DAY, 30, 10, step_days=5)] == [0, 5 * DAY, 10 * DAY]
+    assert rolling_windows(0, 30 * DAY, 30, 10) == []
+
+
+def test_window_edges():
+    times = np.arange(0, 10 * DAY, 3600)
+    edges = window_edges(times, rolling_windows(0, times[-1], 2, 1))
+    assert edges.shape == (8, 3)
+    assert edges[0].tolist() == [0, 48, 72] and edges[-1].tolist() == [168, 216, 240]
+    assert window_edges(times, []).shape == (0, 3)
+
+
+def test_walk_forward_matches_a_serial_selection(bars):
+    combos = grid(SPACE)
+    assert DEFAULT_COMBO in combos
+    rows, sequence = walk_forward(bars, combos, 3, 1, min_trades=5, workers=2, chunk_size=5, stops=STOPS)
+    windows = rolling_windows(min(r["time"][0] for r in bars.values()), max(r["time"][-1] for r in bars.values()),
+                              3, 1)
+    assert [row["window"] for row in rows] == list(range(1, len(windows) + 1)) and len(rows) == 7
+    default = combos.index(DEFAULT_COMBO)
+    for row, (best, scores) in zip(rows, serial(bars, combos, windows, 5)):
+        assert {name: row[name] for name in SPACE} == combos[best]
+        assert row["in_sample_profit"] == pytest.approx(scores[best][0])
+        assert row["in_sample_trades"] == scores[best][1] >= 5
+        assert row["out_of_sample_profit"] == pytest.approx(scores[best][2])
+        assert row["out_of_sample_trades"] == scores[best][3]
+        assert row["default_in_sample_rank"] == 1 + sum(s[0] > scores[default][0] for s in scores)
+        assert row["default_out_of_sample_profit"] == pytest.approx(scores[default][2])
+    # The selected combinations' out-of-sample trades, ready for monte_carlo()
+    assert len(sequence) == sum(row["out_of_sample_trades"] for row in rows)
+    assert sequence.sum() == pytest.approx(sum(row["out_of_sample_profit"] for row in rows))
+
+
+def test_walk_forward_skips_windows_without_enough_trades(bars):
+    combos = grid(SPACE)[:3]
+    rows, sequence = walk_forward(bars, combos, 3, 1, min_trades=10 ** 6, workers=1, stops=STOPS)
+    assert all(row["multiplier"] is None and row["out_of_sample_trades"] == 0 for row in rows)
+    assert len(sequence) == 0
+    rows, sequence = walk_forward(bars, combos, 30, 30, workers=1, stops=STOPS)  # history too short
+    assert rows == [] and len(sequence) == 0
+
+
+def test_efficiency():
+    rows = [{"in_sample_profit": 90.0, "out_of_sample_profit": 15.0},
+            {"in_sample_profit": 30.0, "out_of_sample_profit": 5.0}]
+    assert efficiency(rows, 90, 30) == pytest.approx((20 / 30) / (120 / 90))
+    assert np.isnan(efficiency([{"in_sample_profit": -1.0, "out_of_sample_profit": 1.0}], 90, 30))
+
+
+@pytest.mark.parametrize("pnl,expected", [([1, -3, 2, -1], 3), ([-2, 1], 2), ([1, 2, 3], 0), ([], 0)])
+def test_max_drawdown_from_the_running_peak(pnl, expected):
+    assert max_drawdown(np.array(pnl, dtype=float)) == expected
+
+
+def test_resample():
+    pnl = np.random.default_rng(0).normal(0.5, 10, 200)
+    final, drawdown, equity = resample(pnl, 500, 7, "shuffle", checkpoints=np.array([0, 99, 199]))
+    assert final == pytest.approx(np.full(500, pnl.sum()))  # a permutation keeps the total
+    assert equity[:, -1] == pytest.approx(final) and equity.shape == (500, 3)
+    assert (drawdown >= 0).all() and drawdown.std() > 0
+    again = resample(pnl, 500, 7, "bootstrap")
+    assert np.array_equal(again[0], resample(pnl, 500, 7, "bootstrap")[0])
+    assert again[0].std() > 0 and not np.array_equal(again[0], resample(pnl, 500, 8, "bootstrap")[0])
+
+
+def test_monte_carlo_does_not_depend_on_the_worker_count():
+    pnl = np.random.default_rng(1).normal(0.2, 5, 300)
+    serial_result = monte_carlo(pnl, 2000, seed=3, chunk_cells=300 * 150)
+    parallel = monte_carlo(pnl, 2000, seed=3, workers=2, chunk_cells=300 * 150)
+    for key in ("profit", "drawdown"):
+        assert serial_result[key] == parallel[key]
+        assert list(serial_result[key].values()) == sorted(serial_result[key].values())
+    assert serial_result["loss_probability"] == parallel["loss_probability"]
+    assert all(np.array_equal(serial_result["equity"][band], parallel["equity"][band]) for band in (5, 50, 95))
+    assert serial_result["checkpoints"][0] == 1 and serial_result["checkpoints"][-1] == 300
+    assert serial_result["actual_profit"] == pytest.approx(pnl.sum())
+    assert serial_result["actual_drawdown"] == max_drawdown(pnl)
+    assert monte_carlo(pnl, 2000, seed=4)["profit"] != serial_result["profit"]
+
+
+def test_monte_carlo_shuffle_and_empty():
+    pnl = np.array([3.0, -1.0, -1.0, 2.0, -4.0, 5.0])
+    result = monte_carlo(pnl, 200, method="shuffle")
+    assert all(value == pytest.approx(4.0) for value in result["profit"].values())
+    assert result["loss_probability"] == 0.0 and result["drawdown"][95] >= result["drawdown"][5] >= 0
+    assert list(result["checkpoints"]) == [1, 2, 3, 4, 5, 6]
+    assert monte_carlo([], 100) is None and monte_carlo(pnl, 0) is None
+
+
+def test_trade_sequence_merges_symbols_in_signal_order(bars):
+    pnl = trade_sequence(bars, DEFAULT_COMBO, stops=STOPS)
+    merged = sorted((t, p) for symbol, rates in bars.items()
+                    for t, p in zip(*trades_of(rates, DEFAULT_COMBO, symbol)))
+    assert len(pnl) == len(merged) > 0
+    assert pnl.sum() == pytest.approx(sum(p for _, p in merged))
+    only = trade_sequence({"BTCUSDm": bars["BTCUSDm"]}, DEFAULT_COMBO, stops=STOPS)
+    assert np.array_equal(only, trades_of(bars["BTCUSDm"], DEFAULT_COMBO, "BTCUSDm")[1])
+
+
+@pytest.mark.parametrize("kind", ["partitions", "bar_store"])
+def test_load_bars(tmp_path, kind):
+    bars = synthetic_universe(["BTCUSDm", "ETHUSDm"], 5 * 1440, seed=5)
+    if kind == "partitions":
+        store = PartitionStore(str(tmp_path))
+        for symbol, rates in bars.items():
+            store.ingest(symbol, "M1", [rates])
+    else:
+        store = BarStore(str(tmp_path))
+        for symbol, rates in bars.items():
+            store.append(symbol, "M1", rates)
+    loaded = load_bars(str(tmp_path), None, "M1")
+    assert set(loaded) == set(bars)
+    assert all(np.array_equal(loaded[symbol]["time"], bars[symbol]["time"]) for symbol in bars)
+    recent = load_bars(str(tmp_path), ["ETHUSDm"], "M1", days=2)
+    assert list(recent) == ["ETHUSDm"]
+    assert recent["ETHUSDm"]["time"][0] == bars["ETHUSDm"]["time"][-1] - 2 * DAY
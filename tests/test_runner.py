@@ -0,0 +1,104 @@
+import pytest
+
+import symbol_specs
+import trade_journal
+from config import SymbolConfig
+from mt5_sim import SIM_EPOCH, SimTerminal
+from runner import MultiSymbolRunner, build_strategies
+from strategy import SymbolStrategy
+from synthetic import synthetic_universe
+from timeframes import timeframe_seconds
+
+
+def config(timeframe, **overrides):
+    values = {"lot_size": 0.1, "profit_target": 5, "sl_trailing_trigger": 10, "sl_trailing_adjustment": 2,
+              "timeframe": timeframe, "interval_minutes": 1, "sl": 500, "tp": 500}
+    values.update(overrides)
+    return values
+
+
+@pytest.fixture
+def terminal(tmp_path, monkeypatch):
+    # Strategy logs and the trade journal go under tmp_path; specs are read from this terminal, not a cached one
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(symbol_specs, "_specs", None)
+    monkeypatch.setattr(trade_journal, "_journal", trade_journal.TradeJournal(str(tmp_path / "trades.db")))
+    bars = synthetic_universe(["BTCUSDm", "ETHUSDm", "BTCJPYm"], 2 * 1440, seed=7, start=SIM_EPOCH)
+    return SimTerminal(bars, start_time=SIM_EPOCH + 90)
+
+
+@pytest.fixture
+def closes(monkeypatch):
+    # (symbol, closed bar open time, simulated time it was evaluated) for every bar-close callback
+    seen = []
+    on_bar_close = SymbolStrategy.on_bar_close
+
+    def recording(self, symbol, timeframe, closed):
+        seen.append((symbol, int(closed["time"][-1]), self.clock.time()))
+        on_bar_close(self, symbol, timeframe, closed)
+
+    monkeypatch.setattr(SymbolStrategy, "on_bar_close", recording)
+    return seen
+
+
+def run_for(runner, terminal, seconds):
+    end = terminal.time() + seconds
+    while terminal.time() < end:
+        runner.run_cycle()
+        terminal.sleep(min(runner.sleep_time(), end - terminal.time()))
+
+
+def test_every_symbol_is_evaluated_at_its_own_bar_close(terminal, closes):
+    strategies = build_strategies(terminal, {"BTCUSDm": config("M15"), "ETHUSDm": config("H1")}, clock=terminal)
+    runner = MultiSymbolRunner(terminal, strategies, clock=terminal)
+    assert all(strategy.clock is terminal for strategy in strategies)
+    run_for(runner, terminal, 4 * 3600)
+    for symbol, timeframe, count in (("BTCUSDm", "M15", 16), ("ETHUSDm", "H1", 4)):
+        seconds = timeframe_seconds(timeframe)
+        evaluated = [(bar, at) for name, bar, at in closes if name == symbol]
+        # The first close is the bar forming at start; each one is seen within a poll of its close
+        assert [bar for bar, _ in evaluated] == [SIM_EPOCH + i * seconds for i in range(count)]
+        assert all(0 <= at - (bar + seconds) <= 2 for bar, at in evaluated)
+
+
+def test_runner_shares_one_router_and_manager(terminal):
+    strategies = build_strategies(terminal, {"BTCUSDm": config("M5"), "ETHUSDm": config("M5")}, clock=terminal)
+    runner = MultiSymbolRunner(terminal, strategies, clock=terminal)
+    assert len({id(strategy.router) for strategy in strategies}) == 1
+    assert len(runner.managers) == 1
+    run_for(runner, terminal, 6 * 3600)
+    summary = terminal.summary()
+    assert summary["opened"] > 0
+    # Every entry went through and was journalled
+    opens = trade_journal.get_journal().query(action="Open")
+    assert len(opens) == summary["opened"]
+    assert {row["result"] for row in opens} == {"Success"}
+
+
+def test_apply_config_adds_moves_and_stops_symbols(terminal, closes):
+    strategies = build_strategies(terminal, {"BTCUSDm": config("M5"), "ETHUSDm": config("M5")}, clock=terminal)
+    runner = MultiSymbolRunner(terminal, strategies, clock=terminal)
+    run_for(runner, terminal, 1800)
+
+    changes = {
+        "BTCUSDm": SymbolConfig("BTCUSDm", **config("M15", lot_size=0.2), enabled=True),
+        "ETHUSDm": SymbolConfig("ETHUSDm", **config("M5"), enabled=False),
+        "BTCJPYm": SymbolConfig("BTCJPYm", **config("M5", sl=40000, tp=40000), enabled=True),
+    }
+    runner.apply_config(changes)
+    by_symbol = {strategy.symbol: strategy for strategy in runner.strategies}
+    assert sorted(by_symbol) == ["BTCJPYm", "BTCUSDm"]
+    assert by_symbol["BTCUSDm"].lot_size == 0.2
+    # The new symbol joins the shared router and manager
+    assert by_symbol["BTCJPYm"].router is by_symbol["BTCUSDm"].router
+    assert runner.managers == [by_symbol["BTCUSDm"].manager]
+    assert set(runner.scheduler.subscriptions) == {("BTCUSDm", by_symbol["BTCUSDm"].timeframe),
+                                                   ("BTCJPYm", by_symbol["BTCJPYm"].timeframe)}
+
+    changed_at = terminal.time()
+    del closes[:]
+    run_for(runner, terminal, 3600)
+    assert not [entry for entry in closes if entry[0] == "ETHUSDm"]
+    btc = [bar for symbol, bar, _ in closes if symbol == "BTCUSDm"]
+    assert btc and all(bar % 900 == 0 for bar in btc)
+    assert [bar for symbol, bar, _ in closes if symbol == "BTCJPYm"][-1] >= changed_at + 3600 - 2 * 300
@@ -0,0 +1,118 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from candle_state import CandleRangeState, trigger_level
+from mt5_sim import SIM_EPOCH, SimTerminal
+from scanner import UniverseWindow, resolve_symbols, synthetic_window
+from synthetic import synthetic_universe
+from timeframes import TIMEFRAMES
+
+SYMBOLS = ["BTCUSDm", "ETHUSDm", "XAUUSDm", "EURUSDm", "USDJPYm", "GBPUSDm", "BTCJPYm", "USOILm"]
+
+
+@pytest.fixture
+def terminal():
+    bars = synthetic_universe(SYMBOLS, 2 * 1440, seed=21, start=SIM_EPOCH, big_candle_rate=0.1)
+    return SimTerminal(bars, start_time=SIM_EPOCH + 30 * 60 + 17)
+
+
+def allpair_rule(rates):
+    # allpair.py's original per-symbol check on a DataFrame of the last 6 candles
+    df = pd.DataFrame(rates)
+    last_candle = df.iloc[-1]
+    avg_size = (df.iloc[:-1]['high'] - df.iloc[:-1]['low']).mean()
+    last_candle_size = last_candle['high'] - last_candle['low']
+    if last_candle_size >= 2 * avg_size:
+        return last_candle['low'] + (last_candle_size * 0.4)
+    return None
+
+
+def strategy_rule(rates):
+    # SymbolStrategy.check_entry_condition's rule: direction from the candle before the signal candle
+    state = CandleRangeState(5)
+    state.update(rates[:-1])
+    last = rates[-1]
+    if last["high"] - last["low"] >= 1.2 * state.average_range():
+        return state.last_direction(), trigger_level(float(last["high"]), float(last["low"]), state.last_direction())
+    return None
+
+
+def test_scan_matches_the_per_symbol_rule_on_the_forming_candle(terminal):
+    window = UniverseWindow(SYMBOLS, "M1")
+    found = 0
+    for _ in range(150):
+        assert window.load(terminal, start_pos=0) == len(SYMBOLS)
+        candidates = window.scan(multiple=2, direction="BUY")
+        expected = {}
+        for symbol in SYMBOLS:
+            trigger = allpair_rule(terminal.copy_rates_from_pos(symbol, TIMEFRAMES["M1"], 0, 6))
+            if trigger is not None:
+                expected[symbol] = trigger
+        assert {c.symbol: c.trigger for c in candidates} == pytest.approx(expected)
+        assert all(c.direction == "BUY" for c in candidates)
+        assert [c.ratio for c in candidates] == sorted((c.ratio for c in candidates), reverse=True)
+        found += len(candidates)
+        terminal.sleep(83)
+    assert found > 20
+
+
+def test_scan_matches_the_strategy_rule_on_closed_candles(terminal):
+    window = UniverseWindow(SYMBOLS, TIMEFRAMES["M5"])
+    found = 0
+    for _ in range(100):
+        window.load(terminal)
+        candidates = {c.symbol: (c.direction, c.trigger) for c in window.scan(multiple=1.2)}
+        for symbol in SYMBOLS:
+            rates = terminal.copy_rates_from_pos(symbol, TIMEFRAMES["M5"], 1, 6)
+            expected = strategy_rule(rates)
+            if expected is None:
+                assert symbol not in candidates
+            else:
+                assert candidates[symbol][0] == expected[0]
+                assert candidates[symbol][1] == pytest.approx(expected[1])
+        found += len(candidates)
+        terminal.sleep(300)
+    assert found > 20
+
+
+def test_rows_without_history_are_left_out(terminal):
+    window = UniverseWindow(["BTCUSDm", "ETHUSDm"], "M1", lookback=5)
+    rates = terminal.copy_rates_from_pos("BTCUSDm", TIMEFRAMES["M1"], 1, 20)
+    big = rates[-6:].copy()
+    big["high"][-1] = big["low"][-1] + 100 * (big["high"][:-1] - big["low"][:-1]).mean()
+    assert window.set("BTCUSDm", big) and window.set("ETHUSDm", big)
+    assert len(window.scan()) == 2
+    assert not window.set("ETHUSDm", big[:5])
+    assert [c.symbol for c in window.scan()] == ["BTCUSDm"]
+    assert not window.set("BTCUSDm", None)
+    assert window.scan() == []
+    # Only the newest lookback + 1 bars are kept
+    window.set("BTCUSDm", np.concatenate((rates, big)))
+    assert np.array_equal(window.time[0], big["time"])
+
+
+def test_flat_history_never_signals():
+    window = synthetic_window(3)
+    window.high[1, :-1] = window.low[1, :-1]  # no range to compare with
+    window.high[1, -1] = window.low[1, -1] + 1
+    assert "SYM0001" not in {c.symbol for c in window.scan(multiple=0)}
+
+
+def test_scan_filters():
+    window = synthetic_window(200)
+    everything = window.scan(multiple=0)
+    assert len(everything) == 200
+    assert [c.symbol for c in window.scan(multiple=0, limit=5)] == [c.symbol for c in everything[:5]]
+    assert {c.symbol for c in window.scan(multiple=0, symbols=["SYM0003", "SYM0150"])} == {"SYM0003", "SYM0150"}
+    window.time[:10, -1] += 60
+    assert len(window.scan(multiple=0, since=window.time[0, -1])) == 10
+    strong = window.scan(multiple=3)
+    assert strong and all(c.ratio >= 3 and c.size == pytest.approx(c.high - c.low) for c in strong)
+    sells = window.scan(multiple=3, direction="SELL")
+    assert all(c.trigger == pytest.approx(c.high - 0.4 * c.size) for c in sells)
+
+
+def test_resolve_symbols(terminal):
+    assert resolve_symbols(terminal, "*") == SYMBOLS
+    assert resolve_symbols(terminal, ("EURUSDm", "XAUUSDm")) == ["EURUSDm", "XAUUSDm"]
@@ -0,0 +1,150 @@
+import os
+
+import numpy as np
+import pytest
+
+import session_log
+import strategy
+import symbol_specs
+import trade_journal
+from config import SymbolConfig
+from mt5_sim import SIM_EPOCH, ReplayFinished, SimTerminal
+from runner import MultiSymbolRunner, build_strategies
+from session_log import (NOTE, REPEAT, LogExhausted, ReplayHeartbeat, ReplayTerminal, SessionRecorder, compare,
+                         read_log, replay)
+from strategy import SymbolStrategy
+from synthetic import synthetic_universe
+
+CONFIG = {"lot_size": 0.1, "profit_target": 5, "sl_trailing_trigger": 10, "sl_trailing_adjustment": 2,
+          "timeframe": "M5", "interval_minutes": 1, "sl": 150, "tp": 150}
+
+
+@pytest.fixture
+def terminal(tmp_path, monkeypatch):
+    # Strategy logs and the trade journal under tmp_path, specs read from this terminal
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(symbol_specs, "_specs", None)
+    monkeypatch.setattr(trade_journal, "_journal", trade_journal.TradeJournal(str(tmp_path / "trades.db")))
+    bars = synthetic_universe(["BTCUSDm", "ETHUSDm"], 1440, seed=23, start=SIM_EPOCH, big_candle_rate=0.1)
+    return SimTerminal(bars, start_time=SIM_EPOCH + 90, end_time=SIM_EPOCH + 12 * 3600)
+
+
+@pytest.fixture
+def recorder(terminal, tmp_path, monkeypatch):
+    # What from_env sets up under SESSION_LOG, on the simulator's clock
+    recorder = SessionRecorder(terminal, str(tmp_path / "sessions" / "live.bin"), clock=terminal)
+    monkeypatch.setattr(session_log, "_sink", recorder)
+    yield recorder
+    recorder.close()
+
+
+def record(recorder, run):
+    # Run a live loop on the recording terminal until the simulated session ends
+    with pytest.raises(ReplayFinished):
+        run()
+    recorder.close()
+    symbol_specs._specs = None  # the replay reads its specs from the log, as a fresh process would
+    return recorder.path
+
+
+def test_child_session_replays_without_divergence(terminal, recorder):
+    cfg = SymbolConfig("BTCUSDm", enabled=True, **CONFIG)
+    live = SymbolStrategy.from_config(recorder, cfg, clock=terminal)
+    live.log_settings()
+    path = record(recorder, lambda: live.run(None, ReplayHeartbeat(1.0)))
+    replayed = replay(path)
+    assert replayed.stopped == "reached the end of the log"
+    live_signals = [n for n in replayed.recorded if n.kind == "signal"]
+    assert len(live_signals) > 5 and replayed.orders > 0
+    assert compare(replayed) == [] and replayed.divergences == []
+    assert [(n.kind, n.value) for n in replayed.replayed if n.kind in ("signal", "trigger")] == \
+        [(n.kind, n.value) for n in replayed.recorded if n.kind in ("signal", "trigger")]
+
+
+def test_runner_session_replays_without_divergence(terminal, recorder):
+    strategies = build_strategies(recorder, {"BTCUSDm": CONFIG, "ETHUSDm": dict(CONFIG, timeframe="M15")},
+                                  clock=terminal)
+    for live in strategies:
+        live.log_settings()
+    runner = MultiSymbolRunner(recorder, strategies, clock=terminal)
+    replayed = replay(record(recorder, runner.run))
+    assert {n.symbol for n in replayed.recorded if n.kind == "signal"} == {"BTCUSDm", "ETHUSDm"}
+    assert compare(replayed) == [] and replayed.divergences == []
+
+
+def test_changed_strategy_code_shows_where_it_diverges(terminal, recorder, monkeypatch):
+    cfg = SymbolConfig("BTCUSDm", enabled=True, **CONFIG)
+    live = SymbolStrategy.from_config(recorder, cfg, clock=terminal)
+    live.log_settings()
+    path = record(recorder, lambda: live.run(None, ReplayHeartbeat(1.0)))
+    # The trigger moved from 40% to 60% of the signal candle
+    trigger_level = strategy.trigger_level
+    monkeypatch.setattr(strategy, "trigger_level", lambda high, low, side: trigger_level(high, low, side, 0.6))
+    replayed = replay(path)
+    differences = compare(replayed)
+    assert [symbol for symbol, *_ in differences] == ["BTCUSDm"]
+    _, index, before, again = differences[0]
+    assert index == 0 and before.kind == again.kind == "signal" and before.value[1] != again.value[1]
+
+
+def test_log_records(terminal, tmp_path):
+    path = str(tmp_path / "calls.bin")
+    recorder = SessionRecorder(terminal, path, clock=terminal)
+    rates = recorder.copy_rates_from_pos("BTCUSDm", terminal.TIMEFRAME_M1, 0, 10)
+    for _ in range(3):
+        recorder.positions_get(symbol="BTCUSDm")
+    tick = recorder.symbol_info_tick("BTCUSDm")
+    assert recorder.symbol_info_tick("NOPEm") is None
+    recorder.note("signal", "BTCUSDm", ("BUY", 1.5))
+    recorder.close()
+    constants, records, keys = read_log(path)
+    assert constants["TRADE_RETCODE_DONE"] == terminal.TRADE_RETCODE_DONE
+    assert [record.kind for record in records].count(REPEAT) == 2  # an unchanged answer is one byte
+    assert records[-1].kind == NOTE
+    again = ReplayTerminal(path)
+    assert again.TIMEFRAME_M1 == terminal.TIMEFRAME_M1
+    assert np.array_equal(again.copy_rates_from_pos("BTCUSDm", terminal.TIMEFRAME_M1, 0, 10), rates)
+    assert again.positions_get(symbol="BTCUSDm") == ()
+    assert tuple(again.symbol_info_tick("BTCUSDm")) == tuple(tick)
+    assert again.symbol_info_tick("NOPEm") is None
+    with pytest.raises(LogExhausted, match="never called live"):
+        again.symbol_info_tick("ETHUSDm")
+    # A record cut short by a crash ends the read instead of failing it
+    with open(path, "rb") as file:
+        data = file.read()
+    with open(path, "wb") as file:
+        file.write(data[:-3])
+    assert len(read_log(path)[1]) == len(records) - 1
+    with open(path, "wb") as file:
+        file.write(b"not a log")
+    with pytest.raises(ValueError, match="not a session log"):
+        read_log(path)
+
+
+def test_diverging_calls_get_the_newest_answer_at_their_time(terminal, tmp_path):
+    path = str(tmp_path / "ticks.bin")
+    recorder = SessionRecorder(terminal, path, clock=terminal)
+    live = []
+    for _ in range(5):
+        live.append(recorder.symbol_info_tick("BTCUSDm"))
+        terminal.sleep(10)
+    recorder.close()
+    again = ReplayTerminal(path)
+    assert again.symbol_info_tick("BTCUSDm").bid == live[0].bid
+    again.sleep(25)  # asked less often than live: skips what was answered in between
+    assert again.symbol_info_tick("BTCUSDm") == live[2]
+    again.sleep(100)
+    with pytest.raises(LogExhausted, match="end of the log"):
+        again.symbol_info_tick("BTCUSDm")
+
+
+def test_from_env(terminal, tmp_path, monkeypatch):
+    monkeypatch.setattr(session_log, "_sink", None)
+    monkeypatch.delenv("SESSION_LOG", raising=False)
+    assert session_log.from_env(terminal, "BTCUSDm") is terminal
+    monkeypatch.setenv("SESSION_LOG", str(tmp_path / "sessions"))
+    wrapped = session_log.from_env(terminal, "BTCUSDm", clock=terminal)
+    assert session_log._sink is wrapped and wrapped.clock is terminal
+    name = os.path.basename(wrapped.path)
+    assert name.startswith("BTCUSDm-") and name.endswith(f"-{os.getpid()}.bin")
+    wrapped.close()
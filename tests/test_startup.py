@@ -0,0 +1,80 @@
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from master import Supervisor, Worker
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("numpy", "pandas", "MetaTrader5", "mt5_sim", "strategy")
+
+
+def imported(code_or_args, cwd=ROOT):
+    # Top-level modules a fresh interpreter imported, from -X importtime's report on stderr
+    args = ["-c", code_or_args] if isinstance(code_or_args, str) else code_or_args
+    result = subprocess.run([sys.executable, "-X", "importtime", *args], cwd=cwd, capture_output=True, text=True)
+    modules = {line.split("|")[-1].strip().split(".")[0] for line in result.stderr.splitlines()
+               if line.startswith("import time:")}
+    return result, modules
+
+
+def test_supervisor_imports_stay_light():
+    result, modules = imported("import master")
+    assert result.returncode == 0
+    assert not modules & set(HEAVY)
+
+
+def test_bad_arguments_fail_before_the_heavy_imports():
+    result, modules = imported(["child.py"])
+    assert result.returncode == 1 and "Usage: python child.py" in result.stdout
+    assert not modules & set(HEAVY)
+
+
+def test_master_compiles_cleanly():
+    # No SyntaxWarning, e.g. from an escape sequence in the interpreter path
+    code = "compile(open('master.py').read(), 'master.py', 'exec')"
+    result = subprocess.run([sys.executable, "-W", "error", "-c", code], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+
+
+def wait_for(supervisor, done, timeout=60):
+    deadline = time.monotonic() + timeout
+    while not done():
+        assert time.monotonic() < deadline, "workers did not come up in time"
+        supervisor.step()
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    # Real child.py processes on the simulator, with their logs and heartbeats under tmp_path
+    monkeypatch.chdir(tmp_path)
+    os.symlink(os.path.join(ROOT, "child.py"), tmp_path / "child.py")
+    monkeypatch.setenv("PYTHONPATH", ROOT)
+    monkeypatch.setenv("MT5_BACKEND", "sim")
+    monkeypatch.setenv("MT5_SIM_DAYS", "2")
+    monkeypatch.delenv("TICK_FEED", raising=False)
+    monkeypatch.delenv("SESSION_LOG", raising=False)
+    return tmp_path
+
+
+def test_warm_worker_takes_a_symbol(workdir):
+    supervisor = Supervisor([], python=sys.executable, stagger=0, pool_size=1)
+    try:
+        wait_for(supervisor, lambda: supervisor.spares and supervisor.spares[0].warm)
+        pid = supervisor.spares[0].process.pid
+        supervisor.workers["BTCUSDm"] = worker = Worker("BTCUSDm")
+        wait_for(supervisor, lambda: worker.state == "running")
+        assert worker.process.pid == pid and not worker.cold
+        # Already imported and connected: up after one config read and the first bars, not an interpreter start
+        assert worker.up_after < 5
+    finally:
+        supervisor.shutdown()
+    assert worker.process.returncode == 0
+    with open(worker.log_path) as log:
+        assert "assigning BTCUSDm to warm worker pool-1" in log.read()
+    with open(workdir / "logs" / "BTCUSDm.log") as log:
+        assert "BTCUSDm asked to stop by the supervisor" in log.read()
+
@@ -0,0 +1,185 @@
+import logging
+
+import numpy as np
+import pytest
+
+from mt5_sim import SIM_EPOCH, SimTerminal, symbol_defaults
+from symbol_specs import (SymbolSpecs, decimals, load_snapshot, normalize_price, normalize_stops, normalize_volume,
+                          save_snapshot, spec_from_info, spec_from_snapshot, take_snapshot)
+from synthetic import synthetic_universe
+
+
+class CountingTerminal:
+    # Passes everything through to the simulator, counting the spec reads
+    def __init__(self, terminal):
+        self.terminal = terminal
+        self.calls = []
+
+    def __getattr__(self, name):
+        return getattr(self.terminal, name)
+
+    def symbols_get(self, group=None):
+        self.calls.append(("symbols_get", group))
+        return self.terminal.symbols_get(group)
+
+    def symbol_info(self, symbol):
+        self.calls.append(("symbol_info", symbol))
+        return self.terminal.symbol_info(symbol)
+
+
+def spec(**fields):
+    return spec_from_snapshot("TESTm", {**symbol_defaults(60000.0, "TESTm"), **fields})
+
+
+@pytest.fixture
+def terminal():
+    bars = synthetic_universe(["BTCUSDm", "EURUSDm", "XAUUSDm"], 600, seed=22, start=SIM_EPOCH)
+    specs = {"XAUUSDm": {"point": 0.001, "digits": 3, "trade_tick_size": 0.005, "trade_stops_level": 200,
+                         "volume_step": 0.1, "volume_min": 0.1}}
+    return CountingTerminal(SimTerminal(bars, start_time=SIM_EPOCH + 60, specs=specs))
+
+
+@pytest.mark.parametrize("step,expected", [(0.01, 2), (0.5, 1), (1, 0), (0.00001, 5), (0.25, 2), (100, 0)])
+def test_decimals(step, expected):
+    assert decimals(step) == expected
+
+
+@pytest.mark.parametrize("price,rounding,expected", [
+    (100.12, "nearest", 100.0),
+    (100.13, "nearest", 100.25),
+    (100.01, "up", 100.25),
+    (100.24, "down", 100.0),
+    (100.25, "up", 100.25),  # already on the grid: not pushed a tick further
+    (100.25, "down", 100.25),
+])
+def test_normalize_price(price, rounding, expected):
+    assert normalize_price(spec(trade_tick_size=0.25, point=0.01, digits=2), price, rounding) == expected
+
+
+def test_normalize_price_keeps_the_digits():
+    fx = spec(point=0.00001, trade_tick_size=0.00001, digits=5)
+    assert normalize_price(fx, 1.1 + 0.2) == 1.3
+    assert normalize_price(fx, 1.123456, "up") == 1.12346
+    assert all(normalize_price(fx, value) == round(value, 5) for value in np.linspace(1.05, 1.15, 101))
+
+
+@pytest.mark.parametrize("volume,expected", [(0.057, 0.05), (0.001, 0.01), (1000, 200.0), (0.3, 0.3), (0.07, 0.07)])
+def test_normalize_volume(volume, expected):
+    assert normalize_volume(spec(), volume) == expected
+
+
+def test_normalize_volume_on_a_coarse_step():
+    coarse = spec(volume_step=0.5, volume_min=0.5, volume_max=10.0)
+    assert [normalize_volume(coarse, volume) for volume in (0.2, 1.49, 1.5, 12)] == [0.5, 1.0, 1.5, 10.0]
+
+
+@pytest.mark.parametrize("direction,sl,tp,expected", [
+    ("BUY", 59900.004, 60100.004, (59900.0, 60100.01)),  # rounded away from the market
+    ("BUY", 59999.0, 60001.0, (59995.0, 60005.0)),  # pushed out to the 5.00 stops level from the bid
+    ("BUY", 0.0, 60100.0, (0.0, 60100.0)),
+    ("BUY", 60000.5, 60100.0, None),  # SL above the bid: would be hit on entry
+    ("SELL", 60100.004, 59900.004, (60100.01, 59900.0)),
+    ("SELL", 60002.0, 59999.0, (60006.0, 59996.0)),  # measured from the ask
+    ("SELL", 60100.0, 60001.5, None),
+])
+def test_normalize_stops(direction, sl, tp, expected):
+    assert normalize_stops(spec(trade_stops_level=500), direction, sl, tp, 60000.0, 60001.0) == expected
+
+
+def test_bulk_load_then_no_round_trips(terminal):
+    specs = SymbolSpecs(terminal, clock=terminal)
+    assert specs.load(["BTCUSDm", "XAUUSDm"]) == []
+    assert terminal.calls == [("symbols_get", "BTCUSDm,XAUUSDm")]
+    assert set(specs.specs) == {"BTCUSDm", "XAUUSDm"}
+    gold = specs.get("XAUUSDm")
+    assert (gold.tick_size, gold.stops_level, gold.volume_step, gold.volume_digits) == (0.005, 200, 0.1, 1)
+    assert gold == spec_from_info(terminal.symbol_info("XAUUSDm"))
+    terminal.calls.clear()
+    specs.get("BTCUSDm")
+    assert terminal.calls == []
+    # A symbol left out of the bulk read costs one symbol_info
+    assert specs.get("EURUSDm").point == 0.00001
+    specs.get("EURUSDm")
+    assert specs.get("NOPEm") is None
+    assert terminal.calls == [("symbol_info", "EURUSDm"), ("symbol_info", "NOPEm")]
+
+
+def test_refresh_replaces_changed_specs(terminal, caplog):
+    specs = SymbolSpecs(terminal, interval=300, clock=terminal)
+    specs.load()
+    assert set(specs.specs) == {"BTCUSDm", "EURUSDm", "XAUUSDm"}
+    terminal.specs["BTCUSDm"]["trade_stops_level"] = 50
+    terminal.sleep(299)
+    assert specs.maybe_refresh() == []
+    assert specs.get("BTCUSDm").stops_level == 0
+    terminal.sleep(1)
+    with caplog.at_level(logging.INFO, logger="symbol_specs"):
+        assert specs.maybe_refresh() == ["BTCUSDm"]
+    assert specs.get("BTCUSDm").stops_level == 50 and "BTCUSDm spec changed" in caplog.text
+    assert specs.loaded == terminal.time()
+    assert SymbolSpecs(terminal).refresh() == []
+
+
+def test_spec_rejections_get_the_symbol_reread(terminal):
+    specs = SymbolSpecs(terminal, clock=terminal)
+    specs.load(["BTCUSDm"])
+    terminal.specs["BTCUSDm"]["volume_min"] = 0.1
+    specs.rejected("BTCUSDm", terminal.TRADE_RETCODE_DONE)
+    specs.rejected("BTCUSDm", terminal.TRADE_RETCODE_REQUOTE)
+    assert specs.get("BTCUSDm").volume_min == 0.01
+    for retcode in (terminal.TRADE_RETCODE_INVALID_VOLUME, terminal.TRADE_RETCODE_INVALID_STOPS):
+        terminal.specs["BTCUSDm"]["volume_min"] += 0.1
+        specs.rejected("BTCUSDm", retcode)
+        assert specs.get("BTCUSDm").volume_min == terminal.specs["BTCUSDm"]["volume_min"]
+        assert "BTCUSDm" not in specs.stale
+
+
+def entry(terminal, symbol, order_type, sl_offset, tp_offset, volume=0.123):
+    # SL/TP offsets from the price they trigger on: the bid for a buy, the ask for a sell
+    tick = terminal.symbol_info_tick(symbol)
+    sign = 1 if order_type == terminal.ORDER_TYPE_BUY else -1
+    price, market = (tick.ask, tick.bid) if sign == 1 else (tick.bid, tick.ask)
+    return {"action": terminal.TRADE_ACTION_DEAL, "symbol": symbol, "volume": volume, "type": order_type,
+            "price": price, "sl": market - sign * sl_offset, "tp": market + sign * tp_offset, "deviation": 10}, tick
+
+
+@pytest.mark.parametrize("order_type", [SimTerminal.ORDER_TYPE_BUY, SimTerminal.ORDER_TYPE_SELL])
+def test_normalized_entries_are_accepted(terminal, order_type):
+    specs = SymbolSpecs(terminal, clock=terminal)
+    for symbol in ("BTCUSDm", "XAUUSDm"):
+        spec_ = specs.get(symbol)
+        for offset in (0.0001, 0.0042, 0.3, 7.77):
+            request, tick = entry(terminal, symbol, order_type, offset + spec_.tick_size, offset + spec_.tick_size)
+            assert specs.normalize_request(request, tick) is request
+            for level in ("price", "sl", "tp"):
+                assert request[level] == normalize_price(spec_, request[level])
+            market = tick.bid if order_type == terminal.ORDER_TYPE_BUY else tick.ask
+            assert abs(request["sl"] - market) >= spec_.stops_level * spec_.point
+            assert request["volume"] == normalize_volume(spec_, 0.123)
+            assert terminal.order_send(request).retcode == terminal.TRADE_RETCODE_DONE
+        terminal.sleep(30)
+
+
+def test_normalize_request_refuses_and_modifies(terminal, caplog):
+    specs = SymbolSpecs(terminal, clock=terminal)
+    request, tick = entry(terminal, "XAUUSDm", terminal.ORDER_TYPE_BUY, -1.0, 5.0)
+    with caplog.at_level(logging.WARNING, logger="symbol_specs"):
+        assert specs.normalize_request(request, tick) is None
+    assert "XAUUSDm BUY refused" in caplog.text
+    # A modification only goes onto the grid: the position is already open
+    modify = {"action": terminal.TRADE_ACTION_SLTP, "symbol": "XAUUSDm", "position": 1, "sl": 1999.9971, "tp": 0.0}
+    assert specs.normalize_request(modify) == {**modify, "sl": 1999.995}
+    unknown = {"symbol": "NOPEm", "volume": 0.123, "price": 1.23456789}
+    assert specs.normalize_request(dict(unknown)) == unknown
+
+
+def test_snapshot_round_trip(terminal, tmp_path, caplog):
+    with caplog.at_level(logging.WARNING, logger="symbol_specs"):
+        snapshot = take_snapshot(terminal, ["XAUUSDm", "BTCUSDm", "NOPEm"])
+    assert list(snapshot) == ["BTCUSDm", "XAUUSDm"] and "NOPEm: no symbol_info" in caplog.text
+    assert snapshot["XAUUSDm"]["currency_profit"] == "USD"
+    path = str(tmp_path / "specs.json")
+    save_snapshot(snapshot, path)
+    for symbol, fields in load_snapshot(path).items():
+        assert spec_from_snapshot(symbol, fields) == spec_from_info(terminal.symbol_info(symbol))
+    assert set(take_snapshot(terminal)) == {"BTCUSDm", "EURUSDm", "XAUUSDm"}
@@ -0,0 +1,126 @@
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import bench
+import synthetic
+from bar_store import BarStore
+from mt5_sim import SIM_EPOCH, symbol_defaults
+from synthetic import MarketModel, model_for, synthetic_rates, synthetic_ticks, synthetic_universe
+
+
+def on_grid(values, point):
+    return np.allclose(values / point, np.round(values / point), rtol=0, atol=1e-6)
+
+
+def test_seeded():
+    assert np.array_equal(synthetic_rates(500, seed=3), synthetic_rates(500, seed=3))
+    assert not np.array_equal(synthetic_rates(500, seed=3)["close"], synthetic_rates(500, seed=4)["close"])
+    # Each symbol has its own stream, which does not change with the rest of the universe
+    small = synthetic_universe(["BTCUSDm", "EURUSDm"], 300, seed=1)
+    large = synthetic_universe(["XAUUSDm", "EURUSDm", "BTCUSDm"], 300, seed=1)
+    assert all(np.array_equal(small[symbol], large[symbol]) for symbol in small)
+    assert not np.array_equal(small["BTCUSDm"]["tick_volume"], small["EURUSDm"]["tick_volume"])
+
+
+@pytest.mark.parametrize("symbol", ["BTCUSDm", "EURUSDm", "USDJPYm", "XAUUSDm"])
+@pytest.mark.parametrize("timeframe,seconds", [("M1", 60), ("M15", 900), ("H4", 14400)])
+def test_bars_are_valid(symbol, timeframe, seconds):
+    model = model_for(symbol, big_candle_rate=0.1, gap_rate=0.01)
+    rates = synthetic_rates(2000, seed=5, timeframe=timeframe, model=model)
+    assert rates["time"][0] == SIM_EPOCH and (np.diff(rates["time"]) == seconds).all()
+    assert (rates["high"] >= np.maximum(rates["open"], rates["close"])).all()
+    assert (rates["low"] <= np.minimum(rates["open"], rates["close"])).all()
+    assert (rates["low"] > 0).all() and (rates["spread"] >= 1).all() and (rates["tick_volume"] > 0).all()
+    for field in ("open", "high", "low", "close"):
+        assert on_grid(rates[field], model.point)
+    # Around the symbol's price level, as the simulator quotes it
+    assert rates["open"][0] == pytest.approx(model.price, rel=1e-6)
+    assert model.point == symbol_defaults(model.price, symbol)["point"]
+
+
+def test_without_gaps_each_bar_opens_at_the_previous_close():
+    rates = synthetic_rates(1000, seed=6)
+    assert np.array_equal(rates["open"][1:], rates["close"][:-1])
+    gapped = synthetic_rates(1000, seed=6, model=MarketModel(gap_rate=0.2))
+    jumps = np.abs(gapped["open"][1:] - gapped["close"][:-1]) / gapped["close"][:-1]
+    assert 100 < (jumps > 0).sum() < 300 and jumps.max() > 5 * MarketModel().volatility
+
+
+def test_big_candles():
+    ranges = {}
+    for rate in (0.0, 0.2):
+        rates = synthetic_rates(5000, seed=7, model=MarketModel(big_candle_rate=rate))
+        ranges[rate] = rates["high"] - rates["low"]
+    assert np.percentile(ranges[0.2], 95) > 2 * np.percentile(ranges[0.0], 95)
+
+
+def test_weekends_are_left_out():
+    start = int(pd.Timestamp("2024-01-01", tz="UTC").timestamp())  # a Monday
+    rates = synthetic_rates(3 * 5 * 1440, seed=8, start=start, model=MarketModel(weekends=True))
+    days = pd.to_datetime(rates["time"], unit="s").dayofweek
+    assert not (days >= 5).any()
+    assert np.bincount(days).tolist() == [3 * 1440] * 5
+    assert pd.Timestamp(int(rates["time"][-1]), unit="s") == pd.Timestamp("2024-01-19 23:59")
+
+
+def test_missing_bars():
+    rates = synthetic_rates(10000, seed=9, model=MarketModel(missing_rate=0.1))
+    steps = np.diff(rates["time"]) // 60
+    assert len(rates) == 10000 and (np.diff(rates["time"]) % 60 == 0).all() and (steps >= 1).all()
+    missing = (steps - 1).sum() / (rates["time"][-1] - rates["time"][0] + 60) * 60
+    assert missing == pytest.approx(0.1, abs=0.01)
+
+
+def test_ticks_stay_inside_their_bar():
+    model = model_for("XAUUSDm")
+    rates = synthetic_rates(300, seed=10, model=model)
+    ticks = synthetic_ticks(rates, seed=10, ticks_per_bar=12, model=model)
+    assert len(ticks) == 300 * 12
+    bar = np.repeat(np.arange(300), 12)
+    assert (ticks["time_msc"] // 1000 - rates["time"][bar] < 60).all() and (np.diff(ticks["time_msc"]) > 0).all()
+    assert (ticks["bid"] >= rates["low"][bar] - 1e-9).all() and (ticks["bid"] <= rates["high"][bar] + 1e-9).all()
+    assert ticks["ask"] - ticks["bid"] == pytest.approx(rates["spread"][bar] * model.point)
+    # Each bar's ticks run from its open to its close
+    per_bar = ticks["bid"].reshape(300, 12)
+    assert per_bar[:, 0] == pytest.approx(rates["open"]) and per_bar[:, -1] == pytest.approx(rates["close"])
+    assert np.array_equal(ticks, synthetic_ticks(rates, seed=10, ticks_per_bar=12, model=model))
+
+
+def test_main_writes_a_bar_store(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(sys, "argv", ["synthetic.py", str(tmp_path), "--symbols", "BTCUSDm", "EURUSDm", "--days",
+                                      "1", "--seed", "2", "--start", "2024-03-04", "--missing-rate", "0.05"])
+    synthetic.main()
+    assert "Done in" in capsys.readouterr().out
+    store = BarStore(str(tmp_path))
+    start = int(pd.Timestamp("2024-03-04", tz="UTC").timestamp())
+    expected = synthetic_universe(["BTCUSDm", "EURUSDm"], 1440, 2, "M1", start, missing_rate=0.05)
+    assert sorted(store.symbols()) == ["BTCUSDm", "EURUSDm"]
+    assert all(np.array_equal(store.bars(symbol, "M1"), rates) for symbol, rates in expected.items())
+
+
+@pytest.mark.parametrize("bench_case", bench.CASES, ids=[c.name for c in bench.CASES])
+def test_bench_cases_run(bench_case, tmp_path, monkeypatch):
+    # The smallest size of every case sets up and runs once without writing a file
+    monkeypatch.chdir(tmp_path)
+    params = min(bench_case.params, key=lambda params: np.prod(list(params.values())))
+    run, items = bench_case.setup(0, **params)
+    run()
+    assert items > 0
+    assert [path for path in tmp_path.rglob("*") if path.is_file()] == []
+
+
+def test_bench_harness_flags_regressions():
+    cheap = bench.Case("cheap", "", ({"n": 10},), lambda seed, n: (lambda: sum(range(n)), n))
+    lines = []
+    results = bench.run_cases([cheap], repeat=3, min_time=0.001, log=lines.append)
+    assert list(results) == ["cheap[n=10]"] and lines[0].startswith("cheap[n=10]")
+    result = results["cheap[n=10]"]
+    assert result["best"] <= result["median"] and result["items"] == 10 and result["repeat"] == 3
+    baseline = {"cheap[n=10]": {"median": result["median"] / 2}, "gone[n=1]": {"median": 1.0}}
+    rows, regressions = bench.compare(results, baseline, tolerance=0.25)
+    assert [row[0] for row in rows] == ["cheap[n=10]"] and rows[0][3] == pytest.approx(1.0)
+    assert regressions == ["cheap[n=10]"]
+    assert bench.compare(results, {"cheap[n=10]": {"median": result["median"]}})[1] == []
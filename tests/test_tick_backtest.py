@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+
+from candle_state import trigger_level
+from synthetic import synthetic_rates
+from tick_backtest import TICK_DTYPE, TickBacktest, read_tick_csv, read_tick_file, synthesize_ticks
+
+
+def tick_loop(ticks, sl, tp, bar_ms=60000, lookback=5, multiplier=1.2):
+    # child.py's logic one tick at a time: (exit time, reason) of every closed trade
+    ranges, bar, armed, position, closed = [], None, None, None, []
+    for time_msc, bid, ask in ticks.tolist():
+        bucket = time_msc // bar_ms
+        if bar is not None and bucket != bar[0]:
+            _, open_, high, low, close = bar
+            if armed is None and len(ranges) >= lookback and high - low >= multiplier * np.mean(ranges[-lookback:]):
+                direction = "BUY" if close > open_ else "SELL"
+                armed = (direction, trigger_level(high, low, direction))
+            ranges.append(high - low)
+            bar = None
+        bar = [bucket, bid, bid, bid, bid] if bar is None else [bucket, bar[1], max(bar[2], bid), min(bar[3], bid), bid]
+        if position is not None:
+            direction, stop, target = position
+            price = bid if direction == "BUY" else ask
+            if direction == "BUY" and (price <= stop or price >= target):
+                closed.append((time_msc, "tp" if price >= target else "sl"))
+                position = None
+            elif direction == "SELL" and (price >= stop or price <= target):
+                closed.append((time_msc, "tp" if price <= target else "sl"))
+                position = None
+        if armed is not None:
+            direction, level = armed
+            if (bid <= level) if direction == "BUY" else (bid >= level):
+                if position is not None:
+                    closed.append((time_msc, "reverse"))
+                sign = 1 if direction == "BUY" else -1
+                position = (direction, level - sign * sl, level + sign * tp)
+                armed = None
+    return closed
+
+
+def ticks_of(*bars):
+    # (second, bid) pairs per minute bar, with a fixed 0.5 spread
+    rows = [(minute * 60000 + second * 1000, bid, bid + 0.5)
+            for minute, path in enumerate(bars) for second, bid in path]
+    return np.array(rows, dtype=TICK_DTYPE)
+
+
+def test_direction_ticks_follow_the_bar():
+    rates = synthetic_rates(50, seed=1)
+    ticks = np.concatenate(list(synthesize_ticks(rates, ticks_per_bar=20, spread=0.5, chunk_bars=7)))
+    per_bar = ticks.reshape(len(rates), 20)
+    assert np.array_equal(per_bar["time_msc"][:, 0], rates["time"] * 1000)
+    assert np.allclose(per_bar["bid"][:, 0], rates["open"])
+    assert np.allclose(per_bar["bid"][:, -1], rates["close"])
+    assert np.allclose(per_bar["bid"].max(axis=1), rates["high"])
+    assert np.allclose(per_bar["bid"].min(axis=1), rates["low"])
+    assert np.allclose(ticks["ask"] - ticks["bid"], 0.5)
+    up = rates["close"] >= rates["open"]
+    low_first = per_bar["bid"].argmin(axis=1) < per_bar["bid"].argmax(axis=1)
+    assert np.array_equal(low_first, up)
+
+
+def test_random_ticks_stay_inside_the_bar():
+    rates = synthetic_rates(200, seed=2)
+    ticks = np.concatenate(list(synthesize_ticks(rates, model="random", ticks_per_bar=12, seed=5)))
+    per_bar = ticks.reshape(len(rates), 12)
+    assert np.all(per_bar["bid"] <= rates["high"][:, None] + 1e-9)
+    assert np.all(per_bar["bid"] >= rates["low"][:, None] - 1e-9)
+    again = np.concatenate(list(synthesize_ticks(rates, model="random", ticks_per_bar=12, seed=5)))
+    assert np.array_equal(ticks, again)
+
+
+@pytest.mark.parametrize("target_first", [True, False])
+def test_stop_and_target_in_one_bar_book_whichever_is_touched_first(target_first):
+    flat = [(0, 100.0), (30, 100.5), (59, 100.0)]
+    big = [(0, 100.0), (20, 96.0), (40, 110.0), (59, 109.0)]  # up bar: trigger at 96 + 0.4 * 14 = 101.6
+    fill = [(0, 103.0), (10, 101.0)]  # BUY at the ask, SL 101.6 - 3, TP 101.6 + 3
+    later = [(40, 105.0), (50, 98.0)] if target_first else [(40, 98.0), (50, 105.0)]
+    backtest = TickBacktest(sl=3, tp=3)
+    trades = backtest.run([ticks_of(*[flat] * 5, big, fill + later)])
+    assert len(trades) == 1
+    trade = trades[0]
+    assert (trade.direction, trade.entry_price) == ("BUY", 101.5)
+    assert trade.reason == ("tp" if target_first else "sl")
+    assert trade.exit_price == (pytest.approx(104.6) if target_first else 98.0)
+    assert trade.exit_time == 6 * 60000 + 40000
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_matches_a_tick_by_tick_loop_whatever_the_chunking(seed):
+    rates = synthetic_rates(3000, seed=seed)
+    ticks = np.concatenate(list(synthesize_ticks(rates, model="random", ticks_per_bar=16, spread=0.3, seed=seed)))
+    expected = tick_loop(ticks, sl=20, tp=20)
+    assert len(expected) > 10
+    for chunk in (len(ticks), 1000, 37):
+        backtest = TickBacktest(sl=20, tp=20)
+        trades = backtest.run(ticks[start:start + chunk] for start in range(0, len(ticks), chunk))
+        assert [(trade.exit_time, trade.reason) for trade in trades] == expected
+
+
+def test_tick_files(tmp_path):
+    rates = synthetic_rates(30, seed=4)
+    ticks = np.concatenate(list(synthesize_ticks(rates, spread=0.25)))
+    ticks.tofile(tmp_path / "ticks.bin")
+    assert np.array_equal(np.concatenate(list(read_tick_file(str(tmp_path / "ticks.bin"), chunk_rows=100))), ticks)
+    seconds = ticks[ticks["time_msc"] % 1000 == 0]
+    with open(tmp_path / "ticks.csv", "w") as file:
+        file.write("time,bid,ask\n")
+        file.writelines(f"{t // 1000},{bid!r},{ask!r}\n" for t, bid, ask in seconds.tolist())
+    assert np.array_equal(np.concatenate(list(read_tick_csv(str(tmp_path / "ticks.csv"), chunk_rows=7))), seconds)
@@ -0,0 +1,179 @@
+import itertools
+import os
+import subprocess
+import sys
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+
+import pytest
+
+import tick_feed
+from config import SymbolConfig
+from mt5_sim import SIM_EPOCH, ReplayFinished, SimTerminal
+from synthetic import synthetic_universe
+from tick_feed import BEAT, SharedTicks, Tick, TickFeed, TickReader, attach_shared_memory
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NAMES = itertools.count()
+
+
+@pytest.fixture(autouse=True)
+def same_process(monkeypatch):
+    # Readers and takeovers here attach from the process that created the block, which has to keep the creator's
+    # resource tracker registration, as a multiprocessing child does
+    monkeypatch.setattr(tick_feed.multiprocessing, "parent_process", lambda: True)
+
+
+@pytest.fixture
+def terminal():
+    bars = synthetic_universe(["BTCUSDm", "ETHUSDm", "XAUUSDm"], 600, seed=19, start=SIM_EPOCH)
+    return SimTerminal(bars, start_time=SIM_EPOCH + 60)
+
+
+@pytest.fixture
+def name():
+    return f"test_ticks_{os.getpid()}_{next(NAMES)}"
+
+
+@pytest.fixture
+def feeds(name):
+    # TickFeeds made in a test, closed (and their block unlinked) after it
+    made = []
+
+    def make(mt5, symbols=(), **kwargs):
+        made.append(TickFeed(mt5, symbols, name=name, **kwargs))
+        return made[-1]
+
+    yield make
+    # Takeovers share the first feed's block: unmap them all, unlink it once
+    for feed in made[:-1]:
+        if feed.buf is not None:
+            feed.block.close()
+    if made and made[-1].buf is not None:
+        made[-1].close()
+
+
+def tick(msc, bid=1.0):
+    return Tick(msc // 1000, bid, bid + 0.0001, 0.0, 1, msc, 6, 0.0)
+
+
+def test_reader_sees_the_terminal_tick(terminal, name, feeds):
+    feed = feeds(terminal, ["BTCUSDm", "ETHUSDm"])
+    reader = TickReader(name)
+    assert reader.latest("BTCUSDm") is None
+    assert feed.poll() == 2
+    assert feed.poll() == 0  # unchanged ticks are not published again
+    for _ in range(5):
+        terminal.sleep(7)
+        assert feed.poll() == 2
+        for symbol in ("BTCUSDm", "ETHUSDm"):
+            assert reader.latest(symbol)[0] == tuple(terminal.symbol_info_tick(symbol))
+    assert reader.latest("XAUUSDm") is None
+    reader.close()
+
+
+def test_since_returns_what_is_left_in_the_ring(name, feeds):
+    feed = feeds(None, ["A"], ring=4)
+    reader = TickReader(name)
+    for msc in range(1, 4):
+        feed.publish(0, tick(msc), 0.0)
+    ticks, cursor = reader.since("A", 0)
+    assert [t.time_msc for t in ticks] == [1, 2, 3] and cursor == 3
+    for msc in range(4, 11):
+        feed.publish(0, tick(msc), 0.0)
+    # Lapped: only the entries the writer cannot be overwriting right now
+    ticks, cursor = reader.since("A", cursor)
+    assert [t.time_msc for t in ticks] == [8, 9, 10] and cursor == 10
+    assert reader.since("A", cursor) == ([], 10)
+    assert reader.since("B", 5) == ([], 5)
+    reader.close()
+
+
+def test_entries_being_written_are_not_read(name, feeds):
+    feed = feeds(None, ["A"], ring=4)
+    reader = TickReader(name)
+    feed.publish(0, tick(1), 0.0)
+    feed.publish(0, tick(2), 0.0)
+    feed.ticks["seq"][0, 1] = 2 * 1 + 1  # the writer is halfway through entry 1
+    assert reader._read(0, 1) is None
+    assert reader._read(0, 0)[6] == 1
+    assert reader._read(0, 4) is None  # entry 0's slot, but from a later lap
+    reader.close()
+
+
+def test_slots_added_later_and_a_restarted_feed(terminal, name, feeds):
+    feed = feeds(terminal, ["BTCUSDm"], capacity=2)
+    reader = TickReader(name)
+    feed.poll()
+    assert reader.latest("ETHUSDm") is None
+    feed.add("ETHUSDm")
+    feed.add("ETHUSDm")
+    feed.poll()
+    assert reader.latest("ETHUSDm")[0].bid == terminal.symbol_info_tick("ETHUSDm").bid
+    with pytest.raises(ValueError, match="full"):
+        feed.add("XAUUSDm")
+    # A new feed takes the block over with its symbols in another order; the reader's slot cache follows
+    restarted = feeds(terminal, ["ETHUSDm", "BTCUSDm"], capacity=2)
+    assert restarted.header["generation"] == 2
+    restarted.poll()
+    for symbol in ("BTCUSDm", "ETHUSDm"):
+        assert reader.latest(symbol)[0].bid == terminal.symbol_info_tick(symbol).bid
+    reader.close()
+
+
+def test_reader_checks_the_block(name):
+    block = shared_memory.SharedMemory(name=name, create=True, size=4096)
+    try:
+        with pytest.raises(ValueError, match="not a tick feed"):
+            TickReader(name)
+    finally:
+        block.close()
+        block.unlink()
+    with pytest.raises(FileNotFoundError):
+        TickReader(name)
+
+
+def test_shared_ticks_fall_back_to_the_terminal(terminal, name, feeds, monkeypatch):
+    shared = SharedTicks(terminal, name, max_age=2.0, retry=0)
+    expected = terminal.symbol_info_tick("BTCUSDm")
+    assert shared.symbol_info_tick("BTCUSDm") == expected  # no feed yet
+    assert shared.symbol_info_tick("XAUUSDm") == terminal.symbol_info_tick("XAUUSDm")
+    feed = feeds(terminal, ["BTCUSDm"])
+    feed.publish(0, tick(1, bid=123.0), 0.0)
+    tick_feed._F64.pack_into(feed.buf, BEAT, tick_feed.time.monotonic())
+    assert shared.symbol_info_tick("BTCUSDm").bid == 123.0
+    assert shared.symbol_info_tick("XAUUSDm") == terminal.symbol_info_tick("XAUUSDm")  # not fed
+    # A feed that stopped beating is not trusted
+    tick_feed._F64.pack_into(feed.buf, BEAT, tick_feed.time.monotonic() - 10)
+    assert shared.symbol_info_tick("BTCUSDm") == expected
+    assert shared.positions_total() == terminal.positions_total()
+    monkeypatch.setenv("TICK_FEED", name)
+    assert isinstance(tick_feed.from_env(terminal), SharedTicks)
+    monkeypatch.delenv("TICK_FEED")
+    assert tick_feed.from_env(terminal) is terminal
+
+
+def test_run_adds_enabled_symbols_until_the_replay_ends(name, feeds):
+    bars = synthetic_universe(["BTCUSDm", "ETHUSDm"], 30, seed=20, start=SIM_EPOCH)
+    terminal = SimTerminal(bars, start_time=SIM_EPOCH + 60, end_time=SIM_EPOCH + 120)
+    cfg = SymbolConfig("ETHUSDm", 0.5, 5, 10, 2, "M1", 1, 15, 15, True)
+    changes = [{"ETHUSDm": cfg, "XAUUSDm": cfg._replace(symbol="XAUUSDm", enabled=False), "LTCUSDm": None}]
+    watcher = SimpleNamespace(poll=lambda: changes.pop() if changes else None)
+    feed = feeds(terminal, ["BTCUSDm"])
+    with pytest.raises(ReplayFinished):
+        feed.run(0.5, watcher, clock=terminal)
+    assert list(feed.index) == ["BTCUSDm", "ETHUSDm"]
+    assert feed.slots["head"][:2].tolist() == [121, 121]  # a poll every 0.5s from 60s to 120s
+
+
+def test_block_outlives_a_reader_process(terminal, name, feeds):
+    # A reader in another interpreter attaches and exits; the feed's block must not be unlinked with it
+    feed = feeds(terminal, ["BTCUSDm"])
+    feed.poll()
+    code = f"import tick_feed; r = tick_feed.TickReader({name!r}); print(r.latest('BTCUSDm')[0].bid); r.close()"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert float(result.stdout) == terminal.symbol_info_tick("BTCUSDm").bid
+    block = attach_shared_memory(name)
+    assert block.size >= tick_feed.block_size(256, 64)
+    block.close()
@@ -0,0 +1,107 @@
+import csv
+import logging
+import sqlite3
+import time
+from datetime import datetime
+
+import pytest
+
+from trade_journal import CSV_HEADER, TradeJournal
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = TradeJournal(str(tmp_path / "logs" / "trades.db"))
+    yield journal
+    journal.close()
+
+
+def locked(journal):
+    # A second connection holding the write lock; the journal gives up at once instead of waiting 30s
+    journal.db.execute("PRAGMA busy_timeout=0")
+    other = sqlite3.connect(journal.path)
+    other.execute("BEGIN EXCLUSIVE")
+    return other
+
+
+def fill(journal):
+    journal.record("EURUSDm", "Open", "BUY", 1.1, 0.1, "Success", 10009, 1, ts=100.0)
+    journal.record("BTCUSDm", "Open", "SELL", 60000.0, 0.5, "Success", 10009, 2, ts=200.0)
+    journal.record("EURUSDm", "Close", "BUY", 1.2, 0.1, "Success", 10009, 1, ts=300.0)
+    journal.record("EURUSDm", "Open", "SELL", 1.2, 0.1, "Failed", 10016, ts=400.0)
+
+
+def test_rows_are_buffered_until_flushed(journal):
+    fill(journal)
+    assert len(journal.buffer) == 4
+    assert journal.db.execute("SELECT COUNT(*) FROM trades").fetchone()[0] == 0
+    assert journal.flush() == 4
+    assert not journal.buffer
+    assert journal.flush() == 0
+    assert journal.db.execute("SELECT COUNT(*) FROM trades").fetchone()[0] == 4
+
+
+@pytest.mark.parametrize("filters,tickets", [
+    ({}, [1, 2, 1, None]),
+    ({"symbol": "EURUSDm"}, [1, 1, None]),
+    ({"action": "Open"}, [1, 2, None]),
+    ({"symbol": "EURUSDm", "action": "Open"}, [1, None]),
+    ({"start": 200.0, "end": 300.0}, [2, 1]),
+    ({"start": datetime.fromtimestamp(250)}, [1, None]),
+])
+def test_query_filters(journal, filters, tickets):
+    fill(journal)  # query sees rows still in the buffer
+    assert [row["ticket"] for row in journal.query(**filters)] == tickets
+
+
+def test_locked_database_keeps_the_rows_in_order(journal):
+    fill(journal)
+    other = locked(journal)
+    with pytest.raises(sqlite3.OperationalError):
+        journal.flush()
+    journal.record("EURUSDm", "Close", "SELL", 1.3, 0.1, "Success", ts=500.0)
+    assert [row[0] for row in journal.buffer] == [100.0, 200.0, 300.0, 400.0, 500.0]
+    other.rollback()
+    other.close()
+    assert journal.flush() == 5
+    assert [row["ts"] for row in journal.query()] == [100.0, 200.0, 300.0, 400.0, 500.0]
+
+
+def test_failed_final_flush_logs_the_rows(journal, caplog):
+    fill(journal)
+    other = locked(journal)
+    with caplog.at_level(logging.ERROR, logger="trade_journal"):
+        journal.close()
+    other.rollback()
+    other.close()
+    messages = [record.getMessage() for record in caplog.records]
+    assert "4 rows not written" in messages[0]
+    assert len([message for message in messages if message.startswith("Unwritten trade row: (")]) == 4
+
+
+def test_background_thread_flushes_and_processes_share_the_file(tmp_path):
+    path = str(tmp_path / "trades.db")
+    first = TradeJournal(path, flush_interval=0.01).start()
+    second = TradeJournal(path, flush_interval=10, max_buffer=3).start()
+    first.record("EURUSDm", "Open", "BUY", 1.1, 0.1, "Success")
+    for ticket in range(3):
+        second.record("BTCUSDm", "Open", "BUY", 60000.0, 0.1, "Success", ticket=ticket)  # a full buffer wakes it
+    deadline = time.time() + 5
+    reader = TradeJournal(path)
+    while len(reader.query()) < 4 and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(reader.query()) == 4
+    for journal in (first, second, reader):
+        journal.close()
+
+
+def test_export_csv_keeps_the_old_layout(journal, tmp_path):
+    fill(journal)
+    path = tmp_path / "Trades.csv"
+    journal.export_csv(str(path), symbol="BTCUSDm")
+    with open(path, newline="") as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == CSV_HEADER
+    assert rows[1] == [datetime.fromtimestamp(200).strftime('%Y-%m-%d %H:%M:%S'), "BTCUSDm", "Open", "SELL",
+                       "60000.0", "0.5", "Success", "10009", "2"]
+    assert len(rows) == 2
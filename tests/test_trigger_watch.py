@@ -0,0 +1,92 @@
+import pytest
+
+from mt5_sim import SIM_EPOCH, SimTerminal
+from synthetic import synthetic_universe
+from trigger_watch import TriggerWatcher
+
+
+@pytest.mark.parametrize("direction,price,fires", [
+    ("BUY", 101.0, False),
+    ("BUY", 100.0, True),
+    ("BUY", 99.0, True),
+    ("SELL", 99.0, False),
+    ("SELL", 100.0, True),
+    ("SELL", 101.0, True),
+])
+def test_check_fires_on_the_pullback(direction, price, fires):
+    watcher = TriggerWatcher()
+    watcher.arm("EURUSDm", direction, 100.0, now=0)
+    fired = watcher.check({"EURUSDm": price})
+    assert [trigger.symbol for trigger in fired] == (["EURUSDm"] if fires else [])
+    # A fired trigger is disarmed; one that did not fire stays armed
+    assert ("EURUSDm" in watcher) == (not fires)
+
+
+def test_one_armed_symbol_does_not_hold_up_the_rest():
+    watcher = TriggerWatcher()
+    watcher.arm("A", "BUY", 100.0, now=0, payload="a")
+    watcher.arm("B", "SELL", 50.0, now=0)
+    watcher.arm("C", "BUY", 10.0, now=0)
+    # No price for C and A not reached: only B fires
+    fired = watcher.check({"A": 100.5, "B": 51.0})
+    assert [trigger.symbol for trigger in fired] == ["B"]
+    assert sorted(watcher.symbols()) == ["A", "C"]
+    assert watcher.check({"A": 99.0, "C": 11.0})[0].payload == "a"
+    assert watcher.symbols() == ["C"]
+
+
+def test_arm_replaces_and_disarm_removes():
+    watcher = TriggerWatcher()
+    watcher.arm("A", "BUY", 100.0, now=0)
+    watcher.arm("A", "SELL", 120.0, now=5)
+    assert len(watcher) == 1
+    assert watcher.check({"A": 90.0}) == []
+    assert watcher.disarm("A").level == 120.0
+    assert watcher.disarm("A") is None
+    assert not watcher
+
+
+def test_expiry():
+    watcher = TriggerWatcher()
+    watcher.arm("A", "BUY", 100.0, now=1000, expiry_seconds=60)
+    watcher.arm("B", "BUY", 100.0, now=1000)
+    assert watcher.expire(1059) == []
+    # An expired trigger is dropped before the snapshot is checked, so it cannot fire
+    assert watcher.check({"A": 90.0}, now=1060) == []
+    assert watcher.symbols() == ["B"]
+    assert watcher.expire(10 ** 9) == []
+
+
+def test_watching_a_simulated_universe_matches_a_per_symbol_wait():
+    symbols = [f"SYM{i}m" for i in range(8)]
+    bars = synthetic_universe(symbols, 240, seed=11, start=SIM_EPOCH)
+    terminal = SimTerminal(bars, start_time=SIM_EPOCH + 60)
+    start = int(terminal.time())
+    levels = {symbol: terminal.symbol_info_tick(symbol).bid * (0.999 if i % 2 else 1.001)
+              for i, symbol in enumerate(symbols)}
+    directions = {symbol: "BUY" if i % 2 else "SELL" for i, symbol in enumerate(symbols)}
+
+    # What watching each symbol on its own, one second at a time, would have found
+    expected = {}
+    for symbol in symbols:
+        probe = SimTerminal({symbol: bars[symbol]}, start_time=start)
+        for second in range(3 * 3600):
+            bid = probe.symbol_info_tick(symbol).bid
+            if (bid <= levels[symbol]) if directions[symbol] == "BUY" else (bid >= levels[symbol]):
+                expected[symbol] = start + second
+                break
+            probe.sleep(1)
+
+    watcher = TriggerWatcher()
+    for symbol in symbols:
+        watcher.arm(symbol, directions[symbol], levels[symbol], terminal.time())
+    found = {}
+    for _ in range(3 * 3600):
+        prices = {symbol: terminal.symbol_info_tick(symbol).bid for symbol in watcher.symbols()}
+        for trigger in watcher.check(prices, terminal.time()):
+            found[trigger.symbol] = int(terminal.time())
+        if not watcher:
+            break
+        terminal.sleep(1)
+    assert len(expected) > len(symbols) // 2
+    assert found == expected
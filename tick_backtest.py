@@ -0,0 +1,235 @@
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+from candle_state import CandleRangeState, trigger_level
+
+TICK_DTYPE = np.dtype([("time_msc", "<i8"), ("bid", "<f8"), ("ask", "<f8")])
+
+TickTrade = namedtuple("TickTrade", "direction signal_time entry_time entry_price sl tp exit_time exit_price reason pnl")
+
+
+# --- tick sources: every source yields TICK_DTYPE chunks, so memory stays bounded by chunk size ---
+
+def synthesize_ticks(rates, model="direction", ticks_per_bar=20, spread=None, point=0.01, bar_seconds=60,
+                     chunk_bars=50000, noise=0.15, seed=0):
+    # Ticks along each bar's path through its extremes: "direction" visits low first on up bars and high first
+    # on down bars (as the simulator does); "random" picks the order per bar and adds noise inside the range.
+    rng = np.random.default_rng(seed)
+    ticks_per_bar = max(ticks_per_bar, 4)
+    grid = np.linspace(0.0, 1.0, ticks_per_bar)
+    # The extremes sit on grid points, so every bar's high and low is actually ticked
+    steps = ticks_per_bar - 1
+    vertex_x = np.array([0, round(steps / 3), round(2 * steps / 3), steps]) / steps
+    segment = np.minimum(np.searchsorted(vertex_x, grid, side="right") - 1, 2)
+    weight = (grid - vertex_x[segment]) / (vertex_x[segment + 1] - vertex_x[segment])
+
+    for start in range(0, len(rates), chunk_bars):
+        bars = rates[start:start + chunk_bars]
+        open_, high, low, close = (np.asarray(bars[name], dtype=np.float64) for name in ("open", "high", "low", "close"))
+        if model == "random":
+            low_first = rng.random(len(bars)) < 0.5
+        else:
+            low_first = close >= open_
+        first = np.where(low_first, low, high)
+        second = np.where(low_first, high, low)
+        vertices = np.stack([open_, first, second, close], axis=1)
+
+        bid = vertices[:, segment] * (1 - weight) + vertices[:, segment + 1] * weight
+        if model == "random":
+            inner = np.ones(ticks_per_bar, dtype=bool)
+            inner[[0, -1]] = False
+            bid[:, inner] += rng.normal(0, noise, (len(bars), inner.sum())) * (high - low)[:, None]
+            bid = np.clip(bid, low[:, None], high[:, None])
+
+        if spread is None:
+            bar_spread = np.asarray(bars["spread"], dtype=np.float64) * point if "spread" in bars.dtype.names else 0.0
+        else:
+            bar_spread = spread
+        chunk = np.zeros(bid.size, dtype=TICK_DTYPE)
+        chunk["time_msc"] = (np.asarray(bars["time"], dtype=np.int64)[:, None] * 1000
+                             + (grid * (bar_seconds * 1000 - 1)).astype(np.int64)[None, :]).ravel()
+        chunk["bid"] = bid.ravel()
+        chunk["ask"] = (bid + np.broadcast_to(np.asarray(bar_spread, dtype=np.float64), (len(bars),))[:, None]).ravel()
+        yield chunk
+
+
+def read_tick_csv(path, chunk_rows=1_000_000):
+    # CSV with a header of time_msc (or time in seconds), bid, ask
+    import pandas as pd
+
+    for frame in pd.read_csv(path, chunksize=chunk_rows):
+        chunk = np.zeros(len(frame), dtype=TICK_DTYPE)
+        if "time_msc" in frame:
+            chunk["time_msc"] = frame["time_msc"].to_numpy(np.int64)
+        else:
+            chunk["time_msc"] = frame["time"].to_numpy(np.int64) * 1000
+        chunk["bid"] = frame["bid"].to_numpy(np.float64)
+        chunk["ask"] = frame["ask"].to_numpy(np.float64)
+        yield chunk
+
+
+def read_tick_file(path, chunk_rows=1_000_000):
+    # Raw TICK_DTYPE records, memory-mapped and walked in slices
+    ticks = np.memmap(path, dtype=TICK_DTYPE, mode="r")
+    for start in range(0, len(ticks), chunk_rows):
+        yield ticks[start:start + chunk_rows]
+
+
+# --- engine ---
+
+class TickBacktest:
+    # child.py's logic on ticks: on each bar close, a bar >= multiplier x the average of the previous `lookback`
+    # ranges arms a trigger 40% into the bar against its direction; the bid crossing it enters at ask (BUY) or
+    # bid (SELL) with SL/TP offset from the trigger, closing any open position first, as place_trade does.
+    # SL/TP are then resolved in tick order, so a bar that spans both books whichever is touched first.
+    def __init__(self, sl, tp, lot_size=1.0, contract_size=1.0, bar_seconds=60, lookback=5, multiplier=1.2,
+                 trigger_fraction=0.4, fill_window=None, use_max=False):
+        self.sl = sl
+        self.tp = tp
+        self.volume = lot_size * contract_size
+        self.bar_ms = bar_seconds * 1000
+        self.multiplier = multiplier
+        self.trigger_fraction = trigger_fraction
+        self.fill_window = fill_window  # bars a trigger stays armed; None watches until hit like child.py
+        self.use_max = use_max  # compare against the max range (6in1backtest.py) instead of the average
+        self.ranges = CandleRangeState(lookback)
+
+        self.bar = None  # [bucket, open, high, low, close] of the forming bar
+        self.armed = None  # (direction, level, signal_time, bars_left)
+        self.position = None  # (direction, entry_time, entry_price, sl, tp, signal_time)
+        self.trades = []
+
+    def run(self, chunks):
+        for chunk in chunks:
+            self.process(chunk)
+        return self.trades
+
+    def process(self, chunk):
+        if len(chunk) == 0:
+            return
+        times = np.asarray(chunk["time_msc"])
+        bid = np.asarray(chunk["bid"])
+        ask = np.asarray(chunk["ask"])
+        buckets = times // self.bar_ms
+        edges = np.flatnonzero(buckets[1:] != buckets[:-1]) + 1
+        starts = np.concatenate(([0], edges))
+        ends = np.concatenate((edges, [len(chunk)]))
+
+        for s, e in zip(starts, ends):
+            bucket = int(buckets[s])
+            if self.bar is not None and bucket != self.bar[0]:
+                self.close_bar()
+            seg_bid = bid[s:e]
+            if self.bar is None:
+                self.bar = [bucket, float(seg_bid[0]), float(seg_bid.max()), float(seg_bid.min()), float(seg_bid[-1])]
+            else:
+                self.bar[2] = max(self.bar[2], float(seg_bid.max()))
+                self.bar[3] = min(self.bar[3], float(seg_bid.min()))
+                self.bar[4] = float(seg_bid[-1])
+            self.run_segment(times[s:e], seg_bid, ask[s:e])
+
+    def run_segment(self, times, bid, ask):
+        p = 0
+        n = len(times)
+        while p < n:
+            fill = exit_ = n
+            if self.armed is not None:
+                direction, level = self.armed[0], self.armed[1]
+                crossed = bid[p:] <= level if direction == "BUY" else bid[p:] >= level
+                hit = int(crossed.argmax())
+                if crossed[hit]:
+                    fill = p + hit
+            if self.position is not None:
+                direction, sl, tp = self.position[0], self.position[3], self.position[4]
+                price = bid[p:] if direction == "BUY" else ask[p:]
+                stopped = (price <= sl) | (price >= tp) if direction == "BUY" else (price >= sl) | (price <= tp)
+                hit = int(stopped.argmax())
+                if stopped[hit]:
+                    exit_ = p + hit
+            if fill == n and exit_ == n:
+                return
+
+            if exit_ <= fill:
+                price = bid[exit_] if self.position[0] == "BUY" else ask[exit_]
+                direction, sl, tp = self.position[0], self.position[3], self.position[4]
+                take = price >= tp if direction == "BUY" else price <= tp
+                self.close_position(int(times[exit_]), tp if take else price, "tp" if take else "sl")
+                p = exit_
+            else:
+                if self.position is not None:
+                    closing = bid[fill] if self.position[0] == "BUY" else ask[fill]
+                    self.close_position(int(times[fill]), float(closing), "reverse")
+                direction, level, signal_time, _ = self.armed
+                entry = float(ask[fill] if direction == "BUY" else bid[fill])
+                sl = level - self.sl if direction == "BUY" else level + self.sl
+                tp = level + self.tp if direction == "BUY" else level - self.tp
+                self.position = (direction, int(times[fill]), entry, sl, tp, signal_time)
+                self.armed = None
+                p = fill + 1
+
+    def close_bar(self):
+        bucket, open_, high, low, close = self.bar
+        self.bar = None
+        if self.armed is not None and self.armed[3] is not None:
+            bars_left = self.armed[3] - 1
+            self.armed = self.armed[:3] + (bars_left,) if bars_left > 0 else None
+
+        if self.armed is None and self.ranges.ready:
+            reference = self.ranges.max_range() if self.use_max else self.ranges.average_range()
+            size = high - low
+            if size >= self.multiplier * reference:
+                direction = "BUY" if close > open_ else "SELL"
+                level = trigger_level(high, low, direction, self.trigger_fraction)
+                self.armed = (direction, level, (bucket + 1) * self.bar_ms, self.fill_window)
+        self.ranges.push(bucket, open_, high, low, close)
+
+    def close_position(self, time_msc, price, reason):
+        direction, entry_time, entry_price, sl, tp, signal_time = self.position
+        pnl = (price - entry_price) * (1 if direction == "BUY" else -1) * self.volume
+        self.trades.append(TickTrade(direction, signal_time, entry_time, entry_price, sl, tp, time_msc, price, reason, pnl))
+        self.position = None
+
+    def summary(self):
+        pnl = np.array([trade.pnl for trade in self.trades])
+        reasons = [trade.reason for trade in self.trades]
+        return {"trades": len(self.trades), "profit": float(pnl.sum()) if len(pnl) else 0.0,
+                "wins": int((pnl > 0).sum()), "losses": int((pnl < 0).sum()),
+                "tp": reasons.count("tp"), "sl": reasons.count("sl"), "reversed": reasons.count("reverse"),
+                "open_position": self.position is not None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tick-level backtest of the big-candle strategy")
+    parser.add_argument("--ticks", help="tick CSV (time_msc/time, bid, ask) or raw .bin of TICK_DTYPE records")
+    parser.add_argument("--store", help="bar_store.py directory; ticks are synthesized from its M1 bars")
+    parser.add_argument("--symbol", default="BTCUSDm")
+    parser.add_argument("--model", default="direction", choices=["direction", "random"])
+    parser.add_argument("--ticks-per-bar", type=int, default=20)
+    parser.add_argument("--point", type=float, default=0.01)
+    parser.add_argument("--sl", type=float, default=15)
+    parser.add_argument("--tp", type=float, default=15)
+    parser.add_argument("--lot-size", type=float, default=0.5)
+    parser.add_argument("--timeframe", default="M1")
+    args = parser.parse_args()
+
+    from timeframes import timeframe_seconds
+
+    if args.ticks:
+        chunks = read_tick_file(args.ticks) if args.ticks.endswith(".bin") else read_tick_csv(args.ticks)
+    elif args.store:
+        from bar_store import BarStore
+
+        chunks = synthesize_ticks(BarStore(args.store).bars(args.symbol, "M1"), args.model, args.ticks_per_bar,
+                                  point=args.point)
+    else:
+        parser.error("one of --ticks or --store is required")
+
+    backtest = TickBacktest(args.sl, args.tp, lot_size=args.lot_size, bar_seconds=timeframe_seconds(args.timeframe))
+    backtest.run(chunks)
+    print(backtest.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,370 @@
+import argparse
+import multiprocessing
+import os
+import signal
+import struct
+import sys
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# Workers find the feed through TICK_FEED=<shared memory name>; master.py --tick-feed sets it
+TICK_FEED_NAME = "forex_mt5_ticks"
+MAGIC = 0x4B43495435544D46
+
+# Same fields as mt5.symbol_info_tick()
+Tick = namedtuple("Tick", "time bid ask last volume time_msc flags volume_real")
+
+# Layout of the block: header, `capacity` symbol slots, then a ring of `ring` ticks per slot. Every field is 8 bytes,
+# so every record stays aligned.
+HEADER_DTYPE = np.dtype([
+    ("magic", "<u8"),
+    ("generation", "<u8"),  # bumped each time a feed (re)initializes the block; readers drop their slot cache
+    ("capacity", "<u8"),
+    ("ring", "<u8"),
+    ("count", "<u8"),  # slots in use
+    ("beat", "<f8"),  # time.monotonic() of the feed's last poll, so readers can tell a dead feed
+])
+SLOT_DTYPE = np.dtype([("name", "S24"), ("head", "<u8")])  # head: ticks ever published for the symbol
+TICK_DTYPE = np.dtype([
+    ("seq", "<u8"),
+    ("time", "<i8"),
+    ("bid", "<f8"),
+    ("ask", "<f8"),
+    ("last", "<f8"),
+    ("volume", "<u8"),
+    ("time_msc", "<i8"),
+    ("flags", "<u8"),
+    ("volume_real", "<f8"),
+    ("published", "<f8"),  # time.monotonic() at publish
+])
+# The hot paths read and write through struct on the mapped buffer: a numpy scalar access costs a microsecond or so
+_U64 = struct.Struct("<Q")
+_F64 = struct.Struct("<d")
+_TICK = struct.Struct("<QqdddQqQdd")
+BEAT = HEADER_DTYPE.fields["beat"][1]
+GENERATION = HEADER_DTYPE.fields["generation"][1]
+COUNT = HEADER_DTYPE.fields["count"][1]
+HEAD = SLOT_DTYPE.fields["head"][1]
+
+
+def block_size(capacity, ring):
+    return HEADER_DTYPE.itemsize + capacity * SLOT_DTYPE.itemsize + capacity * ring * TICK_DTYPE.itemsize
+
+
+def _views(buf, capacity, ring):
+    header = np.ndarray((), HEADER_DTYPE, buf)
+    slots = np.ndarray((capacity,), SLOT_DTYPE, buf, offset=HEADER_DTYPE.itemsize)
+    ticks = np.ndarray((capacity, ring), TICK_DTYPE, buf, offset=HEADER_DTYPE.itemsize + slots.nbytes)
+    return header, slots, ticks
+
+
+def attach_shared_memory(name):
+    # Attach to a block another process created and owns (the tick feed, the optimizer's parent process)
+    block = shared_memory.SharedMemory(name=name)
+    if os.name != "nt" and multiprocessing.parent_process() is None:
+        # Before Python 3.13 an attaching process registers the block with its resource tracker, which unlinks it
+        # when that process exits; the creator owns it. A multiprocessing child (a pool worker) shares its parent's
+        # tracker, where the registration is the creator's own and has to stay for its unlink().
+        from multiprocessing import resource_tracker
+
+        resource_tracker.unregister(block._name, "shared_memory")
+    return block
+
+
+class TickFeed:
+    # The one process that reads ticks from the terminal. Each poll asks symbol_info_tick once per symbol and
+    # publishes changed ticks into a seqlock ring per symbol, so terminal load does not grow with the number of
+    # workers. Writing an entry: seq = odd, fields, seq = even, then head += 1. Stores stay in program order on
+    # x86 (TSO), which is what MT5 runs on; a reader that raced the writer sees a seq mismatch and rereads.
+    def __init__(self, mt5, symbols=(), name=TICK_FEED_NAME, capacity=256, ring=64):
+        self.mt5 = mt5
+        self.name = name
+        size = block_size(capacity, ring)
+        try:
+            self.block = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Left behind by a feed that died, or still mapped by readers: take it over and reinitialize it
+            self.block = attach_shared_memory(name)
+            if self.block.size < size:
+                raise ValueError(f"shared memory {name} is smaller than {size} bytes; stop its readers first")
+        self.header, self.slots, self.ticks = _views(self.block.buf, capacity, ring)
+        generation = int(self.header["generation"]) + 1 if self.header["magic"] == MAGIC else 1
+        self.slots["head"] = 0
+        self.ticks["seq"] = 0
+        self.header["capacity"], self.header["ring"], self.header["count"] = capacity, ring, 0
+        self.header["generation"] = generation
+        self.header["magic"] = MAGIC
+        self.buf = self.block.buf
+        self.heads_at = HEADER_DTYPE.itemsize + HEAD
+        self.ticks_at = HEADER_DTYPE.itemsize + capacity * SLOT_DTYPE.itemsize
+        self.capacity = capacity
+        self.ring = ring
+        self.index = {}
+        self.last_msc = {}
+        for symbol in symbols:
+            self.add(symbol)
+
+    def add(self, symbol):
+        if symbol in self.index:
+            return
+        i = int(self.header["count"])
+        if i >= self.capacity:
+            raise ValueError(f"tick feed is full ({self.capacity} symbols)")
+        self.slots[i] = (symbol.encode(), 0)
+        self.header["count"] = i + 1  # after the name, so a reader never finds a half-written slot
+        self.index[symbol] = i
+
+    def publish(self, i, tick, now):
+        buf = self.buf
+        head = self.heads_at + i * SLOT_DTYPE.itemsize
+        k = _U64.unpack_from(buf, head)[0]
+        at = self.ticks_at + (i * self.ring + k % self.ring) * TICK_DTYPE.itemsize
+        _U64.pack_into(buf, at, 2 * k + 1)
+        _TICK.pack_into(buf, at, 2 * k + 1, tick.time, tick.bid, tick.ask, tick.last, tick.volume, tick.time_msc,
+                        tick.flags, tick.volume_real, now)
+        _U64.pack_into(buf, at, 2 * k + 2)
+        _U64.pack_into(buf, head, k + 1)
+
+    def poll(self):
+        published = 0
+        for symbol, i in self.index.items():
+            tick = self.mt5.symbol_info_tick(symbol)
+            if tick is None or tick.time_msc == self.last_msc.get(symbol):
+                continue
+            self.last_msc[symbol] = tick.time_msc
+            self.publish(i, tick, time.monotonic())
+            published += 1
+        _F64.pack_into(self.buf, BEAT, time.monotonic())
+        return published
+
+    def run(self, interval=0.05, watcher=None, clock=time):
+        # watcher: optional config.ConfigWatcher; symbols enabled in config.yaml are added while running.
+        # clock: what the poll interval is slept on (broker.clock, so a simulated terminal's clock moves)
+        while True:
+            changes = watcher.poll() if watcher else None
+            for symbol, cfg in (changes or {}).items():
+                if cfg is not None and cfg.enabled:
+                    self.add(symbol)
+            self.poll()
+            clock.sleep(interval)
+
+    def close(self):
+        self.header = self.slots = self.ticks = self.buf = None
+        self.block.close()
+        self.block.unlink()
+
+
+class TickReader:
+    # Reads a TickFeed's block in place: a latest() is a few array reads on mapped memory, no call to the
+    # terminal and no copy through a pipe
+    def __init__(self, name=TICK_FEED_NAME):
+        self.block = attach_shared_memory(name)
+        header = np.ndarray((), HEADER_DTYPE, self.block.buf)
+        if header["magic"] != MAGIC:
+            raise ValueError(f"shared memory {name} is not a tick feed")
+        capacity, ring = int(header["capacity"]), int(header["ring"])
+        if self.block.size < block_size(capacity, ring):
+            raise ValueError(f"shared memory {name} is truncated")
+        self.slots = _views(self.block.buf, capacity, ring)[1]
+        self.buf = self.block.buf
+        self.heads_at = HEADER_DTYPE.itemsize + HEAD
+        self.ticks_at = HEADER_DTYPE.itemsize + capacity * SLOT_DTYPE.itemsize
+        self.ring = ring
+        self.index = {}
+        self.generation = None
+
+    def alive(self, max_age):
+        return time.monotonic() - _F64.unpack_from(self.buf, BEAT)[0] <= max_age
+
+    def slot(self, symbol):
+        generation = _U64.unpack_from(self.buf, GENERATION)[0]
+        if generation != self.generation:
+            self.index, self.generation = {}, generation
+        i = self.index.get(symbol)
+        if i is None:
+            count = _U64.unpack_from(self.buf, COUNT)[0]
+            if len(self.index) < count:
+                self.index = {name.decode(): i for i, name in enumerate(self.slots["name"][:count])}
+                i = self.index.get(symbol)
+        return i
+
+    def head(self, i):
+        return _U64.unpack_from(self.buf, self.heads_at + i * SLOT_DTYPE.itemsize)[0]
+
+    def _read(self, i, k):
+        # Entry k of slot i, or None if the writer is on it or has lapped it
+        at = self.ticks_at + (i * self.ring + k % self.ring) * TICK_DTYPE.itemsize
+        seq = 2 * k + 2
+        if _U64.unpack_from(self.buf, at)[0] != seq:
+            return None
+        record = _TICK.unpack_from(self.buf, at)
+        if _U64.unpack_from(self.buf, at)[0] != seq:
+            return None
+        return record
+
+    def latest(self, symbol):
+        # (Tick, published) of the newest tick, or None when the feed has no tick for the symbol
+        i = self.slot(symbol)
+        if i is None:
+            return None
+        while True:
+            k = self.head(i)
+            if k == 0:
+                return None
+            record = self._read(i, k - 1)
+            if record is not None:
+                return Tick(*record[1:9]), record[9]
+
+    def since(self, symbol, cursor):
+        # Every tick published after `cursor` that is still in the ring, and the cursor to pass next time
+        i = self.slot(symbol)
+        if i is None:
+            return [], cursor
+        head = self.head(i)
+        ticks = []
+        for k in range(max(cursor, head - self.ring + 1), head):
+            record = self._read(i, k)
+            if record is not None:
+                ticks.append(Tick(*record[1:9]))
+        return ticks, head
+
+    def close(self):
+        self.slots = self.buf = None
+        self.block.close()
+
+
+class SharedTicks:
+    # Drop-in for the mt5 module in a worker: symbol_info_tick() comes from the feed while it is alive and has the
+    # symbol, and from the terminal otherwise (feed not started yet, restarting, or symbol not fed). Everything
+    # else passes through.
+    def __init__(self, mt5, name=TICK_FEED_NAME, max_age=2.0, retry=1.0):
+        self.mt5 = mt5
+        self.name = name
+        self.max_age = max_age
+        self.retry = retry
+        self.reader = None
+        self.next_attach = 0.0
+
+    def __getattr__(self, name):
+        return getattr(self.mt5, name)
+
+    def attach(self):
+        # (Re)map the feed's block, at most every `retry` seconds: a restarted feed may have created a new one
+        now = time.monotonic()
+        if now < self.next_attach:
+            return None
+        self.next_attach = now + self.retry
+        if self.reader is not None:
+            self.reader.close()
+            self.reader = None
+        try:
+            self.reader = TickReader(self.name)
+        except (FileNotFoundError, ValueError):
+            return None
+        return self.reader if self.reader.alive(self.max_age) else None
+
+    def symbol_info_tick(self, symbol):
+        reader = self.reader
+        if reader is None or not reader.alive(self.max_age):
+            reader = self.attach()
+        if reader is not None:
+            latest = reader.latest(symbol)
+            if latest is not None:
+                return latest[0]
+        return self.mt5.symbol_info_tick(symbol)
+
+
+def from_env(mt5):
+    # The mt5 module itself, or wrapped in SharedTicks when a feed is configured with TICK_FEED
+    name = os.environ.get("TICK_FEED")
+    return SharedTicks(mt5, name) if name else mt5
+
+
+def _bench_reader(name, symbol, count):
+    reader = TickReader(name)
+    latencies = []
+    last = None
+    while len(latencies) < count:
+        latest = reader.latest(symbol)
+        if latest is not None and latest[0].time_msc != last:
+            latencies.append(time.monotonic() - latest[1])
+            last = latest[0].time_msc
+    reader.close()
+    print(" ".join(f"{value:.9f}" for value in latencies))
+
+
+def bench(readers, count, interval):
+    # Publish synthetic ticks at `interval` to `readers` processes spinning on latest(); report publish-to-read
+    # latency. The readers are separate interpreters, as strategy workers are.
+    import subprocess
+    import tempfile
+
+    name = f"{TICK_FEED_NAME}_bench_{os.getpid()}"
+    feed = TickFeed(None, ["BENCH"], name=name, capacity=1)
+    code = f"import tick_feed; tick_feed._bench_reader({name!r}, 'BENCH', {count})"
+    outputs = [tempfile.TemporaryFile("w+") for _ in range(readers)]
+    workers = [subprocess.Popen([sys.executable, "-c", code], stdout=output, cwd=os.path.dirname(os.path.abspath(__file__)))
+               for output in outputs]
+    try:
+        time.sleep(1.0)
+        msc = 0
+        while any(worker.poll() is None for worker in workers):
+            msc += 1
+            feed.publish(0, Tick(msc // 1000, 1.0, 1.0001, 0.0, 1, msc, 6, 0.0), time.monotonic())
+            time.sleep(interval)
+    finally:
+        for worker in workers:
+            if worker.poll() is None:
+                worker.kill()
+        feed.close()
+    latencies = []
+    for output in outputs:
+        output.seek(0)
+        latencies.extend(float(value) for value in output.read().split())
+        output.close()
+    latencies.sort()
+    us = [value * 1e6 for value in latencies]
+    print(f"{readers} readers, {len(us)} reads: median {us[len(us) // 2]:.1f} us, p99 {us[int(len(us) * 0.99)]:.1f} us, "
+          f"max {us[-1]:.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Publish ticks of the configured symbols to shared memory")
+    parser.add_argument("--symbols", nargs="+", help="default: the enabled symbols in config.yaml, followed live")
+    parser.add_argument("--name", default=os.environ.get("TICK_FEED", TICK_FEED_NAME))
+    parser.add_argument("--interval", type=float, default=0.05, help="seconds between polls of the terminal")
+    parser.add_argument("--bench", type=int, metavar="READERS", help="measure publish-to-read latency with N readers")
+    args = parser.parse_args()
+
+    if args.bench:
+        bench(args.bench, 2000, 0.001)
+        return
+
+    from broker import clock, mt5
+    from config import ConfigWatcher
+
+    if not mt5.initialize():
+        print("MT5 initialization failed")
+        return 1
+    watcher = None
+    symbols = args.symbols
+    if not symbols:
+        watcher = ConfigWatcher()
+        symbols = [symbol for symbol, cfg in watcher.config.symbols.items() if cfg.enabled]
+    feed = TickFeed(mt5, symbols, name=args.name)
+    print(f"Publishing {len(symbols)} symbols to shared memory {args.name} every {args.interval}s")
+    # A terminate() from master.py still unlinks the block on POSIX
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        feed.run(args.interval, watcher, clock)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        feed.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,50 @@
+# MetaTrader5 TIMEFRAME_* values, so the offline tools work without the terminal package installed
+TIMEFRAMES = {
+    "M1": 1, "M2": 2, "M3": 3, "M4": 4, "M5": 5, "M6": 6, "M10": 10, "M12": 12, "M15": 15, "M20": 20, "M30": 30,
+    "H1": 16385, "H2": 16386, "H3": 16387, "H4": 16388, "H6": 16390, "H8": 16392, "H12": 16396,
+    "D1": 16408, "W1": 32769, "MN1": 49153,
+}
+TIMEFRAME_NAMES = {value: name for name, value in TIMEFRAMES.items()}
+
+TIMEFRAME_SECONDS = {
+    "M1": 60, "M2": 120, "M3": 180, "M4": 240, "M5": 300, "M6": 360, "M10": 600, "M12": 720, "M15": 900,
+    "M20": 1200, "M30": 1800, "H1": 3600, "H2": 7200, "H3": 10800, "H4": 14400, "H6": 21600, "H8": 28800,
+    "H12": 43200, "D1": 86400, "W1": 604800, "MN1": 2592000,
+}
+
+
+def __getattr__(name):
+    # RATES_DTYPE (same layout as the array returned by mt5.copy_rates_from_pos) is built on first use, so
+    # config.py and master.py load without importing numpy
+    if name == "RATES_DTYPE":
+        global RATES_DTYPE
+        import numpy as np
+
+        RATES_DTYPE = np.dtype([
+            ("time", "<i8"),
+            ("open", "<f8"),
+            ("high", "<f8"),
+            ("low", "<f8"),
+            ("close", "<f8"),
+            ("tick_volume", "<u8"),
+            ("spread", "<i4"),
+            ("real_volume", "<u8"),
+        ])
+        return RATES_DTYPE
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def timeframe_name(timeframe):
+    # Accepts "H1" or the MT5 constant mt5.TIMEFRAME_H1
+    if isinstance(timeframe, str):
+        name = timeframe.upper()
+        if name not in TIMEFRAMES:
+            raise ValueError(f"Unknown timeframe: {timeframe}")
+        return name
+    if timeframe not in TIMEFRAME_NAMES:
+        raise ValueError(f"Unknown timeframe: {timeframe}")
+    return TIMEFRAME_NAMES[timeframe]
+
+
+def timeframe_seconds(timeframe):
+    return TIMEFRAME_SECONDS[timeframe_name(timeframe)]
@@ -0,0 +1,154 @@
+import atexit
+import csv
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+JOURNAL_PATH = os.path.join("logs", "trades.db")
+logger = logging.getLogger("trade_journal")
+
+CSV_HEADER = ["Timestamp", "Symbol", "Action", "OrderType", "Price", "Volume", "Result", "Retcode", "Ticket"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    pid INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    action TEXT NOT NULL,
+    order_type TEXT,
+    price REAL,
+    volume REAL,
+    result TEXT,
+    retcode INTEGER,
+    ticket INTEGER
+);
+CREATE INDEX IF NOT EXISTS trades_symbol_ts ON trades (symbol, ts);
+CREATE INDEX IF NOT EXISTS trades_ts ON trades (ts);
+"""
+
+
+class TradeJournal:
+    # Trade events are appended to an in-memory buffer and written in batches by a background thread into one
+    # SQLite file in WAL mode, so any number of processes can share it without interleaved rows.
+    def __init__(self, path=JOURNAL_PATH, flush_interval=1.0, max_buffer=5000):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.buffer = deque()
+        self.pid = os.getpid()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+
+    def record(self, symbol, action, order_type, price, volume, result, retcode=None, ticket=None, ts=None):
+        self.buffer.append((time.time() if ts is None else ts, self.pid, symbol, action, order_type,
+                            price, volume, result, retcode, ticket))
+        if len(self.buffer) >= self.max_buffer:
+            self._wake.set()
+
+    def flush(self):
+        with self._lock:
+            rows = []
+            while self.buffer:
+                rows.append(self.buffer.popleft())
+            if rows:
+                try:
+                    with self.db:
+                        self.db.executemany(
+                            "INSERT INTO trades (ts, pid, symbol, action, order_type, price, volume, result, retcode, ticket) "
+                            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                except sqlite3.Error:
+                    # Back at the front, in order, for the next flush (e.g. "database is locked" under contention)
+                    self.buffer.extendleft(reversed(rows))
+                    raise
+            return len(rows)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True, name="trade-journal")
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except sqlite3.Error as error:
+                logger.error(f"Trade journal flush failed, {len(self.buffer)} rows kept for the next attempt: {error}")
+
+    def close(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+        try:
+            self.flush()
+        except sqlite3.Error as error:
+            # Usually at interpreter exit, so there is no next attempt: the rows go to the log instead
+            logger.error(f"Trade journal final flush failed, {len(self.buffer)} rows not written: {error}")
+            for row in self.buffer:
+                logger.error(f"Unwritten trade row: {row}")
+
+    def query(self, symbol=None, start=None, end=None, action=None):
+        # Events (flushed or still buffered) filtered by symbol, action and a [start, end] epoch-seconds window
+        self.flush()
+        clauses, params = [], []
+        for column, op, value in (("symbol", "=", symbol), ("action", "=", action), ("ts", ">=", start), ("ts", "<=", end)):
+            if value is not None:
+                clauses.append(f"{column} {op} ?")
+                params.append(value.timestamp() if isinstance(value, datetime) else value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            cursor = self.db.execute(
+                "SELECT ts, symbol, action, order_type, price, volume, result, retcode, ticket FROM trades"
+                f"{where} ORDER BY ts, id", params)
+            names = [column[0] for column in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall()]
+
+    def export_csv(self, path, **filters):
+        # Same layout as the old logs/Trades.csv
+        with open(path, mode="w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(CSV_HEADER)
+            for row in self.query(**filters):
+                writer.writerow([datetime.fromtimestamp(row["ts"]).strftime('%Y-%m-%d %H:%M:%S'), row["symbol"],
+                                 row["action"], row["order_type"], row["price"], row["volume"], row["result"],
+                                 row["retcode"], row["ticket"]])
+
+
+_journal = None
+
+
+def get_journal():
+    # Process-wide journal, started on first use
+    global _journal
+    if _journal is None:
+        _journal = TradeJournal().start()
+    return _journal
+
+
+if __name__ == "__main__":
+    # python trade_journal.py export logs/Trades.csv [symbol]
+    if len(sys.argv) < 3 or sys.argv[1] != "export":
+        print("Usage: python trade_journal.py export <csv_path> [symbol]")
+        sys.exit(1)
+    journal = TradeJournal()
+    journal.export_csv(sys.argv[2], symbol=sys.argv[3] if len(sys.argv) > 3 else None)
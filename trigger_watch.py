@@ -0,0 +1,48 @@
+from collections import namedtuple
+
+Trigger = namedtuple("Trigger", "symbol direction level armed_at expires_at payload")
+
+
+class TriggerWatcher:
+    # Keeps one armed entry trigger per symbol and checks all of them against a single price snapshot.
+    # BUY fires when the price falls to the level, SELL when it rises to it (the big-candle pullback entry).
+    def __init__(self):
+        self.triggers = {}
+
+    def __len__(self):
+        return len(self.triggers)
+
+    def __contains__(self, symbol):
+        return symbol in self.triggers
+
+    def symbols(self):
+        return list(self.triggers)
+
+    def arm(self, symbol, direction, level, now, expiry_seconds=None, payload=None):
+        expires_at = now + expiry_seconds if expiry_seconds is not None else None
+        trigger = Trigger(symbol, direction, level, now, expires_at, payload)
+        self.triggers[symbol] = trigger
+        return trigger
+
+    def disarm(self, symbol):
+        return self.triggers.pop(symbol, None)
+
+    def expire(self, now):
+        expired = [t for t in self.triggers.values() if t.expires_at is not None and now >= t.expires_at]
+        for trigger in expired:
+            del self.triggers[trigger.symbol]
+        return expired
+
+    def check(self, prices, now=None):
+        # prices: {symbol: bid}; returns the triggers crossed in this snapshot and disarms them
+        if now is not None:
+            self.expire(now)
+        fired = []
+        for symbol, trigger in list(self.triggers.items()):
+            price = prices.get(symbol)
+            if price is None:
+                continue
+            if (trigger.direction == "BUY" and price <= trigger.level) or (trigger.direction == "SELL" and price >= trigger.level):
+                fired.append(trigger)
+                del self.triggers[symbol]
+        return fired